@@ -12,9 +12,24 @@ from .connection import setGlobalConnectionParams, getDatabaseConnection, Databa
 
 from .model import DatabaseModel
 from .special import SQL_NULL, QueryStr
+from .expressions import F
 
 from .query import SelectQuery, InsertQuery, UpdateQuery, DeleteQuery, SelectInnerJoinQuery, SelectGenericJoinQuery
 
+from .queryset import QuerySet
+from .chunked import ChunkedQueryRunner
+from .batch import QueryBatch
+from .explain import QueryPlan
+from .costguard import setGlobalCostGuard, QueryCostExceededError
+from .stats import setGlobalQueryStats
+from .routing import registerReplica, setGlobalReplicaRouting
+from .pool import DatabaseConnectionPool, getPoolMetricsText
+from .sharding import HashShardMap, RangeShardMap
+from .parallel import executeParallel
+from .partitioned import PartitionedScan
+from .fieldcodecs import RawCodec, FloatCodec, LazyJSONCodec, FunctionCodec
+from .transaction import transactional
+
 __version__ = '2.0.2'
 __version_tuple__ = ('2', '0', '2')
 __version_int_tuple__ = (2, 0, 2)
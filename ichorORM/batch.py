@@ -0,0 +1,197 @@
+'''
+    Copyright (c) 2018 Timothy Savannah
+
+    Licensed under the terms of the Lesser GNU Lesser General Public License version 2.1
+
+      license can be found at https://raw.githubusercontent.com/kata198/ichorORM/master/LICENSE
+
+
+    batch - Send many insert / update / delete queries to the database in a single round trip
+'''
+# vim: set ts=4 sw=4 st=4 expandtab:
+
+from .query import InsertQuery, UpdateQuery, DeleteQuery
+from .costguard import checkQueryCost
+
+from . import getDatabaseConnection
+
+__all__ = ('QueryBatch', )
+
+
+class QueryBatch(object):
+    '''
+        QueryBatch - Collects InsertQuery / UpdateQuery / DeleteQuery objects, and executes them all in a single statement
+
+            ( one round trip, one commit ), with the result of each query returned separately.
+
+            Each query becomes a data-modifying CTE:
+
+                WITH ichor_batch_0 AS ( INSERT ... RETURNING id ), ichor_batch_1 AS ( UPDATE ... RETURNING 1 ), ...
+                  SELECT ( SELECT array_agg(id) FROM ichor_batch_0 ), ( SELECT count(*) FROM ichor_batch_1 ), ...
+
+            NOTE: As with any single statement, all the queries see the same snapshot of the database.
+
+              They cannot see each other's changes ( e.x. an update will not match a row inserted earlier in the same batch ),
+
+              and should not modify the same rows. Use for independent queries.
+
+            e.x.
+
+                batch = QueryBatch()
+                batch.add( InsertQuery(MyModel, { 'name' : 'one' }) )
+                batch.add( updateQuery )
+                batch.add( deleteQuery )
+
+                (newPk, numUpdated, numDeleted) = batch.execute()
+    '''
+
+    def __init__(self, queries=None):
+        '''
+            __init__ - Create a QueryBatch
+
+                @param queries <None/list<QueryBase>> default None - Initial queries to add, @see #add
+        '''
+        self.queries = []
+
+        # rowcounts - After #execute, the number of rows affected by each query
+        self.rowcounts = None
+
+        if queries:
+            for query in queries:
+                self.add(query)
+
+
+    def add(self, query, allowDeleteAll=False):
+        '''
+            add - Add a query to this batch
+
+                @param query <InsertQuery/UpdateQuery/DeleteQuery> - The query
+
+                @param allowDeleteAll <bool> default False - If True, allow a DeleteQuery without a "WHERE" stage
+
+                @return <int> - The index of this query's result in the return of #execute
+        '''
+        if not issubclass(query.__class__, (InsertQuery, UpdateQuery, DeleteQuery)):
+            raise ValueError('Only InsertQuery, UpdateQuery, and DeleteQuery can be batched. Got: %s' %(query.__class__.__name__, ))
+
+        if issubclass(query.__class__, UpdateQuery) and query.returningFields:
+            raise ValueError('An UpdateQuery with returning fields cannot be batched. Use executeUpdate instead.')
+
+        if issubclass(query.__class__, DeleteQuery) and not allowDeleteAll and not query.getWhereClause():
+            raise ValueError('Error: Tried to delete the entire tablespace of  %s  (no where clause). Add with allowDeleteAll=True to proceed anyway with deleting all records.' %(query.getTableName(), ))
+
+        self.queries.append(query)
+
+        return len(self.queries) - 1
+
+
+    def __len__(self):
+        return len(self.queries)
+
+
+    def getSqlParameterizedValues(self):
+        '''
+            getSqlParameterizedValues - Get the combined SQL and params for all the queries in this batch
+
+                @return tuple( <str/None>, <dict>, list<int> ) - The SQL ( None if nothing to execute ), the params,
+
+                    and the indexes ( into #queries ) of the queries included, in the order of the selected columns.
+
+                    An UpdateQuery without any fields set is not included.
+        '''
+        cteStrs = []
+        selectStrs = []
+        params = {}
+        includedIdxs = []
+
+        for idx, query in enumerate(self.queries):
+            if issubclass(query.__class__, UpdateQuery) and not query.hasAnyUpdates:
+                continue
+
+            cteName = 'ichor_batch_%d' %(idx, )
+
+            (querySql, queryParams) = query.getSqlParameterizedValues(paramPrefix=cteName)
+            params.update(queryParams)
+
+            if issubclass(query.__class__, InsertQuery):
+                primaryKeyName = query.getModel().PRIMARY_KEY
+
+                cteStrs.append( '%s AS ( %s RETURNING %s )' %(cteName, querySql.strip(), primaryKeyName) )
+                selectStrs.append( '( SELECT array_agg(%s) FROM %s )' %(primaryKeyName, cteName) )
+            else:
+                cteStrs.append( '%s AS ( %s RETURNING 1 )' %(cteName, querySql.strip()) )
+                selectStrs.append( '( SELECT count(*) FROM %s )' %(cteName, ) )
+
+            includedIdxs.append(idx)
+
+        if not cteStrs:
+            return (None, params, includedIdxs)
+
+        sql = 'WITH %s SELECT %s' %( ', '.join(cteStrs), ', '.join(selectStrs) )
+
+        return (sql, params, includedIdxs)
+
+
+    def execute(self, dbConn=None, doCommit=True):
+        '''
+            execute - Execute all the queries in this batch, in a single statement
+
+                @param dbConn <None/DatabaseConnection> default None - The connection to use, which must be to the primary.
+                    If None, a new transaction-mode connection ( to the primary ) is used.
+
+                @param doCommit <bool> default True - If True, commit once after the batch. If False, you must commit.
+
+                    A #dbConn must be specified if doCommit=False
+
+                @return list - The result of each query, in the order added:
+
+                    InsertQuery - The primary key of the inserted row
+
+                    UpdateQuery / DeleteQuery - The number of rows affected
+
+                  The number of rows affected by each query is also set on #rowcounts
+        '''
+        if not doCommit and not dbConn:
+            raise ValueError('doCommit=False but a dbConn not specified!')
+
+        # The batch is a data-modifying CTE sent with doSelectParams, so nothing else keeps it off a replica.
+        #   It must not go through getReadDatabaseConnection.
+        if dbConn and dbConn.isReplica:
+            raise ValueError('QueryBatch writes, but the given dbConn is to a read replica!')
+
+        results = [ 0 ] * len(self.queries)
+        rowcounts = [ 0 ] * len(self.queries)
+
+        (sql, params, includedIdxs) = self.getSqlParameterizedValues()
+
+        if sql is not None:
+            if not dbConn:
+                dbConn = getDatabaseConnection(isTransactionMode=True)
+
+            for idx in includedIdxs:
+                query = self.queries[idx]
+                # An INSERT ... VALUES of one row has a fixed, trivial cost, so is not worth an EXPLAIN
+                if not issubclass(query.__class__, InsertQuery):
+                    (querySql, queryParams) = query.getSqlParameterizedValues()
+                    checkQueryCost(query, querySql, queryParams, dbConn)
+
+            row = dbConn.doSelectParams(sql, params)[0]
+            dbConn._noteWrite()
+
+            for idx, value in zip(includedIdxs, row):
+                if issubclass(self.queries[idx].__class__, InsertQuery):
+                    pks = value or []
+                    results[idx] = pks[0] if pks else None
+                    rowcounts[idx] = len(pks)
+                else:
+                    results[idx] = rowcounts[idx] = int(value)
+
+            if doCommit:
+                dbConn.commit()
+
+        self.rowcounts = rowcounts
+
+        return results
+
+
+# vim: set ts=4 sw=4 st=4 expandtab:
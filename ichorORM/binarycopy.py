@@ -0,0 +1,354 @@
+'''
+    Copyright (c) 2018 Timothy Savannah
+
+    Licensed under the terms of the Lesser GNU Lesser General Public License version 2.1
+
+      license can be found at https://raw.githubusercontent.com/kata198/ichorORM/master/LICENSE
+
+
+    binarycopy - Reading query results via  COPY ( query ) TO STDOUT ( FORMAT binary ) ,
+
+        which skips text encoding/decoding of each value on both ends.
+
+        The binary tuple stream is parsed in place with struct / memoryview, either from the full output,
+
+          or incrementally from chunks as they arrive.
+'''
+# vim: set ts=4 sw=4 st=4 expandtab:
+
+import datetime
+import struct
+
+from decimal import Decimal
+
+__all__ = ('BinaryCopyFormatError', 'getBinaryDecoder', 'getBinaryDecoders', 'iterBinaryCopyRows', 'iterBinaryCopyChunks', 'BINARY_COPY_SUPPORTED_OIDS')
+
+# COPY_BINARY_SIGNATURE - The fixed signature at the start of the binary COPY format
+COPY_BINARY_SIGNATURE = b'PGCOPY\n\xff\r\n\x00'
+
+# Postgres type OIDs
+OID_BOOL = 16
+OID_INT8 = 20
+OID_INT2 = 21
+OID_INT4 = 23
+OID_TEXT = 25
+OID_FLOAT4 = 700
+OID_FLOAT8 = 701
+OID_BPCHAR = 1042
+OID_VARCHAR = 1043
+OID_DATE = 1082
+OID_TIMESTAMP = 1114
+OID_NUMERIC = 1700
+
+_INT16 = struct.Struct('!h')
+_INT32 = struct.Struct('!i')
+_INT64 = struct.Struct('!q')
+_FLOAT4 = struct.Struct('!f')
+_FLOAT8 = struct.Struct('!d')
+_NUMERIC_HEADER = struct.Struct('!hhHh')
+
+# Postgres dates and timestamps are relative to 2000-01-01
+_POSTGRES_EPOCH_DATETIME = datetime.datetime(2000, 1, 1)
+_POSTGRES_EPOCH_ORDINAL = datetime.date(2000, 1, 1).toordinal()
+
+_TIMESTAMP_INFINITY = 0x7FFFFFFFFFFFFFFF
+_TIMESTAMP_NEG_INFINITY = -0x8000000000000000
+_DATE_INFINITY = 0x7FFFFFFF
+_DATE_NEG_INFINITY = -0x80000000
+
+_NUMERIC_NEG = 0x4000
+_NUMERIC_NAN = 0xC000
+_NUMERIC_PINF = 0xD000
+_NUMERIC_NINF = 0xF000
+
+
+class BinaryCopyFormatError(Exception):
+    '''
+        BinaryCopyFormatError - Exception raised when binary COPY data is malformed
+    '''
+    pass
+
+
+def _decodeInt2(buf, offset, length):
+    return _INT16.unpack_from(buf, offset)[0]
+
+def _decodeInt4(buf, offset, length):
+    return _INT32.unpack_from(buf, offset)[0]
+
+def _decodeInt8(buf, offset, length):
+    return _INT64.unpack_from(buf, offset)[0]
+
+def _decodeFloat4(buf, offset, length):
+    return _FLOAT4.unpack_from(buf, offset)[0]
+
+def _decodeFloat8(buf, offset, length):
+    return _FLOAT8.unpack_from(buf, offset)[0]
+
+def _decodeBool(buf, offset, length):
+    return buf[offset] != 0
+
+def _decodeTimestamp(buf, offset, length):
+    microseconds = _INT64.unpack_from(buf, offset)[0]
+
+    if microseconds == _TIMESTAMP_INFINITY:
+        return datetime.datetime.max
+    if microseconds == _TIMESTAMP_NEG_INFINITY:
+        return datetime.datetime.min
+
+    return _POSTGRES_EPOCH_DATETIME + datetime.timedelta(microseconds=microseconds)
+
+def _decodeDate(buf, offset, length):
+    days = _INT32.unpack_from(buf, offset)[0]
+
+    if days == _DATE_INFINITY:
+        return datetime.date.max
+    if days == _DATE_NEG_INFINITY:
+        return datetime.date.min
+
+    return datetime.date.fromordinal(_POSTGRES_EPOCH_ORDINAL + days)
+
+def _decodeNumeric(buf, offset, length):
+    (numDigits, weight, sign, displayScale) = _NUMERIC_HEADER.unpack_from(buf, offset)
+
+    if sign == _NUMERIC_NAN:
+        return Decimal('NaN')
+    if sign == _NUMERIC_PINF:
+        return Decimal('Infinity')
+    if sign == _NUMERIC_NINF:
+        return Decimal('-Infinity')
+
+    # Digits are base 10000, the first having a weight of 10000 ^ weight
+    coefficient = 0
+    digitsOffset = offset + 8
+    for i in range(numDigits):
+        coefficient = ( coefficient * 10000 ) + _INT16.unpack_from(buf, digitsOffset + (i * 2))[0]
+
+    exponent = (weight + 1 - numDigits) * 4
+
+    # Match the text representation, which has exactly displayScale digits after the decimal point
+    if exponent > -displayScale:
+        coefficient *= 10 ** (exponent + displayScale)
+    elif exponent < -displayScale:
+        coefficient //= 10 ** (-displayScale - exponent)
+
+    return Decimal( ( 1 if sign == _NUMERIC_NEG else 0, tuple( [ int(digit) for digit in str(coefficient) ] ), -displayScale ) )
+
+
+_FIXED_DECODERS = {
+    OID_BOOL      : _decodeBool,
+    OID_INT2      : _decodeInt2,
+    OID_INT4      : _decodeInt4,
+    OID_INT8      : _decodeInt8,
+    OID_FLOAT4    : _decodeFloat4,
+    OID_FLOAT8    : _decodeFloat8,
+    OID_DATE      : _decodeDate,
+    OID_TIMESTAMP : _decodeTimestamp,
+    OID_NUMERIC   : _decodeNumeric,
+}
+
+_TEXT_OIDS = (OID_TEXT, OID_VARCHAR, OID_BPCHAR)
+
+# BINARY_COPY_SUPPORTED_OIDS - The type OIDs which can be decoded from binary COPY
+BINARY_COPY_SUPPORTED_OIDS = tuple( list(_FIXED_DECODERS.keys()) + list(_TEXT_OIDS) )
+
+
+def getBinaryDecoder(typeOid, encoding='utf_8'):
+    '''
+        getBinaryDecoder - Get the decoder for a postgres type
+
+            @param typeOid <int> - The postgres type OID
+
+            @param encoding <str> default 'utf_8' - The client encoding, used for text
+
+            @return <None/function(buf, offset, length)> - The decoder, or None if the type is not supported
+    '''
+    if typeOid in _TEXT_OIDS:
+        return lambda buf, offset, length : str(buf[offset : offset + length], encoding)
+
+    return _FIXED_DECODERS.get(typeOid, None)
+
+
+def getBinaryDecoders(typeOids, encoding='utf_8'):
+    '''
+        getBinaryDecoders - Get the decoders for a series of columns
+
+            @param typeOids list<int> - The postgres type OID of each column
+
+            @param encoding <str> default 'utf_8' - The client encoding, used for text
+
+            @return <None/list<function>> - The decoder of each column, or None if any column has an unsupported type
+    '''
+    decoders = []
+
+    for typeOid in typeOids:
+        decoder = getBinaryDecoder(typeOid, encoding)
+        if decoder is None:
+            return None
+
+        decoders.append(decoder)
+
+    return decoders
+
+
+def iterBinaryCopyRows(data, decoders):
+    '''
+        iterBinaryCopyRows - Parse the output of  COPY ... TO STDOUT ( FORMAT binary )
+
+            Values are decoded directly from #data, without copying each field out.
+
+            @param data <bytes-like> - The full COPY output
+
+            @param decoders list<function> - The decoder of each column, @see getBinaryDecoders
+
+            @return generator<tuple> - Yields each row, a tuple of cols
+
+            @raises BinaryCopyFormatError - If #data is not valid binary COPY output for #decoders
+    '''
+    buf = memoryview(data)
+    bufLen = len(buf)
+
+    if bytes(buf[:11]) != COPY_BINARY_SIGNATURE:
+        raise BinaryCopyFormatError('Missing binary COPY signature.')
+
+    # Header is signature, int32 flags, and int32 length of a header extension
+    headerExtensionLength = _INT32.unpack_from(buf, 15)[0]
+    offset = 19 + headerExtensionLength
+
+    numColumns = len(decoders)
+
+    int16Unpack = _INT16.unpack_from
+    int32Unpack = _INT32.unpack_from
+
+    while offset < bufLen:
+        numFields = int16Unpack(buf, offset)[0]
+        offset += 2
+
+        if numFields == -1:
+            # Trailer
+            return
+
+        if numFields != numColumns:
+            raise BinaryCopyFormatError('Expected %d fields in row, but got %d.' %(numColumns, numFields))
+
+        row = []
+        for decoder in decoders:
+            fieldLength = int32Unpack(buf, offset)[0]
+            offset += 4
+
+            if fieldLength == -1:
+                row.append(None)
+            else:
+                row.append( decoder(buf, offset, fieldLength) )
+                offset += fieldLength
+
+        yield tuple(row)
+
+    raise BinaryCopyFormatError('Binary COPY data ended without a trailer.')
+
+
+def _parseCompleteRows(buf, offset, decoders):
+    '''
+        _parseCompleteRows - Parse the complete rows in #buf starting at #offset, stopping at a partial row
+
+            @return tuple( rows<list<tuple>>, offset<int>, isDone<bool> ) - The rows, the offset after the last complete row,
+
+                and whether the trailer was reached
+    '''
+    bufLen = len(buf)
+    numColumns = len(decoders)
+
+    int16Unpack = _INT16.unpack_from
+    int32Unpack = _INT32.unpack_from
+
+    rows = []
+
+    while offset + 2 <= bufLen:
+        numFields = int16Unpack(buf, offset)[0]
+
+        if numFields == -1:
+            # Trailer
+            return (rows, offset + 2, True)
+
+        if numFields != numColumns:
+            raise BinaryCopyFormatError('Expected %d fields in row, but got %d.' %(numColumns, numFields))
+
+        rowOffset = offset + 2
+        row = []
+        for decoder in decoders:
+            if rowOffset + 4 > bufLen:
+                return (rows, offset, False)
+
+            fieldLength = int32Unpack(buf, rowOffset)[0]
+            rowOffset += 4
+
+            if fieldLength == -1:
+                row.append(None)
+            else:
+                if rowOffset + fieldLength > bufLen:
+                    return (rows, offset, False)
+
+                row.append( decoder(buf, rowOffset, fieldLength) )
+                rowOffset += fieldLength
+
+        rows.append(tuple(row))
+        offset = rowOffset
+
+    return (rows, offset, False)
+
+
+def iterBinaryCopyChunks(chunks, decoders):
+    '''
+        iterBinaryCopyChunks - Parse the output of  COPY ... TO STDOUT ( FORMAT binary ) as it arrives in chunks
+
+            The rows completed by each chunk are decoded and yielded before the next chunk is read. One buffer is reused,
+
+              holding only the partial row left over plus the next chunk, so memory does not grow with the output.
+
+            @param chunks <iterable<bytes>> - The COPY output, split anywhere. @see DatabaseConnection.doCopyOutParamsStream
+
+            @param decoders list<function> - The decoder of each column, @see getBinaryDecoders
+
+            @return generator<tuple> - Yields each row, a tuple of cols
+
+            @raises BinaryCopyFormatError - If the output is not valid binary COPY output for #decoders
+    '''
+    pending = bytearray()
+
+    # offset - Position in #pending of the next row, or None until the header has been read
+    offset = None
+
+    for chunk in chunks:
+        pending += chunk
+
+        if offset is None:
+            if len(pending) < 19:
+                continue
+
+            if bytes(pending[:11]) != COPY_BINARY_SIGNATURE:
+                raise BinaryCopyFormatError('Missing binary COPY signature.')
+
+            # Header is signature, int32 flags, and int32 length of a header extension
+            headerLength = 19 + _INT32.unpack_from(pending, 15)[0]
+            if len(pending) < headerLength:
+                continue
+
+            offset = headerLength
+
+        (rows, offset, isDone) = _parseCompleteRows(pending, offset, decoders)
+
+        for row in rows:
+            yield row
+
+        if isDone:
+            return
+
+        del pending[:offset]
+        offset = 0
+
+    if offset is None:
+        raise BinaryCopyFormatError('Missing binary COPY signature.')
+
+    raise BinaryCopyFormatError('Binary COPY data ended without a trailer.')
+
+
+# vim: set ts=4 sw=4 st=4 expandtab:
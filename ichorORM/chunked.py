@@ -0,0 +1,339 @@
+'''
+    Copyright (c) 2018 Timothy Savannah
+
+    Licensed under the terms of the Lesser GNU Lesser General Public License version 2.1
+
+      license can be found at https://raw.githubusercontent.com/kata198/ichorORM/master/LICENSE
+
+
+    chunked - Execute a DeleteQuery or UpdateQuery in many small, separately committed chunks
+'''
+# vim: set ts=4 sw=4 st=4 expandtab:
+
+import copy
+import time
+
+from .constants import WHERE_AND, CHUNK_BY_PK, CHUNK_BY_CTID, ALL_CHUNK_MODES
+from .query import FilterType, FilterStage, SelectQuery, DeleteQuery, UpdateQuery
+
+from . import getDatabaseConnection
+
+__all__ = ('ChunkedQueryRunner', 'ChunkProgress', 'CHUNK_BY_PK', 'CHUNK_BY_CTID')
+
+
+class ChunkProgress(object):
+    '''
+        ChunkProgress - Passed to the progress callback of a ChunkedQueryRunner after each committed chunk
+    '''
+
+    __slots__ = ('chunkNum', 'chunkRowCount', 'totalRowCount', 'lastPk', 'elapsed')
+
+    def __init__(self, chunkNum, chunkRowCount, totalRowCount, lastPk, elapsed):
+        '''
+            __init__ - Create a ChunkProgress
+
+                @param chunkNum <int> - The number of this chunk (starting at 1)
+
+                @param chunkRowCount <int> - The number of rows affected by this chunk
+
+                @param totalRowCount <int> - The number of rows affected by all chunks thus far
+
+                @param lastPk <None/???> - The last primary key processed (CHUNK_BY_PK only, None for CHUNK_BY_CTID).
+
+                    Pass this as #startAfterPk to a new runner to resume.
+
+                @param elapsed <float> - Seconds elapsed since the runner was started
+        '''
+        self.chunkNum = chunkNum
+        self.chunkRowCount = chunkRowCount
+        self.totalRowCount = totalRowCount
+        self.lastPk = lastPk
+        self.elapsed = elapsed
+
+    def __repr__(self):
+        return 'ChunkProgress( chunkNum=%d , chunkRowCount=%d , totalRowCount=%d , lastPk=%s , elapsed=%.3f )' % \
+            (self.chunkNum, self.chunkRowCount, self.totalRowCount, repr(self.lastPk), self.elapsed)
+
+
+class _CtidChunkFilter(FilterType):
+    '''
+        _CtidChunkFilter - A condition limiting a query to the ctids returned by an embedded SelectQuery.
+
+            Renders as  ctid = ANY( ARRAY( SELECT ctid FROM ... LIMIT N ) ) , which postgres executes as a TID scan.
+    '''
+
+    __slots__ = ('selectQuery', )
+
+    def __init__(self, selectQuery):
+        self.selectQuery = selectQuery
+
+    def toStr(self):
+        return ' ctid = ANY( ARRAY%s ) ' %( self.selectQuery.asQueryStr(), )
+
+    def toStrParam(self, paramName):
+        (selectStr, selectParams) = self.selectQuery.asQueryStrParams(paramPrefix=paramName)
+
+        return ( ' ctid = ANY( ARRAY%s ) ' %(selectStr, ), selectParams )
+
+
+class ChunkedQueryRunner(object):
+    '''
+        ChunkedQueryRunner - Executes a DeleteQuery or UpdateQuery in chunks of at most N rows,
+
+            committing after every chunk, so that very large purges / backfills do not hold
+            locks (or bloat the WAL) for the duration of a single enormous statement.
+
+          Two chunking modes are supported:
+
+            CHUNK_BY_PK   - (default) Walk the primary key in ascending order. Each chunk covers the
+                             next #chunkSize matching primary keys as a range ( pk > last AND pk <= chunkMax ).
+                             The run can be resumed by passing the last processed key as #startAfterPk
+
+            CHUNK_BY_CTID - Each chunk is limited to the physical row ids ( ctid ) of the first #chunkSize
+                             matching rows. Useful when there is no usable primary key index.
+                             The run ends when a chunk affects fewer than #chunkSize rows, so an UpdateQuery
+                             run this way MUST have a WHERE which excludes rows that have already been updated.
+    '''
+
+    def __init__(self, query, chunkSize=1000, chunkBy=CHUNK_BY_PK, sleepBetween=0, sleepRatio=0, progressCallback=None, startAfterPk=None, maxChunks=None, allowDeleteAll=False):
+        '''
+            __init__ - Create a ChunkedQueryRunner
+
+                @param query <DeleteQuery/UpdateQuery> - The query to run. Its WHERE is used to select the rows of each chunk.
+
+                    The query object is not modified.
+
+                @param chunkSize <int> default 1000 - Maximum number of rows to affect per chunk (per commit)
+
+                @param chunkBy <str> default CHUNK_BY_PK - CHUNK_BY_PK or CHUNK_BY_CTID, @see ChunkedQueryRunner
+
+                @param sleepBetween <float> default 0 - Seconds to sleep after each committed chunk
+
+                @param sleepRatio <float> default 0 - Additionally sleep this multiple of the time the chunk took to run.
+
+                    e.x. 1.0 means sleep as long as the chunk took, limiting the runner to ~50% of the time on the database.
+
+                @param progressCallback <None/function> default None - If provided, called with a ChunkProgress after each committed chunk.
+
+                    If this function returns False (not just a false-like value), the run is stopped.
+
+                @param startAfterPk <None/???> default None - CHUNK_BY_PK only. If provided, only records with a primary key
+
+                    greater than this value will be affected. Use the "lastPk" from a ChunkProgress to resume an interrupted run.
+
+                @param maxChunks <None/int> default None - If provided, stop after this many chunks
+
+                @param allowDeleteAll <bool> default False - Same as on DeleteQuery.executeDelete, must be True to
+
+                    run a DeleteQuery which has no WHERE clause
+        '''
+
+        if not issubclass(query.__class__, (DeleteQuery, UpdateQuery)):
+            raise ValueError('ChunkedQueryRunner only supports DeleteQuery and UpdateQuery, got: %s' %(query.__class__.__name__, ))
+
+        if chunkBy not in ALL_CHUNK_MODES:
+            raise ValueError('Unknown chunkBy: %s.   Possible modes:  %s.' %(repr(chunkBy), repr(ALL_CHUNK_MODES)))
+
+        chunkSize = int(chunkSize)
+        if chunkSize < 1:
+            raise ValueError('chunkSize must be at least 1. Got: %d' %(chunkSize, ))
+
+        if startAfterPk is not None and chunkBy != CHUNK_BY_PK:
+            raise ValueError('startAfterPk may only be used with chunkBy=CHUNK_BY_PK')
+
+        self.query = query
+        self.chunkSize = chunkSize
+        self.chunkBy = chunkBy
+        self.sleepBetween = sleepBetween
+        self.sleepRatio = sleepRatio
+        self.progressCallback = progressCallback
+        self.maxChunks = maxChunks
+        self.allowDeleteAll = allowDeleteAll
+
+        # lastPk - The last primary key processed. Can be used to resume.
+        self.lastPk = startAfterPk
+
+        # totalRowCount - Total rows affected thus far
+        self.totalRowCount = 0
+
+        # numChunks - Number of chunks committed thus far
+        self.numChunks = 0
+
+        # isComplete - True once every matching row has been processed
+        self.isComplete = False
+
+
+    def _copyQueryWithStage(self, extraStage):
+        '''
+            _copyQueryWithStage - Get a copy of #query with an additional top-level filter stage
+
+                @param extraStage <FilterStage> - The additional stage to AND onto the WHERE
+
+                @return <DeleteQuery/UpdateQuery> - A copy of the query. The original is unmodified.
+        '''
+        chunkQuery = copy.copy(self.query)
+        chunkQuery.filterStages = list(self.query.filterStages) + [ extraStage ]
+
+        return chunkQuery
+
+
+    def _getNextPkChunk(self, dbConn):
+        '''
+            _getNextPkChunk - Find the highest primary key of the next chunk, and how many matching rows it covers
+
+                @param dbConn <DatabaseConnection> - Connection to use
+
+                @return tuple( chunkMaxPk<???/None>, numRows<int> ) - chunkMaxPk is None when there are no more matching rows
+        '''
+        model = self.query.model
+        primaryKeyName = model.PRIMARY_KEY
+
+        filterStages = list(self.query.filterStages)
+        if self.lastPk is not None:
+            afterStage = FilterStage(WHERE_AND)
+            afterStage.addCondition(primaryKeyName, '>', self.lastPk)
+            filterStages.append(afterStage)
+
+        boundsQuery = SelectQuery(model, selectFields=[primaryKeyName], filterStages=filterStages, orderByField=primaryKeyName, orderByDir='ASC', limitNum=self.chunkSize)
+
+        (boundsSql, boundsParams) = boundsQuery.getSqlParameterizedValues(paramPrefix='chunk')
+
+        sql = 'SELECT MAX(%s), COUNT(*) FROM ( %s ) AS _ichor_chunk' %(primaryKeyName, boundsSql)
+
+        rows = dbConn.doSelectParams(sql, boundsParams)
+
+        (chunkMaxPk, numRows) = rows[0]
+
+        return (chunkMaxPk, numRows)
+
+
+    def _runPkChunk(self, dbConn):
+        '''
+            _runPkChunk - Run the next CHUNK_BY_PK chunk
+
+                @return tuple( rowCount<int>, isLastChunk<bool> )
+        '''
+        (chunkMaxPk, numRows) = self._getNextPkChunk(dbConn)
+        if chunkMaxPk is None:
+            return (0, True)
+
+        primaryKeyName = self.query.model.PRIMARY_KEY
+
+        rangeStage = FilterStage(WHERE_AND)
+        if self.lastPk is not None:
+            rangeStage.addCondition(primaryKeyName, '>', self.lastPk)
+        rangeStage.addCondition(primaryKeyName, '<=', chunkMaxPk)
+
+        chunkQuery = self._copyQueryWithStage(rangeStage)
+
+        rowCount = self._executeChunkQuery(chunkQuery, dbConn)
+
+        self.lastPk = chunkMaxPk
+
+        return (rowCount, numRows < self.chunkSize)
+
+
+    def _runCtidChunk(self, dbConn):
+        '''
+            _runCtidChunk - Run the next CHUNK_BY_CTID chunk
+
+                @return tuple( rowCount<int>, isLastChunk<bool> )
+        '''
+        ctidQuery = SelectQuery(self.query.model, selectFields=['ctid'], filterStages=self.query.filterStages, limitNum=self.chunkSize)
+
+        ctidStage = FilterStage(WHERE_AND)
+        ctidStage.addFilter( _CtidChunkFilter(ctidQuery) )
+
+        chunkQuery = self._copyQueryWithStage(ctidStage)
+
+        rowCount = self._executeChunkQuery(chunkQuery, dbConn)
+
+        return (rowCount, rowCount < self.chunkSize)
+
+
+    def _executeChunkQuery(self, chunkQuery, dbConn):
+        '''
+            _executeChunkQuery - Execute and commit a single chunk
+
+                @return <int> - Number of rows affected
+        '''
+        (sql, params) = chunkQuery.getSqlParameterizedValues()
+
+        rowCount = dbConn.executeSqlParamsGetRowCount(sql, params)
+
+        dbConn.commit()
+
+        return max(rowCount, 0)
+
+
+    def run(self, dbConn=None):
+        '''
+            run - Run chunks until every matching row has been processed (or the run is stopped)
+
+                @param dbConn <None/DatabaseConnection> default None - Connection to use.
+
+                    If None, a new transaction-mode connection with the global settings is used.
+
+                    NOTE: The connection is committed after every chunk, so do not pass a connection
+                      which has other uncommitted work on it.
+
+                @return <int> - Total number of rows affected by this call
+        '''
+        query = self.query
+
+        if issubclass(query.__class__, UpdateQuery) and not query.hasAnyUpdates:
+            self.isComplete = True
+            return 0
+
+        if issubclass(query.__class__, DeleteQuery) and not self.allowDeleteAll and not query.getWhereClause():
+            raise ValueError('Error: Tried to delete the entire tablespace of  %s  (no where clause). Use allowDeleteAll=True to proceed anyway with deleting all records.' %(query.getTableName(), ))
+
+        if not dbConn:
+            dbConn = getDatabaseConnection(isTransactionMode=True)
+
+        if self.chunkBy == CHUNK_BY_PK:
+            runChunk = self._runPkChunk
+        else:
+            runChunk = self._runCtidChunk
+
+        startTime = time.time()
+        rowCountThisRun = 0
+
+        while not self.isComplete:
+
+            if self.maxChunks is not None and self.numChunks >= self.maxChunks:
+                break
+
+            chunkStartTime = time.time()
+
+            (rowCount, isLastChunk) = runChunk(dbConn)
+
+            chunkEndTime = time.time()
+
+            if isLastChunk:
+                self.isComplete = True
+
+            if rowCount == 0 and isLastChunk:
+                # Nothing left to do
+                break
+
+            self.numChunks += 1
+            self.totalRowCount += rowCount
+            rowCountThisRun += rowCount
+
+            if self.progressCallback:
+                progress = ChunkProgress(self.numChunks, rowCount, self.totalRowCount, self.lastPk, chunkEndTime - startTime)
+                if self.progressCallback(progress) is False:
+                    break
+
+            if self.isComplete:
+                break
+
+            sleepTime = self.sleepBetween + ( self.sleepRatio * (chunkEndTime - chunkStartTime) )
+            if sleepTime > 0:
+                time.sleep(sleepTime)
+
+        return rowCountThisRun
+
+
+# vim: set ts=4 sw=4 st=4 expandtab:
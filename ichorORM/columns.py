@@ -0,0 +1,268 @@
+'''
+    Copyright (c) 2018 Timothy Savannah
+
+    Licensed under the terms of the Lesser GNU Lesser General Public License version 2.1
+
+      license can be found at https://raw.githubusercontent.com/kata198/ichorORM/master/LICENSE
+
+
+    columns - Columnar results. Rows are appended in batches directly into per-column typed buffers
+      ( array.array ), which are returned as NumPy arrays when NumPy is available.
+'''
+# vim: set ts=4 sw=4 st=4 expandtab:
+
+import array
+
+from collections import OrderedDict
+
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
+__all__ = ('ColumnResults', 'ColumnBuilder', 'COLUMN_TYPE_OBJECT', 'HAS_NUMPY')
+
+# HAS_NUMPY - True if NumPy is importable, in which case columns are returned as NumPy arrays by default
+HAS_NUMPY = bool(numpy is not None)
+
+# COLUMN_TYPE_OBJECT - Column type for values which are kept as python objects ( e.x. strings, datetimes )
+COLUMN_TYPE_OBJECT = 'object'
+
+# _BOOL_TYPECODE - Typecode used to buffer boolean columns
+_BOOL_TYPECODE = 'B'
+
+
+class ColumnResults(OrderedDict):
+    '''
+        ColumnResults - An OrderedDict of field name -> column of values, in the order selected.
+
+            Each column is an array.array ( or NumPy array ) when typed, otherwise a list ( or NumPy object array ).
+
+            NULLs in a typed column are stored as 0 ( or False ), so check the null masks.
+
+            @attribute nullMasks <OrderedDict> - field name -> mask, where the mask has a 1 ( True ) for each row
+                in which that field was NULL.
+    '''
+
+    def __init__(self, *args, **kwargs):
+        OrderedDict.__init__(self, *args, **kwargs)
+
+        self.nullMasks = OrderedDict()
+
+
+def _getTypecodeForValue(value):
+    '''
+        _getTypecodeForValue - Get the column type to use for a column, given its first non-NULL value
+
+            @param value - A value
+
+            @return <str> - An array.array typecode, or COLUMN_TYPE_OBJECT
+    '''
+    # bool is a subclass of int, so check first
+    if issubclass(value.__class__, bool):
+        return _BOOL_TYPECODE
+    if issubclass(value.__class__, int):
+        return 'q'
+    if issubclass(value.__class__, float):
+        return 'd'
+
+    return COLUMN_TYPE_OBJECT
+
+
+class _Column(object):
+    '''
+        _Column - The buffer for a single column, used by ColumnBuilder
+    '''
+
+    def __init__(self, fieldName, typecode=None):
+        '''
+            __init__ - Create a _Column
+
+                @param fieldName <str> - The field name
+
+                @param typecode <None/str> default None - array.array typecode or COLUMN_TYPE_OBJECT,
+                    or None to determine by the first non-NULL value
+        '''
+        self.fieldName = fieldName
+
+        # isExplicit - If True, the type was given and values must fit it
+        self.isExplicit = bool(typecode is not None)
+        self.isBool = False
+
+        self.buffer = None
+        self.typecode = None
+        self.nullMask = array.array('B')
+
+        if typecode is not None:
+            self._setTypecode(typecode)
+
+    def _setTypecode(self, typecode):
+        self.typecode = typecode
+
+        if typecode == COLUMN_TYPE_OBJECT:
+            self.buffer = []
+            self.fillValue = None
+        else:
+            try:
+                self.buffer = array.array(typecode)
+            except ValueError:
+                raise ValueError('Unknown type for field %s: %s. Should be an array.array typecode ( e.x. "q", "d" ) or %s' %(repr(self.fieldName), repr(typecode), repr(COLUMN_TYPE_OBJECT)))
+
+            self.fillValue = 0
+
+    def _convertToObject(self):
+        '''
+            _convertToObject - Convert a typed column to an object column, when a value does not fit the determined type
+        '''
+        oldBuffer = self.buffer
+        oldNullMask = self.nullMask
+
+        self.typecode = COLUMN_TYPE_OBJECT
+        self.isBool = False
+        self.fillValue = None
+        self.buffer = [ None if oldNullMask[i] else oldBuffer[i] for i in range(len(oldBuffer)) ]
+
+    def addValues(self, values):
+        '''
+            addValues - Append a batch of values to this column
+
+                @param values <tuple> - The values, one per row
+        '''
+        if self.typecode is None:
+            for value in values:
+                if value is not None:
+                    self._setTypecode( _getTypecodeForValue(value) )
+                    self.isBool = bool(self.typecode == _BOOL_TYPECODE)
+                    break
+            else:
+                # All NULL thus far. Hold them as objects until a value is seen.
+                self.nullMask.frombytes( b'\x01' * len(values) )
+                if self.buffer is None:
+                    self.buffer = []
+                self.buffer += values
+                return
+
+            if self.nullMask:
+                # Fill the leading NULLs in the now-typed buffer
+                numLeadingNulls = len(self.nullMask)
+                if self.typecode == COLUMN_TYPE_OBJECT:
+                    self.buffer = [None] * numLeadingNulls
+                else:
+                    self.buffer.frombytes( bytes( self.buffer.itemsize * numLeadingNulls ) )
+
+        originalValues = values
+
+        if None in values:
+            self.nullMask.extend( [ value is None for value in values ] )
+
+            fillValue = self.fillValue
+            values = [ fillValue if value is None else value for value in values ]
+        else:
+            self.nullMask.frombytes( bytes( len(values) ) )
+
+        if self.typecode == COLUMN_TYPE_OBJECT:
+            self.buffer += values
+            return
+
+        try:
+            self.buffer.extend(values)
+        except (TypeError, OverflowError) as e:
+            if self.isExplicit:
+                raise ValueError('Value in field %s does not fit type %s: %s' %(repr(self.fieldName), repr(self.typecode), str(e)))
+
+            # array.array.extend appends values prior to the failure, so trim back to the batch start
+            del self.buffer[ len(self.nullMask) - len(values): ]
+            self._convertToObject()
+            self.buffer += originalValues
+
+    def getColumn(self, useNumpy):
+        '''
+            getColumn - Get the finished column and null mask
+
+                @param useNumpy <bool> - Whether to return NumPy arrays
+
+                @return tuple( column, nullMask )
+        '''
+        buffer = self.buffer
+        if buffer is None:
+            buffer = []
+
+        if not useNumpy:
+            return ( buffer, self.nullMask )
+
+        nullMask = numpy.frombuffer(self.nullMask, dtype=numpy.bool_)
+
+        if self.typecode in (None, COLUMN_TYPE_OBJECT):
+            column = numpy.empty( len(buffer), dtype=object )
+            column[:] = buffer
+        elif self.isBool:
+            column = numpy.frombuffer(buffer, dtype=numpy.bool_)
+        else:
+            column = numpy.frombuffer(buffer, dtype=buffer.typecode)
+
+        return ( column, nullMask )
+
+
+class ColumnBuilder(object):
+    '''
+        ColumnBuilder - Builds columns from batches of rows
+    '''
+
+    def __init__(self, fields, dtypes=None, useNumpy=None):
+        '''
+            __init__ - Create a ColumnBuilder
+
+                @param fields list<str> - The selected fields, in order
+
+                @param dtypes <None/dict> default None - Map of field name -> array.array typecode ( e.x. "q" for 64-bit integer, "d" for double )
+                    or COLUMN_TYPE_OBJECT. Fields not present have their type determined by the first non-NULL value
+                    ( int -> "q", float -> "d", bool -> bool, anything else -> object )
+
+                @param useNumpy <None/bool> default None - Whether to return NumPy arrays. None to use NumPy if it is importable.
+        '''
+        dtypes = dtypes or {}
+
+        for fieldName in dtypes.keys():
+            if fieldName not in fields:
+                raise ValueError('dtypes contains a field which is not selected: %s' %(repr(fieldName), ))
+
+        if useNumpy is None:
+            useNumpy = HAS_NUMPY
+        elif useNumpy and not HAS_NUMPY:
+            raise ImportError('useNumpy=True but NumPy could not be imported.')
+
+        self.fields = tuple(fields)
+        self.useNumpy = useNumpy
+
+        self.columns = [ _Column(fieldName, dtypes.get(fieldName, None)) for fieldName in self.fields ]
+
+    def addRows(self, rows):
+        '''
+            addRows - Append a batch of rows
+
+                @param rows list<tuple> - The rows
+        '''
+        if not rows:
+            return
+
+        columns = self.columns
+
+        # Transpose the batch
+        for column, values in zip(columns, zip(*rows)):
+            column.addValues(values)
+
+    def getResults(self):
+        '''
+            getResults - Get the finished columns
+
+                @return <ColumnResults>
+        '''
+        ret = ColumnResults()
+
+        for column in self.columns:
+            ( ret[column.fieldName], ret.nullMasks[column.fieldName] ) = column.getColumn(self.useNumpy)
+
+        return ret
+
+
+# vim: set ts=4 sw=4 st=4 expandtab:
@@ -10,6 +10,9 @@
 # vim: set ts=4 sw=4 expandtab:
 
 
+import itertools
+import queue
+import re
 import sys
 import threading
 import traceback
@@ -17,7 +20,11 @@ import time
 import psycopg2
 import psycopg2.extensions as psycopg2_ext
 
+from collections import OrderedDict
+
 from .objs import IgnoreParameter, UseGlobalSetting
+from .constants import ALL_ISOLATION_LEVELS
+from .stats import startStatementStats
 
 __all__ = ('setGlobalConnectionParams', 'getDatabaseConnection', 'DatabaseConnection', 'DatabaseConnectionFailure')
 
@@ -198,8 +205,81 @@ def resolveConnectionParamsDict(host=UseGlobalSetting, port=UseGlobalSetting, db
 # TODO: Make this info come from a config file
 MAX_LOCK_TIMEOUT = 10.0
 
+# DEFAULT_STREAM_CHUNK_SIZE - Default number of rows fetched per round-trip when streaming results
+DEFAULT_STREAM_CHUNK_SIZE = 2000
+
+# COPY_STREAM_CHUNK_SIZE - Default number of bytes per chunk when streaming COPY output, @see DatabaseConnection.doCopyOutParamsStream
+COPY_STREAM_CHUNK_SIZE = 256 * 1024
+
+# COPY_STREAM_MAX_QUEUED_CHUNKS - Default max number of chunks of COPY output waiting to be consumed
+COPY_STREAM_MAX_QUEUED_CHUNKS = 4
+
+# _streamCursorCounter - Used to generate unique names for server-side (named) cursors
+_streamCursorCounter = itertools.count()
+
+# _writeState - Per-thread state of writes through primary ( non-replica ) connections, for read-your-writes routing
+_writeState = threading.local()
+
+
+def getLastWriteTime():
+    '''
+        getLastWriteTime - Get the time of the last write ( or commit ) by the current thread through a primary connection
+
+            @return <None/float> - time.monotonic() of the last write, or None if none
+    '''
+    return getattr(_writeState, 'lastWriteTime', None)
+
+
+def isInTransactionBlock():
+    '''
+        isInTransactionBlock - Check if the current thread is within a transaction block ( @see DatabaseConnection.transaction )
+
+            on a primary connection. Reads are then not routed to a replica, which could not see the uncommitted writes.
+
+            @return <bool>
+    '''
+    return getattr(_writeState, 'transactionBlockDepth', 0) > 0
+
 
-def getDatabaseConnection(host=UseGlobalSetting, port=UseGlobalSetting, dbname=UseGlobalSetting, user=UseGlobalSetting, password=UseGlobalSetting, isTransactionMode=False):
+def _enterTransactionBlock():
+    '''
+        _enterTransactionBlock - Record that the current thread began a transaction block on a primary connection
+    '''
+    _writeState.transactionBlockDepth = getattr(_writeState, 'transactionBlockDepth', 0) + 1
+
+
+def _exitTransactionBlock():
+    '''
+        _exitTransactionBlock - Record that the current thread finished a transaction block on a primary connection
+    '''
+    _writeState.transactionBlockDepth = max( getattr(_writeState, 'transactionBlockDepth', 0) - 1, 0 )
+
+
+# SESSION_PARAM_NAME_RE - Valid names for session params ( e.x. "work_mem", or "myapp.user_id" )
+SESSION_PARAM_NAME_RE = re.compile(r'^[A-Za-z_][A-Za-z0-9_]*(\.[A-Za-z_][A-Za-z0-9_]*)?$')
+
+
+def _checkIsolationLevel(isolationLevel):
+    '''
+        _checkIsolationLevel - Validate an isolation level
+
+            @param isolationLevel <None/str> - One of constants.ALL_ISOLATION_LEVELS ( case-insensitive ), or None for the server default
+
+            @return <None/str> - The isolation level, upper-cased
+
+            @raises ValueError - If not a valid isolation level
+    '''
+    if isolationLevel is None:
+        return None
+
+    isolationLevelUpper = str(isolationLevel).upper()
+    if isolationLevelUpper not in ALL_ISOLATION_LEVELS:
+        raise ValueError('Unknown isolation level: %s. Should be one of: %s' %(repr(isolationLevel), repr(ALL_ISOLATION_LEVELS)))
+
+    return isolationLevelUpper
+
+
+def getDatabaseConnection(host=UseGlobalSetting, port=UseGlobalSetting, dbname=UseGlobalSetting, user=UseGlobalSetting, password=UseGlobalSetting, isTransactionMode=False, isolationLevel=None, readOnly=False, deferrable=False):
     '''
         getDatabaseConnection - Gets a database connection.
 
@@ -212,7 +292,7 @@ def getDatabaseConnection(host=UseGlobalSetting, port=UseGlobalSetting, dbname=U
     '''
     (host, port, dbname, user, password) = resolveConnectionParamsTuple(host, port, dbname, user, password)
 
-    return DatabaseConnection(host=host, port=port, dbname=dbname, user=user, password=password, isTransactionMode=isTransactionMode)
+    return DatabaseConnection(host=host, port=port, dbname=dbname, user=user, password=password, isTransactionMode=isTransactionMode, isolationLevel=isolationLevel, readOnly=readOnly, deferrable=deferrable)
 
 
 class DatabaseConnection(object):
@@ -220,7 +300,7 @@ class DatabaseConnection(object):
         DatabaseConnection - Manages connections to the postgresql database
     '''
 
-    def __init__(self, host=UseGlobalSetting, port=UseGlobalSetting, dbname=UseGlobalSetting, user=UseGlobalSetting, password=UseGlobalSetting, isTransactionMode=False):
+    def __init__(self, host=UseGlobalSetting, port=UseGlobalSetting, dbname=UseGlobalSetting, user=UseGlobalSetting, password=UseGlobalSetting, isTransactionMode=False, isolationLevel=None, readOnly=False, deferrable=False):
         '''
             __init__ - Create a DatabaseConnection object
 
@@ -257,6 +337,17 @@ class DatabaseConnection(object):
               @param isTransactionMode <bool> default False, whether or not to default this connection to using transactions.
                 If False, autocommit is enabled.
 
+              @param isolationLevel <None/str> default None - Isolation level for transactions on this connection,
+                one of constants.ALL_ISOLATION_LEVELS ( e.x. constants.ISOLATION_REPEATABLE_READ ). None uses the server default.
+
+              @param readOnly <bool> default False - If True, transactions on this connection are READ ONLY
+
+              @param deferrable <bool> default False - If True, transactions on this connection are DEFERRABLE
+                ( only has an effect with SERIALIZABLE READ ONLY, where it waits for a snapshot which cannot fail )
+
+                These apply to transaction mode and transaction blocks, and are sent along with the BEGIN.
+                @see #setTransactionCharacteristics
+
         '''
 
         (host, port, dbname, user, password) = resolveConnectionParamsTuple(host, port, dbname, user, password)
@@ -269,9 +360,38 @@ class DatabaseConnection(object):
 
         self.isTransaction = isTransactionMode
 
+        # isReplica - True if this is a connection to a read replica, @see routing
+        self.isReplica = False
+
+        self.isolationLevel = _checkIsolationLevel(isolationLevel)
+        self.readOnly = bool(readOnly)
+        self.deferrable = bool(deferrable)
+
         self._connection = None
         self._cursor = None
 
+        # _transactionCharacteristics - The ( isolationLevel, readOnly, deferrable ) last set on #_connection
+        self._transactionCharacteristics = None
+
+        # sessionParams - Session params ( GUCs ) for this connection, @see #setSessionParam
+        self.sessionParams = OrderedDict()
+
+        # _appliedSessionParams - The session params last set on #_connection
+        self._appliedSessionParams = {}
+        self._sessionParamsStale = False
+        self._sessionParamsUncommitted = False
+
+        # _transactionDepth - Number of nested transaction blocks currently open, @see #transaction
+        self._transactionDepth = 0
+
+
+    def _noteWrite(self):
+        '''
+            _noteWrite - Record that a write ( or commit ) happened on this connection, @see getLastWriteTime
+        '''
+        if not self.isReplica:
+            _writeState.lastWriteTime = time.monotonic()
+
 
     def _getConnectStr(self):
         '''
@@ -310,6 +430,11 @@ class DatabaseConnection(object):
         if forceReconnect is True or self._connection is None:
             connectStr = self._getConnectStr()
 
+            self._transactionCharacteristics = None
+            self._appliedSessionParams = {}
+            self._sessionParamsStale = bool(self.sessionParams)
+            self._sessionParamsUncommitted = False
+
             try:
                 self._connection = psycopg2.connect(connectStr)
             except Exception as connectException:
@@ -322,16 +447,205 @@ class DatabaseConnection(object):
 
                 # Raise this exception? Currently, return None
 
-        # If we are in transaction mode, set to read-commit. Otherwise, use autocommit
-        #    (commit after every transaction)
         if self._connection:
-            if not self.isTransaction:
-                self._connection.set_isolation_level(psycopg2_ext.ISOLATION_LEVEL_AUTOCOMMIT)
-            else:
-                self._connection.set_isolation_level(psycopg2_ext.ISOLATION_LEVEL_READ_COMMITTED)
+            self._syncSessionState()
 
         return self._connection
 
+    def _syncSessionState(self):
+        '''
+            _syncSessionState - Bring the session state of the current connection ( autocommit, transaction characteristics,
+
+              session params ) in line with the settings on this object.
+
+              The last-set state is tracked, so this only costs a round trip when session params have changed.
+        '''
+        conn = self._connection
+
+        # If we are in transaction mode, disable autocommit. Otherwise, use autocommit
+        #    (commit after every transaction)
+        if conn.autocommit == bool(self.isTransaction) and conn.status == psycopg2_ext.STATUS_READY:
+            conn.autocommit = not self.isTransaction
+
+        if self.isTransaction and self._transactionDepth == 0:
+            self._setTransactionCharacteristics(self.isolationLevel, self.readOnly, self.deferrable)
+
+        if self._sessionParamsStale:
+            self._applySessionParams()
+
+    def _applySessionParams(self):
+        '''
+            _applySessionParams - Send any session params which differ from those last set on the current connection,
+
+              all in a single statement
+        '''
+        conn = self._connection
+        appliedSessionParams = self._appliedSessionParams
+
+        sqlParts = []
+        params = {}
+
+        for paramName in list(appliedSessionParams.keys()):
+            if paramName not in self.sessionParams:
+                sqlParts.append('RESET ' + paramName)
+                del appliedSessionParams[paramName]
+
+        setConfigs = []
+        for paramName, paramValue in self.sessionParams.items():
+            if appliedSessionParams.get(paramName, None) != paramValue:
+                idx = len(setConfigs)
+                setConfigs.append( 'set_config(%%(name%d)s, %%(value%d)s, false)' %(idx, idx) )
+                params['name%d' %(idx, )] = paramName
+                params['value%d' %(idx, )] = paramValue
+
+        if setConfigs:
+            sqlParts.append('SELECT ' + ', '.join(setConfigs))
+
+        self._sessionParamsStale = False
+
+        if not sqlParts:
+            return
+
+        cursor = conn.cursor()
+        try:
+            cursor.execute('; '.join(sqlParts), params)
+        finally:
+            cursor.close()
+
+        appliedSessionParams.update(self.sessionParams)
+
+        if not conn.autocommit:
+            # Changes made within a transaction are undone if it is rolled back
+            self._sessionParamsUncommitted = True
+
+    def _onTransactionEnd(self, isCommit):
+        '''
+            _onTransactionEnd - Called after a commit or rollback ( including ROLLBACK TO SAVEPOINT )
+
+                @param isCommit <bool> - True if a commit, False if a rollback
+        '''
+        if not self._sessionParamsUncommitted:
+            return
+
+        if isCommit is False:
+            # Session params set in the transaction have been undone. Re-apply them on the next operation.
+            self._appliedSessionParams = {}
+            self._sessionParamsStale = bool(self.sessionParams)
+
+        self._sessionParamsUncommitted = False
+
+    def setSessionParam(self, paramName, paramValue):
+        '''
+            setSessionParam - Set a session parameter ( GUC ) on this connection, e.x. "work_mem"
+
+              Sent with the next operation, only if changed from the value last set, and re-sent upon reconnect.
+
+              @param paramName <str> - The parameter name
+
+              @param paramValue <str/int/None> - The value. None to RESET to the default.
+        '''
+        if not SESSION_PARAM_NAME_RE.match(paramName):
+            raise ValueError('Invalid session param name: %s' %(repr(paramName), ))
+
+        if paramValue is None:
+            if paramName not in self.sessionParams:
+                return
+            del self.sessionParams[paramName]
+        else:
+            paramValue = str(paramValue)
+            if self.sessionParams.get(paramName, None) == paramValue:
+                return
+            self.sessionParams[paramName] = paramValue
+
+        self._sessionParamsStale = True
+
+    def getSessionParam(self, paramName):
+        '''
+            getSessionParam - Get the value of a session parameter set by #setSessionParam
+
+              @param paramName <str> - The parameter name
+
+              @return <str/None> - The value, or None if not set
+        '''
+        return self.sessionParams.get(paramName, None)
+
+    def setSearchPath(self, schemas):
+        '''
+            setSearchPath - Set the search_path for this connection
+
+              @param schemas <str/list<str>/None> - Schema name(s), in order. None for the default.
+        '''
+        if schemas is not None and not issubclass(schemas.__class__, str):
+            schemas = ', '.join(schemas)
+
+        self.setSessionParam('search_path', schemas)
+
+    def setTimezone(self, timezone):
+        '''
+            setTimezone - Set the timezone for this connection
+
+              @param timezone <str/None> - The timezone, e.x. "UTC". None for the default.
+        '''
+        self.setSessionParam('timezone', timezone)
+
+    def setStatementTimeout(self, timeoutMs):
+        '''
+            setStatementTimeout - Set the statement_timeout for this connection
+
+              @param timeoutMs <int/None> - Timeout in milliseconds. 0 to disable, None for the default.
+        '''
+        if timeoutMs is not None:
+            timeoutMs = int(timeoutMs)
+
+        self.setSessionParam('statement_timeout', timeoutMs)
+
+    def _setTransactionCharacteristics(self, isolationLevel, readOnly, deferrable):
+        '''
+            _setTransactionCharacteristics - Set the isolation level / read only / deferrable for the next transaction
+
+              on the current connection. These are sent along with the BEGIN, so this does not cost a round trip.
+
+              Does nothing if unchanged.
+
+              @return <bool> - False if they could not be set because a transaction is in progress, otherwise True
+        '''
+        characteristics = (isolationLevel, bool(readOnly), bool(deferrable))
+        if characteristics == self._transactionCharacteristics:
+            return True
+
+        conn = self._connection
+        if conn.status != psycopg2_ext.STATUS_READY or conn.autocommit:
+            # In a transaction, or set_session would issue SETs on an autocommit connection
+            return False
+
+        conn.set_session(
+            isolation_level=isolationLevel or 'DEFAULT',
+            readonly=True if readOnly else 'DEFAULT',
+            deferrable=True if deferrable else 'DEFAULT',
+        )
+        self._transactionCharacteristics = characteristics
+
+        return True
+
+    def setTransactionCharacteristics(self, isolationLevel=IgnoreParameter, readOnly=IgnoreParameter, deferrable=IgnoreParameter):
+        '''
+            setTransactionCharacteristics - Set the isolation level / read only / deferrable for transactions on this connection.
+
+              Takes effect at the start of the next transaction.
+
+              @param isolationLevel <None/str/IgnoreParameter> default IgnoreParameter - @see #__init__ . IgnoreParameter to leave as-is.
+
+              @param readOnly <bool/IgnoreParameter> default IgnoreParameter - @see #__init__ . IgnoreParameter to leave as-is.
+
+              @param deferrable <bool/IgnoreParameter> default IgnoreParameter - @see #__init__ . IgnoreParameter to leave as-is.
+        '''
+        if isolationLevel is not IgnoreParameter:
+            self.isolationLevel = _checkIsolationLevel(isolationLevel)
+        if readOnly is not IgnoreParameter:
+            self.readOnly = bool(readOnly)
+        if deferrable is not IgnoreParameter:
+            self.deferrable = bool(deferrable)
+
     def closeConnection(self):
         '''
             closeConnection - Close the database connection
@@ -343,21 +657,22 @@ class DatabaseConnection(object):
                 pass
         self._connection = None
         self._cursor = None
+        self._transactionCharacteristics = None
+        self._appliedSessionParams = {}
+        self._sessionParamsStale = bool(self.sessionParams)
+        self._sessionParamsUncommitted = False
 
 
     def beginTransactionMode(self):
         '''
             beginTransactionMode - Set transaction mode.
-              This disables autocommit on future connection, and closes current connection.
+              This disables autocommit, starting with the next operation.
 
             @see #commitTransaction to commit the current transaction
             @see #endTransactionMode to unset transaction mode
 
             Alias is "startTransactionMode"
         '''
-        if self.isTransaction is False:
-            self.closeConnection()
-
         self.isTransaction = True
 
     startTransactionMode = beginTransactionMode
@@ -378,16 +693,93 @@ class DatabaseConnection(object):
     def endTransactionMode(self):
         '''
             endTransactionMode - Disable transaction mode.
-              This will enable autocommit on future connections, and closes current connection.
+              This enables autocommit, starting with the next operation. Any uncommitted changes are rolled back.
 
             @see #beginTransactionMode to re-enable transaction mode
         '''
-        if self.isTransaction:
-            self.closeConnection()
+        if self.isTransaction and self._connection is not None and not self._connection.closed:
+            if self._connection.status != psycopg2_ext.STATUS_READY:
+                self.rollback()
 
         self.isTransaction = False
 
 
+    def transaction(self, isolation=None, retries=0, backoff=IgnoreParameter, maxBackoff=IgnoreParameter, readOnly=None, deferrable=None):
+        '''
+            transaction - Get a transaction block on this connection, which commits when the block completes
+
+              and rolls back if it raises. To re-run the block on a serialization failure or deadlock,
+              iterate over it with retries:
+
+                for txn in dbConn.transaction(isolation='SERIALIZABLE', retries=5):
+                    with txn:
+                        ...
+
+              @param isolation <None/str> default None - The isolation level, e.x. "SERIALIZABLE". None for this connection's isolationLevel.
+
+              @param retries <int> default 0 - When iterated, number of times to re-run on a retryable error
+
+              @param backoff <float> default transaction.DEFAULT_TRANSACTION_BACKOFF - Base delay in seconds before a retry
+
+              @param maxBackoff <float> default transaction.DEFAULT_TRANSACTION_MAX_BACKOFF - Maximum delay in seconds before a retry
+
+              @param readOnly <None/bool> default None - If True, READ ONLY. None for this connection's readOnly.
+
+              @param deferrable <None/bool> default None - If True, DEFERRABLE. None for this connection's deferrable.
+
+              @return <ichorORM.transaction.Transaction>
+        '''
+        from .transaction import Transaction, DEFAULT_TRANSACTION_BACKOFF, DEFAULT_TRANSACTION_MAX_BACKOFF
+
+        if backoff is IgnoreParameter:
+            backoff = DEFAULT_TRANSACTION_BACKOFF
+        if maxBackoff is IgnoreParameter:
+            maxBackoff = DEFAULT_TRANSACTION_MAX_BACKOFF
+
+        return Transaction(self, isolation=isolation, retries=retries, backoff=backoff, maxBackoff=maxBackoff, readOnly=readOnly, deferrable=deferrable)
+
+
+    def savepoint(self, name=None):
+        '''
+            savepoint - Get a savepoint block. If the block raises, only the changes made within it are rolled back,
+
+              and the transaction continues. Requires a transaction block ( @see #transaction ) or transaction mode.
+
+              A transaction block within another is also a savepoint.
+
+              @param name <None/str> default None - The savepoint name. If None, one is generated.
+
+              @return <ichorORM.transaction.Savepoint>
+        '''
+        from .transaction import Savepoint
+
+        return Savepoint(self, name=name)
+
+
+    def runTransaction(self, func, isolation=None, retries=IgnoreParameter, backoff=IgnoreParameter, maxBackoff=IgnoreParameter, readOnly=None, deferrable=None):
+        '''
+            runTransaction - Run a function in a transaction block on this connection,
+
+              re-running it on a serialization failure or deadlock
+
+              @param func <function(dbConn)> - The function to run. Must be safe to run more than once.
+
+              @see ichorORM.transaction.runTransaction for the other arguments
+
+              @return - The return of #func
+        '''
+        from .transaction import runTransaction, DEFAULT_TRANSACTION_RETRIES, DEFAULT_TRANSACTION_BACKOFF, DEFAULT_TRANSACTION_MAX_BACKOFF
+
+        if retries is IgnoreParameter:
+            retries = DEFAULT_TRANSACTION_RETRIES
+        if backoff is IgnoreParameter:
+            backoff = DEFAULT_TRANSACTION_BACKOFF
+        if maxBackoff is IgnoreParameter:
+            maxBackoff = DEFAULT_TRANSACTION_MAX_BACKOFF
+
+        return runTransaction(self, func, isolation=isolation, retries=retries, backoff=backoff, maxBackoff=maxBackoff, readOnly=readOnly, deferrable=deferrable)
+
+
     def getCursor(self, forceReconnect=False):
         '''
             getCursor - Gets a psycopg cursor to the database
@@ -411,6 +803,9 @@ class DatabaseConnection(object):
 
                 if not cursor or cursor.closed:
                     raise DatabaseConnectionFailure('Failed to establish a cursor, even with a forced reconnect.')
+        else:
+            # The cursor is reused across commits, so check the session state here too
+            self._syncSessionState()
 
         self._cursor = cursor
 
@@ -420,14 +815,21 @@ class DatabaseConnection(object):
     def commit(self):
         '''
             commit - Commit whatever is on the current connection
+
+              Within a transaction block ( @see #transaction ), does nothing, as the block commits when it completes.
         '''
 
         if not self._connection:
             return False
 
-        self._cursor = None
+        if self._transactionDepth > 0:
+            return None
+
+        ret = self._connection.commit()
+        self._onTransactionEnd(True)
+        self._noteWrite()
 
-        return self._connection.commit()
+        return ret
 
 
     def rollback(self):
@@ -437,9 +839,26 @@ class DatabaseConnection(object):
         if not self._connection:
             return False
 
-        self._cursor = None
+        ret = self._connection.rollback()
+        self._onTransactionEnd(False)
+
+        return ret
+
+    def cancel(self):
+        '''
+            cancel - Cancel the statement currently executing on this connection. Safe to call from another thread.
 
-        return self._connection.rollback()
+              The call executing the statement raises psycopg2.extensions.QueryCanceledError
+
+            @return <bool> - False if not connected, otherwise True ( a cancel was requested )
+        '''
+        conn = self._connection
+        if conn is None or conn.closed:
+            return False
+
+        conn.cancel()
+
+        return True
 
     def _sendSqlCommand(self, query, cursorCmdLambda=None, cursorCmdLambdaArgs=None):
         '''
@@ -479,6 +898,10 @@ class DatabaseConnection(object):
         if not cursorCmdLambda:
             cursorCmdLambda = lambda _cursor : _cursor.execute(query)
 
+        statsRecorder = startStatementStats(query)
+        if statsRecorder is not None:
+            cursorCmdLambda = statsRecorder.wrap(cursorCmdLambda)
+
         cursor = self.getCursor()
 
         try:
@@ -493,6 +916,9 @@ class DatabaseConnection(object):
             else:
                 raise cursorException
 
+        if statsRecorder is not None:
+            statsRecorder.finish(cursor.rowcount)
+
         return (cursor, ret)
 
 
@@ -506,6 +932,7 @@ class DatabaseConnection(object):
         '''
 
         (cursor, result) = self._sendSqlCommand( query )
+        self._noteWrite()
 
         return result
 
@@ -519,10 +946,29 @@ class DatabaseConnection(object):
         '''
 
         (cursor, result) = self._sendSqlCommand( query, lambda _cursor : _cursor.execute(query, params) )
+        self._noteWrite()
 
         return result
 
 
+    def executeSqlParamsGetRowCount(self, query, params):
+        '''
+            executeSqlParamsGetRowCount - Execute arbitary SQL with parameterized values,
+                and return the number of rows affected (for UPDATE / DELETE / etc)
+
+            @param query <str> - SQL Query
+
+            @param params <dict> - Params to pass,  %(name)s  should have an entry "name"
+
+            @return <int> - The number of rows affected, or -1 if not applicable
+        '''
+
+        (cursor, result) = self._sendSqlCommand( query, lambda _cursor : _cursor.execute(query, params) )
+        self._noteWrite()
+
+        return cursor.rowcount
+
+
     def doSelect(self, query):
         '''
             doSelect - Perform a SELECT query and return all the rows.
@@ -535,12 +981,260 @@ class DatabaseConnection(object):
         rows = cursor.fetchall()
         return rows
 
-    def doSelectParams(self, query, params):
+    def doSelectParams(self, query, params, typecasters=None):
+        '''
+            doSelectParams - Perform a parameterized SELECT query, and return the rows
+
+            @param query <str> - SQL Query
+
+            @param params <dict> - Params to pass,  %(name)s  should have an entry "name"
+
+            @param typecasters <None/dict> default None - If provided, a map of postgres type OID -> function(value, cursor)
+                used to decode values of that type in place of the default. These are registered on a dedicated cursor.
+
+            @return list<tuple> - Rows of cols
+        '''
+        if typecasters:
+            statsRecorder = startStatementStats(query)
+
+            cursor = self._getTypecasterCursor(typecasters)
+            try:
+                if statsRecorder is None:
+                    cursor.execute(query, params)
+                    return cursor.fetchall()
+
+                statsRecorder.call(cursor.execute, query, params)
+                rows = statsRecorder.call(cursor.fetchall)
+                statsRecorder.finish(len(rows))
+                return rows
+            finally:
+                cursor.close()
+
         (cursor, result) = self._sendSqlCommand( query, lambda _cursor : _cursor.execute(query, params) )
 
         rows = cursor.fetchall()
         return rows
 
+    def _getTypecasterCursor(self, typecasters, **cursorKwargs):
+        '''
+            _getTypecasterCursor - Get a new cursor, with the given typecasters registered on it ( and only it )
+
+            @param typecasters <dict> - Map of postgres type OID -> function(value, cursor)
+
+            @param cursorKwargs - Any arguments to pass to connection.cursor ( e.x. name )
+
+            @return psycopg2.cursor object
+        '''
+        conn = self.getConnection()
+        if conn is None:
+            raise DatabaseConnectionFailure('Could not connect to psycopg2 database.')
+
+        cursor = conn.cursor(**cursorKwargs)
+
+        for typeOid, typecaster in typecasters.items():
+            psycopg2_ext.register_type( psycopg2_ext.new_type( (typeOid, ), 'ICHOR_CAST_%d' %(typeOid, ), typecaster ), cursor )
+
+        return cursor
+
+    def doSelectParamsStream(self, query, params, chunkSize=DEFAULT_STREAM_CHUNK_SIZE, typecasters=None):
+        '''
+            doSelectParamsStream - Perform a SELECT query using a server-side cursor, and
+                yield rows as they are fetched, #chunkSize rows per round-trip.
+
+                The full result set is never held in memory at once.
+
+                If this connection is not in transaction mode, the cursor is declared WITH HOLD
+                  so that it may be used with autocommit.
+
+            @param query <str> - SQL Query
+
+            @param params <dict> - Params to pass,  %(name)s  should have an entry "name"
+
+            @param chunkSize <int> default DEFAULT_STREAM_CHUNK_SIZE - Number of rows to fetch per round-trip
+
+            @param typecasters <None/dict> default None - If provided, a map of postgres type OID -> function(value, cursor)
+                used to decode values of that type in place of the default. @see #doSelectParams
+
+            @return generator<tuple> - Yields each row, a tuple of cols
+        '''
+        # Captured now, as the attribution of the caller may not apply while the rows are consumed
+        statsRecorder = startStatementStats(query)
+
+        return self._iterSelectParamsStream(query, params, chunkSize, typecasters, statsRecorder)
+
+    def _iterSelectParamsStream(self, query, params, chunkSize, typecasters, statsRecorder):
+        '''
+            _iterSelectParamsStream - The generator of #doSelectParamsStream
+
+                @param statsRecorder <None/stats._StatementStatsRecorder> - If provided, the time spent executing
+
+                  and fetching ( but not consuming the rows ) is recorded when the stream is finished or closed
+        '''
+        cursorName = '_ichor_stream_%d' %( next(_streamCursorCounter), )
+
+        cursor = self._getTypecasterCursor(typecasters or {}, name=cursorName, withhold=not self.isTransaction)
+        cursor.itersize = chunkSize
+
+        if statsRecorder is None:
+            execute = cursor.execute
+            fetchmany = cursor.fetchmany
+        else:
+            execute = statsRecorder.wrap(cursor.execute)
+            fetchmany = statsRecorder.wrap(cursor.fetchmany)
+
+        numRows = 0
+        try:
+            execute(query, params)
+
+            while True:
+                rows = fetchmany(chunkSize)
+                if not rows:
+                    break
+
+                numRows += len(rows)
+                for row in rows:
+                    yield row
+        except Exception:
+            # Failed statements are not recorded
+            statsRecorder = None
+            raise
+        finally:
+            try:
+                cursor.close()
+            except:
+                pass
+
+            if statsRecorder is not None:
+                statsRecorder.finish(numRows)
+
+
+    def getColumnTypeOidsParams(self, query, params):
+        '''
+            getColumnTypeOidsParams - Get the postgres type OIDs of the columns a SELECT query would return,
+                without fetching any rows.
+
+            @param query <str> - SQL Query
+
+            @param params <dict> - Params to pass,  %(name)s  should have an entry "name"
+
+            @return list<int> - The type OID of each column, in order
+        '''
+        probeQuery = 'SELECT * FROM ( %s ) AS _ichor_probe LIMIT 0' %(query, )
+
+        (cursor, result) = self._sendSqlCommand( probeQuery, lambda _cursor : _cursor.execute(probeQuery, params) )
+
+        return [ column.type_code for column in cursor.description ]
+
+    def doCopyOutParams(self, query, params, fileObj, copyOptions='FORMAT binary'):
+        '''
+            doCopyOutParams - Perform a  COPY ( query ) TO STDOUT  writing the output into a file-like object.
+
+                COPY does not support parameters, so the params are substituted into the query client-side ( via mogrify )
+
+            @param query <str> - SQL Query
+
+            @param params <dict> - Params to pass,  %(name)s  should have an entry "name"
+
+            @param fileObj <file-like> - Object with a "write" method which will receive the output
+
+            @param copyOptions <str> default 'FORMAT binary' - The options to COPY
+        '''
+        cursor = self.getCursor()
+
+        copyQuery = 'COPY ( %s ) TO STDOUT ( %s )' %( cursor.mogrify(query, params).decode(self.getEncoding()), copyOptions )
+
+        self._sendSqlCommand( copyQuery, lambda _cursor : _cursor.copy_expert(copyQuery, fileObj) )
+
+    def doCopyOutParamsStream(self, query, params, copyOptions='FORMAT binary', chunkSize=COPY_STREAM_CHUNK_SIZE, maxQueuedChunks=COPY_STREAM_MAX_QUEUED_CHUNKS):
+        '''
+            doCopyOutParamsStream - Perform a  COPY ( query ) TO STDOUT , and yield the output in chunks as it arrives.
+
+                psycopg2 only writes COPY output into a file-like object, so the COPY is run in a separate thread
+                  which hands chunks of about #chunkSize bytes to this generator through a queue of at most #maxQueuedChunks.
+                  The memory used is bounded by those, rather than the size of the full output.
+
+                The COPY is not started until the first chunk is requested. If the generator is closed early,
+                  the remaining output is read and discarded, so the connection remains usable.
+
+            @param query <str> - SQL Query
+
+            @param params <dict> - Params to pass,  %(name)s  should have an entry "name"
+
+            @param copyOptions <str> default 'FORMAT binary' - The options to COPY
+
+            @param chunkSize <int> default COPY_STREAM_CHUNK_SIZE - Approximate number of bytes per chunk
+
+            @param maxQueuedChunks <int> default COPY_STREAM_MAX_QUEUED_CHUNKS - Max chunks read ahead of the consumer
+
+            @return generator<bytes> - The COPY output, in chunks
+        '''
+        # Captured now, as the attribution of the caller may not apply while the chunks are consumed
+        statsRecorder = startStatementStats(query)
+
+        return self._iterCopyOutParamsStream(query, params, copyOptions, chunkSize, maxQueuedChunks, statsRecorder)
+
+    def _iterCopyOutParamsStream(self, query, params, copyOptions, chunkSize, maxQueuedChunks, statsRecorder):
+        '''
+            _iterCopyOutParamsStream - The generator of #doCopyOutParamsStream
+        '''
+        cursor = self.getCursor()
+
+        copyQuery = 'COPY ( %s ) TO STDOUT ( %s )' %( cursor.mogrify(query, params).decode(self.getEncoding()), copyOptions )
+
+        chunksQueue = queue.Queue(maxsize=maxQueuedChunks)
+        stopEvent = threading.Event()
+        writer = _CopyChunkWriter(chunksQueue, chunkSize, stopEvent)
+
+        def _runCopy():
+            try:
+                if statsRecorder is None:
+                    cursor.copy_expert(copyQuery, writer)
+                else:
+                    statsRecorder.call(cursor.copy_expert, copyQuery, writer)
+
+                writer.flush()
+                chunksQueue.put( (None, None) )
+            except Exception as e:
+                chunksQueue.put( (None, e) )
+
+        copyThread = threading.Thread(target=_runCopy, name='ichorORM-copy-out')
+        copyThread.daemon = True
+        copyThread.start()
+
+        try:
+            while True:
+                (chunk, copyException) = chunksQueue.get()
+                if copyException is not None:
+                    raise copyException
+                if chunk is None:
+                    break
+
+                yield chunk
+
+            copyThread.join()
+            if statsRecorder is not None:
+                statsRecorder.finish(cursor.rowcount)
+        finally:
+            # If closed early, the writer discards the rest. Keep draining so it is never stuck on a full queue.
+            stopEvent.set()
+            while copyThread.is_alive():
+                try:
+                    chunksQueue.get(timeout=0.1)
+                except queue.Empty:
+                    pass
+
+    def getEncoding(self):
+        '''
+            getEncoding - Get the python name of the client encoding of this connection
+
+            @return <str> - e.x. "utf_8"
+        '''
+        conn = self.getConnection()
+        if conn is None:
+            raise DatabaseConnectionFailure('Could not connect to psycopg2 database.')
+
+        return psycopg2_ext.encodings.get(conn.encoding, 'utf_8')
+
     def doInsert(self, query, valueDicts=None, doCommit=True, returnPk=True):
         '''
             doInsert - Perform an INSERT query with a parameterized query
@@ -590,6 +1284,7 @@ class DatabaseConnection(object):
             ret = None
             (cursor, result) = self._sendSqlCommand ( query, lambda _cursor : _cursor.executemany(query, valueDicts), )
 
+        self._noteWrite()
 
         if doCommit is True:
             self.commit()
@@ -598,6 +1293,36 @@ class DatabaseConnection(object):
         return ret
 
 
+class _CopyChunkWriter(object):
+    '''
+        _CopyChunkWriter - File-like object receiving COPY output, which hands it to a queue in chunks.
+
+            psycopg2 calls #write per row, so rows are gathered into one reused buffer until #chunkSize is reached.
+    '''
+
+    def __init__(self, chunksQueue, chunkSize, stopEvent):
+        self.chunksQueue = chunksQueue
+        self.chunkSize = chunkSize
+        self.stopEvent = stopEvent
+
+        self.pending = bytearray()
+
+    def write(self, data):
+        if self.stopEvent.is_set():
+            # The consumer has gone away, discard the rest
+            return
+
+        self.pending += data
+        if len(self.pending) >= self.chunkSize:
+            self.flush()
+
+    def flush(self):
+        if self.pending and not self.stopEvent.is_set():
+            self.chunksQueue.put( (bytes(self.pending), None) )
+
+        del self.pending[:]
+
+
 class DatabaseConnectionFailure(Exception):
     '''
         DatabaseConnectionFailure - Exception raised when there is a failure connecting to the database
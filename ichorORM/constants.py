@@ -9,7 +9,10 @@
 '''
 
 __all__ = ('FETCH_ALL_FIELDS', 'WHERE_AND', 'WHERE_OR', 'WHERE_ALL_TYPES', 'SQL_NULL',
-    'JOIN_INNER', 'JOIN_LEFT', 'JOIN_RIGHT', 'JOIN_OUTER_FULL'
+    'JOIN_INNER', 'JOIN_LEFT', 'JOIN_RIGHT', 'JOIN_OUTER_FULL',
+    'CHUNK_BY_PK', 'CHUNK_BY_CTID', 'COST_GUARD_RAISE', 'COST_GUARD_LOG',
+    'ISOLATION_READ_UNCOMMITTED', 'ISOLATION_READ_COMMITTED', 'ISOLATION_REPEATABLE_READ', 'ISOLATION_SERIALIZABLE',
+    'REPLICA_SELECT_ROUND_ROBIN', 'REPLICA_SELECT_LEAST_LATENCY',
 )
 
 from .special import SQL_NULL
@@ -30,3 +33,28 @@ JOIN_OUTER_FULL = 'OUTER FULL'
 
 ALL_JOINS = (JOIN_INNER, JOIN_LEFT, JOIN_RIGHT, JOIN_OUTER_FULL)
 
+# Chunking modes (for ChunkedQueryRunner)
+CHUNK_BY_PK = 'PK'
+CHUNK_BY_CTID = 'CTID'
+
+ALL_CHUNK_MODES = (CHUNK_BY_PK, CHUNK_BY_CTID)
+
+# Cost guard actions (for costguard.setGlobalCostGuard)
+COST_GUARD_RAISE = 'raise'
+COST_GUARD_LOG = 'log'
+
+ALL_COST_GUARD_ACTIONS = (COST_GUARD_RAISE, COST_GUARD_LOG)
+
+# Transaction isolation levels (for DatabaseConnection isolationLevel, and transaction blocks)
+ISOLATION_READ_UNCOMMITTED = 'READ UNCOMMITTED'
+ISOLATION_READ_COMMITTED = 'READ COMMITTED'
+ISOLATION_REPEATABLE_READ = 'REPEATABLE READ'
+ISOLATION_SERIALIZABLE = 'SERIALIZABLE'
+
+ALL_ISOLATION_LEVELS = (ISOLATION_READ_UNCOMMITTED, ISOLATION_READ_COMMITTED, ISOLATION_REPEATABLE_READ, ISOLATION_SERIALIZABLE)
+
+# Replica selection strategies (for routing.setGlobalReplicaRouting)
+REPLICA_SELECT_ROUND_ROBIN = 'round_robin'
+REPLICA_SELECT_LEAST_LATENCY = 'least_latency'
+
+ALL_REPLICA_SELECTIONS = (REPLICA_SELECT_ROUND_ROBIN, REPLICA_SELECT_LEAST_LATENCY)
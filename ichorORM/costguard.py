@@ -0,0 +1,208 @@
+'''
+    Copyright (c) 2018 Timothy Savannah
+
+    Licensed under the terms of the Lesser GNU Lesser General Public License version 2.1
+
+      license can be found at https://raw.githubusercontent.com/kata198/ichorORM/master/LICENSE
+
+
+    costguard - Optional guard which checks the planner's estimated cost / rows of a query before it is executed
+'''
+# vim: set ts=4 sw=4 st=4 expandtab:
+
+import sys
+import threading
+
+from collections import OrderedDict
+
+from .constants import COST_GUARD_RAISE, COST_GUARD_LOG, ALL_COST_GUARD_ACTIONS
+from .objs import IgnoreParameter
+from .explain import explainSql
+
+__all__ = ('setGlobalCostGuard', 'clearCostGuardCache', 'checkQueryCost', 'QueryCostExceededError',
+    'COST_GUARD_RAISE', 'COST_GUARD_LOG',
+)
+
+global GLOBAL_MAX_COST
+global GLOBAL_MAX_ROWS
+global GLOBAL_ACTION
+
+GLOBAL_MAX_COST = None
+GLOBAL_MAX_ROWS = None
+GLOBAL_ACTION = COST_GUARD_RAISE
+
+# PLAN_CACHE_MAX_SIZE - Maximum number of query shapes to remember the estimates of
+PLAN_CACHE_MAX_SIZE = 1024
+
+# _planCache - Parameterized SQL -> ( estimatedCost, estimatedRows ). Least recently used is evicted first.
+_planCache = OrderedDict()
+_planCacheLock = threading.Lock()
+
+
+class QueryCostExceededError(Exception):
+    '''
+        QueryCostExceededError - Exception raised when a query's estimated cost or rows exceeds the configured threshold
+    '''
+
+    def __init__(self, msg, sql=None, estimatedCost=None, estimatedRows=None):
+        Exception.__init__(self, msg)
+
+        self.sql = sql
+        self.estimatedCost = estimatedCost
+        self.estimatedRows = estimatedRows
+
+
+def setGlobalCostGuard(maxCost=IgnoreParameter, maxRows=IgnoreParameter, action=IgnoreParameter):
+    '''
+        setGlobalCostGuard - Set the global thresholds checked before executing a SelectQuery, UpdateQuery, or DeleteQuery.
+
+                            Every parameter defaults to "IgnoreParameter" and will thus not be set unless
+                              specified to be something different.
+
+                            A model may override these by setting MAX_QUERY_COST and/or MAX_QUERY_ROWS
+
+                            When no threshold applies to a query (the default), no EXPLAIN is performed.
+
+                        @param maxCost <None/float> default IgnoreParameter - Maximum planner estimated total cost, or None for no limit
+
+                        @param maxRows <None/int> default IgnoreParameter - Maximum planner estimated rows, or None for no limit
+
+                        @param action <str> default IgnoreParameter - COST_GUARD_RAISE to raise a QueryCostExceededError (default),
+
+                            or COST_GUARD_LOG to write a warning to stderr and execute anyway
+    '''
+    global GLOBAL_MAX_COST
+    global GLOBAL_MAX_ROWS
+    global GLOBAL_ACTION
+
+    if action != IgnoreParameter:
+        if action not in ALL_COST_GUARD_ACTIONS:
+            raise ValueError('Unknown cost guard action: %s.   Possible actions:  %s.' %(repr(action), repr(ALL_COST_GUARD_ACTIONS)))
+        GLOBAL_ACTION = action
+
+    if maxCost != IgnoreParameter:
+        GLOBAL_MAX_COST = maxCost
+    if maxRows != IgnoreParameter:
+        GLOBAL_MAX_ROWS = maxRows
+
+
+def clearCostGuardCache():
+    '''
+        clearCostGuardCache - Forget all cached estimates ( e.x. after an ANALYZE or large data change )
+    '''
+    with _planCacheLock:
+        _planCache.clear()
+
+
+def _getThresholds(query):
+    '''
+        _getThresholds - Get the thresholds which apply to a query.
+
+            Models may define MAX_QUERY_COST / MAX_QUERY_ROWS to override the global.
+              If a query has multiple models, the strictest applies.
+
+            @return tuple( maxCost<None/float>, maxRows<None/int> )
+    '''
+    maxCost = None
+    maxRows = None
+
+    hasModelCost = False
+    hasModelRows = False
+
+    for model in query.getModels():
+
+        modelMaxCost = model.MAX_QUERY_COST
+        if modelMaxCost is not None:
+            hasModelCost = True
+            if maxCost is None or modelMaxCost < maxCost:
+                maxCost = modelMaxCost
+
+        modelMaxRows = model.MAX_QUERY_ROWS
+        if modelMaxRows is not None:
+            hasModelRows = True
+            if maxRows is None or modelMaxRows < maxRows:
+                maxRows = modelMaxRows
+
+    if not hasModelCost:
+        maxCost = GLOBAL_MAX_COST
+    if not hasModelRows:
+        maxRows = GLOBAL_MAX_ROWS
+
+    return (maxCost, maxRows)
+
+
+def _getEstimates(sql, params, dbConn):
+    '''
+        _getEstimates - Get the ( cost, rows ) estimates for a query shape, from cache or via EXPLAIN
+    '''
+    with _planCacheLock:
+        estimates = _planCache.get(sql, None)
+        if estimates is not None:
+            _planCache.move_to_end(sql)
+            return estimates
+
+    plan = explainSql(sql, params, dbConn=dbConn)
+
+    rootNode = plan.rootNode
+
+    estimatedRows = rootNode.estimatedRows
+    if rootNode.nodeType == 'ModifyTable' and rootNode.children:
+        # For UPDATE / DELETE, the rows which will be modified are the rows of the child scan
+        estimatedRows = rootNode.children[0].estimatedRows
+
+    estimates = (plan.totalCost, estimatedRows)
+
+    with _planCacheLock:
+        _planCache[sql] = estimates
+        while len(_planCache) > PLAN_CACHE_MAX_SIZE:
+            _planCache.popitem(last=False)
+
+    return estimates
+
+
+def checkQueryCost(query, sql, params, dbConn):
+    '''
+        checkQueryCost - Check a query against the configured cost guard, prior to execution.
+
+            The estimates are cached per query shape (the parameterized SQL), so EXPLAIN is
+
+              performed only the first time a given shape is seen.
+
+            @param query <QueryBase> - The query about to be executed
+
+            @param sql <str> - The parameterized SQL of the query
+
+            @param params <dict> - The parameters of the query
+
+            @param dbConn <DatabaseConnection> - The connection the query will be executed on
+
+            @raises QueryCostExceededError - If a threshold is exceeded and the action is COST_GUARD_RAISE
+    '''
+    if query.ignoreCostGuard:
+        return
+
+    (maxCost, maxRows) = _getThresholds(query)
+    if maxCost is None and maxRows is None:
+        return
+
+    (estimatedCost, estimatedRows) = _getEstimates(sql, params, dbConn)
+
+    problems = []
+    if maxCost is not None and estimatedCost is not None and estimatedCost > maxCost:
+        problems.append('estimated cost %s exceeds max %s' %(str(estimatedCost), str(maxCost)))
+    if maxRows is not None and estimatedRows is not None and estimatedRows > maxRows:
+        problems.append('estimated rows %s exceeds max %s' %(str(estimatedRows), str(maxRows)))
+
+    if not problems:
+        return
+
+    msg = '%s on [ %s ]: %s.  SQL: %s' %(query.__class__.__name__, ', '.join([ model.TABLE_NAME for model in query.getModels() ]), ' and '.join(problems), sql.strip())
+
+    if GLOBAL_ACTION == COST_GUARD_LOG:
+        sys.stderr.write('WARNING: Query cost guard: %s\n' %(msg, ))
+        return
+
+    raise QueryCostExceededError(msg, sql=sql, estimatedCost=estimatedCost, estimatedRows=estimatedRows)
+
+
+# vim: set ts=4 sw=4 st=4 expandtab:
@@ -0,0 +1,347 @@
+'''
+    Copyright (c) 2018 Timothy Savannah
+
+    Licensed under the terms of the Lesser GNU Lesser General Public License version 2.1
+
+      license can be found at https://raw.githubusercontent.com/kata198/ichorORM/master/LICENSE
+
+
+    explain - EXPLAIN / EXPLAIN ANALYZE support, and parsed query plans
+'''
+# vim: set ts=4 sw=4 st=4 expandtab:
+
+import json
+
+from . import getDatabaseConnection
+
+__all__ = ('QueryPlan', 'PlanNode', 'explainSql', 'EXPLAIN_FORMATS')
+
+# EXPLAIN_FORMATS - The formats postgres supports for EXPLAIN output
+EXPLAIN_FORMATS = ('json', 'text', 'xml', 'yaml')
+
+# EXPLAIN_SAVEPOINT_NAME - Name of savepoint used to roll back an EXPLAIN ANALYZE of a write
+#   performed within an existing transaction
+EXPLAIN_SAVEPOINT_NAME = '_ichor_explain'
+
+
+class PlanNode(object):
+    '''
+        PlanNode - A single node ( like "Seq Scan" or "Hash Join" ) within a QueryPlan
+    '''
+
+    def __init__(self, nodeData, parent=None):
+        '''
+            __init__ - Create a PlanNode
+
+                @param nodeData <dict> - The "Plan" dict for this node, from EXPLAIN ( FORMAT JSON )
+
+                @param parent <None/PlanNode> default None - The parent node, or None if this is the root
+        '''
+        self.raw = nodeData
+        self.parent = parent
+
+        self.nodeType = nodeData.get('Node Type')
+        self.relationName = nodeData.get('Relation Name', None)
+        self.alias = nodeData.get('Alias', None)
+        self.indexName = nodeData.get('Index Name', None)
+
+        self.startupCost = nodeData.get('Startup Cost', None)
+        self.totalCost = nodeData.get('Total Cost', None)
+        self.estimatedRows = nodeData.get('Plan Rows', None)
+
+        # These are only present with ANALYZE
+        self.actualRows = nodeData.get('Actual Rows', None)
+        self.actualLoops = nodeData.get('Actual Loops', None)
+        self.actualStartupTime = nodeData.get('Actual Startup Time', None)
+        self.actualTotalTime = nodeData.get('Actual Total Time', None)
+
+        # These are only present with BUFFERS
+        self.sharedHitBlocks = nodeData.get('Shared Hit Blocks', None)
+        self.sharedReadBlocks = nodeData.get('Shared Read Blocks', None)
+
+        self.children = [ PlanNode(childData, parent=self) for childData in nodeData.get('Plans', []) ]
+
+    @property
+    def isSeqScan(self):
+        '''
+            isSeqScan - True if this node is a sequential scan of a table
+
+                @return <bool>
+        '''
+        return self.nodeType == 'Seq Scan'
+
+    @property
+    def totalActualRows(self):
+        '''
+            totalActualRows - The total rows produced by this node over all loops ( ANALYZE only )
+
+                @return <None/int> - Actual rows * loops, or None if not analyzed
+        '''
+        if self.actualRows is None:
+            return None
+
+        return self.actualRows * (self.actualLoops or 1)
+
+    @property
+    def totalActualTime(self):
+        '''
+            totalActualTime - Total milliseconds spent in this node (and children) over all loops ( ANALYZE only )
+
+                @return <None/float> - Actual total time * loops, or None if not analyzed
+        '''
+        if self.actualTotalTime is None:
+            return None
+
+        return self.actualTotalTime * (self.actualLoops or 1)
+
+    @property
+    def rowsEstimateRatio(self):
+        '''
+            rowsEstimateRatio - Ratio of actual rows (per loop) to estimated rows ( ANALYZE only )
+
+                A value far from 1.0 means the planner misestimated this node.
+
+                @return <None/float> - actual / estimated, or None if not analyzed
+        '''
+        if self.actualRows is None or self.estimatedRows is None:
+            return None
+
+        return float(self.actualRows) / max(self.estimatedRows, 1)
+
+    def walk(self):
+        '''
+            walk - Iterate over this node and all descendants, depth-first
+
+                @return generator<PlanNode>
+        '''
+        yield self
+
+        for child in self.children:
+            for node in child.walk():
+                yield node
+
+    def __repr__(self):
+        ret = [ 'PlanNode( nodeType=%s' %(repr(self.nodeType), ) ]
+
+        if self.relationName:
+            ret.append('relationName=%s' %(repr(self.relationName), ))
+
+        ret.append('totalCost=%s , estimatedRows=%s' %(repr(self.totalCost), repr(self.estimatedRows)))
+
+        if self.actualRows is not None:
+            ret.append('actualRows=%s , actualTotalTime=%s' %(repr(self.actualRows), repr(self.actualTotalTime)))
+
+        return ' , '.join(ret) + ' )'
+
+
+class QueryPlan(object):
+    '''
+        QueryPlan - A parsed EXPLAIN ( FORMAT JSON ) result
+    '''
+
+    def __init__(self, planData):
+        '''
+            __init__ - Create a QueryPlan
+
+                @param planData <list/dict/str> - The output of EXPLAIN ( FORMAT JSON ).
+
+                    May be the JSON string, the parsed list, or the single dict within that list.
+        '''
+        if issubclass(planData.__class__, (str, bytes)):
+            planData = json.loads(planData)
+
+        if issubclass(planData.__class__, (list, tuple)):
+            planData = planData[0]
+
+        self.raw = planData
+
+        self.rootNode = PlanNode(planData['Plan'])
+
+        # These are in milliseconds and only present with ANALYZE
+        self.planningTime = planData.get('Planning Time', None)
+        self.executionTime = planData.get('Execution Time', None)
+
+        self.nodes = list(self.rootNode.walk())
+
+    @property
+    def isAnalyzed(self):
+        '''
+            isAnalyzed - True if this plan includes ANALYZE ( actual ) information
+
+                @return <bool>
+        '''
+        return self.rootNode.actualRows is not None
+
+    @property
+    def totalCost(self):
+        '''
+            totalCost - The planner's estimated total cost of the query
+
+                @return <float>
+        '''
+        return self.rootNode.totalCost
+
+    @property
+    def startupCost(self):
+        '''
+            startupCost - The planner's estimated startup cost of the query
+
+                @return <float>
+        '''
+        return self.rootNode.startupCost
+
+    @property
+    def estimatedRows(self):
+        '''
+            estimatedRows - The planner's estimate of rows returned by the query
+
+                @return <int>
+        '''
+        return self.rootNode.estimatedRows
+
+    @property
+    def actualRows(self):
+        '''
+            actualRows - The number of rows actually returned by the query ( ANALYZE only )
+
+                @return <None/int>
+        '''
+        return self.rootNode.totalActualRows
+
+    @property
+    def seqScans(self):
+        '''
+            seqScans - All sequential scan nodes in this plan
+
+                @return list<PlanNode>
+        '''
+        return [ node for node in self.nodes if node.isSeqScan ]
+
+    @property
+    def hasSeqScan(self):
+        '''
+            hasSeqScan - True if any node in this plan is a sequential scan
+
+                @return <bool>
+        '''
+        return bool(self.seqScans)
+
+    def getNodesByType(self, nodeType):
+        '''
+            getNodesByType - Get all nodes of a given type
+
+                @param nodeType <str> - A node type, like "Index Scan"
+
+                @return list<PlanNode>
+        '''
+        return [ node for node in self.nodes if node.nodeType == nodeType ]
+
+    def getNodesByRelation(self, relationName):
+        '''
+            getNodesByRelation - Get all nodes which scan a given table
+
+                @param relationName <str> - The table name
+
+                @return list<PlanNode>
+        '''
+        return [ node for node in self.nodes if node.relationName == relationName ]
+
+    def __repr__(self):
+        ret = 'QueryPlan( totalCost=%s , estimatedRows=%s' %(repr(self.totalCost), repr(self.estimatedRows))
+        if self.isAnalyzed:
+            ret += ' , actualRows=%s , executionTime=%s' %(repr(self.actualRows), repr(self.executionTime))
+
+        return ret + ' , nodes=%s )' %(repr(self.nodes), )
+
+
+def _getExplainPrefix(analyze, buffers, format):
+    '''
+        _getExplainPrefix - Get the  EXPLAIN ( ... )  portion to be prepended to a query
+    '''
+    format = format.lower()
+    if format not in EXPLAIN_FORMATS:
+        raise ValueError('Unknown EXPLAIN format: %s.  Possible formats:  %s.' %(repr(format), repr(EXPLAIN_FORMATS)))
+
+    options = []
+    if analyze:
+        options.append('ANALYZE true')
+    if buffers:
+        options.append('BUFFERS true')
+    options.append('FORMAT ' + format.upper())
+
+    return 'EXPLAIN ( %s ) ' %(', '.join(options), )
+
+
+def _parseExplainRows(rows, format):
+    '''
+        _parseExplainRows - Convert the rows returned by EXPLAIN into a QueryPlan (json) or a string (other formats)
+    '''
+    if format.lower() == 'json':
+        return QueryPlan(rows[0][0])
+
+    return '\n'.join( [ row[0] for row in rows ] )
+
+
+def explainSql(sql, params, analyze=False, buffers=False, format='json', isWrite=False, dbConn=None):
+    '''
+        explainSql - EXPLAIN a parameterized SQL statement
+
+            @param sql <str> - The (parameterized) SQL
+
+            @param params <dict> - The parameters
+
+            @param analyze <bool> default False - If True, EXPLAIN ANALYZE (actually executes the statement)
+
+            @param buffers <bool> default False - If True, include buffer usage
+
+            @param format <str> default 'json' - One of EXPLAIN_FORMATS
+
+            @param isWrite <bool> default False - If True and #analyze is True, the statement is executed
+
+                within a transaction ( or savepoint ) which is rolled back, so no data is modified.
+
+            @param dbConn <None/DatabaseConnection> default None - Connection to use, or None for a new one
+
+                with the global settings
+
+            @return <QueryPlan/str> - For the 'json' format, a parsed QueryPlan. Otherwise, the plan text.
+    '''
+    explainSqlStr = _getExplainPrefix(analyze, buffers, format) + sql
+
+    if not analyze or not isWrite:
+        if not dbConn:
+            dbConn = getDatabaseConnection()
+
+        rows = dbConn.doSelectParams(explainSqlStr, params)
+
+        return _parseExplainRows(rows, format)
+
+    # ANALYZE of a write -- must be rolled back
+    if not dbConn:
+        dbConn = getDatabaseConnection(isTransactionMode=True)
+        try:
+            rows = dbConn.doSelectParams(explainSqlStr, params)
+        finally:
+            dbConn.rollback()
+
+    elif dbConn.isTransaction:
+        # Already within a transaction, do not lose what is pending. Use a savepoint.
+        dbConn.executeSql('SAVEPOINT ' + EXPLAIN_SAVEPOINT_NAME)
+        try:
+            rows = dbConn.doSelectParams(explainSqlStr, params)
+        finally:
+            dbConn.executeSql('ROLLBACK TO SAVEPOINT ' + EXPLAIN_SAVEPOINT_NAME)
+            dbConn.executeSql('RELEASE SAVEPOINT ' + EXPLAIN_SAVEPOINT_NAME)
+
+    else:
+        # Autocommit connection, explicitly wrap in a transaction
+        dbConn.executeSql('BEGIN')
+        try:
+            rows = dbConn.doSelectParams(explainSqlStr, params)
+        finally:
+            dbConn.executeSql('ROLLBACK')
+
+    return _parseExplainRows(rows, format)
+
+
+# vim: set ts=4 sw=4 st=4 expandtab:
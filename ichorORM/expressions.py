@@ -0,0 +1,215 @@
+'''
+    Copyright (c) 2018 Timothy Savannah
+
+    Licensed under the terms of the Lesser GNU Lesser General Public License version 2.1
+
+      license can be found at https://raw.githubusercontent.com/kata198/ichorORM/master/LICENSE
+
+
+    expressions - Parameterized SQL expressions on fields, e.x.  F('count') + 1
+'''
+# vim: set ts=4 sw=4 st=4 expandtab:
+
+import re
+
+from psycopg2.extensions import adapt as psycopg2_adapt
+
+from .special import isQueryStr
+
+__all__ = ('Expression', 'F', 'CombinedExpression', 'isExpression')
+
+
+# FIELD_NAME_RE - A field reference must be a plain identifier, optionally prefixed by a table name.
+#   This is what makes F safe to use with untrusted input -- nothing else can be embedded.
+FIELD_NAME_RE = re.compile('^[A-Za-z_][A-Za-z0-9_]*([.][A-Za-z_][A-Za-z0-9_]*)?$')
+
+
+def isExpression(obj):
+    '''
+        isExpression - Check if passed object is an Expression (like F('field') + 1 )
+
+            @return <bool> - True if #obj extends Expression, otherwise False
+    '''
+    return bool( issubclass(obj.__class__, Expression) )
+
+
+def _operandToStr(operand):
+    '''
+        _operandToStr - Convert an operand into a string with any values inline
+    '''
+    if isExpression(operand):
+        return operand.toStr()
+    if isQueryStr(operand):
+        return str(operand)
+
+    # Avoid circular import
+    from .query import isSelectQuery
+    if isSelectQuery(operand):
+        return operand.asQueryStr()
+
+    return str(psycopg2_adapt(operand))
+
+
+def _operandToStrParam(operand, paramName):
+    '''
+        _operandToStrParam - Convert an operand into a parameterized string
+
+            @return tuple( <str>, <dict> ) - The sql string and parameters
+    '''
+    if isExpression(operand):
+        return operand.toStrParam(paramName)
+    if isQueryStr(operand):
+        return ( str(operand), {} )
+
+    from .query import isSelectQuery
+    if isSelectQuery(operand):
+        return operand.asQueryStrParams(paramPrefix=paramName)
+
+    return ( '%(' + paramName + ')s', { paramName : operand } )
+
+
+class Expression(object):
+    '''
+        Expression - Base class of SQL expressions.
+
+            Supports the arithmetic operators ( + - * / % ) with other expressions or values,
+              producing a CombinedExpression. Values are always passed as parameters.
+    '''
+
+    __slots__ = ()
+
+    def toStr(self):
+        '''
+            toStr - Convert this expression into a SQL string, with any values inline
+
+              Recommended to use #toStrParam for quoting / injection reasons
+
+                @return <str> - SQL
+        '''
+        raise NotImplementedError('Must implement toStr. Type %s does not.' %(self.__class__.__name__, ))
+
+    def toStrParam(self, paramName):
+        '''
+            toStrParam - Convert this expression into a SQL string using parameterized values
+
+                @param paramName <str> - A unique name which will be used as the prefix for any params
+
+                @return tuple( <str>, <dict> ) - A tuple of the SQL string and a dict of paramNames -> paramValues
+        '''
+        raise NotImplementedError('Must implement toStrParam. Type %s does not.' %(self.__class__.__name__, ))
+
+    def __add__(self, other):
+        return CombinedExpression(self, '+', other)
+
+    def __radd__(self, other):
+        return CombinedExpression(other, '+', self)
+
+    def __sub__(self, other):
+        return CombinedExpression(self, '-', other)
+
+    def __rsub__(self, other):
+        return CombinedExpression(other, '-', self)
+
+    def __mul__(self, other):
+        return CombinedExpression(self, '*', other)
+
+    def __rmul__(self, other):
+        return CombinedExpression(other, '*', self)
+
+    def __truediv__(self, other):
+        return CombinedExpression(self, '/', other)
+
+    def __rtruediv__(self, other):
+        return CombinedExpression(other, '/', self)
+
+    __div__ = __truediv__
+    __rdiv__ = __rtruediv__
+
+    def __mod__(self, other):
+        return CombinedExpression(self, '%%', other)
+
+    def __rmod__(self, other):
+        return CombinedExpression(other, '%%', self)
+
+    def __neg__(self):
+        return CombinedExpression(0, '-', self)
+
+
+class F(Expression):
+    '''
+        F - A reference to a field (column), for use in expressions.
+
+            For example, to increment a counter in a single statement:
+
+              updateQuery.setFieldValue('count', F('count') + 1)
+
+            which becomes   count = count + %(param)s
+    '''
+
+    __slots__ = ('fieldName', )
+
+    def __init__(self, fieldName):
+        '''
+            __init__ - Create a field reference
+
+                @param fieldName <str> - The name of the field, optionally prefixed with the table name ( e.x. "person.age" )
+        '''
+        if not FIELD_NAME_RE.match(fieldName):
+            raise ValueError('Invalid field name for F expression: %s' %(repr(fieldName), ))
+
+        self.fieldName = fieldName
+
+    def toStr(self):
+        return self.fieldName
+
+    def toStrParam(self, paramName):
+        return ( self.fieldName, {} )
+
+    def __repr__(self):
+        return 'F(%s)' %(repr(self.fieldName), )
+
+
+class CombinedExpression(Expression):
+    '''
+        CombinedExpression - Two operands joined by an arithmetic operator.
+
+            Generally created via the operators on Expression, like  F('count') + 1
+    '''
+
+    __slots__ = ('left', 'operator', 'right')
+
+    def __init__(self, left, operator, right):
+        '''
+            __init__ - Create a CombinedExpression
+
+                @param left <Expression/QueryStr/SelectQuery/???> - The left operand
+
+                @param operator <str> - The operator
+
+                @param right <Expression/QueryStr/SelectQuery/???> - The right operand
+
+              Operands which are not an Expression, QueryStr, or SelectQuery will be parameterized values.
+        '''
+        self.left = left
+        self.operator = operator
+        self.right = right
+
+    def toStr(self):
+        return '( %s %s %s )' %( _operandToStr(self.left), self.operator.replace('%%', '%'), _operandToStr(self.right) )
+
+    def toStrParam(self, paramName):
+        params = {}
+
+        (leftStr, leftParams) = _operandToStrParam(self.left, paramName + '_l')
+        params.update(leftParams)
+
+        (rightStr, rightParams) = _operandToStrParam(self.right, paramName + '_r')
+        params.update(rightParams)
+
+        return ( '( %s %s %s )' %( leftStr, self.operator, rightStr ), params )
+
+    def __repr__(self):
+        return 'CombinedExpression( %s %s %s )' %( repr(self.left), self.operator.replace('%%', '%'), repr(self.right) )
+
+
+# vim: set ts=4 sw=4 st=4 expandtab:
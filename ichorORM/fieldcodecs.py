@@ -0,0 +1,444 @@
+'''
+    Copyright (c) 2018 Timothy Savannah
+
+    Licensed under the terms of the Lesser GNU Lesser General Public License version 2.1
+
+      license can be found at https://raw.githubusercontent.com/kata198/ichorORM/master/LICENSE
+
+
+    fieldcodecs - Per-field decoders, set via FIELD_CODECS on a model or SelectQuery.setFieldCodec
+
+        A codec may decode the raw text sent by the server ( skipping psycopg2's decoding entirely,
+
+          via a typecaster registered on a dedicated cursor ), or post-process the value in the hydration loop.
+'''
+# vim: set ts=4 sw=4 st=4 expandtab:
+
+import json
+import threading
+
+from collections import OrderedDict
+
+import psycopg2.extensions as psycopg2_ext
+
+__all__ = ('FieldCodec', 'RawCodec', 'FloatCodec', 'LazyJSONCodec', 'FunctionCodec', 'LazyJSONValue',
+    'CodecPlan', 'getCodecPlan', 'clearCodecTypeCache',
+)
+
+# Postgres type OIDs
+OID_JSON = 114
+OID_NUMERIC = 1700
+OID_DATE = 1082
+OID_TIME = 1083
+OID_TIMESTAMP = 1114
+OID_TIMESTAMPTZ = 1184
+OID_INTERVAL = 1186
+OID_UUID = 2950
+OID_JSONB = 3802
+
+# TYPE_CACHE_MAX_SIZE - Maximum number of query shapes to remember the column types of
+TYPE_CACHE_MAX_SIZE = 1024
+
+# _typeCache - Parameterized SQL -> list of column type OIDs. Least recently used is evicted first.
+_typeCache = OrderedDict()
+_typeCacheLock = threading.Lock()
+
+
+class FieldCodec(object):
+    '''
+        FieldCodec - Base class of field codecs.
+
+            Implement #decode to post-process values ( already decoded by psycopg2 ) in the hydration loop.
+
+            To skip psycopg2's decoding altogether, list the postgres types in TYPE_OIDS and implement #decodeRaw,
+
+              which receives the text sent by the server for a field of one of those types.
+    '''
+
+    # TYPE_OIDS - Postgres type OIDs for which #decodeRaw is used in place of psycopg2's decoding
+    TYPE_OIDS = ()
+
+    def decode(self, value):
+        '''
+            decode - Decode a value already decoded by psycopg2. Not called for NULL.
+
+                @param value - The value
+
+                @return - The decoded value
+        '''
+        return value
+
+    def decodeRaw(self, text):
+        '''
+            decodeRaw - Decode the text sent by the server, for a field of one of TYPE_OIDS. Not called for NULL.
+
+                @param text <str> - The text
+
+                @return - The decoded value
+        '''
+        return text
+
+
+class RawCodec(FieldCodec):
+    '''
+        RawCodec - Pass the value through as the text sent by the server, without decoding.
+
+            For numeric, json/jsonb, date/time, interval, and uuid fields. Other types are left as psycopg2 decodes them.
+    '''
+
+    TYPE_OIDS = (OID_NUMERIC, OID_JSON, OID_JSONB, OID_DATE, OID_TIME, OID_TIMESTAMP, OID_TIMESTAMPTZ, OID_INTERVAL, OID_UUID)
+
+
+class FloatCodec(FieldCodec):
+    '''
+        FloatCodec - Decode numeric fields as float instead of Decimal
+    '''
+
+    TYPE_OIDS = (OID_NUMERIC, )
+
+    def decode(self, value):
+        return float(value)
+
+    def decodeRaw(self, text):
+        return float(text)
+
+
+class LazyJSONValue(object):
+    '''
+        LazyJSONValue - Holds the text of a json value, which is only parsed upon first access.
+
+            Acts as the parsed value for item access, iteration, len, "in", and comparison,
+
+              and other attributes ( e.x. .get , .items ) are taken from the parsed value.
+
+            Use #value to get the parsed value itself, or #rawValue for the text.
+
+            Saving a model with a LazyJSONValue saves the text.
+    '''
+
+    __slots__ = ('rawValue', '_value', '_isParsed')
+
+    def __init__(self, rawValue):
+        self.rawValue = rawValue
+        self._value = None
+        self._isParsed = False
+
+    @property
+    def value(self):
+        '''
+            value - The parsed value
+        '''
+        if not self._isParsed:
+            self._value = json.loads(self.rawValue)
+            self._isParsed = True
+
+        return self._value
+
+    @property
+    def isParsed(self):
+        '''
+            isParsed - True if the value has been parsed
+        '''
+        return self._isParsed
+
+    def __getattr__(self, name):
+        # Only called for attributes not found normally. Do not parse for special or unset attributes ( e.x. when copying )
+        if name.startswith('__') or name in LazyJSONValue.__slots__:
+            raise AttributeError(name)
+
+        return getattr(self.value, name)
+
+    def __getitem__(self, key):
+        return self.value[key]
+
+    def __iter__(self):
+        return iter(self.value)
+
+    def __len__(self):
+        return len(self.value)
+
+    def __contains__(self, item):
+        return item in self.value
+
+    def __bool__(self):
+        return bool(self.value)
+
+    __nonzero__ = __bool__
+
+    def __eq__(self, other):
+        if issubclass(other.__class__, LazyJSONValue):
+            other = other.value
+        return self.value == other
+
+    def __ne__(self, other):
+        return not self.__eq__(other)
+
+    __hash__ = None
+
+    def __repr__(self):
+        return 'LazyJSONValue( %s )' %(self.rawValue, )
+
+
+# Save as the json text
+psycopg2_ext.register_adapter(LazyJSONValue, lambda lazyValue : psycopg2_ext.adapt(lazyValue.rawValue))
+
+
+class LazyJSONCodec(FieldCodec):
+    '''
+        LazyJSONCodec - Decode json / jsonb fields as a LazyJSONValue, which is only parsed upon first access
+    '''
+
+    TYPE_OIDS = (OID_JSON, OID_JSONB)
+
+    def decode(self, value):
+        if issubclass(value.__class__, str):
+            return LazyJSONValue(value)
+
+        # Already parsed ( e.x. json built in the query, not the raw field )
+        return value
+
+    def decodeRaw(self, text):
+        return LazyJSONValue(text)
+
+
+class FunctionCodec(FieldCodec):
+    '''
+        FunctionCodec - Decode with custom functions
+    '''
+
+    def __init__(self, decodeFunc=None, decodeRawFunc=None, typeOids=()):
+        '''
+            __init__ - Create a FunctionCodec
+
+                @param decodeFunc <None/function(value)> - Function to post-process a value already decoded by psycopg2
+
+                @param decodeRawFunc <None/function(text)> - Function to decode the text sent by the server,
+
+                    for a field of one of #typeOids
+
+                @param typeOids list<int> default () - Postgres type OIDs for which #decodeRawFunc is used
+        '''
+        if typeOids and not decodeRawFunc:
+            raise ValueError('FunctionCodec with typeOids requires a decodeRawFunc.')
+
+        self.TYPE_OIDS = tuple(typeOids)
+
+        if decodeFunc is not None:
+            self.decode = decodeFunc
+        if decodeRawFunc is not None:
+            self.decodeRaw = decodeRawFunc
+
+
+# _STATELESS_CODEC_TYPES - Codec types where any two instances decode alike
+_STATELESS_CODEC_TYPES = (RawCodec, FloatCodec, LazyJSONCodec)
+
+
+def clearCodecTypeCache():
+    '''
+        clearCodecTypeCache - Forget all cached column types ( e.x. after altering a table )
+    '''
+    with _typeCacheLock:
+        _typeCache.clear()
+
+
+def _getColumnTypeOids(sql, params, dbConn):
+    '''
+        _getColumnTypeOids - Get the column type OIDs of a query, from cache or via a  LIMIT 0  probe
+    '''
+    with _typeCacheLock:
+        typeOids = _typeCache.get(sql, None)
+        if typeOids is not None:
+            _typeCache.move_to_end(sql)
+            return typeOids
+
+    typeOids = dbConn.getColumnTypeOidsParams(sql, params)
+
+    with _typeCacheLock:
+        _typeCache[sql] = typeOids
+        while len(_typeCache) > TYPE_CACHE_MAX_SIZE:
+            _typeCache.popitem(last=False)
+
+    return typeOids
+
+
+def _makeTypecaster(decodeRaw):
+    '''
+        _makeTypecaster - Make a typecaster for psycopg2 which decodes with #decodeRaw
+    '''
+    return lambda value, cursor : None if value is None else decodeRaw(value)
+
+
+class CodecPlan(object):
+    '''
+        CodecPlan - How to apply the codecs for a query:
+
+            the typecasters to register on the cursor, and the decoders to apply to each row after fetching.
+    '''
+
+    def __init__(self):
+        # typecasters - Type OID -> function(value, cursor), to register on the cursor
+        self.typecasters = {}
+
+        # columnDecoders - list of ( columnIdx, function(value) ), to apply after fetching
+        self.columnDecoders = []
+
+        # _castCursor - The cursor, as seen by a passthrough typecaster. @see #_addPassthroughType
+        self._castCursor = None
+
+    def _addPassthroughType(self, typeOid):
+        '''
+            _addPassthroughType - Fetch a type as the text sent by the server, for when columns of that type
+
+                decode differently. Columns which want the default decoding use #_getDefaultDecoder
+        '''
+        def _passthroughTypecaster(value, cursor):
+            self._castCursor = cursor
+            return value
+
+        self.typecasters[typeOid] = _passthroughTypecaster
+
+    def _getDefaultDecoder(self, typeOid, decode=None):
+        '''
+            _getDefaultDecoder - Get a function which decodes passed-through text of a type as psycopg2 would have,
+
+                and then applies #decode ( if provided )
+        '''
+        defaultTypecaster = psycopg2_ext.string_types.get(typeOid, None)
+        if defaultTypecaster is None:
+            return decode
+
+        if decode is None:
+            return lambda text : defaultTypecaster(text, self._castCursor)
+
+        return lambda text : decode( defaultTypecaster(text, self._castCursor) )
+
+    def decodeRow(self, row):
+        '''
+            decodeRow - Apply the column decoders to a row
+
+                @param row <tuple> - The row
+
+                @return <tuple> - The decoded row
+        '''
+        if not self.columnDecoders:
+            return row
+
+        row = list(row)
+        for columnIdx, decode in self.columnDecoders:
+            value = row[columnIdx]
+            if value is not None:
+                row[columnIdx] = decode(value)
+
+        return tuple(row)
+
+    def decodeRows(self, rows):
+        '''
+            decodeRows - Apply the column decoders to a list of rows
+
+                @param rows list<tuple> - The rows
+
+                @return list<tuple> - The decoded rows
+        '''
+        if not self.columnDecoders:
+            return rows
+
+        decodeRow = self.decodeRow
+
+        return [ decodeRow(row) for row in rows ]
+
+
+def _hasDecode(codec):
+    '''
+        _hasDecode - Check if a codec does anything in #FieldCodec.decode
+    '''
+    return bool( codec.__class__.decode is not FieldCodec.decode or 'decode' in codec.__dict__ )
+
+
+def getCodecPlan(columnCodecs, sql, params, dbConn):
+    '''
+        getCodecPlan - Get the plan for applying codecs to the results of a query
+
+            When every column of a type has a codec which lists that type in TYPE_OIDS ( and they decode alike ),
+
+              a typecaster calling #FieldCodec.decodeRaw is registered on the cursor, so there is no work after fetching.
+
+            Otherwise ( as a typecaster applies to the whole cursor ), that type is fetched as text and each column
+
+              of it decoded after fetching: with #FieldCodec.decodeRaw, or as psycopg2 would and then #FieldCodec.decode
+
+            The column types are found with a  LIMIT 0  probe, cached per query shape, and only when some codec has TYPE_OIDS.
+
+            @param columnCodecs list<None/FieldCodec> - The codec of each column, in order
+
+            @param sql <str> - The parameterized SQL of the query
+
+            @param params <dict> - The parameters of the query
+
+            @param dbConn <DatabaseConnection> - The connection the query will be executed on
+
+            @return <None/CodecPlan> - None if there are no codecs
+    '''
+    if not any(columnCodecs):
+        return None
+
+    rawTypeOids = set()
+    for codec in columnCodecs:
+        if codec is not None:
+            rawTypeOids.update(codec.TYPE_OIDS)
+
+    codecPlan = CodecPlan()
+
+    # handledColumnIdxs - Columns fully handled by a typecaster or an entry in columnDecoders
+    handledColumnIdxs = set()
+
+    if rawTypeOids:
+        typeOids = _getColumnTypeOids(sql, params, dbConn)
+
+        columnIdxsByOid = {}
+        for columnIdx in range(len(typeOids)):
+            typeOid = typeOids[columnIdx]
+            codec = columnCodecs[columnIdx]
+            if codec is not None and typeOid in codec.TYPE_OIDS:
+                columnIdxsByOid.setdefault(typeOid, [])
+
+        for columnIdx in range(len(typeOids)):
+            if typeOids[columnIdx] in columnIdxsByOid:
+                columnIdxsByOid[ typeOids[columnIdx] ].append(columnIdx)
+
+        for typeOid, columnIdxs in columnIdxsByOid.items():
+            codecs = [ columnCodecs[columnIdx] for columnIdx in columnIdxs ]
+
+            # A column of this type may be shared with a field without a codec, which is decoded per column below
+            firstCodec = [ codec for codec in codecs if codec is not None ][0]
+            if typeOid in firstCodec.TYPE_OIDS and all( [ codec is firstCodec or ( codec is not None and codec.__class__ is firstCodec.__class__ and codec.__class__ in _STATELESS_CODEC_TYPES ) for codec in codecs ] ):
+                codecPlan.typecasters[typeOid] = _makeTypecaster(firstCodec.decodeRaw)
+                handledColumnIdxs.update(columnIdxs)
+                continue
+
+            # Columns of this type decode differently
+            codecPlan._addPassthroughType(typeOid)
+
+            for columnIdx, codec in zip(columnIdxs, codecs):
+                if codec is not None and typeOid in codec.TYPE_OIDS:
+                    decoder = codec.decodeRaw
+                else:
+                    decoder = codecPlan._getDefaultDecoder(typeOid, codec.decode if codec is not None and _hasDecode(codec) else None)
+
+                if decoder is not None:
+                    codecPlan.columnDecoders.append( (columnIdx, decoder) )
+
+                handledColumnIdxs.add(columnIdx)
+
+    for columnIdx in range(len(columnCodecs)):
+        codec = columnCodecs[columnIdx]
+        if codec is None or columnIdx in handledColumnIdxs or not _hasDecode(codec):
+            continue
+
+        codecPlan.columnDecoders.append( (columnIdx, codec.decode) )
+
+    codecPlan.columnDecoders.sort()
+
+    return codecPlan
+
+
+# vim: set ts=4 sw=4 st=4 expandtab:
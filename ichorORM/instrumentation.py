@@ -0,0 +1,99 @@
+'''
+    Copyright (c) 2018 Timothy Savannah
+
+    Licensed under the terms of the Lesser GNU Lesser General Public License version 2.1
+
+      license can be found at https://raw.githubusercontent.com/kata198/ichorORM/master/LICENSE
+
+
+    instrumentation - Events emitted by ichorORM ( e.x. transaction retries ), with counters and listeners.
+
+        Every event increments a counter of its name. Listeners are called with each event as it happens.
+'''
+# vim: set ts=4 sw=4 st=4 expandtab:
+
+import sys
+import threading
+import traceback
+
+__all__ = ('addInstrumentationListener', 'removeInstrumentationListener', 'emitInstrumentationEvent',
+    'getInstrumentationCounters', 'resetInstrumentationCounters',
+)
+
+# _listeners - Functions called with ( eventName, eventData ) on every event
+_listeners = []
+
+# _counters - Event name -> number of times emitted
+_counters = {}
+
+_instrumentationLock = threading.Lock()
+
+
+def addInstrumentationListener(listener):
+    '''
+        addInstrumentationListener - Add a function to be called on every event
+
+            @param listener <function(eventName<str>, eventData<dict>)> - The listener. Exceptions raised by it
+
+                are written to stderr and otherwise ignored.
+    '''
+    with _instrumentationLock:
+        if listener not in _listeners:
+            _listeners.append(listener)
+
+
+def removeInstrumentationListener(listener):
+    '''
+        removeInstrumentationListener - Remove a listener added by #addInstrumentationListener
+
+            @param listener <function> - The listener
+
+            @return <bool> - True if it was removed, False if it was not present
+    '''
+    with _instrumentationLock:
+        if listener in _listeners:
+            _listeners.remove(listener)
+            return True
+
+    return False
+
+
+def emitInstrumentationEvent(eventName, **eventData):
+    '''
+        emitInstrumentationEvent - Emit an event: increment its counter, and call each listener
+
+            @param eventName <str> - The event name, e.x. "transaction_retry"
+
+            Any other arguments are passed to the listeners as the event data
+    '''
+    with _instrumentationLock:
+        _counters[eventName] = _counters.get(eventName, 0) + 1
+        listeners = list(_listeners)
+
+    for listener in listeners:
+        try:
+            listener(eventName, eventData)
+        except Exception as e:
+            sys.stderr.write('WARNING: Exception in instrumentation listener %s on event %s:\n' %(repr(listener), repr(eventName)))
+            traceback.print_exception(*sys.exc_info())
+
+
+def getInstrumentationCounters():
+    '''
+        getInstrumentationCounters - Get the number of times each event has been emitted
+
+            @return dict<str : int> - A copy of the counters
+    '''
+    with _instrumentationLock:
+        return dict(_counters)
+
+
+def resetInstrumentationCounters():
+    '''
+        resetInstrumentationCounters - Reset all the counters to zero
+    '''
+    with _instrumentationLock:
+        _counters.clear()
+
+
+# vim: set ts=4 sw=4 st=4 expandtab:
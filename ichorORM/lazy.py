@@ -0,0 +1,177 @@
+'''
+    Copyright (c) 2018 Timothy Savannah
+
+    Licensed under the terms of the Lesser GNU Lesser General Public License version 2.1
+
+      license can be found at https://raw.githubusercontent.com/kata198/ichorORM/master/LICENSE
+
+
+    lazy - Lightweight proxies which hold a fetched row, and only create the model object when needed
+'''
+# vim: set ts=4 sw=4 st=4 expandtab:
+
+__all__ = ('LazyModelProxy', 'getLazyFieldIdxs')
+
+
+def getLazyFieldIdxs(model, fields):
+    '''
+        getLazyFieldIdxs - Get the field index map shared by all the proxies from the same results
+
+            @param model <DatabaseModel type> - The model
+
+            @param fields list<str> - The selected fields, in order
+
+            @return dict<str : int> - Field name -> column index, for each selected field on the model
+    '''
+    modelFields = set(model.FIELDS)
+
+    return { fields[i] : i for i in range(len(fields)) if fields[i] in modelFields }
+
+
+class LazyModelProxy(object):
+    '''
+        LazyModelProxy - Stands in for a model object, holding just the row tuple and a field index map shared with
+
+            every other proxy from the same results.
+
+            Reading a selected field returns the value straight from the row. The full model object is only created
+
+              upon accessing anything else ( a method, a relation, an unselected field ), or setting any attribute.
+
+              From then on, everything is passed to that object.
+
+            A proxy is associated with the deferred field loader upon creation, so loading a deferred field loads it for
+
+              every proxy from the same results in one query, and reading it from another proxy does not create its object.
+
+            Use #_getObj to get the model object itself.
+    '''
+
+    __slots__ = ('_lazyModel', '_lazyRow', '_lazyFieldIdxs', '_lazyDeferredFieldLoader', '_lazyObj', '_lazyLoadedFields', '__weakref__')
+
+    def __init__(self, model, row, fieldIdxs, deferredFieldLoader=None):
+        '''
+            __init__ - Create a LazyModelProxy
+
+                @param model <DatabaseModel type> - The model
+
+                @param row <tuple> - The row
+
+                @param fieldIdxs <dict> - Field name -> index in #row. @see getLazyFieldIdxs
+
+                @param deferredFieldLoader <None/DeferredFieldLoader> default None - If provided, this proxy ( and later
+
+                    the object ) is associated with this loader
+        '''
+        object.__setattr__(self, '_lazyModel', model)
+        object.__setattr__(self, '_lazyRow', row)
+        object.__setattr__(self, '_lazyFieldIdxs', fieldIdxs)
+        object.__setattr__(self, '_lazyDeferredFieldLoader', deferredFieldLoader)
+        object.__setattr__(self, '_lazyObj', None)
+        object.__setattr__(self, '_lazyLoadedFields', None)
+
+        if deferredFieldLoader is not None:
+            deferredFieldLoader.addProxy(self)
+
+    def _getObj(self):
+        '''
+            _getObj - Get the model object, creating it if not yet created
+
+                @return <DatabaseModel>
+        '''
+        obj = self._lazyObj
+        if obj is not None:
+            return obj
+
+        row = self._lazyRow
+
+        obj = self._lazyModel( **{ fieldName : row[idx] for fieldName, idx in self._lazyFieldIdxs.items() } )
+
+        if self._lazyDeferredFieldLoader is not None:
+            self._lazyDeferredFieldLoader.addObj(obj)
+
+        if self._lazyLoadedFields:
+            # Deferred fields already loaded onto this proxy
+            for fieldName, value in self._lazyLoadedFields.items():
+                setattr(obj, fieldName, value)
+
+        object.__setattr__(self, '_lazyObj', obj)
+        object.__setattr__(self, '_lazyRow', None)
+        object.__setattr__(self, '_lazyLoadedFields', None)
+
+        return obj
+
+    def _hasLoadedField(self, fieldName):
+        '''
+            _hasLoadedField - Check if a deferred field has been loaded onto this proxy ( before the object was created )
+
+                @param fieldName <str> - The field name
+
+                @return <bool>
+        '''
+        return bool( self._lazyLoadedFields is not None and fieldName in self._lazyLoadedFields )
+
+    def _setLoadedField(self, fieldName, value):
+        '''
+            _setLoadedField - Set the value of a deferred field, loaded by the DeferredFieldLoader, without creating the object
+
+                @param fieldName <str> - The field name
+
+                @param value - The loaded value
+        '''
+        if self._lazyObj is not None:
+            setattr(self._lazyObj, fieldName, value)
+            return
+
+        if self._lazyLoadedFields is None:
+            object.__setattr__(self, '_lazyLoadedFields', {})
+
+        self._lazyLoadedFields[fieldName] = value
+
+    @property
+    def _isMaterialized(self):
+        '''
+            _isMaterialized - True if the model object has been created
+        '''
+        return bool(self._lazyObj is not None)
+
+    def __getattr__(self, name):
+        # Only called for attributes not found on the proxy itself
+        if name in LazyModelProxy.__slots__:
+            # Not yet set ( e.x. when copying )
+            raise AttributeError(name)
+
+        if self._lazyObj is None:
+            idx = self._lazyFieldIdxs.get(name, None)
+            if idx is not None:
+                return self._lazyRow[idx]
+
+            if self._lazyLoadedFields is not None and name in self._lazyLoadedFields:
+                return self._lazyLoadedFields[name]
+
+            if name.startswith('__'):
+                # Do not create the object for special attributes ( e.x. when copying )
+                raise AttributeError(name)
+
+        return getattr(self._getObj(), name)
+
+    def __setattr__(self, name, value):
+        if name in LazyModelProxy.__slots__:
+            object.__setattr__(self, name, value)
+        else:
+            setattr(self._getObj(), name, value)
+
+    def __delattr__(self, name):
+        delattr(self._getObj(), name)
+
+    def __repr__(self):
+        if self._lazyObj is not None:
+            return repr(self._lazyObj)
+
+        primaryKeyName = self._lazyModel.PRIMARY_KEY
+        idx = self._lazyFieldIdxs.get(primaryKeyName, None)
+
+        return '%s( <lazy> %s=%s )' %(self._lazyModel.__name__, primaryKeyName, repr(self._lazyRow[idx]) if idx is not None else '?')
+
+
+# vim: set ts=4 sw=4 st=4 expandtab:
@@ -0,0 +1,221 @@
+'''
+    Copyright (c) 2018 Timothy Savannah
+
+    Licensed under the terms of the Lesser GNU Lesser General Public License version 2.1
+
+      license can be found at https://raw.githubusercontent.com/kata198/ichorORM/master/LICENSE
+
+
+    mappers - Row mappers, which convert rows of columns into result shapes (mappings, DictObjs, etc).
+
+        A mapper is built once from the selected fields, so all the work of figuring out which column
+
+          goes where is done once, leaving a tight loop per row.
+'''
+# vim: set ts=4 sw=4 st=4 expandtab:
+
+import operator
+import threading
+
+from collections import OrderedDict, namedtuple
+
+from .objs import DictObj
+
+__all__ = ('RowMapper', 'MappingRowMapper', 'DictObjRowMapper', 'RecordRowMapper', 'getRecordType', 'splitTableField')
+
+# RECORD_TYPES_MAX_SIZE - Number of distinct field lists whose record type is cached. The cache is cleared when full.
+RECORD_TYPES_MAX_SIZE = 1024
+
+# _recordTypes - Fields tuple -> record type. @see getRecordType
+_recordTypes = {}
+_recordTypesLock = threading.Lock()
+
+
+def splitTableField(fieldName):
+    '''
+        splitTableField - Split a field in the form  TABLE.FIELD
+
+            @param fieldName <str> - The field name, like "person.first_name"
+
+            @return tuple( tableName<str>, fieldName<str> )
+
+            @raises ValueError - If #fieldName is not in the form TABLE.FIELD
+    '''
+    fieldSplit = fieldName.split('.', 1)
+    if len(fieldSplit) != 2 or not fieldSplit[0] or not fieldSplit[1]:
+        raise ValueError('Field name  %s  is not in the form  TABLE.FIELD' %(repr(fieldName), ))
+
+    return ( fieldSplit[0], fieldSplit[1] )
+
+
+def _getColumnsGetter(columnIdxs):
+    '''
+        _getColumnsGetter - Get a function which extracts a tuple of the given columns from a row
+
+            @param columnIdxs list<int> - The column indexes
+
+            @return function(row) -> tuple
+    '''
+    if not columnIdxs:
+        return lambda row : ()
+
+    if len(columnIdxs) == 1:
+        columnIdx = columnIdxs[0]
+        return lambda row : ( row[columnIdx], )
+
+    return operator.itemgetter(*columnIdxs)
+
+
+class RowMapper(object):
+    '''
+        RowMapper - Base class of row mappers
+    '''
+
+    def __init__(self, fields):
+        '''
+            __init__ - Create a RowMapper
+
+                @param fields list<str> - The selected fields, in order (e.x. from SelectQuery.getFields)
+        '''
+        self.fields = tuple(fields)
+
+    def mapRow(self, row):
+        '''
+            mapRow - Convert a single row
+
+                @param row <tuple> - A row of columns
+
+                @return - The converted row
+        '''
+        raise NotImplementedError('Must implement mapRow. Type %s does not.' %(self.__class__.__name__, ))
+
+    def mapRows(self, rows):
+        '''
+            mapRows - Convert a series of rows
+
+                @param rows iterable<tuple> - The rows
+
+                @return list - The converted rows
+        '''
+        mapRow = self.mapRow
+
+        return [ mapRow(row) for row in rows ]
+
+
+class MappingRowMapper(RowMapper):
+    '''
+        MappingRowMapper - Maps each row to an OrderedDict of field name -> value, in the order selected
+    '''
+
+    def mapRow(self, row):
+        return OrderedDict( zip(self.fields, row) )
+
+    def mapRows(self, rows):
+        fields = self.fields
+
+        return [ OrderedDict( zip(fields, row) ) for row in rows ]
+
+
+class DictObjRowMapper(RowMapper):
+    '''
+        DictObjRowMapper - Maps each row to a DictObj of table name -> DictObj of field name -> value
+
+            e.x.   row.person.first_name
+    '''
+
+    def __init__(self, fields, tableNames):
+        '''
+            __init__ - Create a DictObjRowMapper
+
+                @param fields list<str> - The selected fields, in order, each in the form  TABLE.FIELD
+
+                @param tableNames list<str> - All the tables in the query. Each will be present on every row,
+
+                    even if no fields from it are selected.
+        '''
+        RowMapper.__init__(self, fields)
+
+        columnsByTable = OrderedDict( [ (tableName, []) for tableName in tableNames ] )
+
+        for columnIdx in range(len(self.fields)):
+            (tableName, fieldName) = splitTableField(self.fields[columnIdx])
+
+            columnsByTable.setdefault(tableName, []).append( (fieldName, columnIdx) )
+
+        # tableMaps - list of ( tableName, fieldNames tuple, getter of the columns for those fields )
+        self.tableMaps = []
+        for tableName, tableColumns in columnsByTable.items():
+            fieldNames = tuple( [ fieldName for fieldName, columnIdx in tableColumns ] )
+            columnsGetter = _getColumnsGetter( [ columnIdx for fieldName, columnIdx in tableColumns ] )
+
+            self.tableMaps.append( (tableName, fieldNames, columnsGetter) )
+
+    def mapRow(self, row):
+        return DictObj( [ ( tableName, DictObj( zip(fieldNames, columnsGetter(row)) ) ) for tableName, fieldNames, columnsGetter in self.tableMaps ] )
+
+    def mapRows(self, rows):
+        tableMaps = self.tableMaps
+
+        return [
+            DictObj( [ ( tableName, DictObj( zip(fieldNames, columnsGetter(row)) ) ) for tableName, fieldNames, columnsGetter in tableMaps ] )
+            for row in rows
+        ]
+
+
+
+def getRecordType(fields):
+    '''
+        getRecordType - Get the record type (a namedtuple) for a list of fields.
+
+            Types are generated once per distinct list of fields, and shared by every query selecting those fields.
+
+              At most RECORD_TYPES_MAX_SIZE types are cached, so ad-hoc field lists do not grow memory without limit.
+              When full the cache is cleared, so a field list may then get a new ( equal comparing ) type.
+
+            Attribute names are the field names, with TABLE.FIELD becoming TABLE__FIELD.
+              Any name which is not a valid identifier is replaced with _N (where N is the column index).
+
+            @param fields list<str> - The selected fields, in order
+
+            @return <namedtuple type>
+    '''
+    fields = tuple(fields)
+
+    recordType = _recordTypes.get(fields, None)
+    if recordType is not None:
+        return recordType
+
+    with _recordTypesLock:
+        recordType = _recordTypes.get(fields, None)
+        if recordType is None:
+            if len(_recordTypes) >= RECORD_TYPES_MAX_SIZE:
+                _recordTypes.clear()
+
+            attrNames = [ fieldName.replace('.', '__') for fieldName in fields ]
+            recordType = _recordTypes[fields] = namedtuple('Record', attrNames, rename=True)
+
+    return recordType
+
+
+class RecordRowMapper(RowMapper):
+    '''
+        RecordRowMapper - Maps each row to a record, a lightweight tuple with attribute access by field name
+
+            e.x.   row.first_name   or, on a join,   row.person__first_name
+
+            @see getRecordType
+    '''
+
+    def __init__(self, fields):
+        RowMapper.__init__(self, fields)
+
+        self.recordType = getRecordType(self.fields)
+
+    def mapRow(self, row):
+        return self.recordType._make(row)
+
+    def mapRows(self, rows):
+        return list( map(self.recordType._make, rows) )
+
+
+# vim: set ts=4 sw=4 st=4 expandtab:
@@ -9,15 +9,22 @@
 '''
 
 import copy
+import weakref
 
 from .constants import FETCH_ALL_FIELDS, WHERE_AND, WHERE_OR, ALL_WHERE_TYPES, SQL_NULL
 from . import DatabaseConnection, getDatabaseConnection
 
 from .query import InsertQuery, UpdateQuery, SelectQuery, DeleteQuery
+from .queryset import QuerySet, getSelectFieldsForModel
+from .lazy import LazyModelProxy
 
 from .WhereClause import WhereClause
+from .expressions import F
 
-__all__ = ('DatabaseModel', )
+__all__ = ('DatabaseModel', 'DeferredFieldLoader')
+
+# DEFERRED_LOAD_BATCH_SIZE - Maximum number of primary keys per query when loading a deferred field
+DEFERRED_LOAD_BATCH_SIZE = 1000
 
 # Compat: class property decorator
 try:
@@ -29,6 +36,114 @@ except NameError:
 		def __get__(self, instance, owner):
 			return self.getter(owner)
 
+class DeferredFieldLoader(object):
+    '''
+        DeferredFieldLoader - Loads fields which were not selected, upon first access.
+
+            One loader is shared by all the objects from the same results, so accessing a deferred field
+
+              on any one of them loads that field for all of them in a single query.
+    '''
+
+    def __init__(self, model, fieldNames, dbConn=None):
+        '''
+            __init__ - Create a DeferredFieldLoader
+
+                @param model <DatabaseModel type> - The model
+
+                @param fieldNames list<str> - The names of the deferred fields
+
+                @param dbConn <None/DatabaseConnection> Default None - A specific DatabaseConnection to use,
+                    if None generate a new connection with global settings
+        '''
+        self.model = model
+        self.fieldNames = set(fieldNames)
+        self.dbConn = dbConn
+
+        # Weak references, so that a loader does not keep the whole result set alive
+        self._objRefs = []
+
+
+    def addObj(self, obj):
+        '''
+            addObj - Mark the deferred fields on an object as not loaded, and associate it with this loader
+
+                @param obj <DatabaseModel> - An object of #model
+        '''
+        objDict = obj.__dict__
+        for fieldName in self.fieldNames:
+            objDict.pop(fieldName, None)
+
+        objDict['_deferredFieldLoader'] = self
+
+        self._objRefs.append( weakref.ref(obj) )
+
+
+    def addProxy(self, proxy):
+        '''
+            addProxy - Associate a LazyModelProxy with this loader, so that a load includes its row
+
+                without the model object being created
+
+                @param proxy <LazyModelProxy> - A proxy of an object of #model
+        '''
+        self._objRefs.append( weakref.ref(proxy) )
+
+
+    def load(self, fieldName):
+        '''
+            load - Load a deferred field onto every object (which has not since set it) associated with this loader
+
+                @param fieldName <str> - The field name
+        '''
+        model = self.model
+        primaryKeyName = model.PRIMARY_KEY
+
+        objsByPk = {}
+        for objRef in self._objRefs:
+            obj = objRef()
+            if obj is None:
+                continue
+
+            if isinstance(obj, LazyModelProxy):
+                # Once created, the object itself is associated with this loader
+                if obj._isMaterialized or obj._hasLoadedField(fieldName):
+                    continue
+            elif fieldName in obj.__dict__:
+                continue
+
+            objsByPk.setdefault( getattr(obj, primaryKeyName), [] ).append(obj)
+
+        self._objRefs = [ objRef for objRef in self._objRefs if objRef() is not None ]
+
+        pks = list(objsByPk.keys())
+
+        for i in range(0, len(pks), DEFERRED_LOAD_BATCH_SIZE):
+            batchPks = pks[i : i + DEFERRED_LOAD_BATCH_SIZE]
+
+            q = SelectQuery(model, selectFields=[primaryKeyName, fieldName])
+            q.addStage().addCondition(primaryKeyName, 'in', batchPks)
+
+            for row in q.executeGetRows(dbConn=self.dbConn):
+                for obj in objsByPk.pop(row[0], []):
+                    _setLoadedField(obj, fieldName, row[1])
+
+        # Any not found were deleted since fetched
+        for objs in objsByPk.values():
+            for obj in objs:
+                _setLoadedField(obj, fieldName, None)
+
+
+def _setLoadedField(obj, fieldName, value):
+    '''
+        _setLoadedField - Set a loaded deferred field on an object, or on a LazyModelProxy without creating its object
+    '''
+    if isinstance(obj, LazyModelProxy):
+        obj._setLoadedField(fieldName, value)
+    else:
+        setattr(obj, fieldName, value)
+
+
 class DatabaseModel(object):
     '''
         DatabaseModel - Models should extend this
@@ -56,6 +171,25 @@ class DatabaseModel(object):
     #     simplified/streamlined ORM usage
     PRIMARY_KEY = 'id'
 
+    # MAX_QUERY_COST - If not None, SelectQuery / UpdateQuery / DeleteQuery on this model will check the planner's
+    #   estimated total cost before executing, and refuse if it exceeds this value.
+    #   Overrides the global set by costguard.setGlobalCostGuard
+    MAX_QUERY_COST = None
+
+    # MAX_QUERY_ROWS - Same as MAX_QUERY_COST, but for the planner's estimated number of rows
+    MAX_QUERY_ROWS = None
+
+    # FIELD_CODECS - Field name -> ichorORM.fieldcodecs.FieldCodec used to decode that field when selected,
+    #   e.x.  { 'price' : FloatCodec(), 'payload' : LazyJSONCodec() }
+    FIELD_CODECS = {}
+
+    # SHARD_KEY - If the table is split across several databases, the field which decides the database ( shard ) of each row
+    SHARD_KEY = None
+
+    # SHARD_MAP - An ichorORM.sharding.ShardMap ( e.x. HashShardMap ) mapping SHARD_KEY values to shards.
+    #   Queries without an explicit dbConn are routed to the owning shard(s). @see ichorORM.sharding
+    SHARD_MAP = None
+
     @classmethod
     def getModelRelations(cls):
         '''
@@ -229,6 +363,22 @@ class DatabaseModel(object):
         return self
 
 
+    def _addShardKeyCondition(self, where):
+        '''
+            _addShardKeyCondition - On a sharded model, add  SHARD_KEY = value  to a query stage selecting this object,
+
+                so that the query is routed to this object's shard only
+
+                @param where <FilterStage> - The stage
+        '''
+        if self.SHARD_MAP is None or not self.SHARD_KEY:
+            return
+
+        shardKeyValue = getattr(self, self.SHARD_KEY, None)
+        if shardKeyValue is not None:
+            where.addCondition(self.SHARD_KEY, '=', shardKeyValue)
+
+
     def updateObject(self, updateFieldNames, dbConn=None, doCommit=True):
         '''
             updateObject - Performs an UPDATE on a given list of field names, based on value held on current object.
@@ -261,12 +411,70 @@ class DatabaseModel(object):
         where = q.addStage()
 
         where.addCondition(primaryKeyName, '=', getattr(self, primaryKeyName))
+        self._addShardKeyCondition(where)
 
         q.executeUpdate(dbConn=dbConn, doCommit=doCommit)
 
 
+    def increment(self, fieldName, by=1, dbConn=None, doCommit=True):
+        '''
+            increment - Atomically add to a numeric field, within the database.
+
+                This performs a single  UPDATE ... SET field = field + by ... RETURNING field
+
+                  so concurrent increments are never lost, and no read (or SELECT FOR UPDATE) is required beforehand.
+
+                The value on this object is updated to the new value in the database.
+
+                @param fieldName <str> - The field to increment
+
+                @param by <int/float/Decimal> default 1 - The amount to add (may be negative to decrement)
+
+                @param dbConn <None/DatabaseConnection> Default None- A specific DatabaseConnection to use,
+                    if None generate a new connection with global settings
+
+                @param doCommit <bool> default True - If True, will commit upon update.
+                    If False, you must call dbConn.commitTransaction yourself when ready.
+                    If doCommit is False, dbConn must be specified (obviously, so you can commit later)
+
+                @return - The new value of the field
+
+
+              Will raise exception if current object is not saved.
+        '''
+        primaryKeyName = self.PRIMARY_KEY
+
+        if primaryKeyName in self.FIELDS and not getattr(self, primaryKeyName, None):
+            raise ValueError('Asked to increment but object is not saved:  < %s >' %(repr(self), ))
+
+        if fieldName not in self.FIELDS:
+            raise ValueError('%s has no field %s' %(self.__class__.__name__, repr(fieldName)))
+
+        if not doCommit and not dbConn:
+            raise ValueError('When doCommit=False, dbConn must be specified. Try connection.getDatabaseConnection()')
+
+        q = UpdateQuery(self.__class__, { fieldName : F(fieldName) + by })
+        q.setReturningFields( [fieldName] )
+
+        where = q.addStage()
+
+        where.addCondition(primaryKeyName, '=', getattr(self, primaryKeyName))
+        self._addShardKeyCondition(where)
+
+        rows = q.executeUpdate(dbConn=dbConn, doCommit=doCommit)
+
+        if not rows:
+            raise KeyError('No such %s object [ %s ] with %s=%s' %(self.__class__.__name__, self.TABLE_NAME, primaryKeyName, getattr(self, primaryKeyName)) )
+
+        newValue = rows[0][0]
+
+        setattr(self, fieldName, newValue)
+
+        return newValue
+
+
     @classmethod
-    def get(cls, _pk, dbConn=None):
+    def get(cls, _pk, dbConn=None, onlyFields=None, deferFields=None):
         '''
             get - Gets a single object of this model type by primary key (id)
 
@@ -275,6 +483,12 @@ class DatabaseModel(object):
             @param dbConn <None/DatabaseConnection> Default None- A specific DatabaseConnection to use,
                         if None generate a new connection with global settings
 
+            @param onlyFields <None/list<str>> Default None - If provided, only select these fields (and the primary key).
+                        Other fields will be loaded upon first access.
+
+            @param deferFields <None/list<str>> Default None - If provided, do not select these fields.
+                        They will be loaded upon first access.
+
             @return object of this type with all fields populated
         '''
         cls._setupModel()
@@ -283,13 +497,17 @@ class DatabaseModel(object):
 
         _pk = str(_pk)
 
-        q = SelectQuery(cls, selectFields='ALL', limitNum=1)
+        selectFields = 'ALL'
+        if onlyFields or deferFields:
+            selectFields = getSelectFieldsForModel(cls, onlyFields=onlyFields, deferFields=deferFields)
+
+        q = SelectQuery(cls, selectFields=selectFields, limitNum=1)
 
         where = q.addStage()
 
         where.addCondition(primaryKeyName, '=', _pk)
 
-        objs = q.executeGetObjs(dbConn=dbConn)
+        objs = q.executeGetObjs(dbConn=dbConn, deferUnselectedFields=True)
 
         if len(objs) != 1:
             raise KeyError('No such %s object [ %s ] with %s=%s' %(cls.__name__, cls.TABLE_NAME, primaryKeyName, _pk) )
@@ -322,6 +540,7 @@ class DatabaseModel(object):
         where = q.addStage()
 
         where.addCondition(primaryKeyName, '=', _pk)
+        self._addShardKeyCondition(where)
 
         q.executeDelete(dbConn=dbConn)
 
@@ -332,7 +551,7 @@ class DatabaseModel(object):
     @classmethod
     def filter(cls, whereType=WHERE_AND, dbConn=None, **kwargs):
         '''
-            filter - Filter and return objects of this type
+            filter - Filter objects of this type. Returns a lazy QuerySet, nothing is executed until the results are used.
 
               @param whereType <WHERE_AND/WHERE_OR> - Whether filter criteria should be AND or OR'd together
 
@@ -346,18 +565,19 @@ class DatabaseModel(object):
 
                 @param orderByDir - If present, ordered results will follow this direction
 
+                @param onlyFields <list<str>> - If present, only select these fields (and the primary key).
+                    Other fields will be loaded upon first access.
+
+                @param deferFields <list<str>> - If present, do not select these fields (e.x. large text columns).
+                    They will be loaded upon first access.
+
 
               All other parameters should be in the form  "fieldName=value" for equality comparison,
                 otherwise fieldName should end with __OPERATION, e.x.   fieldName__ne=value for not-equals,
                 fieldName__like="Start%End" for like, etc.
 
-              @return list<objs> - List of objects of this model type
+              @return <QuerySet> - A lazy QuerySet of objects of this model type ( @see queryset.QuerySet )
         '''
-        cls._setupModel()
-
-        if whereType not in ALL_WHERE_TYPES:
-            raise ValueError('Unknown where type: %s.   Possible types:  %s.' %(repr(whereType), repr(ALL_WHERE_TYPES)))
-
         if 'orderByField' in kwargs:
             orderByField = kwargs.pop('orderByField')
         else:
@@ -368,26 +588,23 @@ class DatabaseModel(object):
         else:
             orderByDir = ''
 
-        q = SelectQuery(cls, orderByField=orderByField, orderByDir=orderByDir)
+        onlyFields = kwargs.pop('onlyFields', None)
+        deferFields = kwargs.pop('deferFields', None)
 
-        where = q.addStage(whereType)
+        ret = QuerySet(cls, dbConn=dbConn).filter(whereType, **kwargs)
 
-        for fieldName, fieldValue in kwargs.items():
-            if '__' in fieldName:
-                try:
-                    fieldName, operation = fieldName.split('__')
-                except:
-                    raise ValueError('Unknown filter param: "%s". double-underscore should be followed by an operation, e.x. __ne' %(fieldName, ))
-            else:
-                operation = '='
+        if orderByField:
+            ret = ret.orderBy(orderByField, orderByDir)
 
-            where.addCondition(fieldName, operation, fieldValue)
+        if onlyFields:
+            ret = ret.only(*onlyFields)
+        if deferFields:
+            ret = ret.defer(*deferFields)
 
-        objs = q.executeGetObjs(dbConn=dbConn)
-        return objs
+        return ret
 
     @classmethod
-    def all(cls, orderByField=None, orderByDir='', dbConn=None):
+    def all(cls, orderByField=None, orderByDir='', dbConn=None, onlyFields=None, deferFields=None):
         '''
             all - Get all objects associated with this model
 
@@ -400,15 +617,25 @@ class DatabaseModel(object):
                 @param dbConn <None/DatabaseConnection> Default None- A specific DatabaseConnection to use,
                     if None generate a new connection with global settings
 
-                @return list<DatabaseModel> - A list of all objects in the database for this model
+                @param onlyFields <None/list<str>> Default None - If provided, only select these fields (and the primary key).
+                    Other fields will be loaded upon first access.
+
+                @param deferFields <None/list<str>> Default None - If provided, do not select these fields.
+                    They will be loaded upon first access.
+
+                @return <QuerySet> - A lazy QuerySet of all objects in the database for this model ( @see queryset.QuerySet )
         '''
+        ret = QuerySet(cls, dbConn=dbConn)
 
-        cls._setupModel()
+        if orderByField:
+            ret = ret.orderBy(orderByField, orderByDir)
 
-        q = SelectQuery(cls, orderByField=orderByField, orderByDir=orderByDir)
+        if onlyFields:
+            ret = ret.only(*onlyFields)
+        if deferFields:
+            ret = ret.defer(*deferFields)
 
-        objs = q.executeGetObjs(dbConn=dbConn)
-        return objs
+        return ret
 
 
     def getRelated(self, relationKey):
@@ -450,6 +677,22 @@ class DatabaseModel(object):
                 ' , '.join(fieldValues) \
         )
 
+    @classmethod
+    def getDeferredFieldLoader(cls, fieldNames, dbConn=None):
+        '''
+            getDeferredFieldLoader - Get a loader for fields which were not selected.
+
+                Objects added to the loader ( via DeferredFieldLoader.addObj ) will load these fields upon first access.
+
+                @param fieldNames list<str> - The names of the deferred fields
+
+                @param dbConn <None/DatabaseConnection> Default None - A specific DatabaseConnection to use,
+                    if None generate a new connection with global settings
+
+                @return <DeferredFieldLoader>
+        '''
+        return DeferredFieldLoader(cls, fieldNames, dbConn=dbConn)
+
     @classmethod
     def _setupModel(cls):
         '''
@@ -471,6 +714,11 @@ class DatabaseModel(object):
         try:
             return object.__getattribute__(self, attrName)
         except AttributeError as ae:
+            deferredFieldLoader = object.__getattribute__(self, '__dict__').get('_deferredFieldLoader', None)
+            if deferredFieldLoader is not None and attrName in deferredFieldLoader.fieldNames:
+                deferredFieldLoader.load(attrName)
+                return object.__getattribute__(self, attrName)
+
             modelRelations = self.MODEL_RELATIONS
             if attrName in modelRelations:
                 return self.getRelated(attrName)
@@ -0,0 +1,186 @@
+'''
+    Copyright (c) 2018 Timothy Savannah
+
+    Licensed under the terms of the Lesser GNU Lesser General Public License version 2.1
+
+      license can be found at https://raw.githubusercontent.com/kata198/ichorORM/master/LICENSE
+
+
+    parallel - Execute independent queries at the same time, each on its own connection
+'''
+# vim: set ts=4 sw=4 st=4 expandtab:
+
+import threading
+import time
+
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_EXCEPTION
+
+from .pool import DatabaseConnectionPool
+
+__all__ = ('executeParallel', 'ParallelExecutionTimeout', 'DEFAULT_PARALLEL_MAX_WORKERS')
+
+# DEFAULT_PARALLEL_MAX_WORKERS - Default max number of queries executing at once in #executeParallel
+DEFAULT_PARALLEL_MAX_WORKERS = 8
+
+
+class ParallelExecutionTimeout(Exception):
+    '''
+        ParallelExecutionTimeout - Raised by #executeParallel when the queries did not all complete within the timeout
+    '''
+    pass
+
+
+class _ParallelWork(object):
+    '''
+        _ParallelWork - The state shared by the workers of an #executeParallel call
+    '''
+
+    def __init__(self, pool):
+        self.pool = pool
+
+        # activeConns - Connections currently executing a query
+        self.activeConns = set()
+
+        # isAborted - Set when a query failed or the timeout passed, so queries not yet started are skipped
+        self.isAborted = False
+
+        self.lock = threading.Lock()
+
+
+    def run(self, query):
+        '''
+            run - Execute one query ( in a worker thread )
+
+                @param query <QueryBase/function> - The query, or a function called as func(dbConn)
+
+                @return - The result of the query
+        '''
+        if self.isAborted:
+            return None
+
+        if getattr(query, '_getShardMap', None) is not None and query._getShardMap(None) is not None:
+            # Sharded models are routed to their own pools
+            return query.execute()
+
+        dbConn = self.pool.checkout()
+        try:
+            with self.lock:
+                self.activeConns.add(dbConn)
+
+            if self.isAborted:
+                return None
+
+            if callable(query):
+                return query(dbConn)
+
+            return query.execute(dbConn=dbConn)
+        finally:
+            with self.lock:
+                self.activeConns.discard(dbConn)
+
+            self.pool.checkin(dbConn)
+
+
+    def abort(self):
+        '''
+            abort - Skip any queries not yet started, and cancel those executing
+        '''
+        with self.lock:
+            self.isAborted = True
+            activeConns = list(self.activeConns)
+
+        for dbConn in activeConns:
+            dbConn.cancel()
+
+
+def executeParallel(queries, maxWorkers=DEFAULT_PARALLEL_MAX_WORKERS, timeout=None, pool=None):
+    '''
+        executeParallel - Execute independent queries at the same time, each on its own connection,
+
+            so that the total time is about that of the slowest query rather than the sum.
+
+            Each query is executed in autocommit mode and sees its own snapshot, so use for independent reads
+
+              ( or writes which do not need to be atomic together ).
+
+            e.x.
+                (people, numMeals, topScores) = executeParallel([ peopleQuery, mealCountQuery, topScoresQuery ], timeout=5)
+
+            @param queries list<QueryBase/function> - The queries. The #execute method of each is called ( so a SelectQuery
+
+                gives its rows, @see SelectQuery.executeGetRows ). A function may be given instead, which is called as func(dbConn)
+
+                ( e.x.  lambda dbConn : myQuery.executeGetObjs(dbConn=dbConn) ).
+
+                Queries on a sharded model are routed to their shards.
+
+            @param maxWorkers <int> default DEFAULT_PARALLEL_MAX_WORKERS - Max number of queries executing at once
+
+            @param timeout <None/float> default None - Max seconds for all the queries to complete. None for no limit.
+
+            @param pool <None/DatabaseConnectionPool> default None - The pool to check out connections from.
+
+                If None, a pool using the global connection params is created, and closed upon return.
+
+                Pass a pool to reuse connections between calls.
+
+            @return list - The result of each query, in the order given
+
+            @raises - The first exception raised by a query, after cancelling the rest
+
+            @raises ParallelExecutionTimeout - If #timeout passed first. Queries still executing are cancelled.
+    '''
+    queries = list(queries)
+    if not queries:
+        return []
+
+    if maxWorkers < 1:
+        raise ValueError('maxWorkers must be at least 1. Got: %s' %(repr(maxWorkers), ))
+
+    numWorkers = min(maxWorkers, len(queries))
+
+    ownsPool = bool(pool is None)
+    if ownsPool:
+        pool = DatabaseConnectionPool(maxSize=numWorkers)
+
+    deadline = None
+    if timeout is not None:
+        deadline = time.monotonic() + timeout
+
+    work = _ParallelWork(pool)
+
+    executor = ThreadPoolExecutor(max_workers=numWorkers)
+    try:
+        futures = [ executor.submit(work.run, query) for query in queries ]
+
+        remaining = None
+        if deadline is not None:
+            remaining = max(deadline - time.monotonic(), 0)
+
+        (doneFutures, notDoneFutures) = wait(futures, timeout=remaining, return_when=FIRST_EXCEPTION)
+
+        for future in futures:
+            if future in doneFutures and future.exception() is not None:
+                work.abort()
+                for otherFuture in notDoneFutures:
+                    otherFuture.cancel()
+
+                raise future.exception()
+
+        if notDoneFutures:
+            work.abort()
+            for future in notDoneFutures:
+                future.cancel()
+
+            raise ParallelExecutionTimeout('%d of %d queries did not complete within %.3f seconds.' %(len(notDoneFutures), len(futures), timeout))
+
+        return [ future.result() for future in futures ]
+
+    finally:
+        # Do not wait on cancelled queries, their connections are checked in as they finish
+        executor.shutdown(wait=False)
+        if ownsPool:
+            pool.closeAll()
+
+
+# vim: set ts=4 sw=4 st=4 expandtab:
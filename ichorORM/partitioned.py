@@ -0,0 +1,396 @@
+'''
+    Copyright (c) 2018 Timothy Savannah
+
+    Licensed under the terms of the Lesser GNU Lesser General Public License version 2.1
+
+      license can be found at https://raw.githubusercontent.com/kata198/ichorORM/master/LICENSE
+
+
+    partitioned - Scan the results of a SelectQuery in several partitions at once, each on its own connection,
+
+        all reading the same snapshot of the database
+'''
+# vim: set ts=4 sw=4 st=4 expandtab:
+
+import copy
+import queue
+import threading
+
+from concurrent.futures import ThreadPoolExecutor
+
+from .constants import WHERE_AND, CHUNK_BY_PK, CHUNK_BY_CTID, ALL_CHUNK_MODES, ISOLATION_REPEATABLE_READ
+from .connection import DEFAULT_STREAM_CHUNK_SIZE
+from .query import FilterType, FilterStage, SelectQuery
+from .pool import DatabaseConnectionPool
+
+__all__ = ('PartitionedScan', 'CHUNK_BY_PK', 'CHUNK_BY_CTID')
+
+
+class _CtidRangeFilter(FilterType):
+    '''
+        _CtidRangeFilter - A condition limiting a query to the rows within a range of table blocks ( by ctid )
+
+            Renders as  ctid >= '(startBlock,0)'::tid AND ctid < '(endBlock,0)'::tid , either bound optional
+    '''
+
+    __slots__ = ('ctidName', 'startBlock', 'endBlock')
+
+    def __init__(self, ctidName, startBlock, endBlock):
+        self.ctidName = ctidName
+        self.startBlock = startBlock
+        self.endBlock = endBlock
+
+    def _getBounds(self):
+        bounds = []
+        if self.startBlock is not None:
+            bounds.append( ('>=', '(%d,0)' %(self.startBlock, )) )
+        if self.endBlock is not None:
+            bounds.append( ('<', '(%d,0)' %(self.endBlock, )) )
+
+        return bounds
+
+    def toStr(self):
+        return ' AND '.join( [ " %s %s '%s'::tid " %(self.ctidName, operator, tid) for (operator, tid) in self._getBounds() ] )
+
+    def toStrParam(self, paramName):
+        expressions = []
+        params = {}
+
+        for idx, (operator, tid) in enumerate(self._getBounds()):
+            boundParamName = '%s_tid%d' %(paramName, idx)
+            expressions.append( ' %s %s %%(%s)s::tid ' %(self.ctidName, operator, boundParamName) )
+            params[boundParamName] = tid
+
+        return ( ' AND '.join(expressions), params )
+
+
+class PartitionedScan(object):
+    '''
+        PartitionedScan - Scan the rows of a SelectQuery in #numPartitions partitions at once, each partition streamed
+
+            on its own connection in its own thread, for a faster export of a large table.
+
+            Every partition reads the same snapshot of the database ( exported with pg_export_snapshot ), so the
+
+              combined results are consistent, as if read by a single query.
+
+          Two partitioning modes are supported:
+
+            CHUNK_BY_PK   - (default) Split the matching rows into ranges of the primary key with about the same number of rows
+
+            CHUNK_BY_CTID - Split the table's blocks ( physical row location ) into equal ranges. Does not need an index,
+
+                             but the partitions are only even when the matching rows are evenly spread through the table.
+
+                             Requires postgresql 14+ to scan each range efficiently ( TID range scan )
+
+          NOTE: The rows are ordered by the query's order by within each partition only. The query may not have a limit or offset.
+
+          e.x.
+                scan = PartitionedScan(SelectQuery(MyModel), numPartitions=8)
+
+                for row in scan.iterRows():
+                    ...
+    '''
+
+    def __init__(self, query, numPartitions=4, partitionBy=CHUNK_BY_PK, chunkSize=DEFAULT_STREAM_CHUNK_SIZE, pool=None):
+        '''
+            __init__ - Create a PartitionedScan
+
+                @param query <SelectQuery> - The query to scan. The query object is not modified.
+
+                @param numPartitions <int> default 4 - Number of partitions, each scanned at the same time on its own connection
+
+                @param partitionBy <str> default CHUNK_BY_PK - CHUNK_BY_PK or CHUNK_BY_CTID, @see PartitionedScan
+
+                @param chunkSize <int> default DEFAULT_STREAM_CHUNK_SIZE - Number of rows fetched per round-trip,
+
+                    and the max number of rows given to each call of the callback of #run
+
+                @param pool <None/DatabaseConnectionPool> default None - The pool to check out connections from ( one per
+
+                    partition, plus one which holds the snapshot ). If None, a pool using the global connection params
+
+                    is created for each run, and closed when it completes.
+        '''
+        if not issubclass(query.__class__, SelectQuery) or not query.getModel():
+            raise ValueError('PartitionedScan requires a SelectQuery on a model. Got: %s' %(query.__class__.__name__, ))
+
+        if query.limitNum or query.offsetNum:
+            raise ValueError('PartitionedScan does not support a query with a limit or offset.')
+
+        if partitionBy not in ALL_CHUNK_MODES:
+            raise ValueError('Unknown partitionBy: %s.   Possible modes:  %s.' %(repr(partitionBy), repr(ALL_CHUNK_MODES)))
+
+        numPartitions = int(numPartitions)
+        if numPartitions < 1:
+            raise ValueError('numPartitions must be at least 1. Got: %d' %(numPartitions, ))
+
+        self.query = query
+        self.numPartitions = numPartitions
+        self.partitionBy = partitionBy
+        self.chunkSize = chunkSize
+        self.pool = pool
+
+
+    def _copyQueryWithStage(self, extraStage):
+        '''
+            _copyQueryWithStage - Get a copy of #query with an additional top-level filter stage
+
+                @param extraStage <FilterStage/None> - The additional stage to AND onto the WHERE, or None for an unmodified copy
+
+                @return <SelectQuery> - A copy of the query. The original is unmodified.
+        '''
+        partitionQuery = copy.copy(self.query)
+        partitionQuery.filterStages = list(self.query.filterStages)
+        if extraStage is not None:
+            partitionQuery.filterStages.append(extraStage)
+
+        return partitionQuery
+
+
+    def _getPkPartitionStages(self, dbConn):
+        '''
+            _getPkPartitionStages - Get the stage limiting each partition to a range of primary keys,
+
+                with the boundaries chosen so that each has about the same number of matching rows
+
+                @param dbConn <DatabaseConnection> - Connection ( within the snapshot ) to use
+
+                @return list<FilterStage/None> - One per partition
+        '''
+        model = self.query.getModel()
+        primaryKeyName = '%s.%s' %(model.TABLE_NAME, model.PRIMARY_KEY)
+
+        if self.numPartitions == 1:
+            return [ None ]
+
+        boundsQuery = self._copyQueryWithStage(None)
+        boundsQuery.setSelectFields( [primaryKeyName] )
+        boundsQuery.orderBys = []
+
+        (boundsSql, boundsParams) = boundsQuery.getSqlParameterizedValues(paramPrefix='partition')
+
+        # Without any filters, the params are an empty list
+        boundsParams = dict(boundsParams or {})
+
+        boundsParams['ichor_partition_fractions'] = [ float(i) / self.numPartitions for i in range(1, self.numPartitions) ]
+
+        sql = 'SELECT percentile_disc( %%(ichor_partition_fractions)s::float8[] ) WITHIN GROUP ( ORDER BY %s ) FROM ( %s ) AS _ichor_partition' %(model.PRIMARY_KEY, boundsSql)
+
+        bounds = dbConn.doSelectParams(sql, boundsParams)[0][0]
+        if not bounds:
+            # No matching rows
+            return [ None ]
+
+        # Few rows may give the same boundary more than once
+        uniqueBounds = []
+        for bound in bounds:
+            if not uniqueBounds or bound != uniqueBounds[-1]:
+                uniqueBounds.append(bound)
+
+        stages = []
+        lowerBound = None
+        for bound in uniqueBounds + [ None ]:
+            rangeStage = FilterStage(WHERE_AND)
+            if lowerBound is not None:
+                rangeStage.addCondition(primaryKeyName, '>', lowerBound)
+            if bound is not None:
+                rangeStage.addCondition(primaryKeyName, '<=', bound)
+
+            stages.append(rangeStage)
+            lowerBound = bound
+
+        return stages
+
+
+    def _getCtidPartitionStages(self, dbConn):
+        '''
+            _getCtidPartitionStages - Get the stage limiting each partition to an equal range of the table's blocks
+
+                @param dbConn <DatabaseConnection> - Connection ( within the snapshot ) to use
+
+                @return list<FilterStage/None> - One per partition
+        '''
+        tableName = self.query.getModel().TABLE_NAME
+
+        if self.numPartitions == 1:
+            return [ None ]
+
+        rows = dbConn.doSelectParams("SELECT pg_relation_size( %(ichor_partition_table)s::regclass ) / current_setting('block_size')::int", { 'ichor_partition_table' : tableName })
+        numBlocks = int(rows[0][0])
+
+        blocksPerPartition = max( (numBlocks + self.numPartitions - 1) // self.numPartitions, 1 )
+
+        bounds = [ blocksPerPartition * i for i in range(1, self.numPartitions) if blocksPerPartition * i < numBlocks ]
+
+        # The first and last partitions are unbounded, so no row is missed
+        stages = []
+        startBlock = None
+        for endBlock in bounds + [ None ]:
+            rangeStage = FilterStage(WHERE_AND)
+            rangeStage.addFilter( _CtidRangeFilter('%s.ctid' %(tableName, ), startBlock, endBlock) )
+
+            stages.append(rangeStage)
+            startBlock = endBlock
+
+        return stages
+
+
+    def getPartitionQueries(self, dbConn):
+        '''
+            getPartitionQueries - Get the query of each partition
+
+                @param dbConn <DatabaseConnection> - Connection to use to find the partition boundaries.
+
+                    Should be within the snapshot which the partitions will read.
+
+                @return list<SelectQuery> - One per partition. May be fewer than #numPartitions if there are few rows.
+        '''
+        if self.partitionBy == CHUNK_BY_PK:
+            stages = self._getPkPartitionStages(dbConn)
+        else:
+            stages = self._getCtidPartitionStages(dbConn)
+
+        return [ self._copyQueryWithStage(stage) for stage in stages ]
+
+
+    def _scanPartition(self, pool, snapshotId, partitionNum, partitionQuery, callback):
+        '''
+            _scanPartition - Stream the rows of one partition within the exported snapshot ( in a worker thread )
+
+                @return <int> - Number of rows
+        '''
+        numRows = 0
+
+        with pool.connection() as dbConn:
+            # Apply any pending session state before the transaction, as SET TRANSACTION SNAPSHOT must be its first statement
+            dbConn.getCursor()
+
+            with dbConn.transaction(isolation=ISOLATION_REPEATABLE_READ, readOnly=True):
+                dbConn.executeSqlParams('SET TRANSACTION SNAPSHOT %(snapshotId)s', { 'snapshotId' : snapshotId })
+
+                rowsIter = partitionQuery.executeIterRows(dbConn=dbConn, chunkSize=self.chunkSize)
+                try:
+                    rows = []
+                    for row in rowsIter:
+                        rows.append(row)
+                        if len(rows) >= self.chunkSize:
+                            numRows += len(rows)
+                            if callback(partitionNum, rows) is False:
+                                return numRows
+                            rows = []
+
+                    if rows:
+                        numRows += len(rows)
+                        callback(partitionNum, rows)
+                finally:
+                    # Close the server-side cursor while still within the transaction
+                    rowsIter.close()
+
+        return numRows
+
+
+    def run(self, callback):
+        '''
+            run - Scan every partition at once, each on its own connection within a shared snapshot.
+
+                @param callback <function> - Called as callback(partitionNum, rows) with each chunk of up to #chunkSize rows
+
+                    ( tuples of columns ). Called from the worker thread of each partition, so calls may happen at the same time.
+
+                    If it returns False (not just a false-like value), the scan of that partition is stopped.
+
+                @return <int> - Total number of rows given to the callback
+
+                @raises - The first exception raised by a partition ( or the callback ), after the others complete
+        '''
+        pool = self.pool
+        ownsPool = bool(pool is None)
+        if ownsPool:
+            pool = DatabaseConnectionPool(maxSize=self.numPartitions + 1)
+
+        try:
+            with pool.connection() as snapshotConn:
+                snapshotConn.getCursor()
+
+                with snapshotConn.transaction(isolation=ISOLATION_REPEATABLE_READ, readOnly=True):
+                    snapshotId = snapshotConn.doSelect('SELECT pg_export_snapshot()')[0][0]
+
+                    partitionQueries = self.getPartitionQueries(snapshotConn)
+
+                    # The snapshot may only be imported while this transaction remains open
+                    with ThreadPoolExecutor(max_workers=len(partitionQueries)) as executor:
+                        futures = [ executor.submit(self._scanPartition, pool, snapshotId, partitionNum, partitionQuery, callback) for (partitionNum, partitionQuery) in enumerate(partitionQueries) ]
+
+                        return sum( [ future.result() for future in futures ] )
+        finally:
+            if ownsPool:
+                pool.closeAll()
+
+
+    def iterRows(self, maxBufferedChunks=None):
+        '''
+            iterRows - Scan every partition at once ( @see #run ), and yield the rows of all partitions as they arrive.
+
+                Rows of different partitions are interleaved.
+
+                @param maxBufferedChunks <None/int> default None - Max chunks fetched but not yet yielded, after which the
+
+                    partitions wait. None for 2 per partition.
+
+                @return generator<tuple> - Rows of columns
+        '''
+        if maxBufferedChunks is None:
+            maxBufferedChunks = self.numPartitions * 2
+
+        chunkQueue = queue.Queue(maxsize=maxBufferedChunks)
+        stopEvent = threading.Event()
+
+        # Sentinel marking the end of the scan
+        doneMarker = object()
+
+        def _putChunk(partitionNum, rows):
+            while not stopEvent.is_set():
+                try:
+                    chunkQueue.put(rows, timeout=0.1)
+                    return True
+                except queue.Full:
+                    continue
+
+            return False
+
+        def _runScan():
+            try:
+                self.run(_putChunk)
+                result = doneMarker
+            except Exception as e:
+                result = e
+
+            while not stopEvent.is_set():
+                try:
+                    chunkQueue.put( (doneMarker, result), timeout=0.1 )
+                    return
+                except queue.Full:
+                    continue
+
+        scanThread = threading.Thread(target=_runScan)
+        scanThread.daemon = True
+        scanThread.start()
+
+        try:
+            while True:
+                rows = chunkQueue.get()
+                if type(rows) == tuple and rows and rows[0] is doneMarker:
+                    if rows[1] is not doneMarker:
+                        raise rows[1]
+                    break
+
+                for row in rows:
+                    yield row
+        finally:
+            # Stops the partitions if the generator was closed early
+            stopEvent.set()
+
+
+# vim: set ts=4 sw=4 st=4 expandtab:
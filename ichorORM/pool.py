@@ -0,0 +1,691 @@
+'''
+    Copyright (c) 2018 Timothy Savannah
+
+    Licensed under the terms of the Lesser GNU Lesser General Public License version 2.1
+
+      license can be found at https://raw.githubusercontent.com/kata198/ichorORM/master/LICENSE
+
+
+    pool - A thread-safe pool of DatabaseConnection objects, which stay connected between uses.
+
+        Each pool keeps metrics ( @see DatabaseConnectionPool.getMetrics , and getPoolMetricsText for all pools in
+
+          the prometheus text format ), and can detect leaked connections ( @see setGlobalPoolLeakDetection )
+'''
+# vim: set ts=4 sw=4 st=4 expandtab:
+
+import bisect
+import itertools
+import sys
+import threading
+import time
+import traceback
+import weakref
+
+from collections import OrderedDict
+
+import psycopg2.extensions as psycopg2_ext
+
+from .objs import IgnoreParameter, UseGlobalSetting
+from .connection import DatabaseConnection, DatabaseConnectionFailure
+from .instrumentation import emitInstrumentationEvent
+
+__all__ = ('DatabaseConnectionPool', 'DatabaseConnectionPoolTimeout', 'PooledConnectionLeak', 'DEFAULT_POOL_MAX_SIZE',
+    'setGlobalPoolLeakDetection', 'getPools', 'getPoolMetricsText', 'CHECKOUT_WAIT_BUCKETS',
+    'LEAK_REASON_HELD', 'LEAK_REASON_UNCOMMITTED',
+)
+
+# DEFAULT_POOL_MAX_SIZE - Default maximum number of connections in a pool
+DEFAULT_POOL_MAX_SIZE = 10
+
+# CHECKOUT_WAIT_BUCKETS - Upper bounds ( in seconds ) of the buckets of the checkout wait time histogram
+CHECKOUT_WAIT_BUCKETS = (0.001, 0.005, 0.01, 0.05, 0.1, 0.5, 1.0, 5.0, 10.0)
+
+# LEAK_REASON_HELD - A connection has been checked out longer than the leak threshold
+LEAK_REASON_HELD = 'held'
+
+# LEAK_REASON_UNCOMMITTED - A connection was checked in with a transaction neither committed nor rolled back
+LEAK_REASON_UNCOMMITTED = 'uncommitted'
+
+global GLOBAL_POOL_LEAK_THRESHOLD
+global GLOBAL_POOL_LEAK_DETECT_UNCOMMITTED
+
+GLOBAL_POOL_LEAK_THRESHOLD = None
+GLOBAL_POOL_LEAK_DETECT_UNCOMMITTED = False
+
+# _pools - Every DatabaseConnectionPool not yet closed
+_pools = weakref.WeakSet()
+_poolsLock = threading.Lock()
+
+_poolNameCounter = itertools.count(1)
+
+
+def setGlobalPoolLeakDetection(threshold=IgnoreParameter, detectUncommitted=IgnoreParameter):
+    '''
+        setGlobalPoolLeakDetection - Set the default leak detection of connection pools.
+
+            A detected leak is written to stderr with the stack where the connection was checked out,
+
+              and emits the instrumentation event "pool_leak" ( @see ichorORM.instrumentation ).
+
+            When enabled, the stack of every checkout is recorded.
+
+            A connection held longer than the threshold is found only when looked for: by DatabaseConnectionPool.checkLeaks
+
+              ( which getMetrics and getPoolMetricsText call ), or upon its checkin. So a connection never checked in is reported
+
+              only if the metrics are polled, or the pool was created with a leakCheckInterval to check on a timer.
+
+                            Every parameter defaults to "IgnoreParameter" and will thus not be set unless
+                              specified to be something different.
+
+                        @param threshold <None/float> default IgnoreParameter - A connection checked out for longer than this
+
+                            many seconds is a leak. None ( the default ) to disable.
+
+                        @param detectUncommitted <bool> default IgnoreParameter - If True, a connection checked in with a
+
+                            transaction neither committed nor rolled back is a leak. Default False.
+    '''
+    global GLOBAL_POOL_LEAK_THRESHOLD
+    global GLOBAL_POOL_LEAK_DETECT_UNCOMMITTED
+
+    if threshold != IgnoreParameter:
+        GLOBAL_POOL_LEAK_THRESHOLD = threshold
+    if detectUncommitted != IgnoreParameter:
+        GLOBAL_POOL_LEAK_DETECT_UNCOMMITTED = bool(detectUncommitted)
+
+
+def getPools():
+    '''
+        getPools - Get every DatabaseConnectionPool which has not been closed
+
+            @return list<DatabaseConnectionPool> - Sorted by name
+    '''
+    with _poolsLock:
+        return sorted(_pools, key=lambda pool : pool.name)
+
+
+class DatabaseConnectionPoolTimeout(DatabaseConnectionFailure):
+    '''
+        DatabaseConnectionPoolTimeout - Raised when no connection could be checked out of a pool within the timeout
+    '''
+    pass
+
+
+class PooledConnectionLeak(object):
+    '''
+        PooledConnectionLeak - A detected leak of a pooled connection
+    '''
+
+    __slots__ = ('poolName', 'reason', 'heldTime', 'stack')
+
+    def __init__(self, poolName, reason, heldTime, stack):
+        '''
+            __init__ - Create a PooledConnectionLeak
+
+                @param poolName <str> - The name of the pool
+
+                @param reason <str> - LEAK_REASON_HELD or LEAK_REASON_UNCOMMITTED
+
+                @param heldTime <float> - Seconds the connection has been checked out
+
+                @param stack <str> - The stack where the connection was checked out
+        '''
+        self.poolName = poolName
+        self.reason = reason
+        self.heldTime = heldTime
+        self.stack = stack
+
+    def __repr__(self):
+        return 'PooledConnectionLeak( %s , reason=%s , heldTime=%.3f )' %(repr(self.poolName), repr(self.reason), self.heldTime)
+
+
+class _CheckoutRecord(object):
+    '''
+        _CheckoutRecord - A connection currently checked out of a pool
+    '''
+
+    __slots__ = ('checkoutTime', 'stackSummary', 'isReported')
+
+    def __init__(self, checkoutTime, stackSummary):
+        self.checkoutTime = checkoutTime
+        # stackSummary - Unformatted stack of the checkout ( formatting is only done for a leak ), or None if not recorded
+        self.stackSummary = stackSummary
+        self.isReported = False
+
+    def getStack(self):
+        if self.stackSummary is None:
+            return '  ( not recorded, leak detection was disabled at checkout )\n'
+
+        return ''.join( traceback.format_list(self.stackSummary) )
+
+
+class DatabaseConnectionPool(object):
+    '''
+        DatabaseConnectionPool - A thread-safe pool of DatabaseConnection objects.
+
+            Use #checkout / #checkin , or the #connection context manager:
+
+                with pool.connection() as dbConn:
+                    ...
+
+            Connections are created as needed, up to #maxSize. Upon checkin, any uncommitted transaction is rolled back,
+
+              and the connection's transaction mode and session params are reset to those of the pool.
+    '''
+
+    def __init__(self, host=UseGlobalSetting, port=UseGlobalSetting, dbname=UseGlobalSetting, user=UseGlobalSetting, password=UseGlobalSetting, isTransactionMode=False, maxSize=DEFAULT_POOL_MAX_SIZE, checkoutTimeout=None, name=None, leakThreshold=UseGlobalSetting, detectUncommitted=UseGlobalSetting, leakCheckInterval=None):
+        '''
+            __init__ - Create a DatabaseConnectionPool
+
+                @see DatabaseConnection.__init__ for the connection arguments
+
+                @param maxSize <int> default DEFAULT_POOL_MAX_SIZE - Maximum number of connections ( checked out and idle )
+
+                @param checkoutTimeout <None/float> default None - Default seconds to wait in #checkout when all connections
+
+                    are checked out. None to wait forever.
+
+                @param name <None/str> default None - A name for this pool, used in metrics. If None, a unique name is generated.
+
+                @param leakThreshold <None/float/UseGlobalSetting> default UseGlobalSetting - @see setGlobalPoolLeakDetection
+
+                @param detectUncommitted <bool/UseGlobalSetting> default UseGlobalSetting - @see setGlobalPoolLeakDetection
+
+                @param leakCheckInterval <None/float> default None - If provided, a background thread calls #checkLeaks
+
+                    every this many seconds ( until #closeAll ), so connections which are never checked in are reported
+
+                    without polling the metrics.
+        '''
+        if maxSize < 1:
+            raise ValueError('maxSize must be at least 1. Got: %s' %(repr(maxSize), ))
+
+        self.connectionParams = { 'host' : host, 'port' : port, 'dbname' : dbname, 'user' : user, 'password' : password }
+        self.isTransactionMode = isTransactionMode
+
+        self.maxSize = maxSize
+        self.checkoutTimeout = checkoutTimeout
+
+        if name is None:
+            name = 'pool%d' %( next(_poolNameCounter), )
+        self.name = name
+
+        self.leakThreshold = leakThreshold
+        self.detectUncommitted = detectUncommitted
+
+        # _idle - Connections not checked out, most recently checked in last
+        self._idle = []
+        # _numOpen - Number of connections, idle or checked out
+        self._numOpen = 0
+
+        # _createTimes - id of each open connection -> time.monotonic() when created
+        self._createTimes = {}
+        # _checkouts - id of each checked out connection -> _CheckoutRecord
+        self._checkouts = {}
+
+        self.numCheckouts = 0
+        self.numTimeouts = 0
+        self.numLeaks = 0
+
+        # _waitBucketCounts - Number of checkouts which waited within each of CHECKOUT_WAIT_BUCKETS ( plus one for longer )
+        self._waitBucketCounts = [ 0 ] * (len(CHECKOUT_WAIT_BUCKETS) + 1)
+        self._waitTotal = 0.0
+
+        self._condition = threading.Condition(threading.Lock())
+        self._isClosed = False
+
+        self._leakMonitorStop = threading.Event()
+        if leakCheckInterval is not None:
+            leakMonitor = threading.Thread(target=_runLeakMonitor, args=(weakref.ref(self), leakCheckInterval, self._leakMonitorStop), name='ichorORM-pool-leaks-' + name)
+            leakMonitor.daemon = True
+            leakMonitor.start()
+
+        with _poolsLock:
+            _pools.add(self)
+
+
+    def _getLeakThreshold(self):
+        if self.leakThreshold is UseGlobalSetting:
+            return GLOBAL_POOL_LEAK_THRESHOLD
+        return self.leakThreshold
+
+    def _getDetectUncommitted(self):
+        if self.detectUncommitted is UseGlobalSetting:
+            return GLOBAL_POOL_LEAK_DETECT_UNCOMMITTED
+        return self.detectUncommitted
+
+
+    def _createConnection(self):
+        '''
+            _createConnection - Create a new DatabaseConnection for this pool ( connecting upon first use )
+        '''
+        return DatabaseConnection(isTransactionMode=self.isTransactionMode, **self.connectionParams)
+
+
+    def _recordCheckout(self, dbConn, startTime, stackSummary):
+        '''
+            _recordCheckout - Record a checkout in the metrics. Must hold #_condition
+        '''
+        now = time.monotonic()
+        waitTime = now - startTime
+
+        self.numCheckouts += 1
+        self._waitTotal += waitTime
+        self._waitBucketCounts[ bisect.bisect_left(CHECKOUT_WAIT_BUCKETS, waitTime) ] += 1
+
+        self._checkouts[id(dbConn)] = _CheckoutRecord(now, stackSummary)
+
+
+    def checkout(self, timeout=UseGlobalSetting):
+        '''
+            checkout - Check out a connection. Must be returned with #checkin
+
+                @param timeout <None/float/UseGlobalSetting> default UseGlobalSetting - Seconds to wait if all connections
+
+                    are checked out. UseGlobalSetting for this pool's #checkoutTimeout, None to wait forever.
+
+                @return <DatabaseConnection>
+
+                @raises DatabaseConnectionPoolTimeout - If none became available within #timeout
+        '''
+        if timeout is UseGlobalSetting:
+            timeout = self.checkoutTimeout
+
+        startTime = time.monotonic()
+
+        deadline = None
+        if timeout is not None:
+            deadline = startTime + timeout
+
+        stackSummary = None
+        if self._getLeakThreshold() is not None or self._getDetectUncommitted():
+            stackSummary = traceback.extract_stack()[:-1]
+
+        with self._condition:
+            while True:
+                if self._isClosed:
+                    raise DatabaseConnectionFailure('Pool is closed.')
+
+                if self._idle:
+                    dbConn = self._idle.pop()
+                    self._recordCheckout(dbConn, startTime, stackSummary)
+                    return dbConn
+
+                if self._numOpen < self.maxSize:
+                    self._numOpen += 1
+                    break
+
+                if deadline is None:
+                    self._condition.wait()
+                else:
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0:
+                        self.numTimeouts += 1
+                        raise DatabaseConnectionPoolTimeout('Timed out after %.3f seconds waiting for a connection from pool %s ( %d checked out ).' %(timeout, repr(self.name), self._numOpen))
+                    self._condition.wait(remaining)
+
+        # Create outside the lock
+        dbConn = self._createConnection()
+
+        with self._condition:
+            self._createTimes[id(dbConn)] = time.monotonic()
+            self._recordCheckout(dbConn, startTime, stackSummary)
+
+        return dbConn
+
+
+    def _resetConnection(self, dbConn):
+        '''
+            _resetConnection - Reset a connection being checked in
+
+                @return tuple( <bool>, <bool> ) - True if it may be reused ( False if it should be discarded ),
+
+                    and True if it had an uncommitted transaction
+        '''
+        conn = dbConn._connection
+        if conn is not None and conn.closed:
+            return (False, False)
+
+        if dbConn._transactionDepth > 0:
+            # Checked in within a transaction block, which will not be completed
+            return (False, True)
+
+        hadTransaction = False
+
+        # conn is None if the connection was never used, and so there is nothing to roll back
+        if conn is not None:
+            try:
+                if not conn.autocommit and conn.status != psycopg2_ext.STATUS_READY:
+                    # Uncommitted transaction
+                    hadTransaction = True
+                    dbConn.rollback()
+            except Exception:
+                return (False, hadTransaction)
+
+        dbConn.isTransaction = self.isTransactionMode
+
+        if dbConn.sessionParams:
+            dbConn.sessionParams.clear()
+            dbConn._sessionParamsStale = True
+
+        return (True, hadTransaction)
+
+
+    def checkin(self, dbConn):
+        '''
+            checkin - Return a connection checked out by #checkout
+
+                A connection which is not checked out from this pool ( e.x. checked in twice ) is ignored, with a warning.
+
+                  Otherwise it could be given out twice, and shared by two threads.
+
+                @param dbConn <DatabaseConnection> - The connection
+        '''
+        with self._condition:
+            record = self._checkouts.pop(id(dbConn), None)
+
+        if record is None:
+            sys.stderr.write('WARNING: Ignoring checkin to pool %s of a connection which is not checked out from it ( checked in twice? ).\n' %(repr(self.name), ))
+            return
+
+        (isReusable, hadTransaction) = self._resetConnection(dbConn)
+
+        leaks = []
+
+        with self._condition:
+            heldTime = time.monotonic() - record.checkoutTime
+
+            leakThreshold = self._getLeakThreshold()
+            if leakThreshold is not None and heldTime > leakThreshold and not record.isReported:
+                leaks.append( PooledConnectionLeak(self.name, LEAK_REASON_HELD, heldTime, record.getStack()) )
+
+            if hadTransaction and self._getDetectUncommitted():
+                leaks.append( PooledConnectionLeak(self.name, LEAK_REASON_UNCOMMITTED, heldTime, record.getStack()) )
+
+            if isReusable and not self._isClosed:
+                self._idle.append(dbConn)
+            else:
+                self._numOpen -= 1
+                self._createTimes.pop(id(dbConn), None)
+                dbConn.closeConnection()
+
+            self._condition.notify()
+
+        for leak in leaks:
+            self._reportLeak(leak)
+
+
+    def connection(self, timeout=UseGlobalSetting):
+        '''
+            connection - Check out a connection for the duration of a "with" block
+
+                @see #checkout
+
+                @return <context manager> - Which gives the DatabaseConnection
+        '''
+        return _PooledConnection(self, timeout)
+
+
+    def closeAll(self):
+        '''
+            closeAll - Close the idle connections, and any checked out connections upon their checkin.
+
+                The pool may not be used afterwards.
+        '''
+        with self._condition:
+            self._isClosed = True
+            idle = self._idle
+            self._idle = []
+            self._numOpen -= len(idle)
+
+            for dbConn in idle:
+                self._createTimes.pop(id(dbConn), None)
+
+            self._condition.notify_all()
+
+        self._leakMonitorStop.set()
+
+        with _poolsLock:
+            _pools.discard(self)
+
+        for dbConn in idle:
+            dbConn.closeConnection()
+
+
+    def _reportLeak(self, leak):
+        '''
+            _reportLeak - Write a leak to stderr, and emit the "pool_leak" instrumentation event
+        '''
+        with self._condition:
+            self.numLeaks += 1
+
+        if leak.reason == LEAK_REASON_HELD:
+            sys.stderr.write('WARNING: Connection from pool %s checked out for %.3f seconds. Checked out at:\n%s' %(repr(leak.poolName), leak.heldTime, leak.stack))
+        else:
+            sys.stderr.write('WARNING: Connection from pool %s checked in with a transaction neither committed nor rolled back ( it was rolled back ). Checked out at:\n%s' %(repr(leak.poolName), leak.stack))
+
+        emitInstrumentationEvent('pool_leak', poolName=leak.poolName, reason=leak.reason, heldTime=leak.heldTime, stack=leak.stack)
+
+
+    def checkLeaks(self):
+        '''
+            checkLeaks - Find the connections checked out for longer than the leak threshold.
+
+                Each is reported ( @see setGlobalPoolLeakDetection ) the first time it is found.
+
+                @return list<PooledConnectionLeak> - The connections currently held too long
+        '''
+        leakThreshold = self._getLeakThreshold()
+        if leakThreshold is None:
+            return []
+
+        now = time.monotonic()
+
+        ret = []
+        newLeaks = []
+
+        with self._condition:
+            for record in self._checkouts.values():
+                heldTime = now - record.checkoutTime
+                if heldTime <= leakThreshold:
+                    continue
+
+                leak = PooledConnectionLeak(self.name, LEAK_REASON_HELD, heldTime, record.getStack())
+                ret.append(leak)
+
+                if not record.isReported:
+                    record.isReported = True
+                    newLeaks.append(leak)
+
+        for leak in newLeaks:
+            self._reportLeak(leak)
+
+        return ret
+
+
+    def getMetrics(self):
+        '''
+            getMetrics - Get the metrics of this pool. Also checks for leaks ( @see #checkLeaks )
+
+                @return dict - With keys:
+
+                    name - The pool name
+
+                    maxSize - Max connections
+
+                    open / idle / inUse - Number of connections, total, not checked out, and checked out
+
+                    checkouts - Number of checkouts
+
+                    timeouts - Number of checkouts which timed out
+
+                    leaks - Number of leaks reported
+
+                    heldTooLong - Number of connections currently checked out longer than the leak threshold
+
+                    waitBuckets - OrderedDict of bucket upper bound ( seconds, the last is float('inf') ) -> number of checkouts
+
+                        which waited at most that long ( cumulative, as in a prometheus histogram )
+
+                    waitTotal - Total seconds waited by all checkouts
+
+                    connectionAges - list<float> of the seconds since each open connection was created, oldest first
+        '''
+        heldTooLong = len(self.checkLeaks())
+
+        now = time.monotonic()
+
+        with self._condition:
+            waitBuckets = OrderedDict()
+            cumulativeCount = 0
+            for upperBound, count in zip( list(CHECKOUT_WAIT_BUCKETS) + [ float('inf') ], self._waitBucketCounts ):
+                cumulativeCount += count
+                waitBuckets[upperBound] = cumulativeCount
+
+            return {
+                'name' : self.name,
+                'maxSize' : self.maxSize,
+                'open' : self._numOpen,
+                'idle' : len(self._idle),
+                'inUse' : self._numOpen - len(self._idle),
+                'checkouts' : self.numCheckouts,
+                'timeouts' : self.numTimeouts,
+                'leaks' : self.numLeaks,
+                'heldTooLong' : heldTooLong,
+                'waitBuckets' : waitBuckets,
+                'waitTotal' : self._waitTotal,
+                'connectionAges' : sorted( [ now - createTime for createTime in self._createTimes.values() ], reverse=True ),
+            }
+
+
+    @property
+    def numOpen(self):
+        '''
+            numOpen - Number of connections in this pool, idle or checked out
+        '''
+        return self._numOpen
+
+    @property
+    def numIdle(self):
+        '''
+            numIdle - Number of connections not checked out
+        '''
+        return len(self._idle)
+
+
+class _PooledConnection(object):
+    '''
+        _PooledConnection - Context manager returned by DatabaseConnectionPool.connection
+    '''
+
+    __slots__ = ('pool', 'timeout', 'dbConn')
+
+    def __init__(self, pool, timeout):
+        self.pool = pool
+        self.timeout = timeout
+        self.dbConn = None
+
+    def __enter__(self):
+        self.dbConn = self.pool.checkout(timeout=self.timeout)
+        return self.dbConn
+
+    def __exit__(self, excType, excValue, excTraceback):
+        dbConn = self.dbConn
+        self.dbConn = None
+        self.pool.checkin(dbConn)
+
+        return False
+
+
+def _escapeLabelValue(value):
+    '''
+        _escapeLabelValue - Escape a prometheus label value
+    '''
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def _formatMetricValue(value):
+    '''
+        _formatMetricValue - Format a prometheus sample value or bucket bound
+    '''
+    if value == float('inf'):
+        return '+Inf'
+    return repr(value)
+
+
+def _runLeakMonitor(poolRef, interval, stopEvent):
+    '''
+        _runLeakMonitor - Call checkLeaks on a pool every #interval seconds, until #stopEvent is set or the pool is gone
+
+            @param poolRef <weakref.ref<DatabaseConnectionPool>> - The pool, weakly referenced so this does not keep it open
+    '''
+    while not stopEvent.wait(interval):
+        pool = poolRef()
+        if pool is None:
+            return
+
+        try:
+            pool.checkLeaks()
+        except Exception:
+            sys.stderr.write('WARNING: Exception checking pool %s for leaks:\n' %(repr(pool.name), ))
+            traceback.print_exception(*sys.exc_info())
+
+        del pool
+
+
+def getPoolMetricsText(pools=None):
+    '''
+        getPoolMetricsText - Get the metrics of connection pools in the prometheus text exposition format,
+
+            to be served from a metrics endpoint
+
+            @param pools <None/list<DatabaseConnectionPool>> default None - The pools, or None for all pools ( @see getPools )
+
+            @return <str>
+    '''
+    if pools is None:
+        pools = getPools()
+
+    allMetrics = [ pool.getMetrics() for pool in pools ]
+
+    lines = []
+
+    def _addMetric(metricName, metricType, helpStr, getSamples):
+        lines.append('# HELP %s %s' %(metricName, helpStr))
+        lines.append('# TYPE %s %s' %(metricName, metricType))
+        for metrics in allMetrics:
+            poolLabel = 'pool="%s"' %(_escapeLabelValue(metrics['name']), )
+            for (suffix, extraLabels, value) in getSamples(metrics):
+                lines.append('%s%s{%s} %s' %(metricName, suffix, ','.join( [ poolLabel ] + extraLabels ), _formatMetricValue(value)))
+
+    _addMetric('ichor_pool_connections', 'gauge', 'Connections in the pool, by state',
+        lambda metrics : [ ('', [ 'state="idle"' ], metrics['idle']), ('', [ 'state="in_use"' ], metrics['inUse']) ])
+
+    _addMetric('ichor_pool_max_connections', 'gauge', 'Max connections in the pool',
+        lambda metrics : [ ('', [], metrics['maxSize']) ])
+
+    _addMetric('ichor_pool_checkouts_total', 'counter', 'Connections checked out of the pool',
+        lambda metrics : [ ('', [], metrics['checkouts']) ])
+
+    _addMetric('ichor_pool_checkout_timeouts_total', 'counter', 'Checkouts which timed out waiting for a connection',
+        lambda metrics : [ ('', [], metrics['timeouts']) ])
+
+    _addMetric('ichor_pool_checkout_wait_seconds', 'histogram', 'Seconds waited to check out a connection',
+        lambda metrics : [ ('_bucket', [ 'le="%s"' %(_formatMetricValue(upperBound), ) ], count) for (upperBound, count) in metrics['waitBuckets'].items() ] + \
+            [ ('_sum', [], metrics['waitTotal']), ('_count', [], metrics['checkouts']) ])
+
+    _addMetric('ichor_pool_connection_max_age_seconds', 'gauge', 'Seconds since the oldest open connection was created',
+        lambda metrics : [ ('', [], metrics['connectionAges'][0] if metrics['connectionAges'] else 0.0) ])
+
+    _addMetric('ichor_pool_leaks_total', 'counter', 'Leaked connections reported',
+        lambda metrics : [ ('', [], metrics['leaks']) ])
+
+    _addMetric('ichor_pool_connections_held_too_long', 'gauge', 'Connections currently checked out longer than the leak threshold',
+        lambda metrics : [ ('', [], metrics['heldTooLong']) ])
+
+    return '\n'.join(lines) + '\n'
+
+
+# vim: set ts=4 sw=4 st=4 expandtab:
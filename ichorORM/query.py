@@ -12,19 +12,32 @@
 
 import copy
 import datetime
+import itertools
 import re
 
 from psycopg2.extensions import adapt as psycopg2_adapt
 
 from .special import QueryStr, SQL_NULL, isQueryStr
+from .expressions import isExpression
 from .constants import WHERE_AND, WHERE_OR, WHERE_ALL_TYPES, ALL_JOINS
 from .utils import convertFilterTypeToOperator, isMultiOperator
 from .objs import DictObj
+from .explain import explainSql
+from .costguard import checkQueryCost
+from .relations import OneToOneRelation
+from .mappers import MappingRowMapper, DictObjRowMapper, RecordRowMapper
 
 
 from collections import OrderedDict
 
 from . import getDatabaseConnection
+from .connection import DEFAULT_STREAM_CHUNK_SIZE
+from .routing import getReadDatabaseConnection
+from .columns import ColumnBuilder
+from .binarycopy import getBinaryDecoders, iterBinaryCopyChunks
+from .fieldcodecs import getCodecPlan
+from .lazy import LazyModelProxy, getLazyFieldIdxs
+from .stats import attributeQueryStats, queryStatsAttribution, timeHydration
 
 __all__ = ('QueryStr', 'QueryBase', 'FilterType', 'isFilterType', 'FilterField', 'FilterJoin', 'FilterStage',
             'isSelectQuery', 'SelectQuery', 'SelectInnerJoinQuery', 'SelectGenericJoinQuery',
@@ -60,7 +73,9 @@ class FilterField(FilterType):
 
                 @param filterType <str> - Operation ( like "=" )
 
-                @param filterValue <str/QueryStr/SelectQuery> - The value to match, or a query to embed to fetch value
+                @param filterValue <str/QueryStr/SelectQuery/Expression> - The value to match, or a query to embed to fetch value,
+
+                    or an expression ( like F('otherField') + 1 )
 
                 @param operator <str/None> default None - If provided, will use
 
@@ -110,6 +125,8 @@ class FilterField(FilterType):
             filterValue = filterValue
         elif isSelectQuery(filterValue):
             filterValue = filterValue.asQueryStr()
+        elif isExpression(filterValue):
+            filterValue = filterValue.toStr()
         else:
             # Convert complex types into proper representation
             filterValue = str(psycopg2_adapt(filterValue))
@@ -176,6 +193,12 @@ class FilterField(FilterType):
             ret += " " + _queryStr
             params.update(_selectParams)
 
+        elif isExpression(filterValue):
+            (_expressionStr, _expressionParams) = filterValue.toStrParam(paramName)
+
+            ret += " " + _expressionStr + " "
+            params.update(_expressionParams)
+
         elif not isMultiOperator(self.operator):
             # If not a multi operator, insert one parameterized value
             ret += ' %(' + paramName + ')s '
@@ -523,6 +546,9 @@ class QueryBase(object):
         if model:
             self.model._setupModel()
 
+        # ignoreCostGuard - Set to True to skip the cost guard check on this query ( @see costguard.setGlobalCostGuard )
+        self.ignoreCostGuard = False
+
         self.filterStages = []
 
         if filterStages:
@@ -550,6 +576,20 @@ class QueryBase(object):
         return self.model
 
 
+    def _getShardMap(self, dbConn):
+        '''
+            _getShardMap - Get the shard map this query should be routed by
+
+                @param dbConn <None/DatabaseConnection> - The connection given to the execute method.
+
+                @return <None/sharding.ShardMap> - The SHARD_MAP of the model, or None if not sharded or a connection was given
+        '''
+        if dbConn:
+            return None
+
+        return getattr(self.getModel(), 'SHARD_MAP', None)
+
+
     def getModels(self):
         '''
             getModels - Gets a list of the models <DatabaseModel> associated with this Query.
@@ -677,6 +717,8 @@ class QueryBase(object):
             execute - Perform the action of this query, regardless of type
                         (useful for batching transactions into lists and iterating through)
 
+                        @see batch.QueryBatch to send many insert / update / delete queries in one round trip
+
                       @param dbConn <DatabaseConnection/None> Default None -
                                 The postgresql connection to use, or None to
                                 create a new one from global settings.
@@ -686,6 +728,33 @@ class QueryBase(object):
         raise NotImplementedError('Must implement execute. Type %s does not.' %(self.__class__.__name__, ))
 
 
+    def explain(self, analyze=False, buffers=False, format='json', dbConn=None):
+        '''
+            explain - Run EXPLAIN on this query (parameterized) and return the plan
+
+                @param analyze <bool> default False - If True, EXPLAIN ANALYZE. This actually executes the query,
+                    to gather actual row counts and timings.
+
+                    For anything but a SELECT, the query is executed within a transaction which is rolled back
+                      (or a savepoint, if #dbConn is already in transaction mode), so no data is modified.
+
+                @param buffers <bool> default False - If True, include buffer usage information
+
+                @param format <str> default 'json' - One of 'json', 'text', 'xml', 'yaml'
+
+                @param dbConn <DatabaseConnection/None> Default None - If None, start a new connection
+                        using the global connection settings. Otherwise, use given connection.
+
+                @return <explain.QueryPlan/str> - For the 'json' format, a parsed QueryPlan
+                    ( with totalCost, estimatedRows, actualRows, seqScans, nodes, etc. )
+
+                    For the other formats, the plan as a string.
+        '''
+        (sql, params) = self.getSqlParameterizedValues()
+
+        return explainSql(sql, params, analyze=analyze, buffers=buffers, format=format, isWrite=not isSelectQuery(self), dbConn=dbConn)
+
+
     def getTableName(self):
         '''
             getTableName - Get the name of the table associated with this model
@@ -713,7 +782,7 @@ class SelectQuery(QueryBase):
         SelectQuery - A Query designed for "SELECT".
     '''
 
-    def __init__(self, model, selectFields='ALL', filterStages=None, orderByField=None, orderByDir='', limitNum=None):
+    def __init__(self, model, selectFields='ALL', filterStages=None, orderByField=None, orderByDir='', limitNum=None, offsetNum=None):
         '''
             __init__ - Create a SelectQuery
 
@@ -730,6 +799,8 @@ class SelectQuery(QueryBase):
                 @param orderByDir <str> - If provided, the direction the "order by" will follow.
 
                 @param limitNum <None/int> default None, if provided integer, will return no more than N rows
+
+                @param offsetNum <None/int> default None, if provided integer, will skip the first N rows
         '''
         QueryBase.__init__(self, model, filterStages)
 
@@ -743,6 +814,13 @@ class SelectQuery(QueryBase):
             self.addOrderBy( orderByField, orderByDir )
 
         self.limitNum = limitNum
+        self.offsetNum = offsetNum
+
+        # _rowMappers - ( mapper type, fields, mapper args ) -> RowMapper. @see #getRowMapper
+        self._rowMappers = {}
+
+        # fieldCodecs - Field name -> FieldCodec, in addition to FIELD_CODECS on the model(s). @see #setFieldCodec
+        self.fieldCodecs = {}
 
 
     def clearOrderBy(self):
@@ -761,6 +839,15 @@ class SelectQuery(QueryBase):
         self.limitNum = limitNum
 
 
+    def setOffsetNum(self, offsetNum):
+        '''
+            setOffsetNum - Set the offset num (number of records to skip)
+
+                @param offsetNum <int/None> - Provide the number of records to skip, or None for no offset.
+        '''
+        self.offsetNum = offsetNum
+
+
     def addOrderBy(self, fieldName, orderByDir=''):
         '''
             addOrderBy - Add an additional "ORDER BY"
@@ -859,6 +946,63 @@ class SelectQuery(QueryBase):
 
         return ', '.join(selectFields)
 
+    def setFieldCodec(self, fieldName, codec):
+        '''
+            setFieldCodec - Set the codec used to decode a selected field, overriding any in FIELD_CODECS on the model.
+
+                @param fieldName <str> - The field name, as selected ( e.x. "price", or on a join "product.price" )
+
+                @param codec <None/ichorORM.fieldcodecs.FieldCodec> - The codec ( e.x. FloatCodec() ), or None to remove
+        '''
+        if codec is None:
+            self.fieldCodecs.pop(fieldName, None)
+        else:
+            self.fieldCodecs[fieldName] = codec
+
+    def getColumnCodecs(self):
+        '''
+            getColumnCodecs - Get the codec of each selected field, from FIELD_CODECS on the model(s) and #setFieldCodec
+
+                @return list<None/ichorORM.fieldcodecs.FieldCodec> - The codec ( or None ) of each field, in order
+        '''
+        models = self.getModels()
+
+        codecsByField = {}
+        for model in models:
+            for fieldName, codec in model.FIELD_CODECS.items():
+                codecsByField['%s.%s' %(model.TABLE_NAME, fieldName)] = codec
+                if len(models) == 1:
+                    codecsByField[fieldName] = codec
+
+        if not codecsByField and not self.fieldCodecs:
+            return [ None ] * len(self.getFields())
+
+        codecsByField.update(self.fieldCodecs)
+
+        return [ codecsByField.get(fieldName, None) for fieldName in self.getFields() ]
+
+    def getRowMapper(self, rowMapperType, *args):
+        '''
+            getRowMapper - Get a row mapper for the currently selected fields.
+
+                The mapper is built once and reused for as long as the selected fields are the same.
+
+                @param rowMapperType <RowMapper type> - The type of mapper, e.x. MappingRowMapper
+
+                @param args - Any additional (hashable) arguments to the mapper, following the fields
+
+                @return <RowMapper>
+        '''
+        fields = tuple(self.getFields())
+
+        cacheKey = (rowMapperType, fields, args)
+
+        rowMapper = self._rowMappers.get(cacheKey, None)
+        if rowMapper is None:
+            rowMapper = self._rowMappers[cacheKey] = rowMapperType(fields, *args)
+
+        return rowMapper
+
     def getOrderByStr(self):
         '''
             getOrderByStr - Gets the ORDER BY portion (or empty string if unset) of the query
@@ -876,12 +1020,17 @@ class SelectQuery(QueryBase):
 
     def getLimitStr(self):
         '''
-            getLimitStr - Get the LIMIT N portion of the query string
+            getLimitStr - Get the LIMIT N ( and OFFSET N ) portion of the query string
         '''
-        if not self.limitNum:
-            return ''
+        ret = ''
 
-        return ' LIMIT ' + str(self.limitNum)
+        if self.limitNum:
+            ret += ' LIMIT ' + str(self.limitNum)
+
+        if self.offsetNum:
+            ret += ' OFFSET ' + str(self.offsetNum)
+
+        return ret
 
 
     def getSql(self):
@@ -913,6 +1062,7 @@ class SelectQuery(QueryBase):
 
         return (sql, whereParams)
 
+    @attributeQueryStats
     def executeGetRows(self, parameterized=True, dbConn=None):
         '''
             executeGetRows - Execute and return the raw data from postgres in rows of columns
@@ -925,19 +1075,301 @@ class SelectQuery(QueryBase):
 
             @return list<list<str>> - Rows of columns
         '''
+        if self._getShardMap(dbConn) is not None:
+            from .sharding import executeOnShards, getShardQuery, mergeShardRows
+
+            shardQuery = getShardQuery(self)
+            shardRows = executeOnShards(self, lambda shardConn : shardQuery.executeGetRows(parameterized=parameterized, dbConn=shardConn))
+
+            return list( mergeShardRows(self, shardRows) )
 
         if not dbConn:
-            dbConn = getDatabaseConnection()
+            dbConn = getReadDatabaseConnection()
 
         if parameterized:
             ( sql, params ) = self.getSqlParameterizedValues()
-            rows = dbConn.doSelectParams(sql, params)
+            checkQueryCost(self, sql, params, dbConn)
         else:
             sql = self.getSql()
+            params = None
+
+        codecPlan = getCodecPlan(self.getColumnCodecs(), sql, params, dbConn)
+        if codecPlan is not None:
+            rows = dbConn.doSelectParams(sql, params, typecasters=codecPlan.typecasters)
+            return codecPlan.decodeRows(rows)
+
+        if parameterized:
+            rows = dbConn.doSelectParams(sql, params)
+        else:
             rows = dbConn.doSelect(sql)
 
         return rows
 
+    def executeGetRecords(self, parameterized=True, dbConn=None):
+        '''
+            executeGetRecords - Execute and return each row as a record: a lightweight, read-only tuple with
+                attribute access by field name ( e.x.  row.first_name , or on a join  row.person__first_name )
+
+                Much cheaper than #executeGetObjs or #executeGetMapping , for when model objects are not needed.
+
+                @param paramertized <bool> Default True - Whether to use parameterized query
+
+                @param dbConn <DatabaseConnection/None> - If None, start a new connection using the
+                                             global connection parameters.
+                                             Otherwise, use this provided connection
+
+            @return list<namedtuple> - One record per row. @see ichorORM.mappers.getRecordType
+        '''
+        rows = self.executeGetRows(parameterized=parameterized, dbConn=dbConn)
+
+        if not rows:
+            return []
+
+        return self.getRowMapper(RecordRowMapper).mapRows(rows)
+
+    def executeIterRows(self, dbConn=None, chunkSize=DEFAULT_STREAM_CHUNK_SIZE):
+        '''
+            executeIterRows - Execute using a server-side cursor, and yield the rows as they are fetched
+
+                The query is not executed until the first row is requested.
+
+                @param dbConn <DatabaseConnection/None> - If None, start a new connection using the
+                                             global connection parameters.
+                                             Otherwise, use this provided connection
+
+                @param chunkSize <int> default DEFAULT_STREAM_CHUNK_SIZE - Number of rows fetched per round-trip
+
+            @return generator<tuple> - Rows of columns
+        '''
+        shardMap = self._getShardMap(dbConn)
+        if shardMap is not None:
+            from .sharding import getShardNamesForQuery, getShardQuery, mergeShardRows
+
+            shardQuery = getShardQuery(self)
+            shardRows = [ _iterPooledRows(shardMap.getPool(shardName), shardQuery, chunkSize) for shardName in getShardNamesForQuery(self, shardMap) ]
+
+            for row in mergeShardRows(self, shardRows):
+                yield row
+            return
+
+        if not dbConn:
+            dbConn = getReadDatabaseConnection()
+
+        ( sql, params ) = self.getSqlParameterizedValues()
+        checkQueryCost(self, sql, params, dbConn)
+
+        codecPlan = getCodecPlan(self.getColumnCodecs(), sql, params, dbConn)
+        if codecPlan is not None:
+            decodeRow = codecPlan.decodeRow
+            with queryStatsAttribution(self):
+                rowsIter = dbConn.doSelectParamsStream(sql, params, chunkSize=chunkSize, typecasters=codecPlan.typecasters)
+
+            for row in rowsIter:
+                yield decodeRow(row)
+            return
+
+        with queryStatsAttribution(self):
+            rowsIter = dbConn.doSelectParamsStream(sql, params, chunkSize=chunkSize)
+
+        for row in rowsIter:
+            yield row
+
+    def executeIterRowsPartitioned(self, numPartitions=4, chunkSize=DEFAULT_STREAM_CHUNK_SIZE, **kwargs):
+        '''
+            executeIterRowsPartitioned - Execute as #numPartitions partitions at once, each on its own connection within a shared
+
+                snapshot, and yield the rows of all partitions as they arrive. Rows of different partitions are interleaved.
+
+                @param numPartitions <int> default 4 - Number of partitions
+
+                @param chunkSize <int> default DEFAULT_STREAM_CHUNK_SIZE - Number of rows fetched per round-trip
+
+              Any additional keyword arguments are passed to PartitionedScan ( e.x. partitionBy, pool )
+
+              @see partitioned.PartitionedScan
+
+            @return generator<tuple> - Rows of columns
+        '''
+        from .partitioned import PartitionedScan
+
+        scan = PartitionedScan(self, numPartitions=numPartitions, chunkSize=chunkSize, **kwargs)
+
+        return scan.iterRows()
+
+    def _executeBinaryCopy(self, dbConn):
+        '''
+            _executeBinaryCopy - Execute via  COPY ( query ) TO STDOUT ( FORMAT binary ) , if every selected column has a supported type
+
+                @param dbConn <DatabaseConnection> - The connection to use
+
+            @return <None/generator<tuple>> - The rows, or None if a column has a type which cannot be decoded from binary
+        '''
+        if any(self.getColumnCodecs()):
+            # Codecs decode the text or psycopg2 values, so use the normal path
+            return None
+
+        ( sql, params ) = self.getSqlParameterizedValues()
+
+        typeOids = dbConn.getColumnTypeOidsParams(sql, params)
+
+        decoders = getBinaryDecoders(typeOids, dbConn.getEncoding())
+        if decoders is None:
+            return None
+
+        checkQueryCost(self, sql, params, dbConn)
+
+        # Decoded as the output arrives, so the full binary output is never held at once
+        return iterBinaryCopyChunks(dbConn.doCopyOutParamsStream(sql, params), decoders)
+
+    @attributeQueryStats
+    def executeGetRowsBinary(self, dbConn=None):
+        '''
+            executeGetRowsBinary - Execute and return the rows of columns, like #executeGetRows , but transfer the results
+                using binary COPY, skipping the text conversion of every value.
+
+                Supported types are int2 / int4 / int8, float4 / float8, bool, text / varchar / char,
+                  timestamp (without time zone), date, and numeric.
+
+                If any selected column has another type, or any selected column has a codec, this falls back to #executeGetRows
+
+                NOTE: float4 values are the exact single-precision value ( e.x. 1.100000023841858 rather than 1.1 )
+
+                @param dbConn <DatabaseConnection/None> - If None, start a new connection using the
+                                             global connection parameters.
+                                             Otherwise, use this provided connection
+
+            @return list<tuple> - Rows of columns
+        '''
+        if self._getShardMap(dbConn) is not None:
+            return self.executeGetRows()
+
+        if not dbConn:
+            dbConn = getReadDatabaseConnection()
+
+        rowsIter = self._executeBinaryCopy(dbConn)
+        if rowsIter is None:
+            return self.executeGetRows(dbConn=dbConn)
+
+        return list(rowsIter)
+
+    @attributeQueryStats
+    def executeGetColumns(self, dtypes=None, dbConn=None, chunkSize=DEFAULT_STREAM_CHUNK_SIZE, useNumpy=None, binaryCopy=False):
+        '''
+            executeGetColumns - Execute using a server-side cursor, and return the results by column rather than by row.
+
+                Rows are fetched in batches of #chunkSize and appended directly into per-column typed buffers
+                  ( array.array ), returned as NumPy arrays when NumPy is available.
+
+                @param dtypes <None/dict> default None - Map of field name -> array.array typecode ( e.x. "q", "d" )
+                    or "object". Fields not present have their type determined by the first non-NULL value.
+
+                @param dbConn <DatabaseConnection/None> - If None, start a new connection using the
+                                             global connection parameters.
+                                             Otherwise, use this provided connection
+
+                @param chunkSize <int> default DEFAULT_STREAM_CHUNK_SIZE - Number of rows fetched per round-trip
+
+                @param useNumpy <None/bool> default None - Whether to return NumPy arrays. None to use NumPy if it is importable.
+
+                @param binaryCopy <bool> default False - If True, transfer the results using binary COPY. @see #executeGetRowsBinary
+
+            @return <ichorORM.columns.ColumnResults> - OrderedDict of field name -> column. NULLs are marked
+                in the #nullMasks attribute, a matching OrderedDict of field name -> mask
+        '''
+        columnBuilder = ColumnBuilder(self.getFields(), dtypes=dtypes, useNumpy=useNumpy)
+
+        rowsIter = None
+        if binaryCopy and self._getShardMap(dbConn) is None:
+            if not dbConn:
+                dbConn = getReadDatabaseConnection()
+
+            rowsIter = self._executeBinaryCopy(dbConn)
+
+        if rowsIter is None:
+            rowsIter = self.executeIterRows(dbConn=dbConn, chunkSize=chunkSize)
+
+        while True:
+            rows = list( itertools.islice(rowsIter, chunkSize) )
+            if not rows:
+                break
+
+            columnBuilder.addRows(rows)
+
+        return columnBuilder.getResults()
+
+    @attributeQueryStats
+    def executeGetCount(self, dbConn=None):
+        '''
+            executeGetCount - Execute a  SELECT COUNT(*)  of the rows this query would return
+
+                @param dbConn <DatabaseConnection/None> - If None, start a new connection using the
+                                             global connection parameters.
+                                             Otherwise, use this provided connection
+
+            @return <int> - The number of rows
+        '''
+        if self._getShardMap(dbConn) is not None:
+            from .sharding import executeOnShards, getShardQuery
+
+            shardQuery = getShardQuery(self)
+            # The offset and limit apply to the merged rows, so count all matches on each shard
+            shardQuery.limitNum = None
+            total = sum( executeOnShards(self, lambda shardConn : shardQuery.executeGetCount(dbConn=shardConn)) )
+
+            total = max(total - (self.offsetNum or 0), 0)
+            if self.limitNum:
+                total = min(total, self.limitNum)
+
+            return total
+
+        if not dbConn:
+            dbConn = getReadDatabaseConnection()
+
+        orderBys = self.orderBys
+        if not self.limitNum and not self.offsetNum:
+            # Ordering does not matter to the count unless it selects which rows are returned
+            self.orderBys = []
+        try:
+            ( sql, params ) = self.getSqlParameterizedValues()
+        finally:
+            self.orderBys = orderBys
+
+        sql = 'SELECT COUNT(*) FROM ( %s ) AS _ichor_count' %(sql, )
+
+        rows = dbConn.doSelectParams(sql, params)
+
+        return int(rows[0][0])
+
+    @attributeQueryStats
+    def executeExists(self, dbConn=None):
+        '''
+            executeExists - Execute a  SELECT EXISTS( ... )  to check if this query would return any rows
+
+                @param dbConn <DatabaseConnection/None> - If None, start a new connection using the
+                                             global connection parameters.
+                                             Otherwise, use this provided connection
+
+            @return <bool> - True if at least one row matches
+        '''
+        if self._getShardMap(dbConn) is not None:
+            if self.offsetNum:
+                return bool( self.executeGetCount() )
+
+            from .sharding import executeOnShards
+
+            return any( executeOnShards(self, lambda shardConn : self.executeExists(dbConn=shardConn)) )
+
+        if not dbConn:
+            dbConn = getReadDatabaseConnection()
+
+        ( sql, params ) = self.getSqlParameterizedValues()
+
+        sql = 'SELECT EXISTS( %s )' %(sql, )
+
+        rows = dbConn.doSelectParams(sql, params)
+
+        return bool(rows[0][0])
+
     def execute(self, dbConn=None, doCommit=True):
         '''
             execute - Execute this action, generic method.
@@ -951,7 +1383,7 @@ class SelectQuery(QueryBase):
         '''
         return self.executeGetRows(dbConn=dbConn)
 
-    def executeGetObjs(self, parameterized=True, dbConn=None):
+    def executeGetObjs(self, parameterized=True, dbConn=None, deferUnselectedFields=False, lazy=False):
         '''
             executeGetObjs - Execute and transform the returned data into a series of objects, one per row returned.
 
@@ -961,6 +1393,16 @@ class SelectQuery(QueryBase):
                                              global connection parameters.
                                              Otherwise, use this provided connection
 
+                @param deferUnselectedFields <bool> Default False - If True, any fields on the model which are not selected
+
+                    will be loaded upon first access (for all the returned objects at once). Otherwise, they will be None.
+
+                @param lazy <bool> Default False - If True, return a LazyModelProxy per row rather than the model object.
+
+                    Selected fields are read straight from the row, and the model object is only created when
+
+                    anything else is accessed or any attribute is set. @see ichorORM.lazy.LazyModelProxy
+
             @return list<model object> - A list of constructed model objects with the fields from this query filled
         '''
 
@@ -968,17 +1410,82 @@ class SelectQuery(QueryBase):
         if not rows:
             return []
 
+        return timeHydration(self._getObjsFromRows, rows, dbConn, deferUnselectedFields, lazy)
+
+    def _getObjsFromRows(self, rows, dbConn, deferUnselectedFields, lazy):
+        '''
+            _getObjsFromRows - Create the model objects of #executeGetObjs from the rows
+        '''
         ret = []
 
         Model = self.model
         fields = self.getFields()
 
+        deferredFieldLoader = None
+        if deferUnselectedFields:
+            deferredFieldNames = [ fieldName for fieldName in Model.FIELDS if fieldName not in fields ]
+            if deferredFieldNames:
+                deferredFieldLoader = Model.getDeferredFieldLoader(deferredFieldNames, dbConn=dbConn)
+
+        if lazy:
+            fieldIdxs = getLazyFieldIdxs(Model, fields)
+
+            return [ LazyModelProxy(Model, row, fieldIdxs, deferredFieldLoader) for row in rows ]
+
         for row in rows:
             fieldMap = { fields[i] : row[i] for i in range(len(fields)) }
             ret.append( Model(**fieldMap) )
 
+        if deferredFieldLoader is not None:
+            for obj in ret:
+                deferredFieldLoader.addObj(obj)
+
         return ret
 
+    def executeIterObjs(self, dbConn=None, chunkSize=DEFAULT_STREAM_CHUNK_SIZE, deferUnselectedFields=False, lazy=False):
+        '''
+            executeIterObjs - Execute using a server-side cursor, and yield a model object per row as they are fetched
+
+                @param dbConn <DatabaseConnection/None> - If None, start a new connection using the
+                                             global connection parameters.
+                                             Otherwise, use this provided connection
+
+                @param chunkSize <int> default DEFAULT_STREAM_CHUNK_SIZE - Number of rows fetched per round-trip
+
+                @param deferUnselectedFields <bool> Default False - If True, any fields on the model which are not selected
+
+                    will be loaded upon first access (for all the objects yielded so far at once). Otherwise, they will be None.
+
+                @param lazy <bool> Default False - If True, yield a LazyModelProxy per row rather than the model object. @see #executeGetObjs
+
+            @return generator<model object>
+        '''
+        Model = self.model
+        fields = self.getFields()
+        numFields = len(fields)
+
+        deferredFieldLoader = None
+        if deferUnselectedFields:
+            deferredFieldNames = [ fieldName for fieldName in Model.FIELDS if fieldName not in fields ]
+            if deferredFieldNames:
+                deferredFieldLoader = Model.getDeferredFieldLoader(deferredFieldNames, dbConn=dbConn)
+
+        if lazy:
+            fieldIdxs = getLazyFieldIdxs(Model, fields)
+
+            for row in self.executeIterRows(dbConn=dbConn, chunkSize=chunkSize):
+                yield LazyModelProxy(Model, row, fieldIdxs, deferredFieldLoader)
+            return
+
+        for row in self.executeIterRows(dbConn=dbConn, chunkSize=chunkSize):
+            fieldMap = { fields[i] : row[i] for i in range(numFields) }
+            obj = Model(**fieldMap)
+
+            if deferredFieldLoader is not None:
+                deferredFieldLoader.addObj(obj)
+
+            yield obj
+
     def asQueryStr(self):
         '''
             asQueryStr - Return this SELECT as an embedded group
@@ -1039,34 +1546,165 @@ class SelectQuery(QueryBase):
         return (selectSqlStr, retParams)
 
 
-class SelectInnerJoinQuery(SelectQuery):
+def _iterPooledRows(pool, query, chunkSize):
     '''
-        SelectInnerJoinQuery - A SELECT query on multiple tables which supports inner join
+        _iterPooledRows - Check out a connection from a pool upon the first row requested, stream the rows of a query,
+
+            and check the connection back in when done ( or the generator is closed )
+
+            @param pool <DatabaseConnectionPool> - The pool
+
+            @param query <SelectQuery> - The query
+
+            @param chunkSize <int> - Number of rows fetched per round-trip
+
+        @return generator<tuple> - Rows of columns
     '''
+    dbConn = pool.checkout()
+    try:
+        for row in query.executeIterRows(dbConn=dbConn, chunkSize=chunkSize):
+            yield row
+    finally:
+        pool.checkin(dbConn)
 
 
-    def __init__(self, models, selectFields='ALL', orderByField=None, orderByDir='', limitNum=None):
-        '''
-            __init__ - Create a SelectInnerJoinQuery
+def _getJoinedModelColumnMap(models, fields):
+    '''
+        _getJoinedModelColumnMap - Compute, once per result set, which columns of a row belong to which model
 
-                @param models - list<DatabaseModel> - List of models to use
+            @param models list<DatabaseModel> - The models in the query
 
-                @param selectFields <'ALL' or list<str>> - Default ALL for all fields on all joined models, or a list of fields to select (prefix with table name, like MyTable.myField)
+            @param fields list<str> - The selected fields, each in the form  TABLE.FIELD
 
+            @return list< tuple( model<DatabaseModel>, pkIdx<int/None>, fieldIdxs< list< tuple(fieldName<str>, columnIdx<int>) > > ) > -
 
-                    Use MyModel.TABLE_NAME + '.*' to select all fields on "MyModel"
+                For each model (in order), the index of its primary key column (or None if not selected),
 
-                @param orderByField <None/str> Default None - Order by this field, if provided
+                  and the (fieldName, columnIdx) of each selected field.
+    '''
+    fieldIdxsByTable = {}
 
-                @param orderByDir <str> Default '' - ASC or DESC for ascneding/descending
+    for i in range(len(fields)):
+        fieldSplit = fields[i].split('.')
+        if len(fieldSplit) != 2:
+            raise ValueError('Field name  %s  is not in the form  TABLE.FIELD' %(repr(fields[i]), ))
 
-                @param limitNum <int/None> default None - If provided, will return MAX this many results
-        '''
-        SelectQuery.__init__(self, None, selectFields=selectFields, orderByField=orderByField, orderByDir=orderByDir, limitNum=limitNum)
+        (tableName, fieldName) = fieldSplit
 
-        self.models = models
-        for model in models:
-            model._setupModel()
+        fieldIdxsByTable.setdefault(tableName, []).append( (fieldName, i) )
+
+    ret = []
+    for model in models:
+        fieldIdxs = fieldIdxsByTable.get(model.TABLE_NAME, [])
+
+        pkIdx = None
+        for fieldName, columnIdx in fieldIdxs:
+            if fieldName == model.PRIMARY_KEY:
+                pkIdx = columnIdx
+                break
+
+        ret.append( (model, pkIdx, fieldIdxs) )
+
+    return ret
+
+
+def _getJoinedModelObj(model, pkIdx, fieldIdxs, row, identityMap):
+    '''
+        _getJoinedModelObj - Get the object of #model from a joined row, using (and populating) #identityMap
+
+            @see _getJoinedModelColumnMap for #pkIdx and #fieldIdxs
+
+            @return <DatabaseModel/None> - The object, or None if no fields are selected or the row has no match for #model
+    '''
+    if not fieldIdxs:
+        return None
+
+    if pkIdx is not None:
+        _pk = row[pkIdx]
+        if _pk is None:
+            return None
+
+        identityKey = (model, _pk)
+
+        obj = identityMap.get(identityKey, None)
+        if obj is None:
+            obj = model( **{ fieldName : row[columnIdx] for fieldName, columnIdx in fieldIdxs } )
+            identityMap[identityKey] = obj
+
+        return obj
+
+    fieldMap = { fieldName : row[columnIdx] for fieldName, columnIdx in fieldIdxs }
+    if all( [ fieldValue is None for fieldValue in fieldMap.values() ] ):
+        return None
+
+    return model(**fieldMap)
+
+
+def _iterJoinedModelObjs(models, fields, rows, maxIdentityMapSize=None):
+    '''
+        _iterJoinedModelObjs - Convert rows from a join into tuples of model objects, one per model.
+
+            An object is shared between every row with the same primary key (for that model), so a
+
+              Person joined to many Meals is only created once.
+
+            If a model has no selected fields, or its primary key (or, if not selected, every field) is NULL
+
+              as the result of an outer join, None is in its place.
+
+            @param models list<DatabaseModel> - The models in the query
+
+            @param fields list<str> - The selected fields, each in the form  TABLE.FIELD
+
+            @param rows iterable<tuple> - The rows
+
+            @param maxIdentityMapSize <None/int> default None - If provided, the objects shared between rows are forgotten
+
+                once there are this many, so that streaming does not keep every object alive.
+
+                Rows further apart may then have different objects for the same primary key.
+
+            @return generator<tuple> - A tuple of model objects (or None) per row, in the same order as #models
+    '''
+    modelColumnMap = _getJoinedModelColumnMap(models, fields)
+
+    identityMap = {}
+
+    for row in rows:
+        if maxIdentityMapSize is not None and len(identityMap) >= maxIdentityMapSize:
+            identityMap.clear()
+
+        yield tuple( [ _getJoinedModelObj(model, pkIdx, fieldIdxs, row, identityMap) for model, pkIdx, fieldIdxs in modelColumnMap ] )
+
+
+class SelectInnerJoinQuery(SelectQuery):
+    '''
+        SelectInnerJoinQuery - A SELECT query on multiple tables which supports inner join
+    '''
+
+
+    def __init__(self, models, selectFields='ALL', orderByField=None, orderByDir='', limitNum=None):
+        '''
+            __init__ - Create a SelectInnerJoinQuery
+
+                @param models - list<DatabaseModel> - List of models to use
+
+                @param selectFields <'ALL' or list<str>> - Default ALL for all fields on all joined models, or a list of fields to select (prefix with table name, like MyTable.myField)
+
+
+                    Use MyModel.TABLE_NAME + '.*' to select all fields on "MyModel"
+
+                @param orderByField <None/str> Default None - Order by this field, if provided
+
+                @param orderByDir <str> Default '' - ASC or DESC for ascneding/descending
+
+                @param limitNum <int/None> default None - If provided, will return MAX this many results
+        '''
+        SelectQuery.__init__(self, None, selectFields=selectFields, orderByField=orderByField, orderByDir=orderByDir, limitNum=limitNum)
+
+        self.models = models
+        for model in models:
+            model._setupModel()
 
     def getTableName(self):
         '''
@@ -1168,9 +1806,49 @@ class SelectInnerJoinQuery(SelectQuery):
 
     def executeGetObjs(self, parameterized=True, dbConn=None):
         '''
-            executeGetObjs - Not supported for SelectInnerJoinQuery
+            executeGetObjs - Execute this query, and return a tuple of model objects for each row,
+
+                one object for each model in the query ( the models passed to the constructor ).
+
+                Objects are created directly from each row, and the same object is returned for every row
+
+                  with the same primary key, e.x.  ( meal1, person1 ), ( meal2, person1 )
+
+                If a model has no fields selected, or the row has no match for it (e.x. a LEFT JOIN), None is in its place.
+
+                @param paramertized <bool> Default True - Whether to use parameterized query
+
+                @param dbConn <DatabaseConnection/None> - If None, start a new connection using the
+                                             global connection parameters.
+                                             Otherwise, use this provided connection
+
+                @return list<tuple<DatabaseModel/None>> - A tuple of model objects per row
+        '''
+        rows = self.executeGetRows(parameterized=parameterized, dbConn=dbConn)
+        if not rows:
+            return []
+
+        return timeHydration(lambda : list( _iterJoinedModelObjs(self.models, self.getFields(), rows) ))
+
+    def executeIterObjs(self, dbConn=None, chunkSize=DEFAULT_STREAM_CHUNK_SIZE):
         '''
-        raise NotImplementedError('SelectInnerJoinQuery does not support executeGetObjs. Use executeGetRows, executeGetMapping, or executeGetDictObjs instead.')
+            executeIterObjs - Execute using a server-side cursor, and yield a tuple of model objects per row
+
+                as they are fetched. @see #executeGetObjs
+
+                Objects are shared between rows with the same primary key only until #chunkSize objects have been created,
+
+                  so that memory does not grow with the number of rows.
+
+                @param dbConn <DatabaseConnection/None> - If None, start a new connection using the
+                                             global connection parameters.
+                                             Otherwise, use this provided connection
+
+                @param chunkSize <int> default DEFAULT_STREAM_CHUNK_SIZE - Number of rows fetched per round-trip
+
+                @return generator<tuple<DatabaseModel/None>>
+        '''
+        return _iterJoinedModelObjs(self.models, self.getFields(), self.executeIterRows(dbConn=dbConn, chunkSize=chunkSize), maxIdentityMapSize=chunkSize)
 
     def executeGetMapping(self, parameterized=True, dbConn=None):
         '''
@@ -1186,28 +1864,12 @@ class SelectInnerJoinQuery(SelectQuery):
             @return list<dict> - List of rows, each row as a dict with named columns
         '''
 
-        ret = []
-
         rows = self.executeGetRows(parameterized=parameterized, dbConn=dbConn)
 
         if not rows:
-            return ret
-
-        fields = self.getFields()
-
-        for row in rows:
-            # Use an OrderedDict versus a regular dict + comprehension
-            #   to ensure returned field order is same as selected
-            thisRowMap = OrderedDict()
-
-            for i in range(len(fields)):
-                fieldName = fields[i]
-
-                thisRowMap[fieldName] = row[i]
+            return []
 
-            ret.append(thisRowMap)
-
-        return ret
+        return self.getRowMapper(MappingRowMapper).mapRows(rows)
 
     def executeGetDictObjs(self, parameterized=True, dbConn=None):
         '''
@@ -1230,40 +1892,12 @@ class SelectInnerJoinQuery(SelectQuery):
                 @return list<DictObjs> - List of rows, a DictObj for each row.
         '''
 
-        ret = []
-
         rows = self.executeGetRows(parameterized=parameterized, dbConn=dbConn)
 
         if not rows:
-            return ret
-
-        fields = self.getFields()
-        tableNames = self.getTableNames()
-
-        newRowDictObj = lambda : DictObj(**{ tableName : DictObj() for tableName in tableNames })
-
-        extractTableNameRE = re.compile('^(?P<table_name>[^\.]+)[.](?P<field_name>.+)$')
-
-        for row in rows:
-
-            thisRowDictObj = newRowDictObj()
-
-            for i in range(len(fields)):
-
-                fieldName = fields[i]
-
-                matchObj = extractTableNameRE.match(fieldName)
-
-                if not matchObj:
-                    raise ValueError('Field name  %s  is not in the form  TABLE.FIELD' %(repr(fieldName), ))
-
-                groupDict = matchObj.groupdict()
-
-                thisRowDictObj[ groupDict['table_name'] ][ groupDict['field_name'] ] = row[i]
-
-            ret.append(thisRowDictObj)
+            return []
 
-        return ret
+        return self.getRowMapper(DictObjRowMapper, tuple(self.getTableNames())).mapRows(rows)
 
 
 class SelectGenericJoinQuery(SelectQuery):
@@ -1331,7 +1965,7 @@ class SelectGenericJoinQuery(SelectQuery):
 
         '''
         if not self.joins:
-            return ( '', [] )
+            return ( '', {} )
 
         innerJoinStrs = []
         innerJoinParams = {}
@@ -1485,14 +2119,15 @@ class SelectGenericJoinQuery(SelectQuery):
 
     def executeGetObjs(self, parameterized=True, dbConn=None):
         '''
-            executeGetObjs - Not supported on SelectGenericJoinQuery
-        '''
-        raise NotImplementedError('SelectInnerJoinQuery does not support executeGetObjs. Use executeGetRows, executeGetMapping, or executeGetDictObjs instead.')
+            executeGetObjs - Execute this query, and return a tuple of model objects for each row,
 
-    def executeGetMapping(self, parameterized=True, dbConn=None):
-        '''
-            executeGetMapping - Execute this query, and return the results as
-                a list of rows, where each list contains a map (OrderedDict) of the field name -> value
+                one object for each model in the query ( the primary model followed by each joined model ).
+
+                Objects are created directly from each row, and the same object is returned for every row
+
+                  with the same primary key, e.x.  ( meal1, person1 ), ( meal2, person1 )
+
+                If a model has no fields selected, or the row has no match for it (e.x. a LEFT JOIN), None is in its place.
 
                 @param paramertized <bool> Default True - Whether to use parameterized query
 
@@ -1500,88 +2135,195 @@ class SelectGenericJoinQuery(SelectQuery):
                                              global connection parameters.
                                              Otherwise, use this provided connection
 
-            @return list<dict> - List of rows, each row as a dict with named columns
+                @return list<tuple<DatabaseModel/None>> - A tuple of model objects per row
         '''
-
-        ret = []
-
         rows = self.executeGetRows(parameterized=parameterized, dbConn=dbConn)
-
         if not rows:
-            return ret
+            return []
 
-        fields = self.getFields()
+        return timeHydration(lambda : list( _iterJoinedModelObjs(self.models, self.getFields(), rows) ))
 
-        for row in rows:
-            # Use an OrderedDict versus a regular dict + comprehension
-            #   to ensure returned field order is same as selected
-            thisRowMap = OrderedDict()
+    def executeIterObjs(self, dbConn=None, chunkSize=DEFAULT_STREAM_CHUNK_SIZE):
+        '''
+            executeIterObjs - Execute using a server-side cursor, and yield a tuple of model objects per row
 
-            for i in range(len(fields)):
-                fieldName = fields[i]
+                as they are fetched. @see #executeGetObjs
 
-                thisRowMap[fieldName] = row[i]
+                Objects are shared between rows with the same primary key only until #chunkSize objects have been created,
 
-            ret.append(thisRowMap)
+                  so that memory does not grow with the number of rows.
 
-        return ret
+                @param dbConn <DatabaseConnection/None> - If None, start a new connection using the
+                                             global connection parameters.
+                                             Otherwise, use this provided connection
 
-    def executeGetDictObjs(self, parameterized=True, dbConn=None):
+                @param chunkSize <int> default DEFAULT_STREAM_CHUNK_SIZE - Number of rows fetched per round-trip
+
+                @return generator<tuple<DatabaseModel/None>>
         '''
-            executeGetDictObjs - Execute this query, and map results to DictObjs by table.
+        return _iterJoinedModelObjs(self.models, self.getFields(), self.executeIterRows(dbConn=dbConn, chunkSize=chunkSize), maxIdentityMapSize=chunkSize)
 
-                I.e. if you have a table "MyTable" and a field "MyTable.MyField", you can access like:
+    def executeGetGraph(self, root=None, collect=None, dbConn=None, chunkSize=DEFAULT_STREAM_CHUNK_SIZE):
+        '''
+            executeGetGraph - Execute this query, and collapse the joined rows into objects of the #root model,
 
-                    rows = executeGetDictObjs()
+                with the joined objects set as attributes upon them.
 
-                    result1 = rows[0]
+                For example, with Person LEFT JOIN Meal:
 
-                    myTableMyField = result1.MyTable.MyField
+                    persons = selQ.executeGetGraph(root=Person, collect={ 'meals' : Meal })
 
-                @param paramertized <bool> Default True - Whether to use parameterized query
+                  returns each Person once, with a "meals" attribute holding a list of that person's Meal objects
+
+                  (an empty list if the person has no meals).
+
+                If #root has a OneToOneRelation with the same name as a collect attribute, the attribute is set
+
+                  to a single object (or None) instead of a list.
+
+                Rows are streamed from a server-side cursor and processed in a single pass.
+
+                The root model's primary key must be selected. Joined objects whose primary key (or, if not selected, every field)
+
+                  is NULL, as from an outer join with no match, are skipped.
+
+                @param root <None/DatabaseModel> default None - The model to return objects of. If None, the primary model.
+
+                @param collect <None/dict< <str> : <DatabaseModel> > default None - Attribute name -> joined model, for the
+
+                    joined objects to be set on each root object
 
                 @param dbConn <DatabaseConnection/None> - If None, start a new connection using the
                                              global connection parameters.
                                              Otherwise, use this provided connection
 
+                @param chunkSize <int> default DEFAULT_STREAM_CHUNK_SIZE - Number of rows fetched per round-trip
 
-                @return list<DictObjs> - List of rows, a DictObj for each row.
+                @return list<DatabaseModel> - The #root objects, in the order first seen
         '''
+        if root is None:
+            root = self.model
+
+        if not collect:
+            collect = {}
+
+        for model in [root] + list(collect.values()):
+            if model not in self.models:
+                raise ValueError('Model %s is not part of this query. Models are: %s' %(model.__name__, repr([ _model.__name__ for _model in self.models ])))
+
+        modelColumnMap = { model : (pkIdx, fieldIdxs) for model, pkIdx, fieldIdxs in _getJoinedModelColumnMap(self.models, self.getFields()) }
+
+        (rootPkIdx, rootFieldIdxs) = modelColumnMap[root]
+        if rootPkIdx is None:
+            raise ValueError('executeGetGraph requires the primary key of the root model, %s.%s, to be selected.' %(root.TABLE_NAME, root.PRIMARY_KEY))
+
+        rootRelations = root.MODEL_RELATIONS or {}
+
+        # collectInfo - list of ( attrName, model, pkIdx, fieldIdxs, isSingle )
+        collectInfo = []
+        for attrName, model in collect.items():
+            (pkIdx, fieldIdxs) = modelColumnMap[model]
+
+            isSingle = bool( issubclass(rootRelations.get(attrName, None).__class__, OneToOneRelation) )
+
+            collectInfo.append( (attrName, model, pkIdx, fieldIdxs, isSingle) )
 
         ret = []
 
+        identityMap = {}
+
+        # seenChildren - ( id(rootObj), attrName ) -> set of ids of joined objects already collected
+        seenChildren = {}
+        seenRootIds = set()
+
+        for row in self.executeIterRows(dbConn=dbConn, chunkSize=chunkSize):
+
+            rootObj = _getJoinedModelObj(root, rootPkIdx, rootFieldIdxs, row, identityMap)
+            if rootObj is None:
+                continue
+
+            rootObjId = id(rootObj)
+
+            if rootObjId not in seenRootIds:
+                # First time seeing this root object
+                seenRootIds.add(rootObjId)
+                ret.append(rootObj)
+
+                for attrName, model, pkIdx, fieldIdxs, isSingle in collectInfo:
+                    if isSingle:
+                        setattr(rootObj, attrName, None)
+                    else:
+                        setattr(rootObj, attrName, [])
+                    seenChildren[ (rootObjId, attrName) ] = set()
+
+            for attrName, model, pkIdx, fieldIdxs, isSingle in collectInfo:
+
+                childObj = _getJoinedModelObj(model, pkIdx, fieldIdxs, row, identityMap)
+                if childObj is None:
+                    continue
+
+                seenIds = seenChildren[ (rootObjId, attrName) ]
+                if id(childObj) in seenIds:
+                    # Repeated by another join
+                    continue
+                seenIds.add( id(childObj) )
+
+                if isSingle:
+                    setattr(rootObj, attrName, childObj)
+                else:
+                    getattr(rootObj, attrName).append(childObj)
+
+        return ret
+
+    def executeGetMapping(self, parameterized=True, dbConn=None):
+        '''
+            executeGetMapping - Execute this query, and return the results as
+                a list of rows, where each list contains a map (OrderedDict) of the field name -> value
+
+                @param paramertized <bool> Default True - Whether to use parameterized query
+
+                @param dbConn <DatabaseConnection/None> - If None, start a new connection using the
+                                             global connection parameters.
+                                             Otherwise, use this provided connection
+
+            @return list<dict> - List of rows, each row as a dict with named columns
+        '''
+
         rows = self.executeGetRows(parameterized=parameterized, dbConn=dbConn)
 
         if not rows:
-            return ret
+            return []
 
-        fields = self.getFields()
-        tableNames = self.getTableNames()
+        return self.getRowMapper(MappingRowMapper).mapRows(rows)
 
-        newRowDictObj = lambda : DictObj(**{ tableName : DictObj() for tableName in tableNames })
+    def executeGetDictObjs(self, parameterized=True, dbConn=None):
+        '''
+            executeGetDictObjs - Execute this query, and map results to DictObjs by table.
 
-        extractTableNameRE = re.compile('^(?P<table_name>[^\.]+)[.](?P<field_name>.+)$')
+                I.e. if you have a table "MyTable" and a field "MyTable.MyField", you can access like:
 
-        for row in rows:
+                    rows = executeGetDictObjs()
 
-            thisRowDictObj = newRowDictObj()
+                    result1 = rows[0]
 
-            for i in range(len(fields)):
+                    myTableMyField = result1.MyTable.MyField
 
-                fieldName = fields[i]
+                @param paramertized <bool> Default True - Whether to use parameterized query
 
-                matchObj = extractTableNameRE.match(fieldName)
+                @param dbConn <DatabaseConnection/None> - If None, start a new connection using the
+                                             global connection parameters.
+                                             Otherwise, use this provided connection
 
-                if not matchObj:
-                    raise ValueError('Field name  %s  is not in the form  TABLE.FIELD' %(repr(fieldName), ))
 
-                groupDict = matchObj.groupdict()
+                @return list<DictObjs> - List of rows, a DictObj for each row.
+        '''
 
-                thisRowDictObj[ groupDict['table_name'] ][ groupDict['field_name'] ] = row[i]
+        rows = self.executeGetRows(parameterized=parameterized, dbConn=dbConn)
 
-            ret.append(thisRowDictObj)
+        if not rows:
+            return []
 
-        return ret
+        return self.getRowMapper(DictObjRowMapper, tuple(self.getTableNames())).mapRows(rows)
 
 
 
@@ -1625,6 +2367,7 @@ class DeleteQuery(QueryBase):
         return (sql, whereParams)
 
 
+    @attributeQueryStats
     def executeDeleteRaw(self, dbConn=None, doCommit=True):
         '''
             executeDelete - Perform the delete. (non-parameterized)
@@ -1647,6 +2390,12 @@ class DeleteQuery(QueryBase):
         if not whereClause:
             raise ValueError('Error: Tried to delete the entire tablespace of  %s  (no where clause).' %(self.getTableName(), ))
 
+        if self._getShardMap(dbConn) is not None:
+            from .sharding import executeOnShards
+
+            executeOnShards(self, lambda shardConn : self.executeDeleteRaw(dbConn=shardConn))
+            return
+
         sql = self.getSql()
 
         if not dbConn:
@@ -1658,6 +2407,7 @@ class DeleteQuery(QueryBase):
             dbConn.commit()
 
 
+    @attributeQueryStats
     def executeDelete(self, dbConn=None, doCommit=True, allowDeleteAll=False):
         '''
             executeDelete - Perform the delete. (parameterized)
@@ -1683,17 +2433,51 @@ class DeleteQuery(QueryBase):
         if not allowDeleteAll and not whereClause:
             raise ValueError('Error: Tried to delete the entire tablespace of  %s  (no where clause). Call executeDelete with allowDeleteAll=True to proceed anyway with deleting all records.' %(self.getTableName(), ))
 
+        if self._getShardMap(dbConn) is not None:
+            from .sharding import executeOnShards
+
+            executeOnShards(self, lambda shardConn : self.executeDelete(dbConn=shardConn, allowDeleteAll=allowDeleteAll))
+            return
+
         (sql, whereParams) = self.getSqlParameterizedValues()
 
         if not dbConn:
             dbConn = getDatabaseConnection(isTransactionMode=True)
 
+        checkQueryCost(self, sql, whereParams, dbConn)
+
         dbConn.executeSqlParams(sql, whereParams)
 
         if doCommit:
             dbConn.commit()
 
 
+    def executeDeleteChunked(self, chunkSize=1000, dbConn=None, allowDeleteAll=False, **kwargs):
+        '''
+            executeDeleteChunked - Perform the delete in chunks of at most #chunkSize rows,
+
+                committing after each chunk.
+
+              @param chunkSize <int> default 1000 - Max number of rows to delete per chunk
+
+              @param dbConn <None/DatabaseConnection> default None - Connection to use.
+                    If None, a new transaction-mode connection is used. Will be committed after each chunk.
+
+              @param allowDeleteAll <bool> default False - If True will allow execution without a "WHERE" stage
+
+              Any additional keyword arguments are passed to ChunkedQueryRunner ( e.x. chunkBy, sleepBetween, progressCallback, startAfterPk )
+
+              @see chunked.ChunkedQueryRunner
+
+              @return <int> - Total number of rows deleted
+        '''
+        from .chunked import ChunkedQueryRunner
+
+        runner = ChunkedQueryRunner(self, chunkSize=chunkSize, allowDeleteAll=allowDeleteAll, **kwargs)
+
+        return runner.run(dbConn=dbConn)
+
+
     def execute(self, dbConn=None, doCommit=True):
         '''
             execute - Execute this action, generic method.
@@ -1742,6 +2526,31 @@ class UpdateQuery(QueryBase):
             # Copy values but not the reference
             self.newFieldValues.update(newFieldValues)
 
+        self.returningFields = None
+
+
+    def setReturningFields(self, returningFields):
+        '''
+            setReturningFields - Set fields to return from the updated rows ( the RETURNING portion )
+
+                When set, #executeUpdate will return the rows.
+
+                @param returningFields <None/list<str>> - Field names to return, or None to not return anything
+        '''
+        if returningFields:
+            self.returningFields = list(returningFields)
+        else:
+            self.returningFields = None
+
+    def getReturningStr(self):
+        '''
+            getReturningStr - Get the RETURNING portion (or empty string if unset) of the query
+        '''
+        if not self.returningFields:
+            return ''
+
+        return ' RETURNING ' + ', '.join(self.returningFields)
+
 
     def setFieldValue(self, fieldName, newValue):
         '''
@@ -1751,6 +2560,9 @@ class UpdateQuery(QueryBase):
 
                 @param newValue <???> - The new value for the field. This can be a string, integer, datetime object, etc.
                       depending on the schema for this field
+
+                      It may also be an expression, such as  F('count') + 1 , which is evaluated by the database
+                        (so concurrent increments do not require a read-modify-write)
         '''
 
         self.newFieldValues[fieldName] = newValue
@@ -1765,6 +2577,16 @@ class UpdateQuery(QueryBase):
         '''
         self.newFieldValues.update(fieldNameToValueMap)
 
+    def _checkShardKeyNotUpdated(self):
+        '''
+            _checkShardKeyNotUpdated - Raise ValueError if this query would change the shard key of a sharded model
+
+                ( which would leave the rows on the wrong shard )
+        '''
+        shardKey = self.getModel().SHARD_KEY
+        if shardKey in self.newFieldValues:
+            raise ValueError('Cannot update shard key %s of sharded %s. Delete and insert the rows instead.' %(repr(shardKey), self.getModel().__name__))
+
     @property
     def hasAnyUpdates(self):
         '''
@@ -1789,6 +2611,8 @@ class UpdateQuery(QueryBase):
 
             if isSelectQuery(newValue):
                 newValue = newValue.asQueryStr()
+            elif isExpression(newValue):
+                newValue = QueryStr( newValue.toStr() )
 
             if isQueryStr(newValue):
                 newValueStr = newValue
@@ -1799,28 +2623,37 @@ class UpdateQuery(QueryBase):
 
         return ' , '.join(ret)
 
-    def getSetFieldParamsAndValues(self):
+    def getSetFieldParamsAndValues(self, paramPrefix=''):
         '''
             getSetFieldParamsAndValues - For parameterized values,
 
                 This returns a tuple of two values, the first is the paramertized marker to be used in the query,
                   the second is a list of values which should be passed alongside
+
+                @param paramPrefix <str> Default '' - If provided, will prefix params with paramPrefix + "_"
         '''
         retParams = []
         retValues = {}
 
         useNewFieldValues = self.newFieldValues
 
+        if paramPrefix:
+            paramPrefix = paramPrefix + '_'
+
         argNum = 0
 
         for fieldName, fieldValue in useNewFieldValues.items():
 
-            identifier = 'arg' + str(argNum)
+            identifier = paramPrefix + 'arg' + str(argNum)
             argNum += 1
 
             if isSelectQuery(fieldValue):
                 (fieldValue, extraRetParams) = fieldValue.asQueryStrParams(paramPrefix=identifier)
                 retValues.update(extraRetParams)
+            elif isExpression(fieldValue):
+                (expressionStr, extraRetParams) = fieldValue.toStrParam(identifier)
+                fieldValue = QueryStr(expressionStr)
+                retValues.update(extraRetParams)
 
             if isQueryStr(fieldValue):
                 retParams.append( fieldName + ' = ' + str(fieldValue) + " " )
@@ -1839,7 +2672,7 @@ class UpdateQuery(QueryBase):
         whereClause = self.getWhereClause()
         setFieldsStr = self.getSetFieldsStr()
 
-        sql = """UPDATE  %s  SET  %s   %s"""  %( self.getTableName(), setFieldsStr, whereClause )
+        sql = """UPDATE  %s  SET  %s   %s %s"""  %( self.getTableName(), setFieldsStr, whereClause, self.getReturningStr() )
 
         return sql
 
@@ -1856,15 +2689,16 @@ class UpdateQuery(QueryBase):
 
         paramValues.update(whereParams)
 
-        (setFieldParams, setFieldParamValues) = self.getSetFieldParamsAndValues()
+        (setFieldParams, setFieldParamValues) = self.getSetFieldParamsAndValues(paramPrefix=paramPrefix)
 
         paramValues.update(setFieldParamValues)
 
-        sql = """UPDATE  %s  SET  %s   %s"""  %( self.getTableName(), ', '.join(setFieldParams), whereClause )
+        sql = """UPDATE  %s  SET  %s   %s %s"""  %( self.getTableName(), ', '.join(setFieldParams), whereClause, self.getReturningStr() )
 
         return (sql, paramValues)
 
 
+    @attributeQueryStats
     def executeUpdateRawValues(self, dbConn=None, doCommit=False):
         '''
             executeUpdate - Update some records
@@ -1881,6 +2715,13 @@ class UpdateQuery(QueryBase):
         if not doCommit and not dbConn:
             raise ValueError('doCommit=False but a dbConn not specified!')
 
+        if self._getShardMap(dbConn) is not None:
+            from .sharding import executeOnShards
+
+            self._checkShardKeyNotUpdated()
+            executeOnShards(self, lambda shardConn : self.executeUpdateRawValues(dbConn=shardConn, doCommit=True))
+            return
+
         sql = self.getSql()
 
         if not dbConn:
@@ -1889,6 +2730,7 @@ class UpdateQuery(QueryBase):
         dbConn.executeSql(sql)
 
 
+    @attributeQueryStats
     def executeUpdate(self, dbConn=None, doCommit=True):
         '''
             executeUpdate - Upate records (parameterized)
@@ -1900,6 +2742,7 @@ class UpdateQuery(QueryBase):
 
             @param doCommit <bool> default True - Whether to commit immediately
 
+            @return <None/list<tuple>> - If #setReturningFields has been called, the returned rows. Otherwise None.
         '''
         if not self.hasAnyUpdates:
             return
@@ -1907,16 +2750,59 @@ class UpdateQuery(QueryBase):
         if not doCommit and not dbConn:
             raise ValueError('doCommit=False but a dbConn not specified!')
 
+        if self._getShardMap(dbConn) is not None:
+            from .sharding import executeOnShards
+
+            self._checkShardKeyNotUpdated()
+            shardResults = executeOnShards(self, lambda shardConn : self.executeUpdate(dbConn=shardConn))
+            if not self.returningFields:
+                return None
+
+            return [ row for rows in shardResults for row in rows ]
+
         (sqlParam, paramValues) = self.getSqlParameterizedValues()
 
         if not dbConn:
             dbConn = getDatabaseConnection(isTransactionMode=True)
 
-        dbConn.executeSqlParams(sqlParam, paramValues)
+        checkQueryCost(self, sqlParam, paramValues, dbConn)
+
+        ret = None
+        if self.returningFields:
+            ret = dbConn.doSelectParams(sqlParam, paramValues)
+            dbConn._noteWrite()
+        else:
+            dbConn.executeSqlParams(sqlParam, paramValues)
 
         if doCommit:
             dbConn.commit()
 
+        return ret
+
+
+    def executeUpdateChunked(self, chunkSize=1000, dbConn=None, **kwargs):
+        '''
+            executeUpdateChunked - Perform the update in chunks of at most #chunkSize rows,
+
+                committing after each chunk. Useful for large backfills.
+
+              @param chunkSize <int> default 1000 - Max number of rows to update per chunk
+
+              @param dbConn <None/DatabaseConnection> default None - Connection to use.
+                    If None, a new transaction-mode connection is used. Will be committed after each chunk.
+
+              Any additional keyword arguments are passed to ChunkedQueryRunner ( e.x. chunkBy, sleepBetween, progressCallback, startAfterPk )
+
+              @see chunked.ChunkedQueryRunner
+
+              @return <int> - Total number of rows updated
+        '''
+        from .chunked import ChunkedQueryRunner
+
+        runner = ChunkedQueryRunner(self, chunkSize=chunkSize, **kwargs)
+
+        return runner.run(dbConn=dbConn)
+
 
     def execute(self, dbConn=None, doCommit=True):
         '''
@@ -1981,29 +2867,36 @@ class InsertQuery(QueryBase):
         self.fieldValues.update(fieldNameToValueMap)
 
 
-    def getTableFieldParamsAndValues(self):
+    def getTableFieldParamsAndValues(self, paramPrefix=''):
         '''
             getTableFieldParamsAndValues - For parameterized values,
 
                 This returns a tuple of two values, the first is the paramertized marker to be used in the query,
                   the second is a list of values which should be passed alongside
+
+                @param paramPrefix <str> Default '' - If provided, will prefix params with paramPrefix + "_"
         '''
         retParams = []
         retValues = {}
 
         useSetFieldValues = self.fieldValues
 
+        if paramPrefix:
+            paramPrefix = paramPrefix + '_'
+
         for fieldName, fieldValue in useSetFieldValues.items():
+            identifier = paramPrefix + fieldName
+
             if isQueryStr(fieldValue):
                 retParams.append(fieldValue)
             elif isSelectQuery(fieldValue):
-                (selParams, selValues) = fieldValue.asQueryStrParams(paramPrefix=fieldName + '_')
+                (selParams, selValues) = fieldValue.asQueryStrParams(paramPrefix=identifier + '_')
 
-                retParams += selParams
+                retParams.append(selParams)
                 retValues.update(selValues)
             else:
-                retParams.append( ' %(' + fieldName + ')s ' )
-                retValues[fieldName] = fieldValue
+                retParams.append( ' %(' + identifier + ')s ' )
+                retValues[identifier] = fieldValue
 
         return (retParams, retValues)
 
@@ -2057,20 +2950,22 @@ class InsertQuery(QueryBase):
 
         return sql
 
-    def getSqlParameterizedValues(self):
+    def getSqlParameterizedValues(self, paramPrefix=''):
         '''
             getSqlParameterizedValues - Get the SQL to execute, parameterized version
 
+              @param paramPrefix <str> Default '' - If provided, will prefix params with paramPrefix + "_"
         '''
 
         tableFieldsStr = self.getTableFieldsStr()
-        tableFieldParams, tableFieldValues = self.getTableFieldParamsAndValues()
+        tableFieldParams, tableFieldValues = self.getTableFieldParamsAndValues(paramPrefix=paramPrefix)
 
         sql = """INSERT INTO  %s %s  VALUES ( %s ) """  %( self.getTableName(), tableFieldsStr, ', '.join(tableFieldParams) )
 
         return (sql, tableFieldValues)
 
 
+    @attributeQueryStats
     def executeInsertRawValues(self, dbConn=None, doCommit=True):
         '''
             executeInsertRawValues - Insert records  (non-parameterized)
@@ -2085,6 +2980,12 @@ class InsertQuery(QueryBase):
 
             @see executeInsertParameterized for the parameterized version.
         '''
+        if self._getShardMap(dbConn) is not None:
+            from .sharding import executeOnShards
+
+            executeOnShards(self, lambda shardConn : self.executeInsertRawValues(dbConn=shardConn))
+            return
+
         sql = self.getSql()
 
         if not dbConn:
@@ -2096,6 +2997,7 @@ class InsertQuery(QueryBase):
         if doCommit:
             dbConn.commit()
 
+    @attributeQueryStats
     def executeInsert(self, dbConn=None, doCommit=True, returnPk=True):
         '''
             executeInsert - Insert records (parameterized)
@@ -2116,6 +3018,11 @@ class InsertQuery(QueryBase):
         if not doCommit and not dbConn:
             raise ValueError('doCommit=False but a dbConn not specified!')
 
+        if self._getShardMap(dbConn) is not None:
+            from .sharding import executeOnShards
+
+            return executeOnShards(self, lambda shardConn : self.executeInsert(dbConn=shardConn, returnPk=returnPk))[0]
+
         if not dbConn:
             dbConn = getDatabaseConnection(isTransactionMode=True)
 
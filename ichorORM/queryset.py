@@ -0,0 +1,413 @@
+'''
+    Copyright (c) 2018 Timothy Savannah
+
+    Licensed under the terms of the Lesser GNU Lesser General Public License version 2.1
+
+      license can be found at https://raw.githubusercontent.com/kata198/ichorORM/master/LICENSE
+
+
+    queryset - A lazy, chainable collection of model objects backed by a SelectQuery
+'''
+# vim: set ts=4 sw=4 st=4 expandtab:
+
+import copy
+
+from .constants import WHERE_AND, ALL_WHERE_TYPES
+from .connection import DEFAULT_STREAM_CHUNK_SIZE
+from .query import SelectQuery
+
+__all__ = ('QuerySet', 'addFilterConditions', 'getSelectFieldsForModel')
+
+
+def addFilterConditions(filterStage, filterArgs):
+    '''
+        addFilterConditions - Add conditions to a FilterStage from "filter" style arguments
+
+            @param filterStage <FilterStage> - The stage to add conditions to
+
+            @param filterArgs <dict> - Keys should be in the form  "fieldName" for equality comparison,
+                otherwise fieldName should end with __OPERATION, e.x.   fieldName__ne  for not-equals,
+                fieldName__like for like, etc.
+    '''
+    for fieldName, fieldValue in filterArgs.items():
+        if '__' in fieldName:
+            try:
+                fieldName, operation = fieldName.split('__')
+            except:
+                raise ValueError('Unknown filter param: "%s". double-underscore should be followed by an operation, e.x. __ne' %(fieldName, ))
+        else:
+            operation = '='
+
+        filterStage.addCondition(fieldName, operation, fieldValue)
+
+
+def getSelectFieldsForModel(model, onlyFields=None, deferFields=None, selectFields=None):
+    '''
+        getSelectFieldsForModel - Get the fields to select for a model, given fields to include and/or exclude.
+
+            The primary key is always selected.
+
+            @param model <DatabaseModel type> - The model
+
+            @param onlyFields <None/list<str>> default None - If provided, select only these fields
+
+            @param deferFields <None/list<str>> default None - If provided, do not select these fields
+
+            @param selectFields <None/list<str>> default None - If provided, the fields currently selected, otherwise all fields
+
+            @return list<str> - The field names to select
+    '''
+    model._setupModel()
+
+    primaryKeyName = model.PRIMARY_KEY
+
+    for fieldName in list(onlyFields or []) + list(deferFields or []):
+        if fieldName not in model.FIELDS:
+            raise ValueError('%s has no field %s' %(model.__name__, repr(fieldName)))
+
+    if deferFields and primaryKeyName in deferFields:
+        raise ValueError('Cannot defer the primary key, %s' %(repr(primaryKeyName), ))
+
+    if selectFields is None or selectFields in ('ALL', '*'):
+        selectFields = list(model.FIELDS)
+
+    if onlyFields:
+        selectFields = [ fieldName for fieldName in selectFields if fieldName in onlyFields or fieldName == primaryKeyName ]
+
+    if deferFields:
+        selectFields = [ fieldName for fieldName in selectFields if fieldName not in deferFields ]
+
+    if primaryKeyName not in selectFields:
+        selectFields.insert(0, primaryKeyName)
+
+    return selectFields
+
+
+class QuerySet(object):
+    '''
+        QuerySet - A lazy collection of objects of a model.
+
+            Nothing is executed until the results are needed:
+
+              * Iterating, len(), and list() fetch and cache the results, in a single query.
+                  Use #iterator to stream very large results from a server-side cursor instead
+              * Slicing ( e.x.  qs[10:20] ) returns a new QuerySet with LIMIT / OFFSET applied
+              * Indexing ( e.x.  qs[3] ) fetches just that single row
+              * bool() uses a SELECT EXISTS, and #count a SELECT COUNT(*), without fetching the rows
+
+            Once the results are cached, all of the above use the cache.
+
+            The methods #filter , #orderBy , #only , #defer , and #lazy return a new QuerySet, leaving this one unmodified.
+
+            Fields which are not selected ( via #only or #defer ) are loaded on first access,
+              for every object from the same results in a single query.
+    '''
+
+    def __init__(self, model, dbConn=None, chunkSize=DEFAULT_STREAM_CHUNK_SIZE):
+        '''
+            __init__ - Create a QuerySet of all objects of a model
+
+                @param model <DatabaseModel type> - The model
+
+                @param dbConn <None/DatabaseConnection> Default None - A specific DatabaseConnection to use,
+                    if None generate a new connection with global settings
+
+                @param chunkSize <int> default DEFAULT_STREAM_CHUNK_SIZE - Number of rows fetched per round-trip by #iterator
+        '''
+        model._setupModel()
+
+        self.model = model
+        self.dbConn = dbConn
+        self.chunkSize = chunkSize
+
+        self._query = SelectQuery(model)
+
+        # isLazy - If True, results are LazyModelProxy objects. @see #lazy
+        self.isLazy = False
+
+        # _resultCache - The fetched objects, once fully evaluated
+        self._resultCache = None
+
+
+    def _clone(self):
+        '''
+            _clone - Create a copy of this QuerySet (without the cached results), for chaining
+        '''
+        ret = self.__class__.__new__(self.__class__)
+
+        ret.model = self.model
+        ret.dbConn = self.dbConn
+        ret.chunkSize = self.chunkSize
+        ret.isLazy = self.isLazy
+
+        query = self._query
+
+        # Only the list of stages is copied, so stages must never be modified after being added
+        newQuery = SelectQuery(self.model, selectFields=copy.copy(query.selectFields), filterStages=query.filterStages, limitNum=query.limitNum, offsetNum=query.offsetNum)
+        newQuery.orderBys = list(query.orderBys)
+        newQuery.ignoreCostGuard = query.ignoreCostGuard
+        newQuery.fieldCodecs = dict(query.fieldCodecs)
+
+        ret._query = newQuery
+        ret._resultCache = None
+
+        return ret
+
+
+    def getQuery(self):
+        '''
+            getQuery - Get a copy of the SelectQuery which this QuerySet will execute
+
+                @return <SelectQuery>
+        '''
+        return self._clone()._query
+
+
+    def filter(self, whereType=WHERE_AND, **kwargs):
+        '''
+            filter - Return a new QuerySet with additional filter conditions.
+
+                Conditions given to separate calls are AND'd together.
+
+              @param whereType <WHERE_AND/WHERE_OR> - Whether the conditions in this call should be AND or OR'd together
+
+              All other parameters should be in the form  "fieldName=value" for equality comparison,
+                otherwise fieldName should end with __OPERATION, e.x.   fieldName__ne=value for not-equals,
+                fieldName__like="Start%End" for like, etc.
+
+              @return <QuerySet>
+        '''
+        if whereType not in ALL_WHERE_TYPES:
+            raise ValueError('Unknown where type: %s.   Possible types:  %s.' %(repr(whereType), repr(ALL_WHERE_TYPES)))
+
+        ret = self._clone()
+
+        if kwargs:
+            where = ret._query.addStage(whereType)
+            addFilterConditions(where, kwargs)
+
+        return ret
+
+
+    def orderBy(self, fieldName, orderByDir=''):
+        '''
+            orderBy - Return a new QuerySet with an additional ORDER BY
+
+                @param fieldName <str> - The field to order by
+
+                @param orderByDir <str> default '' - '', 'ASC', or 'DESC'
+
+                @return <QuerySet>
+        '''
+        ret = self._clone()
+
+        ret._query.addOrderBy(fieldName, orderByDir)
+
+        return ret
+
+
+    def only(self, *fieldNames):
+        '''
+            only - Return a new QuerySet which selects only the given fields.
+
+                The primary key is always selected. Other fields are deferred, and will be loaded on first access.
+
+                @param fieldNames <str> - The field names to select
+
+                @return <QuerySet>
+        '''
+        ret = self._clone()
+
+        ret._query.setSelectFields( getSelectFieldsForModel(self.model, onlyFields=fieldNames, selectFields=self._query.selectFields) )
+
+        return ret
+
+
+    def defer(self, *fieldNames):
+        '''
+            defer - Return a new QuerySet which does not select the given fields ( e.x. large text / bytea columns ).
+
+                Deferred fields are loaded on first access.
+
+                @param fieldNames <str> - The field names to not select
+
+                @return <QuerySet>
+        '''
+        ret = self._clone()
+
+        ret._query.setSelectFields( getSelectFieldsForModel(self.model, deferFields=fieldNames, selectFields=self._query.selectFields) )
+
+        return ret
+
+
+    def lazy(self, isLazy=True):
+        '''
+            lazy - Return a new QuerySet whose results are lightweight proxies, which only create the model object
+
+                when something other than a selected field is accessed, or an attribute is set.
+
+                For when many rows are loaded but only a few fields on a few of them are used.
+
+                @param isLazy <bool> default True - Whether to return proxies
+
+                @return <QuerySet>
+
+                @see ichorORM.lazy.LazyModelProxy
+        '''
+        ret = self._clone()
+
+        ret.isLazy = isLazy
+
+        return ret
+
+
+    def _getSliced(self, start, stop):
+        '''
+            _getSliced - Return a new QuerySet limited to [start:stop] of the current results
+        '''
+        query = self._query
+
+        oldOffset = query.offsetNum or 0
+        oldLimit = query.limitNum or None
+
+        newLimit = None
+        if stop is not None:
+            newLimit = max(stop - start, 0)
+
+        if oldLimit is not None:
+            remaining = max(oldLimit - start, 0)
+            if newLimit is None or remaining < newLimit:
+                newLimit = remaining
+
+        ret = self._clone()
+
+        ret._query.setOffsetNum( (oldOffset + start) or None )
+        ret._query.setLimitNum(newLimit)
+
+        if newLimit == 0:
+            # LIMIT 0 would be omitted from the query -- nothing can match, so do not query at all
+            ret._resultCache = []
+
+        return ret
+
+
+    def __getitem__(self, idx):
+        '''
+            __getitem__ - Slice to a new QuerySet using LIMIT / OFFSET, or fetch a single object by index
+
+                Negative indexes and steps are not supported unless the results have been fetched.
+        '''
+        if self._resultCache is not None:
+            return self._resultCache[idx]
+
+        if issubclass(idx.__class__, slice):
+            if idx.step not in (None, 1):
+                raise ValueError('QuerySet slicing does not support a step.')
+
+            start = idx.start or 0
+            stop = idx.stop
+
+            if start < 0 or (stop is not None and stop < 0):
+                raise ValueError('QuerySet slicing does not support negative indexes.')
+
+            return self._getSliced(start, stop)
+
+        if idx < 0:
+            raise ValueError('QuerySet indexing does not support negative indexes.')
+
+        results = list(self._getSliced(idx, idx + 1))
+        if not results:
+            raise IndexError('QuerySet index out of range: %d' %(idx, ))
+
+        return results[0]
+
+
+    def __iter__(self):
+        return iter(self.fetch())
+
+
+    def iterator(self):
+        '''
+            iterator - Stream the results without caching them, for iterating over very large result sets.
+
+                @return generator<DatabaseModel>
+        '''
+        if self._resultCache is not None:
+            return iter(self._resultCache)
+
+        return self._query.executeIterObjs(dbConn=self.dbConn, chunkSize=self.chunkSize, deferUnselectedFields=True, lazy=self.isLazy)
+
+
+    def fetch(self):
+        '''
+            fetch - Evaluate this QuerySet (if not already), and return the results
+
+                @return list<DatabaseModel>
+        '''
+        if self._resultCache is None:
+            self._resultCache = self._query.executeGetObjs(dbConn=self.dbConn, deferUnselectedFields=True, lazy=self.isLazy)
+
+        return self._resultCache
+
+
+    def count(self):
+        '''
+            count - Get the number of matching objects. Uses a SELECT COUNT(*) unless the results are cached.
+
+                @return <int>
+        '''
+        if self._resultCache is not None:
+            return len(self._resultCache)
+
+        return self._query.executeGetCount(dbConn=self.dbConn)
+
+
+    def exists(self):
+        '''
+            exists - Check if there are any matching objects. Uses a SELECT EXISTS unless the results are cached.
+
+                @return <bool>
+        '''
+        if self._resultCache is not None:
+            return bool(self._resultCache)
+
+        return self._query.executeExists(dbConn=self.dbConn)
+
+
+    def first(self):
+        '''
+            first - Get the first matching object, or None if none match
+
+                @return <None/DatabaseModel>
+        '''
+        if self._resultCache is not None:
+            if self._resultCache:
+                return self._resultCache[0]
+            return None
+
+        results = list(self._getSliced(0, 1))
+        if results:
+            return results[0]
+
+        return None
+
+
+    def __len__(self):
+        return len(self.fetch())
+
+    def __bool__(self):
+        return self.exists()
+
+    __nonzero__ = __bool__
+
+
+    def __repr__(self):
+        if self._resultCache is not None:
+            return 'QuerySet( %s )' %(repr(self._resultCache), )
+
+        ( sql, params ) = self._query.getSqlParameterizedValues()
+
+        return 'QuerySet( %s  ( unevaluated ): %s %s )' %(self.model.__name__, ' '.join(sql.split()), repr(params or {}))
+
+
+# vim: set ts=4 sw=4 st=4 expandtab:
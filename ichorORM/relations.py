@@ -73,11 +73,12 @@ class OneToOneRelation(ForeignRelation):
 
         filterArgs = { self.relatedFieldName : fk }
 
-        relatedObjs = self.relatedType.filter(**filterArgs)
+        # Fetch at most 2, enough to detect an integrity violation
+        relatedObjs = list( self.relatedType.filter(**filterArgs)[:2] )
 
         if len(relatedObjs) > 1:
-            raise RelationIntegrityError('Expected a one-to-one relation from %s.%s -> %s.%s but got %d results on foreign key %s' % \
-                ( sourceObj.__class__.__name__, self.fkFieldName, self.relatedType.__class__.__name__, self.relatedFieldName, len(relatedObjs), fk)
+            raise RelationIntegrityError('Expected a one-to-one relation from %s.%s -> %s.%s but got multiple results on foreign key %s' % \
+                ( sourceObj.__class__.__name__, self.fkFieldName, self.relatedType.__class__.__name__, self.relatedFieldName, fk)
             )
 
         if relatedObjs:
@@ -130,7 +131,7 @@ class OneToManyRelation(ForeignRelation):
 
         filterArgs = { self.relatedFieldName : fk }
 
-        relatedObjs = self.relatedType.filter(**filterArgs)
+        relatedObjs = list( self.relatedType.filter(**filterArgs) )
 
         return relatedObjs
 
@@ -0,0 +1,310 @@
+'''
+    Copyright (c) 2018 Timothy Savannah
+
+    Licensed under the terms of the Lesser GNU Lesser General Public License version 2.1
+
+      license can be found at https://raw.githubusercontent.com/kata198/ichorORM/master/LICENSE
+
+
+    routing - Route reads to read replicas.
+
+        The primary is given by the global connection params ( setGlobalConnectionParams ). Replicas are registered by name
+
+          with #registerReplica . SelectQuery ( and join queries, DatabaseModel.get / filter / all ) without an explicit
+
+          dbConn then read from a replica. Writes, and anything given an explicit dbConn ( such as a transaction ) use that connection.
+
+          Reads without a dbConn by a thread within a transaction block ( DatabaseConnection.transaction ) on the primary
+
+          go to the primary as well. Note they use another connection, so still do not see that transaction's uncommitted writes.
+'''
+# vim: set ts=4 sw=4 st=4 expandtab:
+
+import itertools
+import threading
+import time
+
+from collections import OrderedDict
+
+from .constants import REPLICA_SELECT_ROUND_ROBIN, REPLICA_SELECT_LEAST_LATENCY, ALL_REPLICA_SELECTIONS
+from .objs import IgnoreParameter, UseGlobalSetting
+from .connection import DatabaseConnection, getDatabaseConnection, getLastWriteTime, isInTransactionBlock
+from .instrumentation import emitInstrumentationEvent
+
+__all__ = ('registerReplica', 'unregisterReplica', 'getReplicaNames', 'setGlobalReplicaRouting',
+    'getReadDatabaseConnection', 'probeReplicaLatencies', 'ReplicaTarget',
+    'REPLICA_SELECT_ROUND_ROBIN', 'REPLICA_SELECT_LEAST_LATENCY',
+)
+
+global GLOBAL_ROUTING_ENABLED
+global GLOBAL_REPLICA_SELECTION
+global GLOBAL_READ_YOUR_WRITES_WINDOW
+global GLOBAL_REPLICA_DOWN_TIME
+
+GLOBAL_ROUTING_ENABLED = True
+GLOBAL_REPLICA_SELECTION = REPLICA_SELECT_ROUND_ROBIN
+GLOBAL_READ_YOUR_WRITES_WINDOW = 0
+GLOBAL_REPLICA_DOWN_TIME = 30.0
+
+# LATENCY_EWMA_WEIGHT - Weight of each new latency sample in a replica's moving average
+LATENCY_EWMA_WEIGHT = 0.3
+
+# _replicas - Replica name -> ReplicaTarget
+_replicas = OrderedDict()
+_replicasLock = threading.Lock()
+
+_roundRobinCounter = itertools.count()
+
+
+class ReplicaTarget(object):
+    '''
+        ReplicaTarget - A registered read replica
+    '''
+
+    def __init__(self, name, host=UseGlobalSetting, port=UseGlobalSetting, dbname=UseGlobalSetting, user=UseGlobalSetting, password=UseGlobalSetting):
+        '''
+            __init__ - Create a ReplicaTarget
+
+                @param name <str> - The name of this replica
+
+                @see DatabaseConnection.__init__ for the other arguments. Any left at UseGlobalSetting use the global ( primary ) value.
+        '''
+        self.name = name
+        self.connectionParams = { 'host' : host, 'port' : port, 'dbname' : dbname, 'user' : user, 'password' : password }
+
+        # latency - Moving average of seconds to connect, or None if not yet measured
+        self.latency = None
+
+        # downUntil - time.monotonic() until which this replica is not used after a failure, or None
+        self.downUntil = None
+
+
+    def getDatabaseConnection(self):
+        '''
+            getDatabaseConnection - Get a new ( not yet connected ) DatabaseConnection to this replica
+
+                @return <DatabaseConnection>
+        '''
+        dbConn = DatabaseConnection(**self.connectionParams)
+        dbConn.isReplica = True
+
+        return dbConn
+
+
+    def recordLatency(self, latency):
+        '''
+            recordLatency - Add a latency sample to the moving average
+
+                @param latency <float> - Seconds
+        '''
+        if self.latency is None:
+            self.latency = latency
+        else:
+            self.latency += LATENCY_EWMA_WEIGHT * (latency - self.latency)
+
+
+    def markDown(self):
+        '''
+            markDown - Do not use this replica for GLOBAL_REPLICA_DOWN_TIME seconds
+        '''
+        self.downUntil = time.monotonic() + GLOBAL_REPLICA_DOWN_TIME
+
+
+    def isUp(self, now):
+        '''
+            isUp - Check if this replica may be used
+
+                @param now <float> - time.monotonic()
+        '''
+        return bool( self.downUntil is None or now >= self.downUntil )
+
+
+    def __repr__(self):
+        return 'ReplicaTarget( %s , latency=%s )' %(repr(self.name), repr(self.latency))
+
+
+def registerReplica(name, host=UseGlobalSetting, port=UseGlobalSetting, dbname=UseGlobalSetting, user=UseGlobalSetting, password=UseGlobalSetting):
+    '''
+        registerReplica - Register a read replica. Replaces any replica registered with the same name.
+
+            @param name <str> - A name for this replica
+
+            @see DatabaseConnection.__init__ for the other arguments. Any left at UseGlobalSetting use the global ( primary ) value.
+
+            @return <ReplicaTarget>
+    '''
+    target = ReplicaTarget(name, host=host, port=port, dbname=dbname, user=user, password=password)
+
+    with _replicasLock:
+        _replicas[name] = target
+
+    return target
+
+
+def unregisterReplica(name):
+    '''
+        unregisterReplica - Remove a replica registered by #registerReplica
+
+            @param name <str> - The name of the replica
+
+            @return <bool> - True if it was removed, False if not registered
+    '''
+    with _replicasLock:
+        if name in _replicas:
+            del _replicas[name]
+            return True
+
+    return False
+
+
+def getReplicaNames():
+    '''
+        getReplicaNames - Get the names of the registered replicas
+
+            @return list<str>
+    '''
+    with _replicasLock:
+        return list(_replicas.keys())
+
+
+def setGlobalReplicaRouting(enabled=IgnoreParameter, selection=IgnoreParameter, readYourWritesWindow=IgnoreParameter, replicaDownTime=IgnoreParameter):
+    '''
+        setGlobalReplicaRouting - Set how reads are routed to replicas.
+
+                            Every parameter defaults to "IgnoreParameter" and will thus not be set unless
+                              specified to be something different.
+
+                        @param enabled <bool> default IgnoreParameter - If False, all reads use the primary. Default is True.
+
+                        @param selection <str> default IgnoreParameter - REPLICA_SELECT_ROUND_ROBIN ( the default ) to rotate
+
+                            between the replicas, or REPLICA_SELECT_LEAST_LATENCY to use the one with the lowest measured latency
+
+                        @param readYourWritesWindow <float> default IgnoreParameter - For this many seconds after a thread writes
+
+                            through the primary, reads by that thread also use the primary ( so they see the write, despite replication lag ).
+
+                            Default is 0 ( disabled ).
+
+                        @param replicaDownTime <float> default IgnoreParameter - Seconds to avoid a replica after failing to connect to it.
+                            Default is 30.
+    '''
+    global GLOBAL_ROUTING_ENABLED
+    global GLOBAL_REPLICA_SELECTION
+    global GLOBAL_READ_YOUR_WRITES_WINDOW
+    global GLOBAL_REPLICA_DOWN_TIME
+
+    if selection != IgnoreParameter:
+        if selection not in ALL_REPLICA_SELECTIONS:
+            raise ValueError('Unknown replica selection: %s.   Possible selections:  %s.' %(repr(selection), repr(ALL_REPLICA_SELECTIONS)))
+        GLOBAL_REPLICA_SELECTION = selection
+
+    if enabled != IgnoreParameter:
+        GLOBAL_ROUTING_ENABLED = bool(enabled)
+    if readYourWritesWindow != IgnoreParameter:
+        GLOBAL_READ_YOUR_WRITES_WINDOW = readYourWritesWindow or 0
+    if replicaDownTime != IgnoreParameter:
+        GLOBAL_REPLICA_DOWN_TIME = replicaDownTime
+
+
+def _getCandidateReplicas():
+    '''
+        _getCandidateReplicas - Get the available replicas, in the order they should be tried
+
+            @return list<ReplicaTarget>
+    '''
+    now = time.monotonic()
+
+    with _replicasLock:
+        replicas = [ target for target in _replicas.values() if target.isUp(now) ]
+
+    if len(replicas) <= 1:
+        return replicas
+
+    if GLOBAL_REPLICA_SELECTION == REPLICA_SELECT_LEAST_LATENCY:
+        # Unmeasured replicas first, so that they get measured
+        return sorted(replicas, key=lambda target : ( target.latency is not None, target.latency or 0 ))
+
+    startIdx = next(_roundRobinCounter) % len(replicas)
+
+    return replicas[startIdx:] + replicas[:startIdx]
+
+
+def getReadDatabaseConnection():
+    '''
+        getReadDatabaseConnection - Get a connection to use for a read.
+
+            A replica, unless routing is disabled, no replicas are available, the current thread is within a transaction block
+
+              on the primary, or the current thread has written through the primary within the read-your-writes window.
+
+              Otherwise, the primary.
+
+            A replica which cannot be connected to is avoided for a while ( @see setGlobalReplicaRouting ), and the next is tried.
+
+            @return <DatabaseConnection>
+    '''
+    if not GLOBAL_ROUTING_ENABLED or not _replicas:
+        return getDatabaseConnection()
+
+    if isInTransactionBlock():
+        return getDatabaseConnection()
+
+    if GLOBAL_READ_YOUR_WRITES_WINDOW:
+        lastWriteTime = getLastWriteTime()
+        if lastWriteTime is not None and time.monotonic() - lastWriteTime < GLOBAL_READ_YOUR_WRITES_WINDOW:
+            return getDatabaseConnection()
+
+    for target in _getCandidateReplicas():
+        dbConn = target.getDatabaseConnection()
+
+        startTime = time.monotonic()
+        if dbConn.getConnection() is None:
+            target.markDown()
+            emitInstrumentationEvent('replica_down', replicaName=target.name)
+            continue
+
+        target.recordLatency(time.monotonic() - startTime)
+
+        return dbConn
+
+    return getDatabaseConnection()
+
+
+def probeReplicaLatencies():
+    '''
+        probeReplicaLatencies - Measure the latency of each replica with a "SELECT 1", adding to its moving average
+
+            ( used by REPLICA_SELECT_LEAST_LATENCY ). Replicas which cannot be connected to are marked down.
+
+            @return dict<str : float/None> - Replica name -> latency in seconds of this probe, or None if it failed
+    '''
+    with _replicasLock:
+        replicas = list(_replicas.values())
+
+    ret = {}
+    for target in replicas:
+        dbConn = target.getDatabaseConnection()
+        try:
+            if dbConn.getConnection() is None:
+                target.markDown()
+                ret[target.name] = None
+                continue
+
+            startTime = time.monotonic()
+            dbConn.doSelect('SELECT 1')
+            latency = time.monotonic() - startTime
+
+            target.recordLatency(latency)
+            target.downUntil = None
+            ret[target.name] = latency
+        except Exception:
+            target.markDown()
+            ret[target.name] = None
+        finally:
+            dbConn.closeConnection()
+
+    return ret
+
+
+# vim: set ts=4 sw=4 st=4 expandtab:
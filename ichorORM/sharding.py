@@ -0,0 +1,440 @@
+'''
+    Copyright (c) 2018 Timothy Savannah
+
+    Licensed under the terms of the Lesser GNU Lesser General Public License version 2.1
+
+      license can be found at https://raw.githubusercontent.com/kata198/ichorORM/master/LICENSE
+
+
+    sharding - Split a model's table across several databases ( shards ) by the value of a shard key field.
+
+        A model declares SHARD_KEY ( the field name ) and SHARD_MAP ( a HashShardMap or RangeShardMap ).
+
+        Queries on that model which are not given an explicit dbConn are then routed:
+
+          * A query with  SHARD_KEY = value  ( or  SHARD_KEY in ( values ) ) in its filters goes to the owning shard(s)
+          * An insert goes to the shard owning its SHARD_KEY value ( which is required )
+          * Any other query fans out to every shard in parallel, and the results are merged,
+              with the query's order by, offset, and limit applied to the merged rows.
+
+        Each shard has a DatabaseConnectionPool. Writes which span shards are committed on each shard separately
+          ( not atomically ). For a transaction, check out a connection for a shard with ShardMap.connection and pass it as dbConn.
+'''
+# vim: set ts=4 sw=4 st=4 expandtab:
+
+import bisect
+import copy
+import heapq
+import itertools
+import threading
+import zlib
+
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+
+from .pool import DatabaseConnectionPool, DEFAULT_POOL_MAX_SIZE
+from .constants import WHERE_AND
+
+__all__ = ('ShardMap', 'HashShardMap', 'RangeShardMap', 'getShardNamesForQuery', 'executeOnShards', 'getShardQuery', 'mergeShardRows')
+
+
+class ShardMap(object):
+    '''
+        ShardMap - Base class for mapping a shard key value to the shard which owns it.
+
+            Subclasses implement #getShardNameForKey
+    '''
+
+    def __init__(self, shards, poolMaxSize=DEFAULT_POOL_MAX_SIZE):
+        '''
+            __init__ - Create a ShardMap
+
+                @param shards <OrderedDict/list<tuple>> - Shard name -> connection params, or a list of ( name, connection params ).
+
+                    Connection params is a dict of DatabaseConnection arguments ( host, port, dbname, user, password ).
+
+                    Any not given use the global value.
+
+                @param poolMaxSize <int> default DEFAULT_POOL_MAX_SIZE - Max connections in the pool of each shard
+        '''
+        if hasattr(shards, 'items'):
+            shards = list(shards.items())
+
+        if not shards:
+            raise ValueError('A ShardMap requires at least one shard.')
+
+        self.shards = OrderedDict()
+        for shardName, connectionParams in shards:
+            if shardName in self.shards:
+                raise ValueError('Duplicate shard name: %s' %(repr(shardName), ))
+            self.shards[shardName] = dict(connectionParams or {})
+
+        self.poolMaxSize = poolMaxSize
+
+        self._pools = {}
+        self._poolsLock = threading.Lock()
+
+
+    def getShardNames(self):
+        '''
+            getShardNames - Get the names of all shards
+
+                @return list<str>
+        '''
+        return list(self.shards.keys())
+
+
+    def getShardNameForKey(self, shardKeyValue):
+        '''
+            getShardNameForKey - Get the name of the shard which owns a shard key value
+
+                @param shardKeyValue - The value of the shard key field
+
+                @return <str> - Shard name
+        '''
+        raise NotImplementedError('getShardNameForKey must be implemented by ShardMap subclass %s' %(self.__class__.__name__, ))
+
+
+    def getPool(self, shardName):
+        '''
+            getPool - Get the connection pool of a shard, creating it upon first use
+
+                @param shardName <str> - The shard name
+
+                @return <DatabaseConnectionPool>
+        '''
+        with self._poolsLock:
+            pool = self._pools.get(shardName, None)
+            if pool is None:
+                if shardName not in self.shards:
+                    raise KeyError('No such shard: %s' %(repr(shardName), ))
+
+                pool = self._pools[shardName] = DatabaseConnectionPool(maxSize=self.poolMaxSize, name=shardName, **self.shards[shardName])
+
+        return pool
+
+
+    def connection(self, shardKeyValue):
+        '''
+            connection - Check out a connection to the shard owning a shard key value, for the duration of a "with" block
+
+                e.x.
+                    with MyModel.SHARD_MAP.connection(tenantId) as dbConn:
+                        with dbConn.transaction():
+                            ...
+
+                @param shardKeyValue - The value of the shard key field
+
+                @return <context manager> - Which gives the DatabaseConnection
+        '''
+        return self.getPool( self.getShardNameForKey(shardKeyValue) ).connection()
+
+
+    def closeAll(self):
+        '''
+            closeAll - Close the connection pools of all shards
+        '''
+        with self._poolsLock:
+            pools = list(self._pools.values())
+            self._pools.clear()
+
+        for pool in pools:
+            pool.closeAll()
+
+
+class HashShardMap(ShardMap):
+    '''
+        HashShardMap - Place each shard key value on a shard by a hash of its string form ( crc32, stable across processes )
+
+            NOTE: Changing the number of shards moves most keys to a different shard
+    '''
+
+    def getShardNameForKey(self, shardKeyValue):
+        '''
+            getShardNameForKey - Get the name of the shard which owns a shard key value
+
+                @param shardKeyValue - The value of the shard key field. Values with the same str() are on the same shard.
+
+                @return <str> - Shard name
+        '''
+        if shardKeyValue is None:
+            raise ValueError('Cannot route a NULL shard key value.')
+
+        shardNames = self.getShardNames()
+
+        idx = zlib.crc32( str(shardKeyValue).encode('utf-8') ) % len(shardNames)
+
+        return shardNames[idx]
+
+
+class RangeShardMap(ShardMap):
+    '''
+        RangeShardMap - Place each shard key value on a shard by ranges of values
+    '''
+
+    def __init__(self, ranges, poolMaxSize=DEFAULT_POOL_MAX_SIZE):
+        '''
+            __init__ - Create a RangeShardMap
+
+                @param ranges list<tuple> - A list of ( lowerBound, shard name, connection params ).
+
+                    Each shard owns the values >= its lowerBound, and < the next greater lowerBound.
+
+                    The lowest lowerBound may be None to own all values below the next.
+
+                    e.x.  [ (None, 'shardA', {'host' : 'a'}), (1000, 'shardB', {'host' : 'b'}) ]
+
+                @param poolMaxSize <int> default DEFAULT_POOL_MAX_SIZE - Max connections in the pool of each shard
+        '''
+        if not ranges:
+            raise ValueError('A ShardMap requires at least one shard.')
+
+        ranges = sorted(ranges, key=lambda _range : ( _range[0] is not None, _range[0] if _range[0] is not None else 0 ))
+
+        if [ _range for _range in ranges[1:] if _range[0] is None ]:
+            raise ValueError('Only one range may have a lowerBound of None.')
+
+        ShardMap.__init__(self, [ (shardName, connectionParams) for (lowerBound, shardName, connectionParams) in ranges ], poolMaxSize=poolMaxSize)
+
+        self._hasUnbounded = bool(ranges[0][0] is None)
+        self._lowerBounds = [ _range[0] for _range in ranges if _range[0] is not None ]
+        self._shardNames = [ _range[1] for _range in ranges ]
+
+
+    def getShardNameForKey(self, shardKeyValue):
+        '''
+            getShardNameForKey - Get the name of the shard which owns a shard key value
+
+                @param shardKeyValue - The value of the shard key field
+
+                @return <str> - Shard name
+
+                @raises KeyError - If the value is below every range
+        '''
+        if shardKeyValue is None:
+            raise ValueError('Cannot route a NULL shard key value.')
+
+        idx = bisect.bisect_right(self._lowerBounds, shardKeyValue)
+        if self._hasUnbounded:
+            return self._shardNames[idx]
+
+        if idx == 0:
+            raise KeyError('Shard key value %s is below the lowest range.' %(repr(shardKeyValue), ))
+
+        return self._shardNames[idx - 1]
+
+
+def _getShardKeyValues(filters, whereType, shardKeyNames):
+    '''
+        _getShardKeyValues - Find the values the shard key is restricted to by a set of filters
+
+            @param filters list<FilterType> - The filters
+
+            @param whereType <WHERE_AND/WHERE_OR> - How the filters are joined
+
+            @param shardKeyNames tuple<str> - The shard key field name, and TABLE_NAME.field
+
+            @return <None/list> - The values, or None if the filters do not restrict the shard key
+    '''
+    from .query import FilterField, FilterJoin, FilterStage
+
+    if whereType != WHERE_AND and len(filters) != 1:
+        return None
+
+    for _filter in filters:
+        if issubclass(_filter.__class__, FilterStage):
+            values = _getShardKeyValues(_filter.filters, _filter.whereType, shardKeyNames)
+        elif issubclass(_filter.__class__, FilterField) and not issubclass(_filter.__class__, FilterJoin):
+            values = None
+            if _filter.filterName in shardKeyNames:
+                if _filter.operator == '=':
+                    values = [ _filter.filterValue ]
+                elif _filter.operator == 'in' and issubclass(_filter.filterValue.__class__, (list, tuple, set)):
+                    values = list(_filter.filterValue)
+        else:
+            values = None
+
+        if values is not None:
+            return values
+
+    return None
+
+
+def getShardNamesForQuery(query, shardMap=None):
+    '''
+        getShardNamesForQuery - Get the names of the shards a query must run on
+
+            @param query <QueryBase> - The query. An InsertQuery is routed by the shard key value being inserted,
+
+                others by the shard key values in their filters ( or all shards if not restricted )
+
+            @param shardMap <None/ShardMap> default None - The shard map, or None to use the SHARD_MAP of the query's model
+
+            @return list<str> - Shard names, in the order of the shard map
+    '''
+    from .query import InsertQuery
+
+    model = query.getModel()
+    if shardMap is None:
+        shardMap = model.SHARD_MAP
+
+    shardKey = model.SHARD_KEY
+    if not shardKey:
+        raise ValueError('Model %s has a SHARD_MAP but no SHARD_KEY.' %(model.__name__, ))
+
+    if issubclass(query.__class__, InsertQuery):
+        shardKeyValue = query.fieldValues.get(shardKey, None)
+        if shardKeyValue is None:
+            raise ValueError('Cannot insert into sharded %s without a value for shard key %s.' %(model.__name__, repr(shardKey)))
+
+        return [ shardMap.getShardNameForKey(shardKeyValue) ]
+
+    shardKeyNames = ( shardKey, '%s.%s' %(model.TABLE_NAME, shardKey) )
+
+    values = _getShardKeyValues(query.filterStages, WHERE_AND, shardKeyNames)
+    if values is None:
+        return shardMap.getShardNames()
+
+    owningShardNames = set( [ shardMap.getShardNameForKey(value) for value in values if value is not None ] )
+
+    return [ shardName for shardName in shardMap.getShardNames() if shardName in owningShardNames ]
+
+
+def executeOnShards(query, func, shardNames=None):
+    '''
+        executeOnShards - Call a function with a connection to each shard a query must run on.
+
+            When there is more than one shard, the calls are made in parallel.
+
+            @param query <QueryBase> - The query, on a model with a SHARD_MAP
+
+            @param func <function> - Called as func(dbConn) with a connection checked out of the pool of each shard
+
+            @param shardNames <None/list<str>> default None - The shards to run on, or None to use #getShardNamesForQuery
+
+            @return list - The return of each call, in the order of #shardNames. The first exception raised is propagated.
+    '''
+    shardMap = query.getModel().SHARD_MAP
+
+    if shardNames is None:
+        shardNames = getShardNamesForQuery(query, shardMap)
+
+    def _runOnShard(shardName):
+        with shardMap.getPool(shardName).connection() as dbConn:
+            return func(dbConn)
+
+    if len(shardNames) == 1:
+        return [ _runOnShard(shardNames[0]) ]
+
+    if not shardNames:
+        return []
+
+    with ThreadPoolExecutor(max_workers=len(shardNames)) as executor:
+        futures = [ executor.submit(_runOnShard, shardName) for shardName in shardNames ]
+
+        return [ future.result() for future in futures ]
+
+
+class _MergeKey(object):
+    '''
+        _MergeKey - Sort key for merging rows by several order by fields, each ascending or descending,
+
+            with NULLs ordered as postgresql does ( last when ascending, first when descending )
+    '''
+
+    __slots__ = ('values', 'descending')
+
+    def __init__(self, values, descending):
+        self.values = values
+        self.descending = descending
+
+    def __lt__(self, other):
+        for value, otherValue, isDescending in zip(self.values, other.values, self.descending):
+            if value == otherValue:
+                continue
+
+            if value is None:
+                return isDescending
+            if otherValue is None:
+                return not isDescending
+
+            if isDescending:
+                return value > otherValue
+            return value < otherValue
+
+        return False
+
+
+def _getOrderByIdxs(query):
+    '''
+        _getOrderByIdxs - Get the index within the selected fields of each order by field
+
+            @return list<tuple< <int>, <bool> >> - ( field index, is descending ) per order by
+    '''
+    fields = query.getFields()
+
+    ret = []
+    for ( orderByField, orderByDir ) in query.orderBys:
+        if orderByField in fields:
+            idx = fields.index(orderByField)
+        else:
+            # Match  "field"  with  "TABLE.field"  or the other way around
+            shortName = orderByField.split('.')[-1]
+            matchIdxs = [ i for i, fieldName in enumerate(fields) if fieldName.split('.')[-1] == shortName ]
+            if len(matchIdxs) != 1:
+                raise ValueError('Cannot merge sharded results ordered by %s, which is not a selected field.' %(repr(orderByField), ))
+            idx = matchIdxs[0]
+
+        ret.append( ( idx, bool(orderByDir and orderByDir.upper() == 'DESC') ) )
+
+    return ret
+
+
+def mergeShardRows(query, shardRows):
+    '''
+        mergeShardRows - Merge the rows returned by each shard, applying the order by, offset, and limit of the query
+
+            Each shard should have been given the query with a limit of ( limitNum + offsetNum ) and no offset.
+
+            @param query <SelectQuery> - The query
+
+            @param shardRows list<iterable<tuple>> - The rows of each shard, each ordered by the query's order by
+
+            @return generator<tuple> - The merged rows
+    '''
+    if query.orderBys:
+        orderByIdxs = _getOrderByIdxs(query)
+        descending = tuple( [ isDescending for (idx, isDescending) in orderByIdxs ] )
+        idxs = [ idx for (idx, isDescending) in orderByIdxs ]
+
+        mergedRows = heapq.merge( *shardRows, key=lambda row : _MergeKey( [ row[idx] for idx in idxs ], descending ) )
+    else:
+        mergedRows = itertools.chain( *shardRows )
+
+    offsetNum = query.offsetNum or 0
+    if query.limitNum:
+        return itertools.islice(mergedRows, offsetNum, offsetNum + query.limitNum)
+
+    return itertools.islice(mergedRows, offsetNum, None)
+
+
+def getShardQuery(query):
+    '''
+        getShardQuery - Get a copy of a select query to run on each shard, with the offset folded into the limit
+
+            ( the offset is applied after merging )
+
+            @param query <SelectQuery> - The query
+
+            @return <SelectQuery>
+    '''
+    shardQuery = copy.copy(query)
+
+    if query.limitNum:
+        shardQuery.limitNum = query.limitNum + (query.offsetNum or 0)
+    shardQuery.offsetNum = None
+
+    return shardQuery
+
+
+# vim: set ts=4 sw=4 st=4 expandtab:
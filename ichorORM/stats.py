@@ -0,0 +1,487 @@
+'''
+    Copyright (c) 2018 Timothy Savannah
+
+    Licensed under the terms of the Lesser GNU Lesser General Public License version 2.1
+
+      license can be found at https://raw.githubusercontent.com/kata198/ichorORM/master/LICENSE
+
+
+    stats - Optional in-process statistics of executed statements, aggregated by fingerprint ( the statement with values stripped )
+'''
+# vim: set ts=4 sw=4 st=4 expandtab:
+
+import functools
+import random
+import re
+import sys
+import threading
+import time
+
+from .objs import IgnoreParameter
+
+__all__ = ('setGlobalQueryStats', 'isQueryStatsEnabled', 'fingerprintSql', 'getQueryStats', 'resetQueryStats', 'report',
+    'queryStatsAttribution', 'attributeQueryStats', 'startStatementStats', 'recordHydration', 'timeHydration',
+    'DEFAULT_QUERY_STATS_MAX_FINGERPRINTS', 'QUERY_STATS_SORT_FIELDS',
+)
+
+# DEFAULT_QUERY_STATS_MAX_FINGERPRINTS - Default maximum number of ( fingerprint, model, query class ) entries kept
+DEFAULT_QUERY_STATS_MAX_FINGERPRINTS = 1000
+
+# LATENCY_SAMPLE_SIZE - Number of latencies kept per entry ( a uniform random sample ), from which p95 is calculated
+LATENCY_SAMPLE_SIZE = 200
+
+# EVICT_FRACTION - Fraction of entries evicted ( those with the least total time ) when the max is exceeded
+EVICT_FRACTION = 0.05
+
+# FINGERPRINT_CACHE_MAX_SIZE - Number of SQL strings whose fingerprint is cached. The cache is cleared when full.
+FINGERPRINT_CACHE_MAX_SIZE = 2048
+
+# QUERY_STATS_SORT_FIELDS - The fields which #getQueryStats and #report may sort by
+QUERY_STATS_SORT_FIELDS = ('totalTime', 'calls', 'meanTime', 'p95Time', 'rows', 'hydrationTime')
+
+global GLOBAL_QUERY_STATS_ENABLED
+global GLOBAL_QUERY_STATS_MAX_FINGERPRINTS
+
+GLOBAL_QUERY_STATS_ENABLED = False
+GLOBAL_QUERY_STATS_MAX_FINGERPRINTS = DEFAULT_QUERY_STATS_MAX_FINGERPRINTS
+
+# _entries - ( fingerprint, modelName, queryClassName ) -> _QueryStatsEntry
+_entries = {}
+_entriesLock = threading.Lock()
+
+# _numEvicted - Number of entries evicted since the last reset
+_numEvicted = 0
+
+# _fingerprintCache - SQL -> fingerprint. Read and written without a lock ( single dict operations are atomic )
+_fingerprintCache = {}
+
+# _threadState - Per-thread attribution ( modelName, queryClassName ), and the key of the last statement recorded
+_threadState = threading.local()
+
+
+def setGlobalQueryStats(enabled=IgnoreParameter, maxFingerprints=IgnoreParameter):
+    '''
+        setGlobalQueryStats - Enable or disable collecting statistics of executed statements.
+
+                            Every parameter defaults to "IgnoreParameter" and will thus not be set unless
+                              specified to be something different.
+
+                            Statements are aggregated by fingerprint, model, and query class. @see #report
+
+                            When disabled ( the default ), the only cost is a check of the setting per statement.
+
+                        @param enabled <bool> default IgnoreParameter - True to collect statistics
+
+                        @param maxFingerprints <int> default IgnoreParameter - Maximum number of entries kept.
+
+                            When exceeded, the entries with the least total time are evicted.
+    '''
+    global GLOBAL_QUERY_STATS_ENABLED
+    global GLOBAL_QUERY_STATS_MAX_FINGERPRINTS
+
+    if maxFingerprints != IgnoreParameter:
+        if maxFingerprints < 1:
+            raise ValueError('maxFingerprints must be at least 1. Got: %s' %(repr(maxFingerprints), ))
+        GLOBAL_QUERY_STATS_MAX_FINGERPRINTS = maxFingerprints
+
+    if enabled != IgnoreParameter:
+        GLOBAL_QUERY_STATS_ENABLED = bool(enabled)
+
+
+def isQueryStatsEnabled():
+    '''
+        isQueryStatsEnabled - Check if statistics of executed statements are collected
+
+            @return <bool>
+    '''
+    return GLOBAL_QUERY_STATS_ENABLED
+
+
+# _FINGERPRINT_SUBS - ( regex, replacement ) applied in order to produce a fingerprint
+_FINGERPRINT_SUBS = (
+    # String literals ( including E'' strings )
+    ( re.compile(r"(?:(?<!\w)[eE])?'(?:[^']|'')*'"), '?' ),
+    # Parameters
+    ( re.compile(r'%\([^)]*\)s|%s'), '?' ),
+    # Numbers ( not part of an identifier )
+    ( re.compile(r'(?<![\w$])-?\d+(?:\.\d+)?(?:[eE][-+]?\d+)?\b'), '?' ),
+    ( re.compile(r'\s+'), ' ' ),
+    # IN lists, arrays, and multiple rows of VALUES
+    ( re.compile(r'\bIN \( ?\?(?: ?, ?\?)* ?\)', re.IGNORECASE), 'IN (...)' ),
+    ( re.compile(r'\bARRAY ?\[ ?\?(?: ?, ?\?)* ?\]', re.IGNORECASE), 'ARRAY[...]' ),
+    ( re.compile(r'\bVALUES ?\( ?\?(?: ?, ?\?)* ?\)(?: ?, ?\( ?\?(?: ?, ?\?)* ?\))*', re.IGNORECASE), 'VALUES (...)' ),
+)
+
+
+def fingerprintSql(sql):
+    '''
+        fingerprintSql - Normalize a statement into its fingerprint: literals and parameters replaced by ?,
+
+            IN lists, arrays, and VALUES rows collapsed to (...), and whitespace collapsed.
+
+            e.x.  "SELECT * FROM person WHERE id IN ( %(p_0)s, %(p_1)s ) AND age > 18"
+
+              ->  "SELECT * FROM person WHERE id IN (...) AND age > ?"
+
+            @param sql <str> - The statement
+
+            @return <str> - The fingerprint
+    '''
+    fingerprint = _fingerprintCache.get(sql, None)
+    if fingerprint is not None:
+        return fingerprint
+
+    fingerprint = sql
+    for (regex, replacement) in _FINGERPRINT_SUBS:
+        fingerprint = regex.sub(replacement, fingerprint)
+    fingerprint = fingerprint.strip()
+
+    if len(_fingerprintCache) >= FINGERPRINT_CACHE_MAX_SIZE:
+        _fingerprintCache.clear()
+    _fingerprintCache[sql] = fingerprint
+
+    return fingerprint
+
+
+class _QueryStatsEntry(object):
+    '''
+        _QueryStatsEntry - The statistics of one ( fingerprint, model, query class )
+    '''
+
+    __slots__ = ('fingerprint', 'modelName', 'queryClassName', 'calls', 'totalTime', 'rows', 'hydrationTime', 'latencySample')
+
+    def __init__(self, fingerprint, modelName, queryClassName):
+        self.fingerprint = fingerprint
+        self.modelName = modelName
+        self.queryClassName = queryClassName
+
+        self.calls = 0
+        self.totalTime = 0.0
+        self.rows = 0
+        self.hydrationTime = 0.0
+        self.latencySample = []
+
+    def addStatement(self, elapsed, numRows):
+        '''
+            addStatement - Add an executed statement. Must be called with the lock held.
+        '''
+        self.calls += 1
+        self.totalTime += elapsed
+        if numRows > 0:
+            self.rows += numRows
+
+        # Reservoir sample, so every latency has an equal chance to be kept
+        if len(self.latencySample) < LATENCY_SAMPLE_SIZE:
+            self.latencySample.append(elapsed)
+        else:
+            idx = int(random.random() * self.calls)
+            if idx < LATENCY_SAMPLE_SIZE:
+                self.latencySample[idx] = elapsed
+
+    def toDict(self):
+        '''
+            toDict - Get a snapshot of this entry
+
+                @return dict - @see #getQueryStats
+        '''
+        latencies = sorted(self.latencySample)
+        if latencies:
+            p95Time = latencies[ min( len(latencies) - 1, int(len(latencies) * 0.95) ) ]
+        else:
+            p95Time = 0.0
+
+        return {
+            'fingerprint' : self.fingerprint,
+            'modelName' : self.modelName,
+            'queryClassName' : self.queryClassName,
+            'calls' : self.calls,
+            'totalTime' : self.totalTime,
+            'meanTime' : self.totalTime / self.calls if self.calls else 0.0,
+            'p95Time' : p95Time,
+            'rows' : self.rows,
+            'hydrationTime' : self.hydrationTime,
+        }
+
+
+def _evictEntries(newKey):
+    '''
+        _evictEntries - Evict the entries with the least total time, once over the max. Must be called with the lock held.
+
+            @param newKey <tuple> - The key of the entry just added, which is not evicted ( it has had no chance to accumulate time )
+    '''
+    global _numEvicted
+
+    numToEvict = len(_entries) - GLOBAL_QUERY_STATS_MAX_FINGERPRINTS
+    if numToEvict <= 0:
+        return
+
+    # Evict a batch at once, so this is not done on every new fingerprint when full
+    numToEvict = max( numToEvict, int(GLOBAL_QUERY_STATS_MAX_FINGERPRINTS * EVICT_FRACTION) )
+
+    evictKeys = sorted( [ key for key in _entries.keys() if key != newKey ], key=lambda key : _entries[key].totalTime )[ : numToEvict ]
+    for key in evictKeys:
+        del _entries[key]
+
+    _numEvicted += len(evictKeys)
+
+
+def _recordStatement(sql, attribution, elapsed, numRows):
+    '''
+        _recordStatement - Record an executed statement
+
+            @param sql <str> - The statement
+
+            @param attribution <None/tuple( modelName<str>, queryClassName<str> )> - What executed it, if known
+
+            @param elapsed <float> - Seconds spent executing
+
+            @param numRows <int> - Rows returned or affected ( -1 if not known )
+    '''
+    # Fingerprint outside the lock, so the lock only covers the counters
+    fingerprint = fingerprintSql(sql)
+
+    if attribution is None:
+        key = (fingerprint, None, None)
+    else:
+        key = (fingerprint, attribution[0], attribution[1])
+
+    with _entriesLock:
+        entry = _entries.get(key, None)
+        if entry is None:
+            entry = _entries[key] = _QueryStatsEntry(*key)
+            if len(_entries) > GLOBAL_QUERY_STATS_MAX_FINGERPRINTS:
+                _evictEntries(key)
+
+        entry.addStatement(elapsed, numRows)
+
+    _threadState.lastKey = key
+
+
+class _StatementStatsRecorder(object):
+    '''
+        _StatementStatsRecorder - Times one statement on a connection. @see #startStatementStats
+    '''
+
+    __slots__ = ('sql', 'attribution', 'elapsed')
+
+    def __init__(self, sql, attribution):
+        self.sql = sql
+        self.attribution = attribution
+        self.elapsed = 0.0
+
+    def call(self, func, *args):
+        '''
+            call - Call a function which performs ( part of ) the statement, adding the time taken
+
+                @return - The return of #func
+        '''
+        startTime = time.perf_counter()
+        try:
+            return func(*args)
+        finally:
+            self.elapsed += time.perf_counter() - startTime
+
+    def wrap(self, func):
+        '''
+            wrap - Get a function which calls #func via #call
+        '''
+        return lambda *args : self.call(func, *args)
+
+    def finish(self, numRows):
+        '''
+            finish - Record the statement
+
+                @param numRows <int> - Rows returned or affected ( -1 if not known )
+        '''
+        _recordStatement(self.sql, self.attribution, self.elapsed, numRows)
+
+
+def startStatementStats(sql):
+    '''
+        startStatementStats - Begin timing a statement about to be executed on a connection.
+
+            The attribution ( model and query class ) of the current thread is captured now.
+
+            @param sql <str> - The statement
+
+            @return <None/_StatementStatsRecorder> - None if statistics are not enabled.
+
+              Otherwise, perform the statement via its #call or #wrap , and then call its #finish
+    '''
+    if not GLOBAL_QUERY_STATS_ENABLED:
+        return None
+
+    return _StatementStatsRecorder(sql, getattr(_threadState, 'attribution', None))
+
+
+def recordHydration(elapsed):
+    '''
+        recordHydration - Add time spent creating objects from rows, to the last statement recorded in this thread
+
+            @param elapsed <float> - Seconds spent
+    '''
+    key = getattr(_threadState, 'lastKey', None)
+    if key is None:
+        return
+
+    with _entriesLock:
+        entry = _entries.get(key, None)
+        if entry is not None:
+            entry.hydrationTime += elapsed
+
+
+def timeHydration(func, *args):
+    '''
+        timeHydration - Call a function which creates objects from the rows of the last statement executed in this thread,
+
+            recording the time taken via #recordHydration if statistics are enabled
+
+            @return - The return of #func
+    '''
+    if not GLOBAL_QUERY_STATS_ENABLED:
+        return func(*args)
+
+    startTime = time.perf_counter()
+    try:
+        return func(*args)
+    finally:
+        recordHydration(time.perf_counter() - startTime)
+
+
+class queryStatsAttribution(object):
+    '''
+        queryStatsAttribution - Context manager which attributes the statements executed by this thread within it
+
+            to the model(s) and class of a query. If already within one, the outer attribution is kept.
+    '''
+
+    __slots__ = ('query', 'isOuter')
+
+    def __init__(self, query):
+        '''
+            __init__ - Create this context manager
+
+                @param query <QueryBase> - The query being executed
+        '''
+        self.query = query
+        self.isOuter = False
+
+    def __enter__(self):
+        if GLOBAL_QUERY_STATS_ENABLED and getattr(_threadState, 'attribution', None) is None:
+            query = self.query
+            modelName = ', '.join( [ model.__name__ for model in query.getModels() ] ) or None
+
+            _threadState.attribution = ( modelName, query.__class__.__name__ )
+            self.isOuter = True
+
+        return self
+
+    def __exit__(self, excType, excValue, excTraceback):
+        if self.isOuter:
+            _threadState.attribution = None
+            self.isOuter = False
+
+
+def attributeQueryStats(func):
+    '''
+        attributeQueryStats - Decorator for query methods ( which are not generators ), attributing the statements
+
+            executed within to the query. @see #queryStatsAttribution
+    '''
+    @functools.wraps(func)
+    def _attributed(self, *args, **kwargs):
+        if not GLOBAL_QUERY_STATS_ENABLED:
+            return func(self, *args, **kwargs)
+
+        with queryStatsAttribution(self):
+            return func(self, *args, **kwargs)
+
+    return _attributed
+
+
+def getQueryStats(sortBy='totalTime', top=None):
+    '''
+        getQueryStats - Get a snapshot of the collected statistics
+
+            @param sortBy <str> default 'totalTime' - One of QUERY_STATS_SORT_FIELDS, sorted highest first
+
+            @param top <None/int> default None - If provided, only this many entries are returned
+
+            @return list<dict> - An entry per ( fingerprint, model, query class ), with keys:
+
+                fingerprint - The statement with values stripped. @see #fingerprintSql
+
+                modelName - The name of the model ( comma separated if multiple ), or None if not executed by a query
+
+                queryClassName - The name of the query class, or None if not executed by a query
+
+                calls - Number of times executed
+
+                totalTime / meanTime / p95Time - Seconds spent executing ( the p95 is of a sample of LATENCY_SAMPLE_SIZE )
+
+                rows - Total rows returned or affected
+
+                hydrationTime - Seconds spent creating objects from the rows
+    '''
+    if sortBy not in QUERY_STATS_SORT_FIELDS:
+        raise ValueError('Unknown sortBy: %s.   Possible fields:  %s.' %(repr(sortBy), repr(QUERY_STATS_SORT_FIELDS)))
+
+    with _entriesLock:
+        entries = list(_entries.values())
+
+    # Built outside the lock. A concurrent update may be partially included, which is fine for a snapshot.
+    stats = [ entry.toDict() for entry in entries ]
+    stats.sort(key=lambda entryStats : entryStats[sortBy], reverse=True)
+
+    if top is not None:
+        stats = stats[ : top ]
+
+    return stats
+
+
+def resetQueryStats():
+    '''
+        resetQueryStats - Discard all collected statistics
+    '''
+    global _numEvicted
+
+    with _entriesLock:
+        _entries.clear()
+        _numEvicted = 0
+
+
+def report(top=20, sortBy='totalTime', file=None):
+    '''
+        report - Print the most expensive statement fingerprints
+
+            @param top <int> default 20 - Number of entries to print
+
+            @param sortBy <str> default 'totalTime' - One of QUERY_STATS_SORT_FIELDS
+
+            @param file <None/file-like> default None - Where to write the report. None for sys.stdout
+    '''
+    if file is None:
+        file = sys.stdout
+
+    stats = getQueryStats(sortBy=sortBy)
+
+    lines = []
+    lines.append('Top %d of %d query fingerprints by %s%s:' %(min(top, len(stats)), len(stats), sortBy,
+        ' ( %d evicted )' %(_numEvicted, ) if _numEvicted else ''))
+
+    if not GLOBAL_QUERY_STATS_ENABLED:
+        lines.append('  ( statistics are not enabled, @see setGlobalQueryStats )')
+
+    lines.append('')
+    lines.append('%12s %9s %10s %10s %10s %12s  %s' %('total_ms', 'calls', 'mean_ms', 'p95_ms', 'rows', 'hydrate_ms', 'model / query'))
+
+    for entryStats in stats[ : top ]:
+        lines.append('%12.3f %9d %10.3f %10.3f %10d %12.3f  %s / %s' %(
+            entryStats['totalTime'] * 1000.0, entryStats['calls'], entryStats['meanTime'] * 1000.0, entryStats['p95Time'] * 1000.0,
+            entryStats['rows'], entryStats['hydrationTime'] * 1000.0, entryStats['modelName'] or '-', entryStats['queryClassName'] or '-'))
+        lines.append('      ' + entryStats['fingerprint'])
+
+    file.write('\n'.join(lines) + '\n')
+
+
+# vim: set ts=4 sw=4 st=4 expandtab:
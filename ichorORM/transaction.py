@@ -0,0 +1,415 @@
+'''
+    Copyright (c) 2018 Timothy Savannah
+
+    Licensed under the terms of the Lesser GNU Lesser General Public License version 2.1
+
+      license can be found at https://raw.githubusercontent.com/kata198/ichorORM/master/LICENSE
+
+
+    transaction - Transaction blocks, with automatic retry on serialization failures and deadlocks.
+
+        Usually used via DatabaseConnection.transaction / DatabaseConnection.runTransaction , or the #transactional decorator.
+'''
+# vim: set ts=4 sw=4 st=4 expandtab:
+
+import functools
+import random
+import re
+import sys
+import time
+
+from .instrumentation import emitInstrumentationEvent
+
+__all__ = ('Transaction', 'Savepoint', 'runTransaction', 'transactional', 'isRetryableError',
+    'RETRYABLE_SQLSTATES', 'DEFAULT_TRANSACTION_RETRIES', 'DEFAULT_TRANSACTION_BACKOFF', 'DEFAULT_TRANSACTION_MAX_BACKOFF',
+)
+
+# RETRYABLE_SQLSTATES - serialization_failure and deadlock_detected. A transaction which fails with these may succeed if re-run.
+RETRYABLE_SQLSTATES = ('40001', '40P01')
+
+# DEFAULT_TRANSACTION_RETRIES - Default number of times to re-run a transaction with #runTransaction / #transactional
+DEFAULT_TRANSACTION_RETRIES = 3
+
+# DEFAULT_TRANSACTION_BACKOFF - Default base delay in seconds before a retry. Doubles each retry, with random jitter.
+DEFAULT_TRANSACTION_BACKOFF = 0.05
+
+# DEFAULT_TRANSACTION_MAX_BACKOFF - Default maximum delay in seconds before a retry
+DEFAULT_TRANSACTION_MAX_BACKOFF = 2.0
+
+
+def isRetryableError(exc):
+    '''
+        isRetryableError - Check if an exception is a serialization failure or deadlock, after which the transaction may be re-run
+
+            @param exc <Exception> - The exception
+
+            @return <bool>
+    '''
+    return bool( getattr(exc, 'pgcode', None) in RETRYABLE_SQLSTATES )
+
+
+def _getBackoffDelay(retryNum, backoff, maxBackoff):
+    '''
+        _getBackoffDelay - Get the delay before a retry: exponential, with "full jitter" so that
+
+            contending transactions do not retry in lockstep
+
+            @param retryNum <int> - The retry number, starting at 1
+
+            @return <float> - Seconds
+    '''
+    return random.uniform(0, min(maxBackoff, backoff * ( 2 ** (retryNum - 1) )))
+
+
+class Transaction(object):
+    '''
+        Transaction - A transaction block on a DatabaseConnection.
+
+            Used as a context manager, commits when the block completes and rolls back if it raises:
+
+                with dbConn.transaction():
+                    ...
+
+            Within the block, #DatabaseConnection.commit does nothing, so operations may be called with doCommit=True.
+
+            The isolation level, read only, and deferrable settings are sent along with the BEGIN.
+
+              e.x. a consistent snapshot for a long report, without serialization failure overhead:
+
+                with dbConn.transaction(isolation=ISOLATION_SERIALIZABLE, readOnly=True, deferrable=True):
+                    ...
+
+            A transaction block inside another is a savepoint ( @see Savepoint ): if it raises, only its own changes
+              are rolled back, and the outer transaction may continue.
+
+            To re-run the block on a serialization failure or deadlock, iterate over the attempts:
+
+                for txn in dbConn.transaction(retries=5):
+                    with txn:
+                        ...
+
+              If the block ( or the commit ) fails with a retryable error, it is rolled back and the loop continues after a delay.
+
+              Once out of retries the error is raised. A nested block is never retried, as the outer transaction has failed.
+
+              Used only as a context manager ( not iterated ), the block is never re-run and any error is raised.
+    '''
+
+    def __init__(self, dbConn, isolation=None, retries=0, backoff=DEFAULT_TRANSACTION_BACKOFF, maxBackoff=DEFAULT_TRANSACTION_MAX_BACKOFF, readOnly=None, deferrable=None):
+        '''
+            __init__ - Create a Transaction
+
+                @param dbConn <DatabaseConnection> - The connection
+
+                @param isolation <None/str> default None - The isolation level for this transaction,
+                    one of constants.ALL_ISOLATION_LEVELS ( e.x. "SERIALIZABLE" ). None for the connection's isolationLevel.
+
+                @param retries <int> default 0 - When iterated, number of times to re-run on a retryable error.
+                    Has no effect when used only as a context manager.
+
+                @param backoff <float> default DEFAULT_TRANSACTION_BACKOFF - Base delay in seconds before a retry
+
+                @param maxBackoff <float> default DEFAULT_TRANSACTION_MAX_BACKOFF - Maximum delay in seconds before a retry
+
+                @param readOnly <None/bool> default None - If True, the transaction is READ ONLY. None for the connection's readOnly.
+
+                @param deferrable <None/bool> default None - If True, the transaction is DEFERRABLE. None for the connection's deferrable.
+        '''
+        from .connection import _checkIsolationLevel
+
+        self.dbConn = dbConn
+        self.isolation = _checkIsolationLevel(isolation)
+        self.readOnly = readOnly
+        self.deferrable = deferrable
+        self.retries = retries
+        self.backoff = backoff
+        self.maxBackoff = maxBackoff
+
+        # attemptNum - The current attempt, starting at 1
+        self.attemptNum = 0
+
+        self._isOuter = False
+        self._isIterating = False
+        self._savepoint = None
+        self._wasTransactionMode = None
+        self._retryError = None
+
+
+    def _canRetry(self, exc):
+        '''
+            _canRetry - Check if the block may be re-run after #exc. Only when iterated ( @see #__iter__ ), as otherwise
+              nothing would re-run it.
+        '''
+        return bool( self._isOuter and self._isIterating and self.attemptNum <= self.retries and isRetryableError(exc) )
+
+
+    def __enter__(self):
+        dbConn = self.dbConn
+
+        self.attemptNum += 1
+        self._retryError = None
+
+        if dbConn._transactionDepth > 0:
+            # Nested within another block, use a savepoint
+            self._isOuter = False
+            self._savepoint = Savepoint(dbConn)
+            return self._savepoint.__enter__()
+
+        self._isOuter = True
+
+        self._wasTransactionMode = dbConn.isTransaction
+        dbConn.isTransaction = True
+
+        conn = dbConn.getConnection()
+        if conn is None:
+            dbConn.isTransaction = self._wasTransactionMode
+
+            from .connection import DatabaseConnectionFailure
+            raise DatabaseConnectionFailure('Could not connect to psycopg2 database.')
+
+        isolation = self.isolation if self.isolation is not None else dbConn.isolationLevel
+        readOnly = self.readOnly if self.readOnly is not None else dbConn.readOnly
+        deferrable = self.deferrable if self.deferrable is not None else dbConn.deferrable
+
+        if not dbConn._setTransactionCharacteristics(isolation, readOnly, deferrable):
+            sys.stderr.write('WARNING: Transaction block started on a connection with a transaction already in progress. The block joins it, and its isolation level / read only / deferrable settings have no effect.\n')
+
+        dbConn._transactionDepth = 1
+
+        if not dbConn.isReplica:
+            from .connection import _enterTransactionBlock
+            _enterTransactionBlock()
+
+        return dbConn
+
+
+    def _finish(self, doCommit):
+        '''
+            _finish - Commit or roll back the transaction, and restore the connection's prior mode
+        '''
+        dbConn = self.dbConn
+        conn = dbConn._connection
+
+        try:
+            if conn is not None:
+                if doCommit:
+                    conn.commit()
+                    dbConn._noteWrite()
+                else:
+                    conn.rollback()
+                dbConn._onTransactionEnd(doCommit)
+        finally:
+            dbConn._transactionDepth = 0
+
+            if not dbConn.isReplica:
+                from .connection import _exitTransactionBlock
+                _exitTransactionBlock()
+
+            dbConn.isTransaction = self._wasTransactionMode
+            if self._wasTransactionMode and conn is not None:
+                # Back to the connection's own settings for the next transaction
+                try:
+                    dbConn._setTransactionCharacteristics(dbConn.isolationLevel, dbConn.readOnly, dbConn.deferrable)
+                except Exception:
+                    pass
+
+
+    def __exit__(self, excType, excValue, excTraceback):
+        if not self._isOuter:
+            return self._savepoint.__exit__(excType, excValue, excTraceback)
+
+        if excType is not None:
+            try:
+                self._finish(doCommit=False)
+            except Exception:
+                # The original exception is more relevant
+                pass
+
+            if self._canRetry(excValue):
+                self._retryError = excValue
+                return True
+
+            return False
+
+        try:
+            self._finish(doCommit=True)
+        except Exception as commitException:
+            if self._canRetry(commitException):
+                self._retryError = commitException
+                return False
+            raise
+
+        return False
+
+
+    def __iter__(self):
+        '''
+            __iter__ - Iterate over the attempts at this transaction. @see Transaction
+        '''
+        self.attemptNum = 0
+        self._isIterating = True
+
+        try:
+            while True:
+                yield self
+
+                retryError = self._retryError
+                if retryError is None:
+                    return
+
+                delay = _getBackoffDelay(self.attemptNum, self.backoff, self.maxBackoff)
+
+                emitInstrumentationEvent('transaction_retry', attemptNum=self.attemptNum, sqlstate=retryError.pgcode, delay=delay, dbConn=self.dbConn)
+
+                time.sleep(delay)
+
+                if self.attemptNum > self.retries:
+                    # Should not be reachable, as #_canRetry checks this
+                    raise retryError
+        finally:
+            self._isIterating = False
+
+
+# SAVEPOINT_NAME_RE - Valid names for savepoints
+SAVEPOINT_NAME_RE = re.compile(r'^[A-Za-z_][A-Za-z0-9_]*$')
+
+
+class Savepoint(object):
+    '''
+        Savepoint - A savepoint within a transaction, used as a context manager.
+
+            If the block raises, changes since the savepoint are rolled back ( ROLLBACK TO SAVEPOINT ) and the exception
+              is raised. The transaction itself continues, so a large transaction can absorb failures of single operations:
+
+                with dbConn.transaction():
+                    for valueDict in valueDicts:
+                        try:
+                            with dbConn.savepoint():
+                                dbConn.executeSqlParams(insertSql, valueDict)
+                        except psycopg2.IntegrityError:
+                            # Skip just this record
+                            pass
+
+            Otherwise, the savepoint is released when the block completes.
+
+            Requires a transaction: within a transaction block, or on a connection in transaction mode.
+    '''
+
+    def __init__(self, dbConn, name=None):
+        '''
+            __init__ - Create a Savepoint
+
+                @param dbConn <DatabaseConnection> - The connection
+
+                @param name <None/str> default None - The savepoint name. If None, one is generated from the nesting depth.
+        '''
+        if name is not None and not SAVEPOINT_NAME_RE.match(name):
+            raise ValueError('Invalid savepoint name: %s' %(repr(name), ))
+
+        self.dbConn = dbConn
+        self.name = name
+
+        self._savepointName = None
+
+
+    def __enter__(self):
+        dbConn = self.dbConn
+
+        if dbConn._transactionDepth == 0 and not dbConn.isTransaction:
+            raise ValueError('A savepoint requires a transaction. Use within a transaction block ( DatabaseConnection.transaction ) or in transaction mode.')
+
+        self._savepointName = self.name or 'ichor_savepoint_%d' %(dbConn._transactionDepth, )
+
+        dbConn.executeSql('SAVEPOINT ' + self._savepointName)
+        dbConn._transactionDepth += 1
+
+        return dbConn
+
+
+    def __exit__(self, excType, excValue, excTraceback):
+        dbConn = self.dbConn
+
+        dbConn._transactionDepth -= 1
+
+        if excType is not None:
+            try:
+                dbConn.executeSql('ROLLBACK TO SAVEPOINT ' + self._savepointName)
+                dbConn.executeSql('RELEASE SAVEPOINT ' + self._savepointName)
+                dbConn._onTransactionEnd(False)
+            except Exception:
+                # The original exception is more relevant
+                pass
+
+            return False
+
+        dbConn.executeSql('RELEASE SAVEPOINT ' + self._savepointName)
+
+        return False
+
+
+def runTransaction(dbConn, func, isolation=None, retries=DEFAULT_TRANSACTION_RETRIES, backoff=DEFAULT_TRANSACTION_BACKOFF, maxBackoff=DEFAULT_TRANSACTION_MAX_BACKOFF, readOnly=None, deferrable=None):
+    '''
+        runTransaction - Run a function in a transaction block, re-running it on a serialization failure or deadlock
+
+            @param dbConn <DatabaseConnection> - The connection
+
+            @param func <function(dbConn)> - The function to run. Must be safe to run more than once.
+
+            @param isolation <None/str> default None - The isolation level for the transaction, @see Transaction
+
+            @param retries <int> default DEFAULT_TRANSACTION_RETRIES - Number of times to re-run
+
+            @param backoff <float> default DEFAULT_TRANSACTION_BACKOFF - Base delay in seconds before a retry
+
+            @param maxBackoff <float> default DEFAULT_TRANSACTION_MAX_BACKOFF - Maximum delay in seconds before a retry
+
+            @param readOnly <None/bool> default None - If True, READ ONLY. @see Transaction
+
+            @param deferrable <None/bool> default None - If True, DEFERRABLE. @see Transaction
+
+            @return - The return of #func
+    '''
+    ret = None
+
+    for txn in Transaction(dbConn, isolation=isolation, retries=retries, backoff=backoff, maxBackoff=maxBackoff, readOnly=readOnly, deferrable=deferrable):
+        with txn:
+            ret = func(dbConn)
+
+    return ret
+
+
+def transactional(isolation=None, retries=DEFAULT_TRANSACTION_RETRIES, backoff=DEFAULT_TRANSACTION_BACKOFF, maxBackoff=DEFAULT_TRANSACTION_MAX_BACKOFF, readOnly=None, deferrable=None):
+    '''
+        transactional - Decorator which runs a function in a transaction block, re-running it on a serialization failure or deadlock
+
+            The function must take a "dbConn" keyword argument. If not passed ( or None ), a new connection is used.
+
+              e.x.
+
+                @transactional(isolation='SERIALIZABLE', retries=5)
+                def transfer(fromId, toId, amount, dbConn=None):
+                    ...
+
+            @see runTransaction for the arguments
+    '''
+    def _decorator(func):
+
+        @functools.wraps(func)
+        def _transactionalWrapper(*args, **kwargs):
+            dbConn = kwargs.get('dbConn', None)
+            if dbConn is None:
+                from .connection import getDatabaseConnection
+                dbConn = getDatabaseConnection()
+
+            def _runFunc(_dbConn):
+                kwargs['dbConn'] = _dbConn
+                return func(*args, **kwargs)
+
+            return runTransaction(dbConn, _runFunc, isolation=isolation, retries=retries, backoff=backoff, maxBackoff=maxBackoff, readOnly=readOnly, deferrable=deferrable)
+
+        return _transactionalWrapper
+
+    return _decorator
+
+
+# vim: set ts=4 sw=4 st=4 expandtab:
@@ -0,0 +1,179 @@
+#!/usr/bin/env GoodTests.py
+'''
+    test_BinaryCopy - Test reading results via binary COPY
+'''
+
+import datetime
+import struct
+import subprocess
+import sys
+
+from decimal import Decimal
+
+import LocalConfig
+
+
+import ichorORM
+
+from ichorORM.model import DatabaseModel
+from ichorORM.query import SelectQuery
+from ichorORM.binarycopy import iterBinaryCopyRows, iterBinaryCopyChunks, getBinaryDecoders, BinaryCopyFormatError, COPY_BINARY_SIGNATURE
+
+
+class MyBinaryCopyModel(DatabaseModel):
+    '''
+        MyBinaryCopyModel - A model with a variety of column types
+    '''
+
+    FIELDS = ['id', 'name', 'small_num', 'big_num', 'ratio', 'price', 'is_active', 'created_at', 'birth_date']
+
+    REQUIRED_FIELDS = ['name']
+
+    TABLE_NAME = 'ichortest_my_binary_copy_model'
+
+
+def _makeCopyData(rows):
+    '''
+        _makeCopyData - Build binary COPY data
+
+            @param rows list<list<bytes/None>> - Each row, a list of the already-encoded field values ( None for NULL )
+    '''
+    data = COPY_BINARY_SIGNATURE + struct.pack('!ii', 0, 0)
+
+    for row in rows:
+        data += struct.pack('!h', len(row))
+        for fieldValue in row:
+            if fieldValue is None:
+                data += struct.pack('!i', -1)
+            else:
+                data += struct.pack('!i', len(fieldValue)) + fieldValue
+
+    return data + struct.pack('!h', -1)
+
+
+class TestBinaryCopy(object):
+    '''
+        Test class for binary COPY
+    '''
+
+    def setup_class(self):
+        '''
+            setup_class - ensure this test is setup.
+                Executed prior to any of the tests in this class.
+        '''
+        LocalConfig.ensureTestSetup()
+
+        dbConn = ichorORM.getDatabaseConnection()
+        try:
+            dbConn.executeSql("DROP TABLE " + MyBinaryCopyModel.TABLE_NAME)
+        except:
+            pass
+
+        dbConn.executeSql("CREATE TABLE %s ( id serial primary key, name varchar(255) NOT NULL, small_num smallint, big_num bigint, ratio double precision, price numeric(12, 3), is_active boolean, created_at timestamp, birth_date date )" %(MyBinaryCopyModel.TABLE_NAME, ))
+
+        valueDicts = [
+            { 'name' : 'Jöhn', 'small_num' : -3, 'big_num' : 2 ** 40, 'ratio' : 0.25, 'price' : Decimal('12345.678'), 'is_active' : True, 'created_at' : datetime.datetime(2018, 7, 9, 13, 14, 15, 123456), 'birth_date' : datetime.date(1985, 1, 31) },
+            { 'name' : 'Jane', 'small_num' : None, 'big_num' : -7, 'ratio' : None, 'price' : Decimal('-0.005'), 'is_active' : False, 'created_at' : datetime.datetime(1999, 12, 31, 23, 59, 59), 'birth_date' : None },
+            { 'name' : 'Tom', 'small_num' : 0, 'big_num' : None, 'ratio' : -1.5, 'price' : Decimal('0'), 'is_active' : None, 'created_at' : None, 'birth_date' : datetime.date(2000, 1, 1) },
+        ]
+
+        dbConn.doInsert("INSERT INTO " + MyBinaryCopyModel.TABLE_NAME + " (name, small_num, big_num, ratio, price, is_active, created_at, birth_date) VALUES ( %(name)s, %(small_num)s, %(big_num)s, %(ratio)s, %(price)s, %(is_active)s, %(created_at)s, %(birth_date)s )", valueDicts=valueDicts, returnPk=False)
+
+
+    def teardown_class(self):
+        '''
+            teardown_class - Destroy any data generated by this test.
+                Ran after all tests have completed
+        '''
+        try:
+            dbConn = ichorORM.getDatabaseConnection()
+            dbConn.executeSql("DROP TABLE %s" %(MyBinaryCopyModel.TABLE_NAME, ))
+        except Exception as e:
+            pass
+
+
+    def test_parser(self):
+        '''
+            test_parser - Test parsing binary COPY data directly, without the database
+        '''
+        # int4, text, bool, float8, date, timestamp, numeric
+        decoders = getBinaryDecoders( [23, 25, 16, 701, 1082, 1114, 1700] )
+
+        # numeric 1234.50 -> digits [1234, 5000], weight 0, positive, dscale 2
+        numericValue = struct.pack('!hhHh', 2, 0, 0, 2) + struct.pack('!hh', 1234, 5000)
+
+        data = _makeCopyData([
+            [ struct.pack('!i', -5), 'héllo'.encode('utf-8'), b'\x01', struct.pack('!d', 2.5), struct.pack('!i', 1), struct.pack('!q', 1500000), numericValue ],
+            [ None, b'', b'\x00', None, struct.pack('!i', -1), struct.pack('!q', -1), None ],
+        ])
+
+        rows = list( iterBinaryCopyRows(data, decoders) )
+
+        assert len(rows) == 2 , 'Expected 2 rows. Got %d: %s' %(len(rows), repr(rows))
+
+        expectedRow = ( -5, 'héllo', True, 2.5, datetime.date(2000, 1, 2), datetime.datetime(2000, 1, 1, 0, 0, 1, 500000), Decimal('1234.50') )
+        assert rows[0] == expectedRow , 'Expected first row to be %s. Got: %s' %(repr(expectedRow), repr(rows[0]))
+        assert str(rows[0][6]) == '1234.50' , 'Expected numeric to keep its display scale. Got: ' + str(rows[0][6])
+
+        expectedRow = ( None, '', False, None, datetime.date(1999, 12, 31), datetime.datetime(1999, 12, 31, 23, 59, 59, 999999), None )
+        assert rows[1] == expectedRow , 'Expected second row to be %s. Got: %s' %(repr(expectedRow), repr(rows[1]))
+
+        assert getBinaryDecoders( [23, 114] ) is None , 'Expected no decoders when a type (json) is unsupported.'
+
+        gotException = False
+        try:
+            list( iterBinaryCopyRows(data[:-2], decoders) )
+        except BinaryCopyFormatError as e:
+            gotException = e
+
+        assert gotException is not False , 'Expected BinaryCopyFormatError on data missing the trailer.'
+
+        # Split at every possible chunk size, including within the header and within fields
+        for chunkSize in range(1, len(data) + 1):
+            chunks = [ data[i : i + chunkSize] for i in range(0, len(data), chunkSize) ]
+
+            chunkedRows = list( iterBinaryCopyChunks(chunks, decoders) )
+            assert chunkedRows == rows , 'Expected the same rows with chunks of %d bytes. Got: %s' %(chunkSize, repr(chunkedRows))
+
+        gotException = False
+        try:
+            list( iterBinaryCopyChunks( [ data[:40], data[40:-2] ], decoders) )
+        except BinaryCopyFormatError as e:
+            gotException = e
+
+        assert gotException is not False , 'Expected BinaryCopyFormatError on chunked data missing the trailer.'
+
+
+    def test_getRowsBinary(self):
+        '''
+            test_getRowsBinary - Test executeGetRowsBinary returns the same as executeGetRows
+        '''
+        selQ = SelectQuery(MyBinaryCopyModel, orderByField='id')
+
+        expectedRows = [ tuple(row) for row in selQ.executeGetRows() ]
+
+        rows = selQ.executeGetRowsBinary()
+
+        assert rows == expectedRows , 'Expected binary rows to match text rows.\nExpected: %s\nGot: %s' %(repr(expectedRows), repr(rows))
+
+        selQ = SelectQuery(MyBinaryCopyModel, selectFields=['name', 'price'])
+        selQ.addStage().addCondition('small_num', '<', 0)
+
+        rows = selQ.executeGetRowsBinary()
+
+        assert rows == [ ('Jöhn', Decimal('12345.678')) ] , 'Expected parameters to be applied to binary COPY. Got: ' + repr(rows)
+
+        # Unsupported type falls back
+        selQ = SelectQuery(MyBinaryCopyModel, selectFields=['id', ichorORM.QueryStr("'{}'::json")], orderByField='id')
+
+        rows = selQ.executeGetRowsBinary()
+
+        assert len(rows) == 3 and rows[0][1] == {} , 'Expected fall back to executeGetRows on an unsupported type. Got: ' + repr(rows)
+
+        columns = SelectQuery(MyBinaryCopyModel, selectFields=['id', 'ratio'], orderByField='id').executeGetColumns(binaryCopy=True)
+
+        assert list(columns['ratio'])[0] == 0.25 and columns.nullMasks['ratio'][1] , 'Expected executeGetColumns with binaryCopy to return columns. Got: ' + repr(columns)
+
+
+if __name__ == '__main__':
+    sys.exit(subprocess.Popen('GoodTests.py -n1 "%s" %s' %(sys.argv[0], ' '.join(['"%s"' %(arg.replace('"', '\\"'), ) for arg in sys.argv[1:]]) ), shell=True).wait())
@@ -0,0 +1,227 @@
+#!/usr/bin/env GoodTests.py
+'''
+    test_ChunkedQueryRunner - Test running DeleteQuery / UpdateQuery in chunks
+'''
+
+import subprocess
+import sys
+
+import LocalConfig
+
+
+import ichorORM
+
+from ichorORM.model import DatabaseModel
+from ichorORM.query import SelectQuery, DeleteQuery, UpdateQuery
+from ichorORM.chunked import ChunkedQueryRunner, CHUNK_BY_PK, CHUNK_BY_CTID
+from ichorORM import getDatabaseConnection
+
+
+class MyChunkModel(DatabaseModel):
+    '''
+        MyChunkModel - A model with a bunch of numbered rows
+    '''
+
+    FIELDS = ['id', 'num', 'is_processed']
+
+    REQUIRED_FIELDS = ['num']
+
+    TABLE_NAME = 'ichortest_my_chunk_model'
+
+
+    @classmethod
+    def dropModel(cls):
+        '''
+            dropModel - Will drop this model's table
+        '''
+        dbConn = getDatabaseConnection()
+
+        didDrop = False
+        # Drop table if it exists
+        try:
+            dbConn.executeSql('DROP TABLE %s' %(cls.TABLE_NAME, ))
+            didDrop = True
+        except:
+            pass
+
+        return didDrop
+
+    @classmethod
+    def createModel(cls):
+        '''
+            createModel - Will create this model
+        '''
+        cls.dropModel()
+
+        dbConn = getDatabaseConnection()
+
+        createQuery = '''CREATE TABLE ''' + cls.TABLE_NAME + ''' ( id serial primary key, num integer NOT NULL, is_processed smallint DEFAULT 0 NOT NULL )'''
+
+        dbConn.executeSql(createQuery)
+
+
+class TestChunkedQueryRunner(object):
+    '''
+        Test class for ChunkedQueryRunner
+    '''
+
+    # NUM_ROWS - Number of rows inserted before each test
+    NUM_ROWS = 25
+
+    def setup_class(self):
+        '''
+            setup_class - ensure this test is setup.
+                Executed prior to any of the tests in this class.
+        '''
+        LocalConfig.ensureTestSetup()
+
+        MyChunkModel.createModel()
+
+
+    def teardown_class(self):
+        '''
+            teardown_class - Destroy any data generated by this test.
+                Ran after all tests have completed
+        '''
+        MyChunkModel.dropModel()
+
+
+    def setup_method(self, meth):
+        '''
+            setup_method - Called prior to each method to perform setup specific to it.
+
+                @param meth <built-in method> - The method being tested (compare meth == self.someMethod)
+        '''
+        dbConn = ichorORM.getDatabaseConnection(isTransactionMode=True)
+
+        valueDicts = [ { 'num' : i } for i in range(self.NUM_ROWS) ]
+
+        dbConn.doInsert("INSERT INTO " + MyChunkModel.TABLE_NAME + " (num) VALUES ( %(num)s )", valueDicts=valueDicts, doCommit=True, returnPk=False)
+
+
+    def teardown_method(self, meth):
+        '''
+            teardown_method - Called after execution of each method to clean up
+
+                @param meth <built-in method> - The method being tested (compare meth == self.someMethod)
+        '''
+        dbConn = ichorORM.getDatabaseConnection()
+        dbConn.executeSql('DELETE FROM %s' %( MyChunkModel.TABLE_NAME, ))
+
+
+    def _getNumberRows(self, whereStr=''):
+        '''
+            _getNumberRows - Get the number of rows in the table, optionally with a WHERE
+        '''
+        dbConn = getDatabaseConnection()
+
+        results = dbConn.doSelect("SELECT COUNT(*) FROM %s %s" %( MyChunkModel.TABLE_NAME, whereStr ))
+
+        return int(results[0][0])
+
+
+    def test_deleteByPk(self):
+        '''
+            test_deleteByPk - Test deleting in primary key chunks
+        '''
+
+        delQ = DeleteQuery(MyChunkModel)
+        delQ.addStage().addCondition('num', '>=', 5)
+
+        progresses = []
+
+        runner = ChunkedQueryRunner(delQ, chunkSize=7, chunkBy=CHUNK_BY_PK, progressCallback=progresses.append)
+
+        numDeleted = runner.run()
+
+        assert numDeleted == 20 , 'Expected to delete 20 rows, but run returned %d' %(numDeleted, )
+
+        assert self._getNumberRows() == 5 , 'Expected 5 rows to remain after chunked delete, but got %d' %(self._getNumberRows(), )
+
+        assert runner.isComplete is True , 'Expected runner to be marked complete.'
+
+        assert [ progress.chunkRowCount for progress in progresses ] == [7, 7, 6] , 'Expected chunks of 7, 7, 6 rows. Got: ' + repr(progresses)
+
+        assert progresses[-1].totalRowCount == 20 , 'Expected last progress to have a total of 20 rows. Got: ' + repr(progresses[-1])
+
+
+    def test_deleteResume(self):
+        '''
+            test_deleteResume - Test stopping and resuming a run with startAfterPk
+        '''
+
+        delQ = DeleteQuery(MyChunkModel)
+
+        runner = ChunkedQueryRunner(delQ, chunkSize=10, maxChunks=1, allowDeleteAll=True)
+
+        numDeleted = runner.run()
+
+        assert numDeleted == 10 , 'Expected first run to delete 10 rows, but got %d' %(numDeleted, )
+        assert runner.isComplete is False , 'Expected runner to not be complete after maxChunks reached.'
+        assert runner.lastPk is not None , 'Expected lastPk to be set after a chunk.'
+
+        resumeRunner = ChunkedQueryRunner(delQ, chunkSize=10, startAfterPk=runner.lastPk, allowDeleteAll=True)
+
+        numDeleted = resumeRunner.run()
+
+        assert numDeleted == 15 , 'Expected resumed run to delete remaining 15 rows, but got %d' %(numDeleted, )
+
+        assert self._getNumberRows() == 0 , 'Expected all rows to be deleted.'
+
+
+    def test_deleteAllSafety(self):
+        '''
+            test_deleteAllSafety - Test that a delete without a WHERE is refused unless allowDeleteAll
+        '''
+
+        delQ = DeleteQuery(MyChunkModel)
+
+        gotException = False
+        try:
+            delQ.executeDeleteChunked(chunkSize=5)
+        except ValueError as e:
+            gotException = e
+
+        assert gotException is not False , 'Expected to get a ValueError when running a chunked delete without a WHERE.'
+
+        assert self._getNumberRows() == self.NUM_ROWS , 'Expected no rows to be deleted.'
+
+
+    def test_updateByCtid(self):
+        '''
+            test_updateByCtid - Test a backfill in ctid chunks
+        '''
+
+        upQ = UpdateQuery(MyChunkModel, { 'is_processed' : 1 })
+        # Must exclude already-updated rows when chunking an update by ctid
+        upQ.addStage().addCondition('is_processed', '=', 0)
+
+        progresses = []
+
+        numUpdated = upQ.executeUpdateChunked(chunkSize=10, chunkBy=CHUNK_BY_CTID, progressCallback=progresses.append)
+
+        assert numUpdated == self.NUM_ROWS , 'Expected to update %d rows, but got %d' %(self.NUM_ROWS, numUpdated)
+
+        assert len(progresses) == 3 , 'Expected 3 chunks. Got: ' + repr(progresses)
+
+        assert self._getNumberRows('WHERE is_processed = 0') == 0 , 'Expected all rows to be processed.'
+
+
+    def test_stopFromCallback(self):
+        '''
+            test_stopFromCallback - Test that returning False from the callback stops the run
+        '''
+
+        upQ = UpdateQuery(MyChunkModel, { 'is_processed' : 1 })
+
+        runner = ChunkedQueryRunner(upQ, chunkSize=5, progressCallback=lambda progress : False)
+
+        numUpdated = runner.run()
+
+        assert numUpdated == 5 , 'Expected only one chunk of 5 rows to be updated, but got %d' %(numUpdated, )
+
+        assert self._getNumberRows('WHERE is_processed = 1') == 5 , 'Expected 5 rows to be processed.'
+
+
+if __name__ == '__main__':
+    sys.exit(subprocess.Popen('GoodTests.py -n1 "%s" %s' %(sys.argv[0], ' '.join(['"%s"' %(arg.replace('"', '\\"'), ) for arg in sys.argv[1:]]) ), shell=True).wait())
@@ -0,0 +1,218 @@
+#!/usr/bin/env GoodTests.py
+'''
+    test_CostGuard - Test the query cost guard checked prior to execution
+'''
+
+import subprocess
+import sys
+
+import LocalConfig
+
+
+import ichorORM
+
+from ichorORM.model import DatabaseModel
+from ichorORM.query import SelectQuery, DeleteQuery
+from ichorORM import costguard
+from ichorORM.costguard import setGlobalCostGuard, clearCostGuardCache, QueryCostExceededError, COST_GUARD_RAISE, COST_GUARD_LOG
+
+
+class MyCostGuardModel(DatabaseModel):
+    '''
+        MyCostGuardModel - A model used to test the cost guard
+    '''
+
+    FIELDS = ['id', 'name', 'num']
+
+    REQUIRED_FIELDS = ['name']
+
+    TABLE_NAME = 'ichortest_my_cost_guard_model'
+
+
+class MyLimitedCostGuardModel(MyCostGuardModel):
+    '''
+        MyLimitedCostGuardModel - Same table, but with a model-level row limit
+    '''
+
+    MAX_QUERY_ROWS = 10
+
+
+class TestCostGuard(object):
+    '''
+        Test class for the cost guard
+    '''
+
+    # NUM_ROWS - Number of rows inserted for the tests
+    NUM_ROWS = 200
+
+    def setup_class(self):
+        '''
+            setup_class - ensure this test is setup.
+                Executed prior to any of the tests in this class.
+        '''
+        LocalConfig.ensureTestSetup()
+
+        dbConn = ichorORM.getDatabaseConnection()
+        try:
+            dbConn.executeSql("DROP TABLE " + MyCostGuardModel.TABLE_NAME)
+        except:
+            pass
+
+        dbConn.executeSql("CREATE TABLE %s ( id serial primary key, name varchar(255) NOT NULL, num integer )" %(MyCostGuardModel.TABLE_NAME, ))
+
+        valueDicts = [ { 'name' : 'name%d' %(i, ), 'num' : i } for i in range(self.NUM_ROWS) ]
+
+        dbConn.doInsert("INSERT INTO " + MyCostGuardModel.TABLE_NAME + " (name, num) VALUES ( %(name)s, %(num)s )", valueDicts=valueDicts, returnPk=False)
+
+        dbConn.executeSql("ANALYZE " + MyCostGuardModel.TABLE_NAME)
+
+
+    def teardown_class(self):
+        '''
+            teardown_class - Destroy any data generated by this test.
+                Ran after all tests have completed
+        '''
+        try:
+            dbConn = ichorORM.getDatabaseConnection()
+            dbConn.executeSql("DROP TABLE %s" %(MyCostGuardModel.TABLE_NAME, ))
+        except Exception as e:
+            pass
+
+
+    def setup_method(self, meth):
+        '''
+            setup_method - Called prior to each method to perform setup specific to it.
+
+                @param meth <built-in method> - The method being tested (compare meth == self.someMethod)
+        '''
+        clearCostGuardCache()
+
+
+    def teardown_method(self, meth):
+        '''
+            teardown_method - Called after execution of each method to clean up
+
+                @param meth <built-in method> - The method being tested (compare meth == self.someMethod)
+        '''
+        setGlobalCostGuard(maxCost=None, maxRows=None, action=COST_GUARD_RAISE)
+
+
+    def _getNumberRows(self):
+        '''
+            _getNumberRows - Get the number of rows in the table
+        '''
+        dbConn = ichorORM.getDatabaseConnection()
+
+        return int( dbConn.doSelect("SELECT COUNT(*) FROM " + MyCostGuardModel.TABLE_NAME)[0][0] )
+
+
+    def test_noGuardByDefault(self):
+        '''
+            test_noGuardByDefault - Test that with no thresholds, queries run and nothing is cached
+        '''
+        selQ = SelectQuery(MyCostGuardModel)
+
+        objs = selQ.executeGetObjs()
+
+        assert len(objs) == self.NUM_ROWS , 'Expected to fetch %d objs. Got %d' %(self.NUM_ROWS, len(objs))
+
+        assert len(costguard._planCache) == 0 , 'Expected no EXPLAIN to be performed when no thresholds are set.'
+
+
+    def test_globalMaxRows(self):
+        '''
+            test_globalMaxRows - Test the global max rows raises before executing
+        '''
+        setGlobalCostGuard(maxRows=50)
+
+        selQ = SelectQuery(MyCostGuardModel)
+
+        gotException = False
+        try:
+            selQ.executeGetObjs()
+        except QueryCostExceededError as e:
+            gotException = e
+
+        assert gotException is not False , 'Expected a QueryCostExceededError on a select estimated above maxRows.'
+        assert gotException.estimatedRows > 50 , 'Expected estimatedRows on exception to be above 50. Got: ' + repr(gotException.estimatedRows)
+
+        # A narrow query passes
+        selQ = SelectQuery(MyCostGuardModel)
+        selQ.addStage().addCondition('id', '=', 1)
+
+        objs = selQ.executeGetObjs()
+
+        assert len(objs) == 1 , 'Expected a narrow query to pass the guard and return 1 obj. Got: ' + repr(objs)
+
+        # Explicitly bypassed
+        selQ = SelectQuery(MyCostGuardModel)
+        selQ.ignoreCostGuard = True
+
+        objs = selQ.executeGetObjs()
+
+        assert len(objs) == self.NUM_ROWS , 'Expected ignoreCostGuard to bypass the guard.'
+
+
+    def test_deleteGuarded(self):
+        '''
+            test_deleteGuarded - Test that a guarded delete does not remove any rows
+        '''
+        setGlobalCostGuard(maxRows=50)
+
+        delQ = DeleteQuery(MyCostGuardModel)
+        delQ.addStage().addCondition('num', '>=', 0)
+
+        gotException = False
+        try:
+            delQ.executeDelete()
+        except QueryCostExceededError as e:
+            gotException = e
+
+        assert gotException is not False , 'Expected a QueryCostExceededError on a delete estimated above maxRows.'
+
+        assert self._getNumberRows() == self.NUM_ROWS , 'Expected no rows to be deleted when the cost guard refuses.'
+
+
+    def test_modelOverride(self):
+        '''
+            test_modelOverride - Test MAX_QUERY_ROWS on a model overrides the global
+        '''
+        setGlobalCostGuard(maxRows=100000)
+
+        selQ = SelectQuery(MyLimitedCostGuardModel)
+
+        gotException = False
+        try:
+            selQ.executeGetObjs()
+        except QueryCostExceededError as e:
+            gotException = e
+
+        assert gotException is not False , 'Expected model MAX_QUERY_ROWS to override the global.'
+
+        # Unlimited model still uses the global
+        objs = SelectQuery(MyCostGuardModel).executeGetObjs()
+
+        assert len(objs) == self.NUM_ROWS , 'Expected the model without limits to use the global.'
+
+
+    def test_logAction(self):
+        '''
+            test_logAction - Test the log action executes anyway
+        '''
+        setGlobalCostGuard(maxCost=0.01, action=COST_GUARD_LOG)
+
+        objs = SelectQuery(MyCostGuardModel).executeGetObjs()
+
+        assert len(objs) == self.NUM_ROWS , 'Expected the query to execute with COST_GUARD_LOG.'
+
+        gotException = False
+        try:
+            setGlobalCostGuard(action='blah')
+        except ValueError as e:
+            gotException = e
+
+        assert gotException is not False , 'Expected a ValueError on an unknown action.'
+
+
+if __name__ == '__main__':
+    sys.exit(subprocess.Popen('GoodTests.py -n1 "%s" %s' %(sys.argv[0], ' '.join(['"%s"' %(arg.replace('"', '\\"'), ) for arg in sys.argv[1:]]) ), shell=True).wait())
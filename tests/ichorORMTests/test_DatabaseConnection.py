@@ -111,6 +111,47 @@ class TestDatabaseConnection(object):
         assert dbCursor , 'Expected to be able to get a cursor, but did not.'
 
 
+    def test_sessionState(self):
+        '''
+            test_sessionState - Test session params are applied, re-applied after a rollback, and cursors are reused across commits
+        '''
+        dbConn = ichorORM.getDatabaseConnection()
+
+        dbConn.setStatementTimeout(12345)
+        dbConn.setTimezone('UTC')
+        dbConn.setSearchPath(['pg_catalog', 'public'])
+
+        row = dbConn.doSelect("SELECT current_setting('statement_timeout'), current_setting('TimeZone'), current_setting('search_path')")[0]
+        assert tuple(row) == ('12345ms', 'UTC', 'pg_catalog, public') , 'Expected session params to be applied. Got: ' + repr(row)
+
+        dbCursor = dbConn.getCursor()
+        dbConn.commit()
+        assert dbConn.getCursor() is dbCursor , 'Expected cursor to be reused after commit.'
+
+        dbConn.setSearchPath(None)
+        row = dbConn.doSelect("SELECT current_setting('search_path')")[0]
+        assert row[0] != 'pg_catalog, public' , 'Expected search_path to be reset. Got: ' + repr(row[0])
+
+        # A param set within a transaction is undone by rollback, and should be re-applied
+        dbConn.beginTransactionMode()
+        try:
+            dbConn.setStatementTimeout(54321)
+            row = dbConn.doSelect("SELECT current_setting('statement_timeout')")[0]
+            assert row[0] == '54321ms' , 'Expected statement_timeout in transaction. Got: ' + repr(row[0])
+            dbConn.rollback()
+
+            row = dbConn.doSelect("SELECT current_setting('statement_timeout')")[0]
+            assert row[0] == '54321ms' , 'Expected statement_timeout to be re-applied after rollback. Got: ' + repr(row[0])
+            dbConn.commit()
+        finally:
+            dbConn.endTransactionMode()
+
+        # And after a reconnect
+        dbConn.closeConnection()
+        row = dbConn.doSelect("SELECT current_setting('statement_timeout'), current_setting('TimeZone')")[0]
+        assert tuple(row) == ('54321ms', 'UTC') , 'Expected session params to be applied after reconnect. Got: ' + repr(row)
+
+
     def _dropTestTable(self):
         dbConn = ichorORM.getDatabaseConnection()
 
@@ -0,0 +1,182 @@
+#!/usr/bin/env GoodTests.py
+'''
+    test_DatabaseConnectionPool - Test pooling DatabaseConnection objects
+'''
+
+import subprocess
+import sys
+import time
+
+import LocalConfig
+
+import psycopg2.extensions
+
+
+import ichorORM
+
+from ichorORM.pool import DatabaseConnectionPool, DatabaseConnectionPoolTimeout, getPoolMetricsText, LEAK_REASON_HELD, LEAK_REASON_UNCOMMITTED
+from ichorORM.instrumentation import addInstrumentationListener, removeInstrumentationListener
+
+
+class TestDatabaseConnectionPool(object):
+    '''
+        Test class for DatabaseConnectionPool
+    '''
+
+    def setup_class(self):
+        '''
+            setup_class - ensure this test is setup.
+                Executed prior to any of the tests in this class.
+        '''
+        LocalConfig.ensureTestSetup()
+
+
+    def test_checkout(self):
+        '''
+            test_checkout - Test connections are reused, limited, and reset upon checkin
+        '''
+        pool = DatabaseConnectionPool(maxSize=2)
+
+        with pool.connection() as dbConn:
+            rows = dbConn.doSelect('SELECT 1')
+            assert rows[0][0] == 1 , 'Expected to query through a pooled connection. Got: ' + repr(rows)
+            firstConn = dbConn
+
+        with pool.connection() as dbConn:
+            assert dbConn is firstConn , 'Expected the idle connection to be reused.'
+
+        dbConn1 = pool.checkout()
+        dbConn2 = pool.checkout()
+        assert pool.numOpen == 2 and pool.numIdle == 0 , 'Expected 2 open, 0 idle. Got: %d open, %d idle' %(pool.numOpen, pool.numIdle)
+
+        gotException = False
+        try:
+            pool.checkout(timeout=0.1)
+        except DatabaseConnectionPoolTimeout:
+            gotException = True
+
+        assert gotException , 'Expected DatabaseConnectionPoolTimeout with every connection checked out.'
+
+        # Left in an uncommitted transaction, which should be rolled back upon checkin
+        dbConn1.beginTransactionMode()
+        dbConn1.doSelect('SELECT 1')
+        pool.checkin(dbConn1)
+
+        dbConn = pool.checkout()
+        assert dbConn is dbConn1 , 'Expected the checked in connection.'
+        assert dbConn.isTransaction is False , 'Expected transaction mode reset upon checkin.'
+        assert dbConn.getConnection().status == psycopg2.extensions.STATUS_READY , 'Expected the open transaction rolled back upon checkin.'
+
+        pool.checkin(dbConn)
+        pool.checkin(dbConn2)
+
+        # dbConn2 never ran a query, and so has no psycopg2 connection yet. It should still be kept.
+        assert pool.numOpen == 2 , 'Expected a checked in connection which was never used to be kept open. Got %d open' %(pool.numOpen, )
+
+        # A second checkin is ignored, rather than making the connection idle twice
+        pool.checkin(dbConn)
+        assert pool.numIdle == 2 , 'Expected a second checkin of a connection ignored. Got %d idle' %(pool.numIdle, )
+
+        dbConn1 = pool.checkout()
+        dbConn2 = pool.checkout()
+        assert dbConn1 is not dbConn2 , 'Expected distinct connections after a second checkin.'
+
+        pool.checkin(dbConn1)
+        pool.checkin(dbConn2)
+
+        pool.closeAll()
+        assert pool.numOpen == 0 , 'Expected no open connections after closeAll. Got: %d' %(pool.numOpen, )
+
+
+    def test_metrics(self):
+        '''
+            test_metrics - Test the pool metrics, and the prometheus text
+        '''
+        pool = DatabaseConnectionPool(maxSize=2, name='metricsPool')
+
+        dbConn1 = pool.checkout()
+        dbConn2 = pool.checkout()
+
+        try:
+            pool.checkout(timeout=0.05)
+        except DatabaseConnectionPoolTimeout:
+            pass
+
+        metrics = pool.getMetrics()
+        assert metrics['open'] == 2 and metrics['inUse'] == 2 and metrics['idle'] == 0 , 'Expected 2 connections in use. Got: ' + repr(metrics)
+        assert metrics['checkouts'] == 2 , 'Expected 2 checkouts. Got: ' + repr(metrics['checkouts'])
+        assert metrics['timeouts'] == 1 , 'Expected 1 timeout. Got: ' + repr(metrics['timeouts'])
+        assert list(metrics['waitBuckets'].values())[-1] == 2 , 'Expected every checkout in the last bucket. Got: ' + repr(metrics['waitBuckets'])
+        assert len(metrics['connectionAges']) == 2 , 'Expected an age per connection. Got: ' + repr(metrics['connectionAges'])
+
+        pool.checkin(dbConn1)
+
+        metricsText = getPoolMetricsText([pool])
+        assert 'ichor_pool_connections{pool="metricsPool",state="in_use"} 1' in metricsText , 'Expected in use connections in text. Got: ' + metricsText
+        assert 'ichor_pool_checkout_timeouts_total{pool="metricsPool"} 1' in metricsText , 'Expected timeouts in text. Got: ' + metricsText
+        assert 'ichor_pool_checkout_wait_seconds_bucket{pool="metricsPool",le="+Inf"} 2' in metricsText , 'Expected wait histogram in text. Got: ' + metricsText
+
+        assert 'pool="metricsPool"' in getPoolMetricsText() , 'Expected open pools in the text of all pools.'
+
+        pool.checkin(dbConn2)
+        pool.closeAll()
+
+        assert 'pool="metricsPool"' not in getPoolMetricsText() , 'Expected closed pools removed from the text of all pools.'
+
+
+    def test_leaks(self):
+        '''
+            test_leaks - Test leaked connections are detected, with the stack where checked out
+        '''
+        events = []
+        listener = lambda eventName, eventData : events.append( (eventName, eventData) )
+        addInstrumentationListener(listener)
+
+        try:
+            pool = DatabaseConnectionPool(maxSize=2, leakThreshold=0.1, detectUncommitted=True)
+
+            dbConn = pool.checkout()
+            assert pool.checkLeaks() == [] , 'Expected no leak before the threshold.'
+
+            time.sleep(0.2)
+
+            leaks = pool.checkLeaks()
+            assert len(leaks) == 1 and leaks[0].reason == LEAK_REASON_HELD , 'Expected a held connection. Got: ' + repr(leaks)
+            assert 'test_leaks' in leaks[0].stack , 'Expected the checkout stack. Got: ' + leaks[0].stack
+
+            # Reported once
+            pool.checkLeaks()
+            pool.checkin(dbConn)
+
+            heldEvents = [ eventData for (eventName, eventData) in events if eventName == 'pool_leak' and eventData['reason'] == LEAK_REASON_HELD ]
+            assert len(heldEvents) == 1 , 'Expected one pool_leak event for the held connection. Got: ' + repr(heldEvents)
+
+            with pool.connection() as dbConn:
+                dbConn.beginTransactionMode()
+                dbConn.doSelect('SELECT 1')
+
+            uncommittedEvents = [ eventData for (eventName, eventData) in events if eventName == 'pool_leak' and eventData['reason'] == LEAK_REASON_UNCOMMITTED ]
+            assert len(uncommittedEvents) == 1 , 'Expected a pool_leak event for the uncommitted transaction. Got: ' + repr(uncommittedEvents)
+
+            assert pool.getMetrics()['leaks'] == 2 , 'Expected 2 leaks counted.'
+
+            pool.closeAll()
+
+            # With a leakCheckInterval, a connection never checked in is reported without polling
+            events.clear()
+            pool = DatabaseConnectionPool(maxSize=1, leakThreshold=0.1, leakCheckInterval=0.05)
+
+            dbConn = pool.checkout()
+            time.sleep(0.4)
+
+            heldEvents = [ eventData for (eventName, eventData) in events if eventName == 'pool_leak' and eventData['reason'] == LEAK_REASON_HELD ]
+            assert len(heldEvents) == 1 , 'Expected the leak check timer to report the held connection once. Got: ' + repr(heldEvents)
+
+            pool.checkin(dbConn)
+            pool.closeAll()
+        finally:
+            removeInstrumentationListener(listener)
+
+
+if __name__ == '__main__':
+    sys.exit(subprocess.Popen('GoodTests.py -n1 "%s" %s' %(sys.argv[0], ' '.join(['"%s"' %(arg.replace('"', '\\"'), ) for arg in sys.argv[1:]]) ), shell=True).wait())
@@ -447,6 +447,43 @@ class TestDatabaseModel(object):
             assert getObj.asDict() == obj.asDict() , 'Expected .get to return idential object.\n%s   !=  %s\n' %( repr(obj), repr(getObj))
 
 
+    def test_increment(self):
+        '''
+            test_increment - Test atomically incrementing a field
+        '''
+
+        newObj = MyPersonModel.createAndSave(first_name='Count', last_name='Dracula', age=500)
+
+        # A second copy, which will become stale
+        staleObj = MyPersonModel.get(newObj.id)
+
+        newValue = newObj.increment('age')
+
+        assert newValue == 501 , 'Expected increment to return the new value of 501. Got: ' + repr(newValue)
+        assert newObj.age == 501 , 'Expected increment to set the new value of 501 on the object. Got: ' + repr(newObj.age)
+
+        # Increment the stale copy, should NOT be lost
+        newValue = staleObj.increment('age', by=10)
+
+        assert newValue == 511 , 'Expected increment on a stale object to still increment the database value, to 511. Got: ' + repr(newValue)
+
+        newValue = newObj.increment('age', by=-11)
+
+        assert newValue == 500 , 'Expected negative increment to decrement to 500. Got: ' + repr(newValue)
+
+        objFetch = MyPersonModel.get(newObj.id)
+
+        assert objFetch.age == 500 , 'Expected fetched age to be 500 after increments. Got: ' + repr(objFetch.age)
+
+        gotValueError = False
+        try:
+            MyPersonModel(first_name='Not', last_name='Saved', age=1).increment('age')
+        except ValueError:
+            gotValueError = True
+
+        assert gotValueError , 'Expected to get a ValueError incrementing an unsaved object'
+
+
     def test_createAndSave(self):
         '''
             test_createAndSave - Test the "create and save" method
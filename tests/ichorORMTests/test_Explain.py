@@ -0,0 +1,236 @@
+#!/usr/bin/env GoodTests.py
+'''
+    test_Explain - Test EXPLAIN / EXPLAIN ANALYZE on the various query types
+'''
+
+import subprocess
+import sys
+
+import LocalConfig
+
+
+import ichorORM
+
+from ichorORM.model import DatabaseModel
+from ichorORM.query import SelectQuery, SelectGenericJoinQuery, SelectInnerJoinQuery, UpdateQuery, DeleteQuery, QueryStr
+from ichorORM.constants import JOIN_INNER
+from ichorORM.explain import QueryPlan
+
+
+class MyExplainModel(DatabaseModel):
+    '''
+        MyExplainModel - A model used to test EXPLAIN
+    '''
+
+    FIELDS = ['id', 'name', 'num']
+
+    REQUIRED_FIELDS = ['name']
+
+    TABLE_NAME = 'ichortest_my_explain_model'
+
+
+class MyExplainJoinModel(DatabaseModel):
+    '''
+        MyExplainJoinModel - A model joined to MyExplainModel to test EXPLAIN on joins
+    '''
+
+    FIELDS = ['id', 'id_explain', 'label']
+
+    REQUIRED_FIELDS = ['id_explain']
+
+    TABLE_NAME = 'ichortest_my_explain_join_model'
+
+
+class TestExplain(object):
+    '''
+        Test class for explain on queries
+    '''
+
+    # NUM_ROWS - Number of rows inserted for the tests
+    NUM_ROWS = 50
+
+    def setup_class(self):
+        '''
+            setup_class - ensure this test is setup.
+                Executed prior to any of the tests in this class.
+        '''
+        LocalConfig.ensureTestSetup()
+
+        dbConn = ichorORM.getDatabaseConnection()
+        for tableName in (MyExplainJoinModel.TABLE_NAME, MyExplainModel.TABLE_NAME):
+            try:
+                dbConn.executeSql("DROP TABLE " + tableName)
+            except:
+                pass
+
+        dbConn.executeSql("CREATE TABLE %s ( id serial primary key, name varchar(255) NOT NULL, num integer )" %(MyExplainModel.TABLE_NAME, ))
+
+        valueDicts = [ { 'name' : 'name%d' %(i, ), 'num' : i } for i in range(self.NUM_ROWS) ]
+
+        dbConn.doInsert("INSERT INTO " + MyExplainModel.TABLE_NAME + " (name, num) VALUES ( %(name)s, %(num)s )", valueDicts=valueDicts, returnPk=False)
+
+        dbConn.executeSql("CREATE TABLE %s ( id serial primary key, id_explain integer NOT NULL, label varchar(255) )" %(MyExplainJoinModel.TABLE_NAME, ))
+
+        dbConn.executeSql("INSERT INTO %s (id_explain, label) SELECT id, 'label' FROM %s" %(MyExplainJoinModel.TABLE_NAME, MyExplainModel.TABLE_NAME))
+
+        dbConn.executeSql("ANALYZE " + MyExplainModel.TABLE_NAME)
+        dbConn.executeSql("ANALYZE " + MyExplainJoinModel.TABLE_NAME)
+
+
+    def teardown_class(self):
+        '''
+            teardown_class - Destroy any data generated by this test.
+                Ran after all tests have completed
+        '''
+        try:
+            dbConn = ichorORM.getDatabaseConnection()
+            dbConn.executeSql("DROP TABLE %s" %(MyExplainJoinModel.TABLE_NAME, ))
+            dbConn.executeSql("DROP TABLE %s" %(MyExplainModel.TABLE_NAME, ))
+        except Exception as e:
+            pass
+
+
+    def _getNumberRows(self):
+        '''
+            _getNumberRows - Get the number of rows in the table
+        '''
+        dbConn = ichorORM.getDatabaseConnection()
+
+        return int( dbConn.doSelect("SELECT COUNT(*) FROM " + MyExplainModel.TABLE_NAME)[0][0] )
+
+
+    def test_explainSelect(self):
+        '''
+            test_explainSelect - Test EXPLAIN on a SelectQuery
+        '''
+
+        selQ = SelectQuery(MyExplainModel)
+        selQ.addStage().addCondition('num', '>=', 10)
+
+        plan = selQ.explain()
+
+        assert issubclass(plan.__class__, QueryPlan) , 'Expected explain to return a QueryPlan. Got: ' + repr(plan)
+
+        assert plan.totalCost > 0 , 'Expected a total cost on the plan. Got: ' + repr(plan)
+        assert plan.estimatedRows > 0 , 'Expected estimated rows on the plan. Got: ' + repr(plan)
+
+        assert plan.isAnalyzed is False , 'Expected plan to not be analyzed without analyze=True'
+        assert plan.actualRows is None , 'Expected no actual rows without analyze=True'
+
+        # No index on "num", so must be a seq scan
+        assert plan.hasSeqScan is True , 'Expected a sequential scan. Got: ' + repr(plan)
+        assert plan.seqScans[0].relationName == MyExplainModel.TABLE_NAME , 'Expected seq scan to be on our table. Got: ' + repr(plan.seqScans)
+
+
+    def test_explainAnalyzeSelect(self):
+        '''
+            test_explainAnalyzeSelect - Test EXPLAIN ANALYZE on a SelectQuery
+        '''
+
+        selQ = SelectQuery(MyExplainModel)
+        selQ.addStage().addCondition('num', '>=', 10)
+
+        plan = selQ.explain(analyze=True, buffers=True)
+
+        assert plan.isAnalyzed is True , 'Expected plan to be analyzed with analyze=True'
+
+        assert plan.actualRows == self.NUM_ROWS - 10 , 'Expected actual rows to be %d. Got: %s' %(self.NUM_ROWS - 10, repr(plan.actualRows))
+
+        assert plan.executionTime is not None , 'Expected an execution time with analyze=True'
+
+        assert plan.rootNode.actualTotalTime is not None , 'Expected node timings with analyze=True'
+
+
+    def test_explainText(self):
+        '''
+            test_explainText - Test EXPLAIN in text format
+        '''
+
+        selQ = SelectQuery(MyExplainModel)
+
+        plan = selQ.explain(format='text')
+
+        assert 'Seq Scan' in plan , 'Expected text plan to contain "Seq Scan". Got: ' + repr(plan)
+
+
+    def test_explainJoin(self):
+        '''
+            test_explainJoin - Test EXPLAIN on the join query types
+        '''
+
+        # Without any joins
+        selQ = SelectGenericJoinQuery(MyExplainModel)
+
+        plan = selQ.explain()
+
+        assert plan.getNodesByRelation(MyExplainModel.TABLE_NAME) , 'Expected a node on our table. Got: ' + repr(plan)
+
+        selQ = SelectGenericJoinQuery(MyExplainModel)
+        selQ.addStage().addCondition(MyExplainModel.TABLE_NAME + '.num', '<', 10)
+
+        joinWhere = selQ.joinModel(MyExplainJoinModel, JOIN_INNER)
+        joinWhere.addJoin(MyExplainJoinModel.TABLE_NAME + '.id_explain', '=', MyExplainModel.TABLE_NAME + '.id')
+
+        plan = selQ.explain(analyze=True)
+
+        assert plan.getNodesByRelation(MyExplainModel.TABLE_NAME) , 'Expected a node on our table. Got: ' + repr(plan)
+        assert plan.getNodesByRelation(MyExplainJoinModel.TABLE_NAME) , 'Expected a node on the joined table. Got: ' + repr(plan)
+        assert plan.actualRows == 10 , 'Expected 10 joined rows. Got: ' + repr(plan.actualRows)
+
+        selQ = SelectInnerJoinQuery( [ MyExplainModel, MyExplainJoinModel ] )
+
+        selQWhere = selQ.addStage()
+        selQWhere.addCondition(MyExplainModel.TABLE_NAME + '.num', '<', 10)
+        selQWhere.addCondition(MyExplainModel.TABLE_NAME + '.id', '=', QueryStr(MyExplainJoinModel.TABLE_NAME + '.id_explain'))
+
+        plan = selQ.explain(analyze=True)
+
+        assert plan.getNodesByRelation(MyExplainModel.TABLE_NAME) , 'Expected a node on our table. Got: ' + repr(plan)
+        assert plan.getNodesByRelation(MyExplainJoinModel.TABLE_NAME) , 'Expected a node on the joined table. Got: ' + repr(plan)
+        assert plan.actualRows == 10 , 'Expected 10 joined rows. Got: ' + repr(plan.actualRows)
+
+
+    def test_explainAnalyzeWritesRolledBack(self):
+        '''
+            test_explainAnalyzeWritesRolledBack - Test that EXPLAIN ANALYZE on a write does not modify data
+        '''
+
+        delQ = DeleteQuery(MyExplainModel)
+        delQ.addStage().addCondition('num', '<', 20)
+
+        plan = delQ.explain(analyze=True)
+
+        assert plan.isAnalyzed , 'Expected plan to be analyzed'
+
+        assert self._getNumberRows() == self.NUM_ROWS , 'Expected EXPLAIN ANALYZE of a delete to be rolled back.'
+
+        upQ = UpdateQuery(MyExplainModel, { 'name' : 'changed' })
+
+        # Autocommit connection
+        dbConn = ichorORM.getDatabaseConnection()
+
+        upQ.explain(analyze=True, dbConn=dbConn)
+
+        results = dbConn.doSelect("SELECT COUNT(*) FROM %s WHERE name = 'changed'" %(MyExplainModel.TABLE_NAME, ))
+        assert results[0][0] == 0 , 'Expected EXPLAIN ANALYZE of an update on autocommit connection to be rolled back.'
+
+        # Transaction connection with pending work -- pending work must survive
+        dbConnTrans = ichorORM.getDatabaseConnection(isTransactionMode=True)
+
+        dbConnTrans.executeSql("INSERT INTO %s (name, num) VALUES ('pending', 1000)" %(MyExplainModel.TABLE_NAME, ))
+
+        upQ.explain(analyze=True, dbConn=dbConnTrans)
+
+        dbConnTrans.commit()
+
+        results = dbConn.doSelect("SELECT COUNT(*) FROM %s WHERE name = 'changed'" %(MyExplainModel.TABLE_NAME, ))
+        assert results[0][0] == 0 , 'Expected EXPLAIN ANALYZE of an update within a transaction to be rolled back.'
+
+        results = dbConn.doSelect("SELECT COUNT(*) FROM %s WHERE name = 'pending'" %(MyExplainModel.TABLE_NAME, ))
+        assert results[0][0] == 1 , 'Expected pending work in the transaction to survive an EXPLAIN ANALYZE.'
+
+        dbConn.executeSql("DELETE FROM %s WHERE name = 'pending'" %(MyExplainModel.TABLE_NAME, ))
+
+
+if __name__ == '__main__':
+    sys.exit(subprocess.Popen('GoodTests.py -n1 "%s" %s' %(sys.argv[0], ' '.join(['"%s"' %(arg.replace('"', '\\"'), ) for arg in sys.argv[1:]]) ), shell=True).wait())
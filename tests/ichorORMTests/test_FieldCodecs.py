@@ -0,0 +1,167 @@
+#!/usr/bin/env GoodTests.py
+'''
+    test_FieldCodecs - Test per-field codecs ( FIELD_CODECS / SelectQuery.setFieldCodec )
+'''
+
+import subprocess
+import sys
+
+from decimal import Decimal
+
+import LocalConfig
+
+
+import ichorORM
+
+from ichorORM.model import DatabaseModel
+from ichorORM.query import SelectQuery
+from ichorORM.fieldcodecs import RawCodec, FloatCodec, LazyJSONCodec, FunctionCodec, LazyJSONValue
+
+
+class MyCodecModel(DatabaseModel):
+    '''
+        MyCodecModel - A model with codecs on some fields
+    '''
+
+    FIELDS = ['id', 'name', 'price', 'other_price', 'payload']
+
+    REQUIRED_FIELDS = ['name']
+
+    TABLE_NAME = 'ichortest_my_codec_model'
+
+    FIELD_CODECS = {
+        'price'   : FloatCodec(),
+        'payload' : LazyJSONCodec(),
+    }
+
+
+class MyNoCodecModel(MyCodecModel):
+    '''
+        MyNoCodecModel - The same table, without codecs
+    '''
+
+    FIELD_CODECS = {}
+
+
+class MySharedTypeCodecModel(MyCodecModel):
+    '''
+        MySharedTypeCodecModel - The same table, with a field without a codec before a field of the same type with one
+    '''
+
+    FIELDS = ['id', 'other_price', 'price']
+
+    FIELD_CODECS = {
+        'price' : FloatCodec(),
+    }
+
+
+class TestFieldCodecs(object):
+    '''
+        Test class for field codecs
+    '''
+
+    def setup_class(self):
+        '''
+            setup_class - ensure this test is setup.
+                Executed prior to any of the tests in this class.
+        '''
+        LocalConfig.ensureTestSetup()
+
+        dbConn = ichorORM.getDatabaseConnection()
+        try:
+            dbConn.executeSql("DROP TABLE " + MyCodecModel.TABLE_NAME)
+        except:
+            pass
+
+        dbConn.executeSql("CREATE TABLE %s ( id serial primary key, name varchar(255) NOT NULL, price numeric(10, 2), other_price numeric(10, 2), payload json )" %(MyCodecModel.TABLE_NAME, ))
+
+        valueDicts = [
+            { 'name' : 'one', 'price' : Decimal('1.50'), 'other_price' : Decimal('2.25'), 'payload' : '{"a": 1, "b": [1, 2]}' },
+            { 'name' : 'two', 'price' : None, 'other_price' : Decimal('3.00'), 'payload' : None },
+        ]
+
+        dbConn.doInsert("INSERT INTO " + MyCodecModel.TABLE_NAME + " (name, price, other_price, payload) VALUES ( %(name)s, %(price)s, %(other_price)s, %(payload)s )", valueDicts=valueDicts, returnPk=False)
+
+
+    def teardown_class(self):
+        '''
+            teardown_class - Destroy any data generated by this test.
+                Ran after all tests have completed
+        '''
+        try:
+            dbConn = ichorORM.getDatabaseConnection()
+            dbConn.executeSql("DROP TABLE %s" %(MyCodecModel.TABLE_NAME, ))
+        except Exception as e:
+            pass
+
+
+    def test_modelCodecs(self):
+        '''
+            test_modelCodecs - Test FIELD_CODECS on a model are applied when fetching
+        '''
+        objs = MyCodecModel.filter(orderByField='name').fetch()
+
+        assert len(objs) == 2 , 'Expected 2 objs. Got: ' + repr(objs)
+
+        (objOne, objTwo) = objs
+
+        assert objOne.price == 1.5 and issubclass(objOne.price.__class__, float) , 'Expected FloatCodec to decode price as float. Got: ' + repr(objOne.price)
+        assert objTwo.price is None , 'Expected NULL to remain None. Got: ' + repr(objTwo.price)
+
+        # other_price is the same type, but has no codec
+        assert objOne.other_price == Decimal('2.25') and issubclass(objOne.other_price.__class__, Decimal) , 'Expected field without a codec to be a Decimal. Got: ' + repr(objOne.other_price)
+
+        payload = objOne.payload
+        assert issubclass(payload.__class__, LazyJSONValue) , 'Expected LazyJSONCodec to give a LazyJSONValue. Got: ' + repr(payload)
+        assert payload.isParsed is False , 'Expected json to not be parsed before access.'
+        assert payload['b'] == [1, 2] , 'Expected item access on parsed json. Got: ' + repr(payload['b'])
+        assert payload.isParsed is True , 'Expected json to be parsed upon access.'
+        assert payload == { 'a' : 1, 'b' : [1, 2] } , 'Expected LazyJSONValue to compare as the parsed value.'
+
+        assert objTwo.payload is None , 'Expected NULL json to remain None.'
+
+        # Saving a lazy value saves the json
+        objOne.name = 'one'
+        objOne.updateObject(['name', 'payload'])
+
+        fetchedObj = MyNoCodecModel.get(objOne.id)
+        assert fetchedObj.payload == { 'a' : 1, 'b' : [1, 2] } , 'Expected LazyJSONValue to save as json. Got: ' + repr(fetchedObj.payload)
+
+        # Model without codecs on the same table
+        fetchedObj = MyNoCodecModel.get(objOne.id)
+        assert issubclass(fetchedObj.price.__class__, Decimal) , 'Expected default decoding without codecs. Got: ' + repr(fetchedObj.price)
+
+        # A column without a codec first, of the same type as one with a codec
+        objs = MySharedTypeCodecModel.filter(orderByField='other_price').fetch()
+        assert len(objs) == 2 , 'Expected 2 objects. Got: ' + repr(objs)
+        assert objs[0].price == 1.5 and issubclass(objs[0].price.__class__, float) , 'Expected FloatCodec to decode price as float. Got: ' + repr(objs[0].price)
+        assert objs[0].other_price == Decimal('2.25') and issubclass(objs[0].other_price.__class__, Decimal) , 'Expected field without a codec to be a Decimal. Got: ' + repr(objs[0].other_price)
+
+
+    def test_queryCodecs(self):
+        '''
+            test_queryCodecs - Test SelectQuery.setFieldCodec overrides and adds codecs
+        '''
+        selQ = SelectQuery(MyCodecModel, selectFields=['name', 'price', 'other_price', 'payload'], orderByField='name')
+        selQ.setFieldCodec('price', RawCodec())
+        selQ.setFieldCodec('other_price', FunctionCodec(decodeFunc=lambda value : int(value * 100)))
+        selQ.setFieldCodec('payload', RawCodec())
+
+        rows = selQ.executeGetRows()
+
+        assert rows[0] == ('one', '1.50', 225, '{"a": 1, "b": [1, 2]}') , 'Expected query codecs to apply. Got: ' + repr(rows[0])
+        assert rows[1] == ('two', None, 300, None) , 'Expected query codecs to apply. Got: ' + repr(rows[1])
+
+        rows = list( selQ.executeIterRows() )
+
+        assert rows[0] == ('one', '1.50', 225, '{"a": 1, "b": [1, 2]}') , 'Expected query codecs to apply when streaming. Got: ' + repr(rows[0])
+
+        selQ.setFieldCodec('price', None)
+
+        rows = selQ.executeGetRows()
+
+        assert rows[0][1] == 1.5 , 'Expected removing the query codec to fall back to the model codec. Got: ' + repr(rows[0][1])
+
+
+if __name__ == '__main__':
+    sys.exit(subprocess.Popen('GoodTests.py -n1 "%s" %s' %(sys.argv[0], ' '.join(['"%s"' %(arg.replace('"', '\\"'), ) for arg in sys.argv[1:]]) ), shell=True).wait())
@@ -0,0 +1,132 @@
+#!/usr/bin/env GoodTests.py
+'''
+    test_Parallel - Test executing independent queries in parallel
+'''
+
+import subprocess
+import sys
+import time
+
+import LocalConfig
+
+
+import ichorORM
+
+from ichorORM.model import DatabaseModel
+from ichorORM.query import SelectQuery
+from ichorORM.pool import DatabaseConnectionPool
+from ichorORM.parallel import executeParallel, ParallelExecutionTimeout
+
+
+class MyParallelModel(DatabaseModel):
+    '''
+        MyParallelModel - A model used to test parallel execution
+    '''
+
+    FIELDS = ['id', 'name', 'num']
+
+    REQUIRED_FIELDS = ['name']
+
+    TABLE_NAME = 'ichortest_my_parallel_model'
+
+
+class TestParallel(object):
+    '''
+        Test class for executeParallel
+    '''
+
+    def setup_class(self):
+        '''
+            setup_class - ensure this test is setup.
+                Executed prior to any of the tests in this class.
+        '''
+        LocalConfig.ensureTestSetup()
+
+        dbConn = ichorORM.getDatabaseConnection()
+        try:
+            dbConn.executeSql("DROP TABLE " + MyParallelModel.TABLE_NAME)
+        except:
+            pass
+
+        dbConn.executeSql("CREATE TABLE %s ( id serial primary key, name varchar(255) NOT NULL, num integer )" %(MyParallelModel.TABLE_NAME, ))
+
+        valueDicts = [ { 'name' : 'name%d' %(i, ), 'num' : i } for i in range(10) ]
+
+        dbConn.doInsert("INSERT INTO " + MyParallelModel.TABLE_NAME + " (name, num) VALUES ( %(name)s, %(num)s )", valueDicts=valueDicts, returnPk=False)
+
+
+    def teardown_class(self):
+        '''
+            teardown_class - Destroy any data generated by this test.
+                Ran after all tests have completed
+        '''
+        try:
+            dbConn = ichorORM.getDatabaseConnection()
+            dbConn.executeSql("DROP TABLE %s" %(MyParallelModel.TABLE_NAME, ))
+        except Exception as e:
+            pass
+
+
+    def test_executeParallel(self):
+        '''
+            test_executeParallel - Test results are returned in order, and the queries overlap
+        '''
+        q1 = SelectQuery(MyParallelModel, selectFields=['num'], orderByField='num', limitNum=2)
+        q2 = SelectQuery(MyParallelModel, selectFields=['name'])
+        q2.addStage().addCondition('num', '=', 7)
+
+        sleepQuery = lambda dbConn : dbConn.doSelect('SELECT pg_sleep(0.5), 1')[0][1]
+
+        startTime = time.time()
+        results = executeParallel([ q1, sleepQuery, q2, sleepQuery, sleepQuery ], maxWorkers=5)
+        elapsed = time.time() - startTime
+
+        assert len(results) == 5 , 'Expected a result per query. Got: ' + repr(results)
+        assert [ row[0] for row in results[0] ] == [0, 1] , 'Expected rows of the first query. Got: ' + repr(results[0])
+        assert results[1] == 1 and results[3] == 1 and results[4] == 1 , 'Expected function results. Got: ' + repr(results)
+        assert [ row[0] for row in results[2] ] == ['name7'] , 'Expected rows of the third query. Got: ' + repr(results[2])
+
+        assert elapsed < 1.4 , 'Expected the sleeps to overlap. Took %.3f seconds.' %(elapsed, )
+
+        assert executeParallel([]) == [] , 'Expected no results for no queries.'
+
+
+    def test_errors(self):
+        '''
+            test_errors - Test the first error is raised, and the timeout cancels queries
+        '''
+        pool = DatabaseConnectionPool(maxSize=2)
+
+        badQuery = lambda dbConn : dbConn.doSelect('SELECT * FROM ichortest_no_such_table')
+        sleepQuery = lambda dbConn : dbConn.doSelect('SELECT pg_sleep(5)')
+
+        gotException = False
+        try:
+            executeParallel([ sleepQuery, badQuery ], pool=pool)
+        except Exception as e:
+            gotException = 'ichortest_no_such_table' in str(e)
+
+        assert gotException , 'Expected the error of the failing query.'
+
+        startTime = time.time()
+        gotException = False
+        try:
+            executeParallel([ sleepQuery, sleepQuery ], timeout=0.5, pool=pool)
+        except ParallelExecutionTimeout:
+            gotException = True
+
+        assert gotException , 'Expected ParallelExecutionTimeout.'
+        assert time.time() - startTime < 2 , 'Expected to return at the timeout.'
+
+        # The cancelled queries return their connections
+        time.sleep(0.5)
+        assert pool.numIdle == pool.numOpen , 'Expected every connection checked back in. Got: %d open, %d idle' %(pool.numOpen, pool.numIdle)
+
+        results = executeParallel([ lambda dbConn : dbConn.doSelect('SELECT 5')[0][0] ], pool=pool)
+        assert results == [5] , 'Expected pool usable after cancelled queries. Got: ' + repr(results)
+
+        pool.closeAll()
+
+
+if __name__ == '__main__':
+    sys.exit(subprocess.Popen('GoodTests.py -n1 "%s" %s' %(sys.argv[0], ' '.join(['"%s"' %(arg.replace('"', '\\"'), ) for arg in sys.argv[1:]]) ), shell=True).wait())
@@ -0,0 +1,158 @@
+#!/usr/bin/env GoodTests.py
+'''
+    test_PartitionedScan - Test scanning a query in partitions, within a shared snapshot
+'''
+
+import subprocess
+import sys
+import threading
+
+import LocalConfig
+
+
+import ichorORM
+
+from ichorORM.model import DatabaseModel
+from ichorORM.query import SelectQuery
+from ichorORM.partitioned import PartitionedScan, CHUNK_BY_PK, CHUNK_BY_CTID
+
+
+class MyPartitionedModel(DatabaseModel):
+    '''
+        MyPartitionedModel - A model used to test partitioned scans
+    '''
+
+    FIELDS = ['id', 'name', 'num']
+
+    REQUIRED_FIELDS = ['name']
+
+    TABLE_NAME = 'ichortest_my_partitioned_model'
+
+
+NUM_ROWS = 1000
+
+
+class TestPartitionedScan(object):
+    '''
+        Test class for PartitionedScan
+    '''
+
+    def setup_class(self):
+        '''
+            setup_class - ensure this test is setup.
+                Executed prior to any of the tests in this class.
+        '''
+        LocalConfig.ensureTestSetup()
+
+        dbConn = ichorORM.getDatabaseConnection()
+        try:
+            dbConn.executeSql("DROP TABLE " + MyPartitionedModel.TABLE_NAME)
+        except:
+            pass
+
+        dbConn.executeSql("CREATE TABLE %s ( id serial primary key, name varchar(255) NOT NULL, num integer )" %(MyPartitionedModel.TABLE_NAME, ))
+
+
+    def teardown_class(self):
+        '''
+            teardown_class - Destroy any data generated by this test.
+                Ran after all tests have completed
+        '''
+        try:
+            dbConn = ichorORM.getDatabaseConnection()
+            dbConn.executeSql("DROP TABLE %s" %(MyPartitionedModel.TABLE_NAME, ))
+        except Exception as e:
+            pass
+
+
+    def setup_method(self, meth):
+        '''
+            setup_method - Called prior to each method to perform setup specific to it.
+        '''
+        dbConn = ichorORM.getDatabaseConnection()
+        dbConn.executeSql("DELETE FROM %s" %(MyPartitionedModel.TABLE_NAME, ))
+
+        valueDicts = [ { 'name' : 'name%d' %(i, ), 'num' : i } for i in range(NUM_ROWS) ]
+
+        dbConn.doInsert("INSERT INTO " + MyPartitionedModel.TABLE_NAME + " (name, num) VALUES ( %(name)s, %(num)s )", valueDicts=valueDicts, returnPk=False)
+
+
+    def _runScan(self, partitionBy):
+        '''
+            _runScan - Run a scan, inserting a row after the first chunk is received
+
+                @return tuple( list<tuple>, dict<int : int> ) - The rows, and the number of rows per partition
+        '''
+        rows = []
+        rowsPerPartition = {}
+        lock = threading.Lock()
+
+        def _callback(partitionNum, chunkRows):
+            with lock:
+                if not rows:
+                    # Committed after the snapshot, so should not be seen
+                    MyPartitionedModel(name='afterSnapshot', num=-1).insertObject()
+
+                rows.extend(chunkRows)
+                rowsPerPartition[partitionNum] = rowsPerPartition.get(partitionNum, 0) + len(chunkRows)
+
+        scan = PartitionedScan(SelectQuery(MyPartitionedModel, selectFields=['num']), numPartitions=4, partitionBy=partitionBy, chunkSize=50)
+
+        numRows = scan.run(_callback)
+
+        assert numRows == len(rows) , 'Expected the number of rows returned. Got: %d vs %d' %(numRows, len(rows))
+
+        return (rows, rowsPerPartition)
+
+
+    def test_pkScan(self):
+        '''
+            test_pkScan - Test partitioning by primary key
+        '''
+        (rows, rowsPerPartition) = self._runScan(CHUNK_BY_PK)
+
+        nums = sorted( [ row[0] for row in rows ] )
+        assert nums == list(range(NUM_ROWS)) , 'Expected every row exactly once, and not the row added after the snapshot.'
+
+        assert len(rowsPerPartition) == 4 , 'Expected 4 partitions. Got: ' + repr(rowsPerPartition)
+        for partitionNum, numRows in rowsPerPartition.items():
+            assert 200 <= numRows <= 300 , 'Expected about even partitions. Got: ' + repr(rowsPerPartition)
+
+
+    def test_ctidScan(self):
+        '''
+            test_ctidScan - Test partitioning by ctid
+        '''
+        (rows, rowsPerPartition) = self._runScan(CHUNK_BY_CTID)
+
+        nums = sorted( [ row[0] for row in rows ] )
+        assert nums == list(range(NUM_ROWS)) , 'Expected every row exactly once, and not the row added after the snapshot.'
+
+
+    def test_iterRows(self):
+        '''
+            test_iterRows - Test the merged iterator, and filters
+        '''
+        q = SelectQuery(MyPartitionedModel, selectFields=['num'])
+        q.addStage().addCondition('num', '<', 100)
+
+        nums = sorted( [ row[0] for row in q.executeIterRowsPartitioned(numPartitions=3, chunkSize=10) ] )
+        assert nums == list(range(100)) , 'Expected every matching row exactly once. Got: ' + repr(nums)
+
+        # Stop early
+        rowsIter = q.executeIterRowsPartitioned(numPartitions=3, chunkSize=10)
+        firstRow = next(rowsIter)
+        rowsIter.close()
+        assert firstRow[0] < 100 , 'Expected a matching row. Got: ' + repr(firstRow)
+
+        gotException = False
+        try:
+            PartitionedScan( SelectQuery(MyPartitionedModel, limitNum=5) )
+        except ValueError:
+            gotException = True
+
+        assert gotException , 'Expected ValueError for a query with a limit.'
+
+
+if __name__ == '__main__':
+    sys.exit(subprocess.Popen('GoodTests.py -n1 "%s" %s' %(sys.argv[0], ' '.join(['"%s"' %(arg.replace('"', '\\"'), ) for arg in sys.argv[1:]]) ), shell=True).wait())
@@ -0,0 +1,173 @@
+#!/usr/bin/env GoodTests.py
+'''
+    test_QueryBatch - Test executing many queries in one round trip with QueryBatch
+'''
+
+import subprocess
+import sys
+
+import LocalConfig
+
+
+import ichorORM
+
+from ichorORM.model import DatabaseModel
+from ichorORM.query import SelectQuery, InsertQuery, UpdateQuery, DeleteQuery
+from ichorORM.batch import QueryBatch
+from ichorORM.expressions import F
+
+
+class MyBatchModel(DatabaseModel):
+    '''
+        MyBatchModel - A model used to test batches
+    '''
+
+    FIELDS = ['id', 'name', 'num']
+
+    REQUIRED_FIELDS = ['name']
+
+    TABLE_NAME = 'ichortest_my_batch_model'
+
+
+class TestQueryBatch(object):
+    '''
+        Test class for QueryBatch
+    '''
+
+    def setup_class(self):
+        '''
+            setup_class - ensure this test is setup.
+                Executed prior to any of the tests in this class.
+        '''
+        LocalConfig.ensureTestSetup()
+
+        dbConn = ichorORM.getDatabaseConnection()
+        try:
+            dbConn.executeSql("DROP TABLE " + MyBatchModel.TABLE_NAME)
+        except:
+            pass
+
+        dbConn.executeSql("CREATE TABLE %s ( id serial primary key, name varchar(255) NOT NULL, num integer )" %(MyBatchModel.TABLE_NAME, ))
+
+
+    def teardown_class(self):
+        '''
+            teardown_class - Destroy any data generated by this test.
+                Ran after all tests have completed
+        '''
+        try:
+            dbConn = ichorORM.getDatabaseConnection()
+            dbConn.executeSql("DROP TABLE %s" %(MyBatchModel.TABLE_NAME, ))
+        except Exception as e:
+            pass
+
+
+    def setup_method(self, meth):
+        '''
+            setup_method - Called prior to each method to perform setup specific to it.
+        '''
+        dbConn = ichorORM.getDatabaseConnection()
+        dbConn.executeSql("DELETE FROM %s" %(MyBatchModel.TABLE_NAME, ))
+
+        valueDicts = [ { 'name' : 'name%d' %(i, ), 'num' : i } for i in range(10) ]
+
+        dbConn.doInsert("INSERT INTO " + MyBatchModel.TABLE_NAME + " (name, num) VALUES ( %(name)s, %(num)s )", valueDicts=valueDicts, returnPk=False)
+
+
+    def test_execute(self):
+        '''
+            test_execute - Test a batch of inserts, updates, and deletes returns each result, and commits once
+        '''
+        batch = QueryBatch()
+
+        batch.add( InsertQuery(MyBatchModel, { 'name' : 'new1', 'num' : 100 }) )
+
+        updateQuery = UpdateQuery(MyBatchModel, { 'num' : F('num') + 1000 })
+        updateQuery.addStage().addCondition('num', '<', 3)
+        batch.add(updateQuery)
+
+        batch.add( InsertQuery(MyBatchModel, { 'name' : 'new2', 'num' : 200 }) )
+
+        # No fields set, not executed
+        batch.add( UpdateQuery(MyBatchModel) )
+
+        deleteQuery = DeleteQuery(MyBatchModel)
+        deleteQuery.addStage().addCondition('num', '>=', 7)
+        batch.add(deleteQuery)
+
+        assert len(batch) == 5 , 'Expected 5 queries in batch. Got: %d' %(len(batch), )
+
+        results = batch.execute()
+
+        assert len(results) == 5 , 'Expected a result per query. Got: ' + repr(results)
+
+        (newPk1, numUpdated, newPk2, numUpdatedEmpty, numDeleted) = results
+
+        assert newPk1 and newPk2 and newPk1 != newPk2 , 'Expected primary keys for the inserts. Got: ' + repr(results)
+        assert numUpdated == 3 , 'Expected 3 rows updated. Got: ' + repr(numUpdated)
+        assert numUpdatedEmpty == 0 , 'Expected 0 for an empty update. Got: ' + repr(numUpdatedEmpty)
+        assert numDeleted == 3 , 'Expected 3 rows deleted. Got: ' + repr(numDeleted)
+        assert batch.rowcounts == [1, 3, 1, 0, 3] , 'Expected rowcounts. Got: ' + repr(batch.rowcounts)
+
+        obj = MyBatchModel.get(newPk1)
+        assert obj and obj.name == 'new1' and obj.num == 100 , 'Expected inserted object. Got: ' + repr(obj)
+
+        nums = sorted( [ row[0] for row in SelectQuery(MyBatchModel, selectFields=['num']).executeGetRows() ] )
+        assert nums == [3, 4, 5, 6, 100, 200, 1000, 1001, 1002] , 'Expected batch changes to be committed. Got: ' + repr(nums)
+
+
+    def test_transaction(self):
+        '''
+            test_transaction - Test a batch with doCommit=False, and errors
+        '''
+        dbConn = ichorORM.getDatabaseConnection(isTransactionMode=True)
+
+        batch = QueryBatch([ InsertQuery(MyBatchModel, { 'name' : 'new1', 'num' : 100 }) ])
+
+        gotException = False
+        try:
+            batch.execute(doCommit=False)
+        except ValueError:
+            gotException = True
+
+        assert gotException , 'Expected ValueError with doCommit=False and no dbConn.'
+
+        batch.execute(dbConn=dbConn, doCommit=False)
+        dbConn.rollback()
+
+        objs = MyBatchModel.filter(name='new1').fetch()
+        assert not objs , 'Expected batch to be rolled back. Got: ' + repr(objs)
+
+        gotException = False
+        try:
+            batch.add( DeleteQuery(MyBatchModel) )
+        except ValueError:
+            gotException = True
+
+        assert gotException , 'Expected ValueError adding a delete without a where clause.'
+
+        updateQuery = UpdateQuery(MyBatchModel, { 'num' : 5 })
+        updateQuery.setReturningFields(['id'])
+
+        gotException = False
+        try:
+            batch.add(updateQuery)
+        except ValueError:
+            gotException = True
+
+        assert gotException , 'Expected ValueError adding an update with returning fields.'
+
+        replicaConn = ichorORM.getDatabaseConnection(isTransactionMode=True)
+        replicaConn.isReplica = True
+
+        gotException = False
+        try:
+            batch.execute(dbConn=replicaConn)
+        except ValueError:
+            gotException = True
+
+        assert gotException , 'Expected ValueError executing on a replica connection.'
+
+
+if __name__ == '__main__':
+    sys.exit(subprocess.Popen('GoodTests.py -n1 "%s" %s' %(sys.argv[0], ' '.join(['"%s"' %(arg.replace('"', '\\"'), ) for arg in sys.argv[1:]]) ), shell=True).wait())
@@ -0,0 +1,332 @@
+#!/usr/bin/env GoodTests.py
+'''
+    test_QuerySet - Test the lazy QuerySet returned by DatabaseModel.filter / DatabaseModel.all
+'''
+
+import subprocess
+import sys
+
+import LocalConfig
+
+
+import ichorORM
+
+from ichorORM.model import DatabaseModel
+from ichorORM.queryset import QuerySet
+
+
+class MyQuerySetModel(DatabaseModel):
+    '''
+        MyQuerySetModel - A model with some numbered rows
+    '''
+
+    FIELDS = ['id', 'name', 'num']
+
+    REQUIRED_FIELDS = ['name']
+
+    TABLE_NAME = 'ichortest_my_query_set_model'
+
+
+class CountingConnection(ichorORM.DatabaseConnection):
+    '''
+        CountingConnection - A DatabaseConnection which counts the statements sent
+    '''
+
+    def __init__(self, *args, **kwargs):
+        ichorORM.DatabaseConnection.__init__(self, *args, **kwargs)
+
+        self.numSelects = 0
+        self.numStreams = 0
+
+    def doSelectParams(self, query, params):
+        self.numSelects += 1
+        return ichorORM.DatabaseConnection.doSelectParams(self, query, params)
+
+    def doSelectParamsStream(self, query, params, **kwargs):
+        self.numStreams += 1
+        return ichorORM.DatabaseConnection.doSelectParamsStream(self, query, params, **kwargs)
+
+
+class TestQuerySet(object):
+    '''
+        Test class for QuerySet
+    '''
+
+    # NUM_ROWS - Number of rows inserted for the tests
+    NUM_ROWS = 30
+
+    def setup_class(self):
+        '''
+            setup_class - ensure this test is setup.
+                Executed prior to any of the tests in this class.
+        '''
+        LocalConfig.ensureTestSetup()
+
+        dbConn = ichorORM.getDatabaseConnection()
+        try:
+            dbConn.executeSql("DROP TABLE " + MyQuerySetModel.TABLE_NAME)
+        except:
+            pass
+
+        dbConn.executeSql("CREATE TABLE %s ( id serial primary key, name varchar(255) NOT NULL, num integer )" %(MyQuerySetModel.TABLE_NAME, ))
+
+        valueDicts = [ { 'name' : 'name%d' %(i, ), 'num' : i } for i in range(self.NUM_ROWS) ]
+
+        dbConn.doInsert("INSERT INTO " + MyQuerySetModel.TABLE_NAME + " (name, num) VALUES ( %(name)s, %(num)s )", valueDicts=valueDicts, returnPk=False)
+
+
+    def teardown_class(self):
+        '''
+            teardown_class - Destroy any data generated by this test.
+                Ran after all tests have completed
+        '''
+        try:
+            dbConn = ichorORM.getDatabaseConnection()
+            dbConn.executeSql("DROP TABLE %s" %(MyQuerySetModel.TABLE_NAME, ))
+        except Exception as e:
+            pass
+
+
+    def test_lazy(self):
+        '''
+            test_lazy - Test that nothing is executed until needed, and results are cached
+        '''
+        dbConn = CountingConnection()
+
+        qs = MyQuerySetModel.filter(num__gte=10, dbConn=dbConn)
+
+        assert issubclass(qs.__class__, QuerySet) , 'Expected filter to return a QuerySet. Got: ' + repr(qs)
+
+        qs = qs.filter(num__lt=20).orderBy('num')
+
+        assert dbConn.numSelects == 0 and dbConn.numStreams == 0 , 'Expected nothing to be executed before results are needed.'
+
+        nums = [ obj.num for obj in qs ]
+
+        assert nums == list(range(10, 20)) , 'Expected nums 10 through 19 in order. Got: ' + repr(nums)
+
+        assert dbConn.numSelects == 1 and dbConn.numStreams == 0 , 'Expected iteration to fetch once. Got %d selects, %d streams' %(dbConn.numSelects, dbConn.numStreams)
+
+        # Now cached
+        assert len(qs) == 10 , 'Expected len of 10. Got %d' %(len(qs), )
+        assert bool(qs) is True , 'Expected bool to be True'
+        assert qs[3].num == 13 , 'Expected qs[3] to be num=13. Got: ' + repr(qs[3])
+        assert [ obj.num for obj in qs ] == nums , 'Expected iterating again to give the same results.'
+
+        assert dbConn.numSelects == 1 and dbConn.numStreams == 0 , 'Expected no more queries once results are cached. Got %d selects, %d streams' %(dbConn.numSelects, dbConn.numStreams)
+
+        # iterator streams, and does not cache
+        dbConn = CountingConnection()
+
+        qs = MyQuerySetModel.filter(num__gte=10, dbConn=dbConn).filter(num__lt=20).orderBy('num')
+
+        assert [ obj.num for obj in qs.iterator() ] == nums , 'Expected iterator to give the same results.'
+        assert dbConn.numSelects == 0 and dbConn.numStreams == 1 , 'Expected iterator to stream once. Got %d selects, %d streams' %(dbConn.numSelects, dbConn.numStreams)
+        assert qs._resultCache is None , 'Expected iterator to not cache the results.'
+
+
+    def test_countAndExists(self):
+        '''
+            test_countAndExists - Test that count(), exists(), and bool() use COUNT and EXISTS, and len() fetches once
+        '''
+        dbConn = CountingConnection()
+
+        qs = MyQuerySetModel.filter(num__gte=25, dbConn=dbConn)
+
+        assert qs.count() == 5 , 'Expected COUNT of 5. Got %d' %(qs.count(), )
+        assert qs.exists() is True , 'Expected EXISTS to be True'
+
+        assert dbConn.numSelects == 2 and dbConn.numStreams == 0 , 'Expected one COUNT and one EXISTS, without fetching rows.'
+
+        assert MyQuerySetModel.filter(num__gt=1000).exists() is False , 'Expected EXISTS to be False for no matches.'
+
+        dbConn = CountingConnection()
+
+        qs = MyQuerySetModel.filter(num__gte=25, dbConn=dbConn)
+
+        assert len(qs) == 5 , 'Expected len of 5. Got %d' %(len(qs), )
+        assert bool(qs) is True , 'Expected bool to be True'
+        assert [ obj.num for obj in qs ] == list(range(25, 30)) , 'Expected the cached results.'
+
+        assert dbConn.numSelects == 1 and dbConn.numStreams == 0 , 'Expected len to fetch the results once, and bool to use them. Got %d selects, %d streams' %(dbConn.numSelects, dbConn.numStreams)
+
+        dbConn = CountingConnection()
+
+        qs = MyQuerySetModel.filter(num__gte=25, dbConn=dbConn)
+
+        assert bool(qs) is True , 'Expected bool to be True'
+        assert dbConn.numSelects == 1 and qs._resultCache is None , 'Expected bool to use a single EXISTS without fetching the rows.'
+
+        assert bool(MyQuerySetModel.filter(num__gt=1000)) is False , 'Expected bool to be False for no matches.'
+
+
+    def test_listOneStatement(self):
+        '''
+            test_listOneStatement - Test that list() of a QuerySet issues exactly one statement
+        '''
+        dbConn = CountingConnection()
+
+        objs = list( MyQuerySetModel.filter(num__lt=10, dbConn=dbConn) )
+
+        assert len(objs) == 10 , 'Expected 10 objects. Got %d' %(len(objs), )
+        assert dbConn.numSelects + dbConn.numStreams == 1 , 'Expected exactly one statement. Got %d selects, %d streams' %(dbConn.numSelects, dbConn.numStreams)
+
+        assert MyQuerySetModel.all()[10:].count() == self.NUM_ROWS - 10 , 'Expected count with an offset to account for the offset.'
+
+
+    def test_slicing(self):
+        '''
+            test_slicing - Test slicing becomes LIMIT / OFFSET
+        '''
+        qs = MyQuerySetModel.all(orderByField='num')
+
+        sliced = qs[5:10]
+
+        assert issubclass(sliced.__class__, QuerySet) , 'Expected slicing an unevaluated QuerySet to return a QuerySet.'
+
+        assert sliced.getQuery().limitNum == 5 , 'Expected LIMIT 5. Got: ' + repr(sliced.getQuery().limitNum)
+        assert sliced.getQuery().offsetNum == 5 , 'Expected OFFSET 5. Got: ' + repr(sliced.getQuery().offsetNum)
+
+        assert [ obj.num for obj in sliced ] == [5, 6, 7, 8, 9] , 'Expected nums 5 through 9. Got: ' + repr(sliced)
+
+        # Slice of a slice
+        assert [ obj.num for obj in qs[5:10][1:3] ] == [6, 7] , 'Expected a slice of a slice to be nums 6 and 7.'
+
+        assert [ obj.num for obj in qs[5:10][3:100] ] == [8, 9] , 'Expected a slice of a slice to not extend past the first slice.'
+
+        assert list(qs[5:5]) == [] , 'Expected an empty slice to be empty.'
+
+        assert qs[12].num == 12 , 'Expected index 12 to be num=12.'
+
+        gotException = False
+        try:
+            qs[self.NUM_ROWS + 5]
+        except IndexError as e:
+            gotException = e
+
+        assert gotException is not False , 'Expected an IndexError on out of range index.'
+
+        assert qs.first().num == 0 , 'Expected first to be num=0'
+
+
+    def test_only(self):
+        '''
+            test_only - Test only selecting some fields, and that the others are loaded in a single batch upon access
+        '''
+        dbConn = CountingConnection()
+
+        objs = list( MyQuerySetModel.all(orderByField='num', dbConn=dbConn).only('num')[:3] )
+
+        assert [ obj.num for obj in objs ] == [0, 1, 2] , 'Expected nums 0, 1, 2. Got: ' + repr(objs)
+
+        assert dbConn.numSelects == 1 , 'Expected one select for the results. Got %d' %(dbConn.numSelects, )
+        dbConn.numSelects = 0
+
+        for obj in objs:
+            assert obj.id is not None , 'Expected primary key to always be selected.'
+            assert 'name' not in obj.__dict__ , 'Expected unselected field to not be loaded.'
+
+        assert dbConn.numSelects == 0 , 'Expected no selects prior to accessing a deferred field.'
+
+        assert objs[1].name == 'name1' , 'Expected deferred field to be loaded upon access. Got: ' + repr(objs[1].name)
+
+        assert dbConn.numSelects == 1 , 'Expected one select to load the deferred field. Got %d' %(dbConn.numSelects, )
+
+        assert [ obj.name for obj in objs ] == ['name0', 'name1', 'name2'] , 'Expected deferred field loaded for all objects. Got: ' + repr(objs)
+
+        assert dbConn.numSelects == 1 , 'Expected the deferred field to be loaded for all objects in the same select. Got %d' %(dbConn.numSelects, )
+
+
+    def test_defer(self):
+        '''
+            test_defer - Test deferring fields, on QuerySet and on DatabaseModel.get / filter
+        '''
+        qs = MyQuerySetModel.filter(num__lt=5, deferFields=['name'], orderByField='num')
+
+        assert 'name' not in qs.getQuery().getFields() , 'Expected deferred field to not be selected. Got: ' + repr(qs.getQuery().getFields())
+
+        objs = list(qs)
+
+        assert [ obj.name for obj in objs ] == [ 'name%d' %(i, ) for i in range(5) ] , 'Expected deferred field to be loaded upon access. Got: ' + repr(objs)
+
+        # Setting a deferred field before access should not be overwritten by a load
+        objs = list( MyQuerySetModel.all(orderByField='num').defer('name', 'num')[:2] )
+
+        objs[0].name = 'changed'
+
+        assert objs[1].name == 'name1' , 'Expected deferred field to load. Got: ' + repr(objs[1].name)
+        assert objs[0].name == 'changed' , 'Expected an explicitly set field to not be overwritten by a deferred load.'
+        assert objs[0].num == 0 , 'Expected second deferred field to load.'
+
+        firstObj = MyQuerySetModel.filter(num=7)[0]
+
+        obj = MyQuerySetModel.get(firstObj.id, onlyFields=['num'])
+
+        assert 'name' not in obj.__dict__ , 'Expected get with onlyFields to not load other fields.'
+        assert obj.name == 'name7' , 'Expected deferred field on get to load upon access.'
+
+        gotException = False
+        try:
+            MyQuerySetModel.all().defer('id')
+        except ValueError as e:
+            gotException = e
+
+        assert gotException is not False , 'Expected a ValueError when deferring the primary key.'
+
+
+    def test_chainingDoesNotModify(self):
+        '''
+            test_chainingDoesNotModify - Test that chaining returns a new QuerySet and leaves the original alone
+        '''
+        qs = MyQuerySetModel.filter(num__lt=10)
+
+        qs2 = qs.filter(num__gte=5)
+
+        assert len(qs) == 10 , 'Expected original QuerySet to be unmodified. Got %d' %(len(qs), )
+        assert len(qs2) == 5 , 'Expected chained QuerySet to have 5. Got %d' %(len(qs2), )
+
+    def test_lazyProxies(self):
+        '''
+            test_lazyProxies - Test QuerySet.lazy returns proxies which only create the model object when needed
+        '''
+        proxies = list( MyQuerySetModel.filter(num__lt=5).orderBy('num').only('num').lazy() )
+
+        assert [ proxy.num for proxy in proxies ] == [0, 1, 2, 3, 4] , 'Expected selected field to be read from the proxies. Got: ' + repr(proxies)
+
+        assert not any( [ proxy._isMaterialized for proxy in proxies ] ) , 'Expected reading selected fields to not create the model objects.'
+
+        # Unselected field is deferred, and creates the object
+        assert proxies[2].name == 'name2' , 'Expected deferred field to load through the proxy. Got: ' + repr(proxies[2].name)
+        assert proxies[2]._isMaterialized , 'Expected accessing an unselected field to create the model object.'
+        assert not proxies[3]._isMaterialized , 'Expected other proxies to be untouched.'
+
+        obj = proxies[3]._getObj()
+
+        assert issubclass(obj.__class__, MyQuerySetModel) , 'Expected _getObj to return the model object. Got: ' + repr(obj)
+
+        proxies[4].num = 100
+
+        assert proxies[4]._isMaterialized and proxies[4].num == 100 , 'Expected setting an attribute to create the model object and set on it.'
+
+        assert proxies[4]._getObj().num == 100 , 'Expected set value on the model object.'
+
+        proxies = MyQuerySetModel.all().lazy().fetch()
+
+        assert len(proxies) == self.NUM_ROWS , 'Expected lazy fetch to return all rows. Got %d' %(len(proxies), )
+
+        # A deferred field is loaded for every proxy in one select
+        dbConn = CountingConnection()
+
+        proxies = list( MyQuerySetModel.filter(num__lt=5, dbConn=dbConn).orderBy('num').only('num').lazy() )
+        dbConn.numSelects = 0
+
+        assert [ proxy.name for proxy in proxies ] == [ 'name%d' %(i, ) for i in range(5) ] , 'Expected deferred field loaded through every proxy. Got: ' + repr(proxies)
+        assert dbConn.numSelects == 1 , 'Expected the deferred field to be loaded for all proxies in one select. Got %d' %(dbConn.numSelects, )
+        assert [ proxy._isMaterialized for proxy in proxies ] == [True, False, False, False, False] , 'Expected only the first proxy accessed to create its model object.'
+        assert proxies[3]._getObj().name == 'name3' , 'Expected the loaded field on the model object once created.'
+        assert dbConn.numSelects == 1 , 'Expected no further select once created. Got %d' %(dbConn.numSelects, )
+
+
+
+if __name__ == '__main__':
+    sys.exit(subprocess.Popen('GoodTests.py -n1 "%s" %s' %(sys.argv[0], ' '.join(['"%s"' %(arg.replace('"', '\\"'), ) for arg in sys.argv[1:]]) ), shell=True).wait())
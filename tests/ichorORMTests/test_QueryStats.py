@@ -0,0 +1,167 @@
+#!/usr/bin/env GoodTests.py
+'''
+    test_QueryStats - Test statistics of executed statements, by fingerprint
+'''
+
+import io
+import subprocess
+import sys
+
+import LocalConfig
+
+
+import ichorORM
+
+from ichorORM.model import DatabaseModel
+from ichorORM.query import SelectQuery, UpdateQuery
+from ichorORM.stats import setGlobalQueryStats, fingerprintSql, getQueryStats, resetQueryStats, report
+
+
+class MyStatsModel(DatabaseModel):
+    '''
+        MyStatsModel - A model used to test query statistics
+    '''
+
+    FIELDS = ['id', 'name', 'num']
+
+    REQUIRED_FIELDS = ['name']
+
+    TABLE_NAME = 'ichortest_my_stats_model'
+
+
+class TestQueryStats(object):
+    '''
+        Test class for query statistics
+    '''
+
+    def setup_class(self):
+        '''
+            setup_class - ensure this test is setup.
+                Executed prior to any of the tests in this class.
+        '''
+        LocalConfig.ensureTestSetup()
+
+        dbConn = ichorORM.getDatabaseConnection()
+        try:
+            dbConn.executeSql("DROP TABLE " + MyStatsModel.TABLE_NAME)
+        except:
+            pass
+
+        dbConn.executeSql("CREATE TABLE %s ( id serial primary key, name varchar(255) NOT NULL, num integer )" %(MyStatsModel.TABLE_NAME, ))
+
+        valueDicts = [ { 'name' : 'name%d' %(i, ), 'num' : i } for i in range(10) ]
+
+        dbConn.doInsert("INSERT INTO " + MyStatsModel.TABLE_NAME + " (name, num) VALUES ( %(name)s, %(num)s )", valueDicts=valueDicts, returnPk=False)
+
+
+    def teardown_class(self):
+        '''
+            teardown_class - Destroy any data generated by this test.
+                Ran after all tests have completed
+        '''
+        try:
+            dbConn = ichorORM.getDatabaseConnection()
+            dbConn.executeSql("DROP TABLE %s" %(MyStatsModel.TABLE_NAME, ))
+        except Exception as e:
+            pass
+
+
+    def setup_method(self, meth):
+        '''
+            setup_method - Called prior to each method to perform setup specific to it.
+        '''
+        resetQueryStats()
+        setGlobalQueryStats(enabled=True)
+
+
+    def teardown_method(self, meth):
+        '''
+            teardown_method - Called after each method
+        '''
+        setGlobalQueryStats(enabled=False)
+        resetQueryStats()
+
+
+    def test_fingerprintSql(self):
+        '''
+            test_fingerprintSql - Test values are stripped, and lists collapsed
+        '''
+        fingerprint = fingerprintSql("SELECT * FROM  person\n WHERE id IN ( %(where_0)s, %(where_1)s ) AND age > 18")
+        assert fingerprint == "SELECT * FROM person WHERE id IN (...) AND age > ?" , 'Unexpected fingerprint: ' + repr(fingerprint)
+
+        fingerprint = fingerprintSql("SELECT * FROM t1 WHERE name = 'O''Brien' AND id IN (1, 2, 3) LIMIT 10")
+        assert fingerprint == "SELECT * FROM t1 WHERE name = ? AND id IN (...) LIMIT ?" , 'Unexpected fingerprint: ' + repr(fingerprint)
+
+        fingerprint = fingerprintSql("INSERT INTO t (a, b) VALUES (%s, %s), (%s, %s)")
+        assert fingerprint == "INSERT INTO t (a, b) VALUES (...)" , 'Unexpected fingerprint: ' + repr(fingerprint)
+
+        assert fingerprintSql("SELECT * FROM t WHERE id IN (4)") == fingerprintSql("SELECT * FROM t WHERE id IN (4, 5, 6)") , \
+            'Expected IN lists of any length to have the same fingerprint.'
+
+
+    def test_queryStats(self):
+        '''
+            test_queryStats - Test statements are aggregated by fingerprint, model, and query class
+        '''
+        for i in range(1, 6):
+            q = SelectQuery(MyStatsModel)
+            q.addStage().addCondition('num', 'in', list(range(i)))
+            objs = q.executeGetObjs()
+            assert len(objs) == i , 'Expected %d objects. Got: %d' %(i, len(objs))
+
+        uq = UpdateQuery(MyStatsModel, newFieldValues={ 'name' : 'updated' })
+        uq.addStage().addCondition('num', '>=', 8)
+        uq.executeUpdate()
+
+        q = SelectQuery(MyStatsModel)
+        assert len(list(q.executeIterRows(chunkSize=3))) == 10 , 'Expected 10 streamed rows.'
+
+        stats = getQueryStats()
+
+        selectStats = [ entryStats for entryStats in stats if entryStats['queryClassName'] == 'SelectQuery' and ' IN ' in entryStats['fingerprint'] ]
+        assert len(selectStats) == 1 , 'Expected one entry for the SELECT with IN lists of different lengths. Got: ' + repr(stats)
+
+        selectStats = selectStats[0]
+        assert selectStats['modelName'] == 'MyStatsModel' , 'Expected the model. Got: ' + repr(selectStats)
+        assert selectStats['calls'] == 5 , 'Expected 5 calls. Got: ' + repr(selectStats)
+        assert selectStats['rows'] == 15 , 'Expected 15 rows. Got: ' + repr(selectStats)
+        assert selectStats['totalTime'] > 0 and selectStats['p95Time'] > 0 , 'Expected latency. Got: ' + repr(selectStats)
+        assert selectStats['hydrationTime'] > 0 , 'Expected hydration time. Got: ' + repr(selectStats)
+
+        updateStats = [ entryStats for entryStats in stats if entryStats['queryClassName'] == 'UpdateQuery' ]
+        assert len(updateStats) == 1 and updateStats[0]['rows'] == 2 , 'Expected the UPDATE of 2 rows. Got: ' + repr(updateStats)
+
+        streamStats = [ entryStats for entryStats in stats if entryStats['queryClassName'] == 'SelectQuery' and ' IN ' not in entryStats['fingerprint'] ]
+        assert len(streamStats) == 1 and streamStats[0]['rows'] == 10 , 'Expected the streamed SELECT of 10 rows. Got: ' + repr(streamStats)
+
+        reportFile = io.StringIO()
+        report(top=2, file=reportFile)
+        reportText = reportFile.getvalue()
+
+        assert 'Top 2 of %d' %(len(stats), ) in reportText , 'Expected report header. Got: ' + reportText
+        assert stats[0]['fingerprint'] in reportText , 'Expected the most expensive fingerprint in report. Got: ' + reportText
+
+
+    def test_maxFingerprints(self):
+        '''
+            test_maxFingerprints - Test the number of entries is bounded, and disabled collects nothing
+        '''
+        setGlobalQueryStats(maxFingerprints=3)
+        try:
+            dbConn = ichorORM.getDatabaseConnection()
+            for i in range(6):
+                dbConn.doSelect('SELECT %d AS col%d' %(i, i))
+
+            assert len(getQueryStats()) <= 3 , 'Expected at most 3 entries. Got: ' + repr(getQueryStats())
+        finally:
+            setGlobalQueryStats(maxFingerprints=1000)
+
+        resetQueryStats()
+        setGlobalQueryStats(enabled=False)
+
+        SelectQuery(MyStatsModel).executeGetRows()
+        assert getQueryStats() == [] , 'Expected nothing collected when disabled.'
+
+
+if __name__ == '__main__':
+    sys.exit(subprocess.Popen('GoodTests.py -n1 "%s" %s' %(sys.argv[0], ' '.join(['"%s"' %(arg.replace('"', '\\"'), ) for arg in sys.argv[1:]]) ), shell=True).wait())
@@ -0,0 +1,186 @@
+#!/usr/bin/env GoodTests.py
+'''
+    test_Routing - Test routing reads to read replicas
+'''
+
+import subprocess
+import sys
+
+import LocalConfig
+
+
+import ichorORM
+
+from ichorORM.model import DatabaseModel
+from ichorORM import connection, routing
+from ichorORM.routing import registerReplica, unregisterReplica, setGlobalReplicaRouting, getReadDatabaseConnection, probeReplicaLatencies
+from ichorORM.constants import REPLICA_SELECT_ROUND_ROBIN, REPLICA_SELECT_LEAST_LATENCY
+
+
+class MyRoutingModel(DatabaseModel):
+    '''
+        MyRoutingModel - A model used to test routing
+    '''
+
+    FIELDS = ['id', 'name']
+
+    REQUIRED_FIELDS = ['name']
+
+    TABLE_NAME = 'ichortest_my_routing_model'
+
+
+class TestRouting(object):
+    '''
+        Test class for replica routing.
+
+          The "replicas" here are the test database itself ( or an unreachable port )
+    '''
+
+    def setup_class(self):
+        '''
+            setup_class - ensure this test is setup.
+                Executed prior to any of the tests in this class.
+        '''
+        LocalConfig.ensureTestSetup()
+
+        dbConn = ichorORM.getDatabaseConnection()
+        try:
+            dbConn.executeSql("DROP TABLE " + MyRoutingModel.TABLE_NAME)
+        except:
+            pass
+
+        dbConn.executeSql("CREATE TABLE %s ( id serial primary key, name varchar(255) NOT NULL )" %(MyRoutingModel.TABLE_NAME, ))
+        dbConn.executeSql("INSERT INTO %s (name) VALUES ('one')" %(MyRoutingModel.TABLE_NAME, ))
+
+
+    def teardown_class(self):
+        '''
+            teardown_class - Destroy any data generated by this test.
+                Ran after all tests have completed
+        '''
+        try:
+            dbConn = ichorORM.getDatabaseConnection()
+            dbConn.executeSql("DROP TABLE %s" %(MyRoutingModel.TABLE_NAME, ))
+        except Exception as e:
+            pass
+
+
+    def setup_method(self, meth):
+        '''
+            setup_method - Called prior to each method to perform setup specific to it.
+        '''
+        # Forget writes by setup_class ( or earlier tests ) on this thread, which would route reads to the primary
+        connection._writeState.lastWriteTime = None
+
+
+    def teardown_method(self, meth):
+        '''
+            teardown_method - Called after each method to undo any changes
+        '''
+        for replicaName in routing.getReplicaNames():
+            unregisterReplica(replicaName)
+
+        setGlobalReplicaRouting(enabled=True, selection=REPLICA_SELECT_ROUND_ROBIN, readYourWritesWindow=0, replicaDownTime=30.0)
+
+
+    def test_routeReads(self):
+        '''
+            test_routeReads - Test reads go to a replica, and writes / explicit connections do not
+        '''
+        dbConn = getReadDatabaseConnection()
+        assert dbConn.isReplica is False , 'Expected primary when no replicas are registered.'
+
+        registerReplica('replicaOne')
+        registerReplica('replicaTwo')
+
+        dbConn = getReadDatabaseConnection()
+        assert dbConn.isReplica is True , 'Expected a replica connection once registered.'
+
+        objs = MyRoutingModel.filter(name='one').fetch()
+        assert len(objs) == 1 , 'Expected to read through a replica. Got: ' + repr(objs)
+
+        setGlobalReplicaRouting(enabled=False)
+        dbConn = getReadDatabaseConnection()
+        assert dbConn.isReplica is False , 'Expected primary when routing is disabled.'
+        setGlobalReplicaRouting(enabled=True)
+
+        latencies = probeReplicaLatencies()
+        assert sorted(latencies.keys()) == ['replicaOne', 'replicaTwo'] , 'Expected a latency per replica. Got: ' + repr(latencies)
+        assert latencies['replicaOne'] is not None and latencies['replicaOne'] >= 0 , 'Expected a latency measurement. Got: ' + repr(latencies)
+
+        setGlobalReplicaRouting(selection=REPLICA_SELECT_LEAST_LATENCY)
+        dbConn = getReadDatabaseConnection()
+        assert dbConn.isReplica is True , 'Expected a replica connection with least latency selection.'
+
+
+    def test_readYourWrites(self):
+        '''
+            test_readYourWrites - Test reads use the primary shortly after a write
+        '''
+        registerReplica('replicaOne')
+        setGlobalReplicaRouting(readYourWritesWindow=60)
+
+        # Replica connections do not count as writes
+        replicaConn = getReadDatabaseConnection()
+        assert replicaConn.isReplica is True , 'Expected a replica before any write.'
+        replicaConn.doSelect('SELECT 1')
+
+        obj = MyRoutingModel(name='two')
+        obj.insertObject()
+
+        dbConn = getReadDatabaseConnection()
+        assert dbConn.isReplica is False , 'Expected primary within the read-your-writes window.'
+
+        setGlobalReplicaRouting(readYourWritesWindow=0)
+        dbConn = getReadDatabaseConnection()
+        assert dbConn.isReplica is True , 'Expected replica with the window disabled.'
+
+
+    def test_transactionBlock(self):
+        '''
+            test_transactionBlock - Test reads use the primary within a transaction block, even before any write
+        '''
+        registerReplica('replicaOne')
+
+        primaryConn = ichorORM.getDatabaseConnection()
+
+        with primaryConn.transaction():
+            dbConn = getReadDatabaseConnection()
+            assert dbConn.isReplica is False , 'Expected primary within a transaction block.'
+
+            with primaryConn.transaction():
+                pass
+
+            dbConn = getReadDatabaseConnection()
+            assert dbConn.isReplica is False , 'Expected primary still, after a nested block ( savepoint ) ends.'
+
+        dbConn = getReadDatabaseConnection()
+        assert dbConn.isReplica is True , 'Expected replica after the transaction block.'
+
+        try:
+            with primaryConn.transaction():
+                raise KeyError('rollback')
+        except KeyError:
+            pass
+
+        dbConn = getReadDatabaseConnection()
+        assert dbConn.isReplica is True , 'Expected replica after a transaction block which rolled back.'
+
+
+    def test_replicaDown(self):
+        '''
+            test_replicaDown - Test a replica which cannot be connected to is skipped
+        '''
+        target = registerReplica('badReplica', host='127.0.0.1', port=1)
+
+        dbConn = getReadDatabaseConnection()
+        assert dbConn.isReplica is False , 'Expected fallback to primary when the only replica is down.'
+        assert target.downUntil is not None , 'Expected replica to be marked down.'
+
+        registerReplica('goodReplica')
+        dbConn = getReadDatabaseConnection()
+        assert dbConn.isReplica is True and dbConn.port != 1 , 'Expected the good replica to be used.'
+
+
+if __name__ == '__main__':
+    sys.exit(subprocess.Popen('GoodTests.py -n1 "%s" %s' %(sys.argv[0], ' '.join(['"%s"' %(arg.replace('"', '\\"'), ) for arg in sys.argv[1:]]) ), shell=True).wait())
@@ -17,7 +17,7 @@ import ichorORM
 from ichorORM.model import DatabaseModel
 from ichorORM.query import InsertQuery, SelectQuery, SelectGenericJoinQuery, QueryStr
 from ichorORM.objs import DictObj
-from ichorORM.constants import JOIN_INNER
+from ichorORM.constants import JOIN_INNER, JOIN_LEFT
 
 from ichor_test_models.all import Person, Meal
 
@@ -77,7 +77,7 @@ class TestSelectGenericJoinQuery(object):
                 @param meth <built-in method> - The method being tested (compare meth == self.someMethod)
         '''
 
-        if meth in ( self.test_generalGetMapping, self.test_generalGetDictObjs, self.test_tableStarSelectFields ):
+        if meth in ( self.test_generalGetMapping, self.test_generalGetDictObjs, self.test_tableStarSelectFields, self.test_executeGetGraph ):
 
             # self.DEFAULT_PERSON_DATASET - A sample dataset of field -> value for Person model
             self.DEFAULT_PERSON_DATASET = [
@@ -168,7 +168,7 @@ class TestSelectGenericJoinQuery(object):
 
                 @param meth <built-in method> - The method being tested (compare meth == self.someMethod)
         '''
-        if meth in ( self.test_generalGetMapping, self.test_generalGetDictObjs, self.test_tableStarSelectFields):
+        if meth in ( self.test_generalGetMapping, self.test_generalGetDictObjs, self.test_tableStarSelectFields, self.test_executeGetGraph ):
             self._deleteGlobalDatasets()
 
 
@@ -296,6 +296,47 @@ class TestSelectGenericJoinQuery(object):
                 assert str(mealObj[mealFieldName]) == str(expectedMealData[mealFieldName]) , 'Unexpected value on meal field %s. Got %s but expected %s' %( mealFieldName, repr(mealObj[mealFieldName]), repr(expectedMealData[mealFieldName]) )
 
 
+    def test_executeGetGraph(self):
+        '''
+            test_executeGetGraph - Test collapsing a LEFT JOIN into Person objects with their meals
+        '''
+        # Add a person without any meals
+        noMealsPerson = Person.createAndSave(first_name='No', last_name='Meals', datasetuid=self.datasetUid)
+
+        selQ = SelectGenericJoinQuery( Person, orderByField=Person.TABLE_NAME + '.id', orderByDir='ASC' )
+
+        selQWhere = selQ.addStage()
+        selQWhere.addCondition(Person.TABLE_NAME + '.datasetuid', '=', self.datasetUid)
+
+        joinWhere = selQ.joinModel( Meal, JOIN_LEFT )
+
+        joinWhere.addJoin(Meal.TABLE_NAME + '.id_person', '=', Person.TABLE_NAME + '.id' )
+
+        persons = selQ.executeGetGraph(root=Person, collect={ 'meals' : Meal })
+
+        assert len(persons) == len(self.DEFAULT_PERSON_DATASET) + 1 , 'Expected one object per person. Got: ' + repr(persons)
+
+        assert [ person.id for person in persons ] == list(sorted( [ person.id for person in persons ] )) , 'Expected persons to be in order of the results.'
+
+        for person in persons:
+            assert issubclass(person.__class__, Person) , 'Expected Person objects. Got: ' + repr(person)
+
+            if person.id == noMealsPerson.id:
+                assert person.meals == [] , 'Expected person with no meals (all NULL meal columns) to have an empty list. Got: ' + repr(person.meals)
+                continue
+
+            expectedMealIds = set( [ mealId for mealId, mealData in self.mealIdToData.items() if mealData['id_person'] == person.id ] )
+
+            mealIds = [ meal.id for meal in person.meals ]
+
+            assert len(mealIds) == len(expectedMealIds) , 'Expected each meal to be collected once. Got: ' + repr(person.meals)
+            assert set(mealIds) == expectedMealIds , 'Expected meals %s for person %d. Got: %s' %(repr(expectedMealIds), person.id, repr(mealIds))
+
+            for meal in person.meals:
+                assert issubclass(meal.__class__, Meal) , 'Expected Meal objects. Got: ' + repr(meal)
+                assert meal.item_name == self.mealIdToData[meal.id]['item_name'] , 'Expected meal fields to be populated. Got: ' + repr(meal)
+
+
     def test_tableStarSelectFields(self):
         '''
             test_tableStarSelectFields - Test that TABLE_NAME + '.*' selects all fields on given table
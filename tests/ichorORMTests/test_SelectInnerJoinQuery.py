@@ -76,7 +76,7 @@ class TestSelectInnerJoinQuery(object):
                 @param meth <built-in method> - The method being tested (compare meth == self.someMethod)
         '''
 
-        if meth in ( self.test_generalGetMapping, self.test_generalGetDictObjs, self.test_tableStarSelectFields ):
+        if meth in ( self.test_generalGetMapping, self.test_generalGetDictObjs, self.test_generalGetObjs, self.test_tableStarSelectFields ):
 
             # self.DEFAULT_PERSON_DATASET - A sample dataset of field -> value for Person model
             self.DEFAULT_PERSON_DATASET = [
@@ -167,7 +167,7 @@ class TestSelectInnerJoinQuery(object):
 
                 @param meth <built-in method> - The method being tested (compare meth == self.someMethod)
         '''
-        if meth in ( self.test_generalGetMapping, self.test_generalGetDictObjs, self.test_tableStarSelectFields ):
+        if meth in ( self.test_generalGetMapping, self.test_generalGetDictObjs, self.test_generalGetObjs, self.test_tableStarSelectFields ):
             self._deleteGlobalDatasets()
 
 
@@ -290,6 +290,80 @@ class TestSelectInnerJoinQuery(object):
                 assert str(mealObj[mealFieldName]) == str(expectedMealData[mealFieldName]) , 'Unexpected value on meal field %s. Got %s but expected %s' %( mealFieldName, repr(mealObj[mealFieldName]), repr(expectedMealData[mealFieldName]) )
 
 
+    def test_generalGetObjs(self):
+        '''
+            test_generalGetObjs - Test getting model objects from a SelectInnerJoinQuery
+        '''
+
+        selQ = SelectInnerJoinQuery( [ Person, Meal ] )
+
+        selQWhere = selQ.addStage()
+        selQWhere.addCondition(Person.TABLE_NAME + '.datasetuid', '=', self.datasetUid)
+        selQWhere.addCondition(Person.TABLE_NAME + '.id', '=', QueryStr(Meal.TABLE_NAME + '.id_person'))
+
+        results = selQ.executeGetObjs()
+
+        assert len(results) == len( self.DEFAULT_MEAL_DATASET ) , 'Expected %d rows but got %d back. Got: %s' %( len(self.DEFAULT_MEAL_DATASET), len(results), repr(results) )
+
+        personsById = {}
+
+        for result in results:
+
+            assert issubclass(result.__class__, tuple) and len(result) == 2 , 'Expected each result to be a tuple of 2 objects. Got: ' + repr(result)
+
+            (personObj, mealObj) = result
+
+            assert issubclass(personObj.__class__, Person) , 'Expected first object to be a Person. Got: ' + repr(personObj)
+            assert issubclass(mealObj.__class__, Meal) , 'Expected second object to be a Meal. Got: ' + repr(mealObj)
+
+            assert mealObj.id_person == personObj.id , 'Expected meal.id_person [ %s ] to equal person.id [ %s ].' %( repr(mealObj.id_person), repr(personObj.id) )
+
+            expectedPersonData = self.personIdToData[personObj.id]
+            expectedMealData = self.mealIdToData[mealObj.id]
+
+            for personFieldName in Person.FIELDS:
+                assert str(getattr(personObj, personFieldName)) == str(expectedPersonData[personFieldName]) , 'Unexpected value on person field %s. Got %s but expected %s' %( personFieldName, repr(getattr(personObj, personFieldName)), repr(expectedPersonData[personFieldName]) )
+
+            for mealFieldName in Meal.FIELDS:
+                assert str(getattr(mealObj, mealFieldName)) == str(expectedMealData[mealFieldName]) , 'Unexpected value on meal field %s. Got %s but expected %s' %( mealFieldName, repr(getattr(mealObj, mealFieldName)), repr(expectedMealData[mealFieldName]) )
+
+            # Same person across many meals should be the same object
+            if personObj.id in personsById:
+                assert personsById[personObj.id] is personObj , 'Expected the same Person object for every row with the same person.id'
+            else:
+                personsById[personObj.id] = personObj
+
+        # Only fields from one model selected
+        selQ = SelectInnerJoinQuery( [ Person, Meal ], selectFields=[ Meal.TABLE_NAME + '.*' ] )
+
+        selQWhere = selQ.addStage()
+        selQWhere.addCondition(Person.TABLE_NAME + '.datasetuid', '=', self.datasetUid)
+        selQWhere.addCondition(Person.TABLE_NAME + '.id', '=', QueryStr(Meal.TABLE_NAME + '.id_person'))
+
+        results = selQ.executeGetObjs()
+
+        for (personObj, mealObj) in results:
+            assert personObj is None , 'Expected None for a model with no selected fields. Got: ' + repr(personObj)
+            assert mealObj.id in self.mealIdToData , 'Expected a meal from the dataset. Got: ' + repr(mealObj)
+
+        # Streamed, with the objects shared between rows bounded by chunkSize
+        selQ = SelectInnerJoinQuery( [ Person, Meal ] )
+
+        selQWhere = selQ.addStage()
+        selQWhere.addCondition(Person.TABLE_NAME + '.datasetuid', '=', self.datasetUid)
+        selQWhere.addCondition(Person.TABLE_NAME + '.id', '=', QueryStr(Meal.TABLE_NAME + '.id_person'))
+
+        results = list( selQ.executeIterObjs(chunkSize=1) )
+
+        assert len(results) == len( self.DEFAULT_MEAL_DATASET ) , 'Expected %d streamed rows but got %d back.' %( len(self.DEFAULT_MEAL_DATASET), len(results) )
+
+        for (personObj, mealObj) in results:
+            assert mealObj.id_person == personObj.id , 'Expected meal.id_person [ %s ] to equal person.id [ %s ].' %( repr(mealObj.id_person), repr(personObj.id) )
+
+        numPersonObjs = len( set( [ id(personObj) for (personObj, mealObj) in results ] ) )
+        assert numPersonObjs == len(results) , 'Expected no objects shared between rows with a chunkSize of 1. Got %d Person objects for %d rows' %(numPersonObjs, len(results))
+
+
     def test_tableStarSelectFields(self):
         '''
             test_tableStarSelectFields - Test that TABLE_NAME + '.*' selects all fields on given table
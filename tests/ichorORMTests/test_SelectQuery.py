@@ -57,7 +57,7 @@ class TestSelectQuery(object):
 
         # TODO: These tests were written before this pattern of test data was being used.
         #   Refactor the tests to replace the "magic numbers" to references to this test data
-        if meth in (self.test_whereOr, self.test_whereAnd, self.test_selectAllObjs, self.test_SelectWithWhere, self.test_SelectSpecificFields, self.test_selectOrderBy, self.test_limitNum, self.test_aggregates):
+        if meth in (self.test_whereOr, self.test_whereAnd, self.test_selectAllObjs, self.test_SelectWithWhere, self.test_SelectSpecificFields, self.test_selectOrderBy, self.test_limitNum, self.test_aggregates, self.test_getRecords):
 
             self.dataSet = [
                 { "id" : None, "first_name" : 'John', 'last_name'  : 'Smith',  'age' : 43, 'birth_day' : 4, 'birth_month' : 11 },
@@ -76,7 +76,7 @@ class TestSelectQuery(object):
             for i in range(len(self.dataSet)):
                 self.dataSet[i]['id'] = pks[i]
 
-        elif meth in ( self.test_sqlNulls, ):
+        elif meth in ( self.test_sqlNulls, self.test_getColumns ):
 
             self.dataSet = [
                 { "id" : None, "first_name" : 'John', 'last_name'  : 'Smith',  'age' : 43, 'birth_day' : 4, 'birth_month' : 11 },
@@ -101,7 +101,7 @@ class TestSelectQuery(object):
         '''
             teardown_method - Called after each method
         '''
-        if meth in (self.test_whereOr, self.test_whereAnd, self.test_selectAllObjs, self.test_SelectWithWhere, self.test_SelectSpecificFields, self.test_selectOrderBy, self.test_limitNum, self.test_aggregates) or meth in (self.test_sqlNulls, ):
+        if meth in (self.test_whereOr, self.test_whereAnd, self.test_selectAllObjs, self.test_SelectWithWhere, self.test_SelectSpecificFields, self.test_selectOrderBy, self.test_limitNum, self.test_aggregates, self.test_getRecords) or meth in (self.test_sqlNulls, self.test_getColumns):
             try:
                 dbConn = ichorORM.getDatabaseConnection()
                 dbConn.executeSql("DELETE FROM %s" %(MyPersonModel.TABLE_NAME, ))
@@ -556,6 +556,75 @@ class TestSelectQuery(object):
         testIt(minAge, gotMinAge, repr(selQFields[4]))
 
 
+    def test_getRecords(self):
+        '''
+            test_getRecords - Test executeGetRecords returns lightweight records with attribute access
+        '''
+        selQ = SelectQuery(MyPersonModel, selectFields=['first_name', 'last_name', 'age'], orderByField='age')
+
+        records = selQ.executeGetRecords()
+
+        expectedDataSet = sorted(self.dataSet, key=lambda dataUnit : dataUnit['age'])
+
+        assert len(records) == len(expectedDataSet) , 'Expected %d records. Got %d: %s' %(len(expectedDataSet), len(records), repr(records))
+
+        for i in range(len(records)):
+            record = records[i]
+            expected = expectedDataSet[i]
+
+            assert issubclass(record.__class__, tuple) , 'Expected record to be a tuple. Got: ' + repr(record.__class__)
+
+            assert record.first_name == expected['first_name'] , 'Expected first_name %s. Got: %s' %(repr(expected['first_name']), repr(record.first_name))
+            assert record.last_name == expected['last_name'] , 'Expected last_name %s. Got: %s' %(repr(expected['last_name']), repr(record.last_name))
+            assert record.age == expected['age'] , 'Expected age %s. Got: %s' %(repr(expected['age']), repr(record.age))
+
+            assert tuple(record) == ( expected['first_name'], expected['last_name'], expected['age'] ) , 'Expected record to also act as a tuple. Got: ' + repr(record)
+
+        otherRecords = SelectQuery(MyPersonModel, selectFields=['first_name', 'last_name', 'age']).executeGetRecords()
+
+        assert otherRecords[0].__class__ is records[0].__class__ , 'Expected the record type to be shared by queries selecting the same fields.'
+
+
+    def test_getColumns(self):
+        '''
+            test_getColumns - Test executeGetColumns returns columns of values, with NULLs marked in the null masks
+        '''
+        selQ = SelectQuery(MyPersonModel, selectFields=['id', 'first_name', 'age', 'birth_day'], orderByField='id')
+
+        # Small chunk size to test appending across batches
+        columns = selQ.executeGetColumns(dtypes={ 'birth_day' : 'd' }, chunkSize=2)
+
+        assert list(columns.keys()) == ['id', 'first_name', 'age', 'birth_day'] , 'Expected a column per field, in order. Got: ' + repr(list(columns.keys()))
+
+        expectedDataSet = sorted(self.dataSet, key=lambda dataUnit : dataUnit['id'])
+
+        for fieldName in ('id', 'first_name', 'age', 'birth_day'):
+            column = columns[fieldName]
+            nullMask = columns.nullMasks[fieldName]
+
+            assert len(column) == len(expectedDataSet) , 'Expected %d values in column %s. Got %d' %(len(expectedDataSet), fieldName, len(column))
+            assert len(nullMask) == len(expectedDataSet) , 'Expected %d values in null mask of %s. Got %d' %(len(expectedDataSet), fieldName, len(nullMask))
+
+            for i in range(len(expectedDataSet)):
+                expectedValue = expectedDataSet[i][fieldName]
+
+                if expectedValue is None:
+                    assert nullMask[i] , 'Expected NULL to be marked in null mask of %s at %d' %(fieldName, i)
+                else:
+                    assert not nullMask[i] , 'Expected non-NULL to not be marked in null mask of %s at %d' %(fieldName, i)
+                    assert column[i] == expectedValue , 'Expected %s at %d to be %s. Got: %s' %(fieldName, i, repr(expectedValue), repr(column[i]))
+
+        assert str(columns['birth_day'].dtype if hasattr(columns['birth_day'], 'dtype') else columns['birth_day'].typecode) in ('d', 'float64') , 'Expected birth_day column to use the given dtype.'
+
+        # No results
+        selQ = SelectQuery(MyPersonModel, selectFields=['id', 'age'])
+        selQ.addStage().addCondition('id', '<', 0)
+
+        columns = selQ.executeGetColumns()
+
+        assert len(columns['id']) == 0 and len(columns['age']) == 0 , 'Expected empty columns on no results. Got: ' + repr(columns)
+
+
 
 if __name__ == '__main__':
     sys.exit(subprocess.Popen('GoodTests.py -n1 "%s" %s' %(sys.argv[0], ' '.join(['"%s"' %(arg.replace('"', '\\"'), ) for arg in sys.argv[1:]]) ), shell=True).wait())
@@ -0,0 +1,210 @@
+#!/usr/bin/env GoodTests.py
+'''
+    test_Sharding - Test routing a model's queries to shards
+'''
+
+import subprocess
+import sys
+
+import LocalConfig
+
+
+import ichorORM
+
+from ichorORM.model import DatabaseModel
+from ichorORM.query import SelectQuery, InsertQuery, UpdateQuery
+from ichorORM.sharding import HashShardMap, RangeShardMap, getShardNamesForQuery, mergeShardRows
+
+
+# Both shards are the test database, so a query sent to every shard sees each row once per shard
+SHARD_MAP = HashShardMap( [ ('shardOne', {}), ('shardTwo', {}) ], poolMaxSize=2 )
+
+
+class MyShardedModel(DatabaseModel):
+    '''
+        MyShardedModel - A model used to test sharding
+    '''
+
+    FIELDS = ['id', 'tenant_id', 'name', 'num']
+
+    REQUIRED_FIELDS = ['tenant_id', 'name']
+
+    TABLE_NAME = 'ichortest_my_sharded_model'
+
+    SHARD_KEY = 'tenant_id'
+
+    SHARD_MAP = SHARD_MAP
+
+
+class TestSharding(object):
+    '''
+        Test class for sharding
+    '''
+
+    def setup_class(self):
+        '''
+            setup_class - ensure this test is setup.
+                Executed prior to any of the tests in this class.
+        '''
+        LocalConfig.ensureTestSetup()
+
+        dbConn = ichorORM.getDatabaseConnection()
+        try:
+            dbConn.executeSql("DROP TABLE " + MyShardedModel.TABLE_NAME)
+        except:
+            pass
+
+        dbConn.executeSql("CREATE TABLE %s ( id serial primary key, tenant_id integer NOT NULL, name varchar(255) NOT NULL, num integer )" %(MyShardedModel.TABLE_NAME, ))
+
+
+    def teardown_class(self):
+        '''
+            teardown_class - Destroy any data generated by this test.
+                Ran after all tests have completed
+        '''
+        SHARD_MAP.closeAll()
+
+        try:
+            dbConn = ichorORM.getDatabaseConnection()
+            dbConn.executeSql("DROP TABLE %s" %(MyShardedModel.TABLE_NAME, ))
+        except Exception as e:
+            pass
+
+
+    def setup_method(self, meth):
+        '''
+            setup_method - Called prior to each method to perform setup specific to it.
+        '''
+        dbConn = ichorORM.getDatabaseConnection()
+        dbConn.executeSql("DELETE FROM %s" %(MyShardedModel.TABLE_NAME, ))
+
+
+    def test_shardMaps(self):
+        '''
+            test_shardMaps - Test mapping shard key values to shards
+        '''
+        shardName = SHARD_MAP.getShardNameForKey(12)
+        assert shardName in ('shardOne', 'shardTwo') , 'Expected a shard name. Got: ' + repr(shardName)
+        assert SHARD_MAP.getShardNameForKey('12') == shardName , 'Expected values with the same string form on the same shard.'
+
+        shardNames = set( [ SHARD_MAP.getShardNameForKey(i) for i in range(50) ] )
+        assert shardNames == set(['shardOne', 'shardTwo']) , 'Expected keys spread over both shards. Got: ' + repr(shardNames)
+
+        rangeMap = RangeShardMap( [ (1000, 'high', {}), (None, 'low', {}), (100, 'mid', {}) ] )
+        assert rangeMap.getShardNameForKey(5) == 'low' , 'Expected low shard for 5.'
+        assert rangeMap.getShardNameForKey(100) == 'mid' , 'Expected mid shard for 100.'
+        assert rangeMap.getShardNameForKey(999) == 'mid' , 'Expected mid shard for 999.'
+        assert rangeMap.getShardNameForKey(5000) == 'high' , 'Expected high shard for 5000.'
+
+        boundedMap = RangeShardMap( [ (100, 'mid', {}) ] )
+        gotException = False
+        try:
+            boundedMap.getShardNameForKey(5)
+        except KeyError:
+            gotException = True
+
+        assert gotException , 'Expected KeyError for a value below every range.'
+
+
+    def test_queryRouting(self):
+        '''
+            test_queryRouting - Test which shards a query is routed to
+        '''
+        q = SelectQuery(MyShardedModel)
+        q.addStage().addCondition('name', '=', 'one')
+        assert getShardNamesForQuery(q) == ['shardOne', 'shardTwo'] , 'Expected fan out without the shard key.'
+
+        q.addStage().addCondition('tenant_id', '=', 12)
+        assert getShardNamesForQuery(q) == [ SHARD_MAP.getShardNameForKey(12) ] , 'Expected the owning shard with the shard key.'
+
+        q = SelectQuery(MyShardedModel)
+        stage = q.addStage('OR')
+        stage.addCondition('tenant_id', '=', 12)
+        stage.addCondition('name', '=', 'one')
+        assert getShardNamesForQuery(q) == ['shardOne', 'shardTwo'] , 'Expected fan out when the shard key is OR\'d.'
+
+        q = InsertQuery(MyShardedModel, { 'name' : 'one' })
+        gotException = False
+        try:
+            getShardNamesForQuery(q)
+        except ValueError:
+            gotException = True
+
+        assert gotException , 'Expected ValueError routing an insert without the shard key.'
+
+
+    def test_mergeRows(self):
+        '''
+            test_mergeRows - Test merging ordered rows from several shards
+        '''
+        q = SelectQuery(MyShardedModel, selectFields=['name', 'num'], orderByField='num', limitNum=3, offsetNum=1)
+
+        shardRows = [ [ ('a', 1), ('b', 5), ('c', None) ], [ ('d', 2), ('e', 7) ] ]
+
+        rows = list( mergeShardRows(q, shardRows) )
+        assert rows == [ ('d', 2), ('b', 5), ('e', 7) ] , 'Expected merged, offset, and limited rows. Got: ' + repr(rows)
+
+        q = SelectQuery(MyShardedModel, selectFields=['name', 'num'], orderByField='num', orderByDir='DESC')
+
+        shardRows = [ [ ('c', None), ('b', 5), ('a', 1) ], [ ('e', 7), ('d', 2) ] ]
+
+        rows = list( mergeShardRows(q, shardRows) )
+        assert rows == [ ('c', None), ('e', 7), ('b', 5), ('d', 2), ('a', 1) ] , 'Expected NULLs first descending. Got: ' + repr(rows)
+
+
+    def test_models(self):
+        '''
+            test_models - Test inserting, getting, filtering, updating, and deleting sharded objects
+        '''
+        objs = [ MyShardedModel(tenant_id=tenantId, name='name%d' %(tenantId, ), num=tenantId) for tenantId in range(1, 6) ]
+        for obj in objs:
+            obj.insertObject()
+
+        assert objs[0].id , 'Expected primary key set on insert.'
+
+        gotException = False
+        try:
+            MyShardedModel(name='noTenant').insertObject()
+        except ValueError:
+            gotException = True
+
+        assert gotException , 'Expected ValueError inserting without the shard key.'
+
+        found = MyShardedModel.filter(tenant_id=3).fetch()
+        assert len(found) == 1 and found[0].name == 'name3' , 'Expected one object from the owning shard. Got: ' + repr(found)
+
+        # Without the shard key, every shard is queried ( here, the same database twice )
+        assert MyShardedModel.filter(name='name3').count() == 2 , 'Expected the object once per shard.'
+
+        nums = [ row[0] for row in SelectQuery(MyShardedModel, selectFields=['num'], orderByField='num', orderByDir='DESC', limitNum=3).executeGetRows() ]
+        assert nums == [5, 5, 4] , 'Expected merged order and limit. Got: ' + repr(nums)
+
+        nums = [ row[0] for row in SelectQuery(MyShardedModel, selectFields=['num'], orderByField='num', limitNum=3).executeIterRows() ]
+        assert nums == [1, 1, 2] , 'Expected merged order and limit when streaming. Got: ' + repr(nums)
+
+        obj = MyShardedModel.get(objs[1].id)
+        assert obj.name == 'name2' , 'Expected get to find the object. Got: ' + repr(obj)
+
+        obj.num = 200
+        obj.updateObject(['num'])
+        found = MyShardedModel.filter(tenant_id=2).fetch()
+        assert found[0].num == 200 , 'Expected update on the owning shard. Got: ' + repr(found)
+
+        gotException = False
+        try:
+            UpdateQuery(MyShardedModel, { 'tenant_id' : 9 }).executeUpdate()
+        except ValueError:
+            gotException = True
+
+        assert gotException , 'Expected ValueError updating the shard key.'
+
+        obj.delete()
+        assert not MyShardedModel.filter(tenant_id=2).exists() , 'Expected object deleted.'
+
+        for shardName in SHARD_MAP.getShardNames():
+            pool = SHARD_MAP.getPool(shardName)
+            assert pool.numIdle == pool.numOpen , 'Expected every connection returned to the pool of ' + shardName
+
+
+if __name__ == '__main__':
+    sys.exit(subprocess.Popen('GoodTests.py -n1 "%s" %s' %(sys.argv[0], ' '.join(['"%s"' %(arg.replace('"', '\\"'), ) for arg in sys.argv[1:]]) ), shell=True).wait())
@@ -0,0 +1,313 @@
+#!/usr/bin/env GoodTests.py
+'''
+    test_Transaction - Test transaction blocks and retries
+'''
+
+import subprocess
+import sys
+
+import LocalConfig
+
+import psycopg2
+
+import ichorORM
+
+from ichorORM.model import DatabaseModel
+from ichorORM.constants import ISOLATION_READ_COMMITTED, ISOLATION_REPEATABLE_READ, ISOLATION_SERIALIZABLE
+from ichorORM.transaction import transactional
+from ichorORM.instrumentation import addInstrumentationListener, removeInstrumentationListener
+
+
+class MyTransactionModel(DatabaseModel):
+    '''
+        MyTransactionModel - A model used to test transactions
+    '''
+
+    FIELDS = ['id', 'name', 'num']
+
+    REQUIRED_FIELDS = ['name']
+
+    TABLE_NAME = 'ichortest_my_transaction_model'
+
+
+class RetryableTestError(Exception):
+    '''
+        RetryableTestError - An exception with a serialization failure SQLSTATE
+    '''
+
+    def __init__(self):
+        Exception.__init__(self, 'serialization failure')
+        self.pgcode = '40001'
+
+
+class TestTransaction(object):
+    '''
+        Test class for transaction blocks
+    '''
+
+    def setup_class(self):
+        '''
+            setup_class - ensure this test is setup.
+                Executed prior to any of the tests in this class.
+        '''
+        LocalConfig.ensureTestSetup()
+
+        dbConn = ichorORM.getDatabaseConnection()
+        try:
+            dbConn.executeSql("DROP TABLE " + MyTransactionModel.TABLE_NAME)
+        except:
+            pass
+
+        dbConn.executeSql("CREATE TABLE %s ( id serial primary key, name varchar(255) NOT NULL, num integer )" %(MyTransactionModel.TABLE_NAME, ))
+
+
+    def teardown_class(self):
+        '''
+            teardown_class - Destroy any data generated by this test.
+                Ran after all tests have completed
+        '''
+        try:
+            dbConn = ichorORM.getDatabaseConnection()
+            dbConn.executeSql("DROP TABLE %s" %(MyTransactionModel.TABLE_NAME, ))
+        except Exception as e:
+            pass
+
+
+    def setup_method(self, meth):
+        '''
+            setup_method - Called prior to each method to perform setup specific to it.
+        '''
+        dbConn = ichorORM.getDatabaseConnection()
+        dbConn.executeSql("DELETE FROM %s" %(MyTransactionModel.TABLE_NAME, ))
+        dbConn.executeSql("INSERT INTO %s (name, num) VALUES ('one', 1)" %(MyTransactionModel.TABLE_NAME, ))
+
+
+    def _getNum(self):
+        objs = MyTransactionModel.filter(name='one').fetch()
+        assert len(objs) == 1 , 'Expected one object. Got: ' + repr(objs)
+        return objs[0].num
+
+
+    def test_commitAndRollback(self):
+        '''
+            test_commitAndRollback - Test a transaction block commits on success, and rolls back upon an exception
+        '''
+        dbConn = ichorORM.getDatabaseConnection()
+
+        with dbConn.transaction():
+            dbConn.executeSql("UPDATE %s SET num = 2" %(MyTransactionModel.TABLE_NAME, ))
+            # Operations which commit do not end the block
+            dbConn.commit()
+
+            assert self._getNum() == 1 , 'Expected change to not be visible to other connections before the block completes.'
+
+        assert self._getNum() == 2 , 'Expected change to be committed when the block completes.'
+        assert dbConn.isTransaction is False , 'Expected connection to return to autocommit mode after the block.'
+
+        gotException = False
+        try:
+            with dbConn.transaction(isolation='SERIALIZABLE'):
+                dbConn.executeSql("UPDATE %s SET num = 3" %(MyTransactionModel.TABLE_NAME, ))
+
+                # A nested block is a savepoint, and is rolled back with the outer transaction
+                with dbConn.transaction():
+                    dbConn.executeSql("UPDATE %s SET num = 4" %(MyTransactionModel.TABLE_NAME, ))
+
+                raise ValueError('abort')
+        except ValueError:
+            gotException = True
+
+        assert gotException , 'Expected exception to be raised from the block.'
+        assert self._getNum() == 2 , 'Expected change to be rolled back upon exception.'
+
+        # Autocommit works again after the block
+        dbConn.executeSql("UPDATE %s SET num = 5" %(MyTransactionModel.TABLE_NAME, ))
+        assert self._getNum() == 5 , 'Expected autocommit after the block.'
+
+
+    def test_characteristics(self):
+        '''
+            test_characteristics - Test isolation level, read only, and deferrable on connections and transaction blocks
+        '''
+        dbConn = ichorORM.getDatabaseConnection(isolationLevel=ISOLATION_REPEATABLE_READ)
+
+        with dbConn.transaction():
+            isolationLevel = dbConn.doSelect("SHOW transaction_isolation")[0][0]
+            assert isolationLevel == 'repeatable read' , 'Expected connection isolation level to be used in block. Got: ' + repr(isolationLevel)
+
+        with dbConn.transaction(isolation=ISOLATION_SERIALIZABLE, readOnly=True, deferrable=True):
+            row = dbConn.doSelect("SELECT current_setting('transaction_isolation'), current_setting('transaction_read_only'), current_setting('transaction_deferrable')")[0]
+            assert tuple(row) == ('serializable', 'on', 'on') , 'Expected block settings to be used. Got: ' + repr(row)
+
+        gotException = False
+        try:
+            with dbConn.transaction(readOnly=True):
+                dbConn.executeSql("UPDATE %s SET num = 2" %(MyTransactionModel.TABLE_NAME, ))
+        except Exception as e:
+            gotException = True
+
+        assert gotException , 'Expected a write in a READ ONLY block to fail.'
+        assert self._getNum() == 1 , 'Expected no change from READ ONLY block.'
+
+        dbConn.setTransactionCharacteristics(isolationLevel=ISOLATION_READ_COMMITTED, readOnly=True)
+        dbConn.beginTransactionMode()
+        try:
+            row = dbConn.doSelect("SELECT current_setting('transaction_isolation'), current_setting('transaction_read_only')")[0]
+            assert tuple(row) == ('read committed', 'on') , 'Expected connection settings in transaction mode. Got: ' + repr(row)
+            dbConn.rollback()
+        finally:
+            dbConn.endTransactionMode()
+
+        gotException = False
+        try:
+            dbConn.transaction(isolation='SOMETIMES')
+        except ValueError:
+            gotException = True
+
+        assert gotException , 'Expected ValueError on an unknown isolation level.'
+
+
+    def test_savepoints(self):
+        '''
+            test_savepoints - Test savepoints and nested transaction blocks absorb failures within a transaction
+        '''
+        dbConn = ichorORM.getDatabaseConnection()
+
+        existingId = dbConn.doSelect("SELECT id FROM %s" %(MyTransactionModel.TABLE_NAME, ))[0][0]
+
+        insertSql = "INSERT INTO " + MyTransactionModel.TABLE_NAME + " (id, name, num) VALUES ( %(id)s, %(name)s, %(num)s )"
+        valueDicts = [
+            { 'id' : existingId + 1, 'name' : 'two', 'num' : 2 },
+            { 'id' : existingId, 'name' : 'duplicate', 'num' : 3 },
+            { 'id' : existingId + 2, 'name' : 'three', 'num' : 3 },
+        ]
+
+        numFailed = 0
+        with dbConn.transaction():
+            for valueDict in valueDicts:
+                try:
+                    with dbConn.savepoint():
+                        dbConn.executeSqlParams(insertSql, valueDict)
+                except psycopg2.IntegrityError:
+                    numFailed += 1
+
+            # Nested block
+            try:
+                with dbConn.transaction():
+                    dbConn.executeSql("UPDATE %s SET num = 100" %(MyTransactionModel.TABLE_NAME, ))
+                    raise ValueError('abort')
+            except ValueError:
+                pass
+
+            dbConn.executeSql("UPDATE %s SET num = num + 10 WHERE name = 'three'" %(MyTransactionModel.TABLE_NAME, ))
+
+        assert numFailed == 1 , 'Expected one failed insert. Got: %d' %(numFailed, )
+
+        rows = dbConn.doSelect("SELECT name, num FROM %s ORDER BY id" %(MyTransactionModel.TABLE_NAME, ))
+        assert [ tuple(row) for row in rows ] == [ ('one', 1), ('two', 2), ('three', 13) ] , 'Expected all but the failed insert and rolled back nested block to be committed. Got: ' + repr(rows)
+
+        gotException = False
+        try:
+            with dbConn.savepoint():
+                pass
+        except ValueError:
+            gotException = True
+
+        assert gotException , 'Expected ValueError on a savepoint outside of a transaction.'
+
+
+    def test_retries(self):
+        '''
+            test_retries - Test a block is re-run upon a serialization failure, and retries are reported
+        '''
+        dbConn = ichorORM.getDatabaseConnection()
+        otherDbConn = ichorORM.getDatabaseConnection()
+
+        events = []
+        def _listener(eventName, eventData):
+            events.append( (eventName, eventData) )
+
+        addInstrumentationListener(_listener)
+        try:
+            attemptNum = 0
+            for txn in dbConn.transaction(isolation='REPEATABLE READ', retries=2, backoff=0):
+                with txn:
+                    attemptNum += 1
+                    num = dbConn.doSelect("SELECT num FROM %s" %(MyTransactionModel.TABLE_NAME, ))[0][0]
+
+                    if attemptNum == 1:
+                        # Concurrent update, causing a serialization failure on our update
+                        otherDbConn.executeSql("UPDATE %s SET num = 10" %(MyTransactionModel.TABLE_NAME, ))
+
+                    dbConn.executeSqlParams("UPDATE " + MyTransactionModel.TABLE_NAME + " SET num = %(num)s", { 'num' : num + 1 })
+        finally:
+            removeInstrumentationListener(_listener)
+
+        assert attemptNum == 2 , 'Expected block to run twice. Ran %d times.' %(attemptNum, )
+        assert self._getNum() == 11 , 'Expected the retry to see the concurrent update. Got: ' + repr(self._getNum())
+
+        retryEvents = [ event for event in events if event[0] == 'transaction_retry' ]
+        assert len(retryEvents) == 1 , 'Expected one transaction_retry event. Got: ' + repr(events)
+        assert retryEvents[0][1]['sqlstate'] == '40001' , 'Expected sqlstate on event. Got: ' + repr(retryEvents[0][1])
+
+        # Out of retries
+        attempts = []
+        def _alwaysFails(_dbConn):
+            attempts.append(1)
+            raise RetryableTestError()
+
+        gotException = False
+        try:
+            dbConn.runTransaction(_alwaysFails, retries=2, backoff=0)
+        except RetryableTestError:
+            gotException = True
+
+        assert gotException , 'Expected error to be raised once out of retries.'
+        assert len(attempts) == 3 , 'Expected 3 attempts with 2 retries. Got: %d' %(len(attempts), )
+
+
+    def test_retriesNotIterated(self):
+        '''
+            test_retriesNotIterated - Test a retryable error is raised ( and rolled back ) when the block is not iterated,
+                as nothing would re-run it
+        '''
+        dbConn = ichorORM.getDatabaseConnection()
+
+        gotException = False
+        try:
+            with dbConn.transaction(retries=3, backoff=0):
+                dbConn.executeSql("INSERT INTO %s (name, num) VALUES ('two', 2)" %(MyTransactionModel.TABLE_NAME, ))
+                raise RetryableTestError()
+        except RetryableTestError:
+            gotException = True
+
+        assert gotException , 'Expected the retryable error to be raised from a with block which is not iterated.'
+
+        rows = dbConn.doSelect("SELECT name FROM %s WHERE name = 'two'" %(MyTransactionModel.TABLE_NAME, ))
+        assert len(rows) == 0 , 'Expected the block to be rolled back. Got: ' + repr(rows)
+
+
+    def test_transactional(self):
+        '''
+            test_transactional - Test the transactional decorator
+        '''
+        attempts = []
+
+        @transactional(retries=3, backoff=0)
+        def _increment(amount, dbConn=None):
+            dbConn.executeSqlParams("UPDATE " + MyTransactionModel.TABLE_NAME + " SET num = num + %(amount)s", { 'amount' : amount })
+            attempts.append(1)
+            if len(attempts) < 3:
+                raise RetryableTestError()
+
+            return 'done'
+
+        ret = _increment(5)
+
+        assert ret == 'done' , 'Expected return of the function. Got: ' + repr(ret)
+        assert len(attempts) == 3 , 'Expected function to be run 3 times. Got: %d' %(len(attempts), )
+        assert self._getNum() == 6 , 'Expected only the successful attempt to be committed. Got: ' + repr(self._getNum())
+
+
+if __name__ == '__main__':
+    sys.exit(subprocess.Popen('GoodTests.py -n1 "%s" %s' %(sys.argv[0], ' '.join(['"%s"' %(arg.replace('"', '\\"'), ) for arg in sys.argv[1:]]) ), shell=True).wait())
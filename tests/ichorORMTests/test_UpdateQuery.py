@@ -16,6 +16,7 @@ import ichorORM
 
 from ichorORM.model import DatabaseModel
 from ichorORM.query import UpdateQuery, SelectQuery, QueryStr
+from ichorORM.expressions import F
 
 from ichor_test_models.all import Person, Meal
 
@@ -75,7 +76,7 @@ class TestUpdateQuery(object):
                 @param meth <built-in method> - The method being tested (compare meth == self.someMethod)
         '''
 
-        if meth in ( self.test_generalUpdate, self.test_updateTransaction, self.test_updateWithQueryStr ):
+        if meth in ( self.test_generalUpdate, self.test_updateTransaction, self.test_updateWithQueryStr, self.test_updateWithExpression ):
 
             # self.DEFAULT_PERSON_DATASET - A sample dataset of field -> value for Person model
             self.DEFAULT_PERSON_DATASET = [
@@ -115,7 +116,7 @@ class TestUpdateQuery(object):
 
                 @param meth <built-in method> - The method being tested (compare meth == self.someMethod)
         '''
-        if meth in ( self.test_generalUpdate, self.test_updateTransaction, self.test_updateWithQueryStr ):
+        if meth in ( self.test_generalUpdate, self.test_updateTransaction, self.test_updateWithQueryStr, self.test_updateWithExpression ):
             self._deleteGlobalDatasets()
 
 
@@ -359,5 +360,53 @@ class TestUpdateQuery(object):
                 assert fieldValue == expectedValue , 'Got unexpected value after update incrementing age. On person %s %s  field "%s" does not have expected value %s. Fetched value was %s' %( first_name, last_name, fieldName, repr(expectedValue), repr(fieldValue) )
 
 
+    def test_updateWithExpression(self):
+        '''
+            test_updateWithExpression - This will test an update which uses F expressions,
+                and RETURNING the updated values
+        '''
+
+        # Set everyone's age to age * 2 + 1 , for those with a birth day after their birth month
+        upQ = UpdateQuery(Person)
+
+        upQ.setFieldValue('age', F('age') * 2 + 1)
+        upQ.setReturningFields(['id', 'age'])
+
+        upQWhere = upQ.addStage()
+        upQWhere.addCondition('datasetuid', '=', self.datasetUid)
+        upQWhere.addCondition('birth_day', '>', F('birth_month'))
+
+        (sql, params) = upQ.getSqlParameterizedValues()
+
+        assert 'age * ' in sql , 'Expected expression to be within the SQL, not a parameter. Got: ' + sql
+        assert 2 in params.values() and 1 in params.values() , 'Expected expression values to be parameters. Got: ' + repr(params)
+
+        gotException = False
+        try:
+            returnedRows = upQ.execute()
+        except Exception as e:
+            gotException = e
+
+        assert gotException == False , 'Got exception on update with expression: %s  %s' %( str(type(gotException)), str(gotException) )
+
+        expectedUpdatedIds = set([ _id for _id, dataItem in self.personIdToDataset.items() if dataItem['birth_day'] > dataItem['birth_month'] ])
+
+        assert set([ row[0] for row in returnedRows ]) == expectedUpdatedIds , 'Expected RETURNING rows for ids %s , but got rows: %s' %(repr(expectedUpdatedIds), repr(returnedRows))
+
+        dbConn = ichorORM.getDatabaseConnection()
+
+        results = dbConn.doSelect("SELECT id, age FROM Person WHERE datasetuid = '%s'" %( self.datasetUid, ))
+
+        assert len(results) == len(self.DEFAULT_PERSON_DATASET) , 'Did not get expected number of results back. Expected %d but got %d' %( len(self.DEFAULT_PERSON_DATASET), len(results))
+
+        for (_id, age) in results:
+
+            expectedAge = self.personIdToDataset[_id]['age']
+            if _id in expectedUpdatedIds:
+                expectedAge = expectedAge * 2 + 1
+
+            assert age == expectedAge , 'Expected person id=%d to have age %d after update with expression. Got: %s' %(_id, expectedAge, repr(age))
+
+
 if __name__ == '__main__':
     sys.exit(subprocess.Popen('GoodTests.py -n1 "%s" %s' %(sys.argv[0], ' '.join(['"%s"' %(arg.replace('"', '\\"'), ) for arg in sys.argv[1:]]) ), shell=True).wait())